@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Benchmark: event-loop latency with inline vs pooled diskcache I/O.
+
+Runs a mixed read/write workload against a throwaway price cache from many
+concurrent coroutines, while a monitor coroutine measures how late the event
+loop wakes up from a 1 ms sleep.  The workload runs twice:
+
+- ``inline``: ``lookup_cached`` / ``set_cached_price`` called directly on the
+  event loop (the old request-handler behaviour).
+- ``pool``: the same calls through ``run_cache_io`` (the cache I/O pool).
+
+Optional background writer threads hold the SQLite write lock in short
+transactions to simulate write contention / a slow disk.
+
+The in-memory tier is disabled for the run so every read hits SQLite.
+
+USAGE
+-----
+    python scripts/bench_cache_io.py
+    python scripts/bench_cache_io.py --concurrency 500 --duration 10 --contention-threads 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import diskcache
+
+# Allow running from repo root without installing
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import src.cache as cache_module
+from src.cache import close_cache, lookup_cached, run_cache_io, set_cached_price
+
+TOKENS = [f"0x{i:040x}" for i in range(1, 201)]
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+    return ordered[idx]
+
+
+def _seed(entries: int) -> None:
+    for i in range(entries):
+        set_cached_price(TOKENS[i % len(TOKENS)], 18_000_000 + i, 1.0 + i, block_timestamp=i)
+
+
+def _contention(cache_dir: str, stop: threading.Event, hold_seconds: float) -> None:
+    """Hold the write lock in short bursts, like a busy batch writer."""
+    cache = diskcache.Cache(cache_dir, disk=cache_module.PriceDisk)
+    i = 0
+    try:
+        while not stop.is_set():
+            with cache.transact():
+                for _ in range(50):
+                    cache.set(f"contention:{i}", {"price": float(i)})
+                    i += 1
+                time.sleep(hold_seconds)
+            # Release the lock for as long as it was held so other writers get a turn
+            time.sleep(hold_seconds)
+    finally:
+        cache.close()
+
+
+async def _run_mode(
+    mode: str, entries: int, concurrency: int, duration: float, write_ratio: float
+) -> tuple[int, list[float]]:
+    lags: list[float] = []
+    ops = 0
+    deadline = time.perf_counter() + duration
+
+    async def monitor() -> None:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - start - 0.001)
+
+    async def worker(seed: int) -> None:
+        nonlocal ops
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            i = rng.randrange(entries)
+            token, block = TOKENS[i % len(TOKENS)], 18_000_000 + i
+            if rng.random() < write_ratio:
+                if mode == "pool":
+                    await run_cache_io(set_cached_price, token, block, 2.0, block_timestamp=i)
+                else:
+                    set_cached_price(token, block, 2.0, block_timestamp=i)
+            elif mode == "pool":
+                await run_cache_io(lookup_cached, token, block)
+            else:
+                lookup_cached(token, block)
+            ops += 1
+            await asyncio.sleep(0)
+
+    await asyncio.gather(monitor(), *(worker(n) for n in range(concurrency)))
+    return ops, lags
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=20_000, help="Entries to seed")
+    parser.add_argument("--concurrency", type=int, default=200, help="Concurrent coroutines")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per mode")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="Fraction of writes")
+    parser.add_argument(
+        "--contention-threads",
+        type=int,
+        default=1,
+        help="Background threads holding the write lock (default: 1)",
+    )
+    parser.add_argument(
+        "--hold-ms", type=float, default=5.0, help="Write-lock hold time per burst (ms)"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench-cache-io-") as cache_dir:
+        cache_module.CACHE_DIR = cache_dir
+        cache_module.HOT_CACHE_MAXSIZE = 0
+        print(f"Seeding {args.entries} entries in {cache_dir} ...")
+        _seed(args.entries)
+
+        stop = threading.Event()
+        threads = [
+            threading.Thread(
+                target=_contention, args=(cache_dir, stop, args.hold_ms / 1000), daemon=True
+            )
+            for _ in range(args.contention_threads)
+        ]
+        for t in threads:
+            t.start()
+
+        print(
+            f"concurrency={args.concurrency} duration={args.duration}s "
+            f"write_ratio={args.write_ratio} contention_threads={args.contention_threads} "
+            f"io_workers={cache_module.CACHE_IO_WORKERS}\n"
+        )
+        print(f"{'mode':<8} {'ops/s':>10} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+        try:
+            for mode in ("inline", "pool"):
+                ops, lags = asyncio.run(
+                    _run_mode(mode, args.entries, args.concurrency, args.duration, args.write_ratio)
+                )
+                print(
+                    f"{mode:<8} {ops / args.duration:>10.0f} "
+                    f"{statistics.median(lags) * 1000 if lags else 0.0:>11.2f} "
+                    f"{_percentile(lags, 99) * 1000:>11.2f} "
+                    f"{max(lags, default=0.0) * 1000:>11.2f}"
+                )
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
+            close_cache()
+
+
+if __name__ == "__main__":
+    main()
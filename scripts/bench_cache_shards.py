@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Benchmark: cache write throughput by shard count under concurrent writers.
+
+Starts ``--writers`` threads that each write price entries as fast as they
+can for ``--duration`` seconds, through the same ``set_cached_price`` /
+``set_cached_prices_many`` calls the server uses, against a throwaway cache
+opened with each shard count in turn.  With one shard every writer queues on
+the same SQLite write lock; with more shards, writers to different shards
+proceed in parallel.
+
+The in-memory tier is disabled so every write hits SQLite.
+
+USAGE
+-----
+    python scripts/bench_cache_shards.py
+    python scripts/bench_cache_shards.py --writers 32 --shards 1 4 8 16 --batch 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Allow running from repo root without installing
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import src.cache as cache_module
+from src.cache import (
+    close_cache,
+    get_cache,
+    open_cache,
+    set_cached_price,
+    set_cached_prices_many,
+)
+
+
+def _writer(n: int, batch: int, stop: threading.Event, counts: list[int]) -> None:
+    token = f"0x{n:040x}"
+    block = 0
+    while not stop.is_set():
+        if batch <= 1:
+            set_cached_price(token, block, 1.0, block_timestamp=block)
+            block += 1
+            counts[n] += 1
+        else:
+            set_cached_prices_many((token, block + i, 1.0, block + i) for i in range(batch))
+            block += batch
+            counts[n] += batch
+
+
+def _run(shards: int, writers: int, batch: int, duration: float, synchronous: int) -> float:
+    with tempfile.TemporaryDirectory(prefix="bench-cache-shards-") as cache_dir:
+        cache_module.CACHE_DIR = cache_dir
+        cache_module.CACHE_SHARDS = shards
+        # diskcache persists settings in the directory, so get_cache() reuses this
+        open_cache(cache_dir, shards, sqlite_synchronous=synchronous).close()
+        get_cache()  # open before the clock starts
+        stop = threading.Event()
+        counts = [0] * writers
+        threads = [
+            threading.Thread(target=_writer, args=(n, batch, stop, counts), daemon=True)
+            for n in range(writers)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(duration)
+        stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        close_cache()
+        return sum(counts) / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=32, help="Concurrent writer threads")
+    parser.add_argument(
+        "--shards", type=int, nargs="+", default=[1, 4, 8, 16], help="Shard counts to compare"
+    )
+    parser.add_argument(
+        "--batch", type=int, default=1, help="Entries per write call (>1 uses the bulk write)"
+    )
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per shard count")
+    parser.add_argument(
+        "--synchronous",
+        type=int,
+        choices=(0, 1, 2),
+        default=1,
+        help="SQLite synchronous pragma: 0=OFF, 1=NORMAL (diskcache default), 2=FULL (fsync "
+        "per commit, closer to a slow network volume)",
+    )
+    args = parser.parse_args()
+
+    cache_module.HOT_CACHE_MAXSIZE = 0
+    print(
+        f"writers={args.writers} batch={args.batch} duration={args.duration}s "
+        f"synchronous={args.synchronous}\n"
+    )
+    print(f"{'shards':>6} {'writes/s':>12} {'vs 1 shard':>11}")
+    baseline: float | None = None
+    for shards in args.shards:
+        rate = _run(shards, args.writers, args.batch, args.duration, args.synchronous)
+        baseline = baseline or rate
+        print(f"{shards:>6} {rate:>12.0f} {rate / baseline:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Export the price cache to a snapshot file, or seed a cache from one.
+
+Snapshots hold every cached price as a compact sorted record (token, block,
+price, block_timestamp) in a gzip stream; see ``src/snapshot.py`` for the
+format.  Importing writes directly into diskcache, which is orders of
+magnitude faster than replaying the lookups through the API.
+
+Import never overwrites entries already in the cache and keeps its progress
+in ``$CACHE_DIR/.snapshot-import.json``: re-running an interrupted import
+resumes it, and re-running a finished one exits immediately.  That makes it
+safe to run on every container start (``CACHE_SNAPSHOT`` in
+``setup-networks.sh``).
+
+Usage
+-----
+    # Export the current cache (run inside the chain's container)
+    python scripts/cache_snapshot.py export /data/cache/ethereum.snap
+
+    # Seed a fresh cache
+    CACHE_DIR=/data/cache python scripts/cache_snapshot.py import ethereum.snap
+
+    # Show a snapshot's header
+    python scripts/cache_snapshot.py info ethereum.snap
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Allow running from repo root without installing
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.cache import close_cache
+from src.snapshot import SnapshotError, export_snapshot, import_snapshot, read_snapshot_header
+
+
+def _export(args: argparse.Namespace) -> None:
+    start = time.perf_counter()
+    header = export_snapshot(
+        args.path,
+        chain=args.chain,
+        progress=lambda scanned: print(f"  scanned {scanned}", flush=True),
+    )
+    size = os.path.getsize(args.path)
+    print(
+        f"\nExported {header.count} prices for {header.chain} to {args.path} "
+        f"({size / 2**20:.1f} MiB) in {time.perf_counter() - start:.1f}s."
+    )
+
+
+def _import(args: argparse.Namespace) -> None:
+    start = time.perf_counter()
+
+    def progress(done: int, total: int) -> None:
+        print(f"  {done}/{total}", flush=True)
+
+    result = import_snapshot(
+        args.path,
+        chain=None if args.any_chain else args.chain,
+        batch_size=args.batch_size,
+        progress=progress,
+    )
+    elapsed = time.perf_counter() - start
+    resumed = f", resumed at record {result.resumed_from}" if result.resumed_from else ""
+    print(
+        f"\nImported {result.imported} prices ({result.existing} already cached{resumed}) "
+        f"in {elapsed:.1f}s."
+    )
+
+
+def _info(args: argparse.Namespace) -> None:
+    header = read_snapshot_header(args.path)
+    print(f"chain:      {header.chain}")
+    print(f"created_at: {header.created_at}")
+    print(f"prices:     {header.count}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Export or import price cache snapshots.",
+    )
+    parser.add_argument(
+        "--chain",
+        default=os.environ.get("CHAIN_NAME", "ethereum"),
+        help="Chain recorded on export / required on import (default: $CHAIN_NAME)",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="Write the cache to a snapshot file")
+    export.add_argument("path", help="Snapshot file to write")
+    export.set_defaults(func=_export)
+
+    load = sub.add_parser("import", help="Load a snapshot into the cache")
+    load.add_argument("path", help="Snapshot file to read")
+    load.add_argument(
+        "--batch-size",
+        type=int,
+        default=10_000,
+        help="Entries written per transaction (default: 10000)",
+    )
+    load.add_argument(
+        "--any-chain",
+        action="store_true",
+        help="Import even if the snapshot was taken on another chain",
+    )
+    load.set_defaults(func=_import)
+
+    info = sub.add_parser("info", help="Print a snapshot's header")
+    info.add_argument("path", help="Snapshot file to read")
+    info.set_defaults(func=_info)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except SnapshotError as e:
+        sys.exit(f"error: {e}")
+    finally:
+        close_cache()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Repack legacy JSON cache entries into the compact binary layout.
+
+The server reads both formats transparently (see ``PriceDisk`` in
+``src/cache.py``), so this migration is optional: entries written before the
+binary layout existed stay zlib-compressed JSON until they are overwritten.
+Running this script rewrites them in place, keeping each entry's remaining
+TTL, and reclaims the space.  Rewritten error entries are also added to the
+error index used by ``get_cached_errors()``.
+
+Run it offline (server stopped) or during a quiet period — it takes the
+cache write lock for one transaction per ``--batch-size`` entries.  It is
+idempotent: already-packed entries are skipped, so it can be interrupted and
+re-run.
+
+Usage
+-----
+    # Migrate the default cache directory
+    python scripts/migrate_cache.py
+
+    # Count legacy entries without rewriting anything
+    python scripts/migrate_cache.py --dry-run
+
+    # Override cache directory
+    CACHE_DIR=/path/to/cache python scripts/migrate_cache.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import zlib
+from pathlib import Path
+
+# Allow running from repo root without installing
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.cache import close_cache, entry_tag, get_cache, is_packed_value
+
+
+def migrate(batch_size: int, dry_run: bool) -> tuple[int, int, int]:
+    """Rewrite legacy entries; returns ``(scanned, migrated, skipped)``."""
+    cache = get_cache()
+    scanned = migrated = skipped = 0
+    pending: list[tuple[str, object, float | None]] = []
+
+    def flush() -> None:
+        nonlocal migrated
+        if not pending:
+            return
+        if not dry_run:
+            with cache.transact():
+                for key, value, expire in pending:
+                    cache.set(key, value, expire=expire, tag=entry_tag(key, value))
+        migrated += len(pending)
+        pending.clear()
+
+    for key in cache:
+        scanned += 1
+        # Keys this server did not write are left alone
+        if not isinstance(key, str):
+            skipped += 1
+            continue
+        raw, expire_time = cache.get(key, read=True, expire_time=True)
+        # raw is None if the entry expired since the scan started; large values
+        # stored as files come back as handles and are left alone
+        if raw is None or not isinstance(raw, bytes) or is_packed_value(raw):
+            skipped += 1
+            continue
+        expire = None
+        if expire_time is not None:
+            expire = expire_time - time.time()
+            if expire <= 0:
+                skipped += 1
+                continue
+        pending.append((key, json.loads(zlib.decompress(raw).decode("utf-8")), expire))
+        if len(pending) >= batch_size:
+            flush()
+            print(f"  scanned {scanned}, migrated {migrated}", flush=True)
+    flush()
+    return scanned, migrated, skipped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Repack legacy JSON cache entries into the binary layout.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Entries rewritten per transaction (default: 1000)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Count legacy entries without rewriting them",
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        scanned, migrated, skipped = migrate(args.batch_size, args.dry_run)
+    finally:
+        close_cache()
+    verb = "would migrate" if args.dry_run else "migrated"
+    print(
+        f"\nDone in {time.perf_counter() - start:.1f}s: scanned {scanned}, "
+        f"{verb} {migrated}, skipped {skipped} (already packed or expired)."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Copy the price cache into a different shard layout.
+
+The server opens ``CACHE_DIR`` with ``CACHE_SHARDS`` shards (1 = a single
+SQLite database, >1 = a diskcache FanoutCache).  Changing ``CACHE_SHARDS`` on
+an existing volume starts from an empty cache, and the server logs
+``cache_layout_mismatch`` until the entries are moved across.  This script
+copies every unexpired entry from the existing layout into the new one,
+keeping each entry's remaining TTL and tag.  The new layout gets the same
+``CACHE_*`` settings as the server, and nothing is culled during the copy.
+
+Both layouts can live in the same directory (the single database is
+``cache.db``, shards are ``000/``, ``001/``, ...), so the default is an
+in-place migration.  Run it with the server stopped.
+
+Usage
+-----
+    # Split the existing single-database cache into 8 shards
+    CACHE_SHARDS=8 python scripts/reshard_cache.py
+
+    # Explicit shard count, then delete the old layout
+    python scripts/reshard_cache.py --shards 8 --remove-source
+
+    # Copy from another directory
+    python scripts/reshard_cache.py --source /old/cache --shards 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+# Allow running from repo root without installing
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import src.cache as cache_module
+from src.cache import PriceCache, _cache_settings, cache_layout, open_cache
+
+
+def copy_entries(source: PriceCache, dest: PriceCache, batch_size: int) -> tuple[int, int]:
+    """Copy unexpired entries; returns ``(copied, skipped)``."""
+    copied = skipped = 0
+    pending: list[tuple[object, object, float | None, str | None]] = []
+
+    def flush() -> None:
+        nonlocal copied
+        with dest.transact():
+            for key, value, expire, tag in pending:
+                dest.set(key, value, expire=expire, tag=tag, retry=True)
+        copied += len(pending)
+        pending.clear()
+
+    for key in source:
+        value, expire_time, tag = source.get(key, expire_time=True, tag=True)
+        if value is None:
+            skipped += 1
+            continue
+        expire = None
+        if expire_time is not None:
+            expire = expire_time - time.time()
+            if expire <= 0:
+                skipped += 1
+                continue
+        pending.append((key, value, expire, tag))
+        if len(pending) >= batch_size:
+            flush()
+            print(f"  copied {copied}", flush=True)
+    if pending:
+        flush()
+    return copied, skipped
+
+
+def remove_layout(directory: str, shards: int) -> None:
+    """Delete the database files of one cache layout in ``directory``."""
+    if shards == 1:
+        for suffix in ("", "-wal", "-shm"):
+            path = os.path.join(directory, f"cache.db{suffix}")
+            if os.path.exists(path):
+                os.remove(path)
+    else:
+        for n in range(shards):
+            shutil.rmtree(os.path.join(directory, f"{n:03d}"), ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Copy the price cache into a different shard layout.",
+    )
+    parser.add_argument(
+        "--source",
+        default=cache_module.CACHE_DIR,
+        help="Directory holding the existing cache (default: $CACHE_DIR)",
+    )
+    parser.add_argument(
+        "--dest",
+        default=cache_module.CACHE_DIR,
+        help="Directory for the new layout (default: $CACHE_DIR)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=max(1, cache_module.CACHE_SHARDS),
+        help="Shard count of the new layout (default: $CACHE_SHARDS)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Entries written per transaction (default: 1000)",
+    )
+    parser.add_argument(
+        "--remove-source",
+        action="store_true",
+        help="Delete the old layout after a successful copy",
+    )
+    args = parser.parse_args()
+
+    source_shards = cache_layout(args.source)
+    if source_shards == 0:
+        sys.exit(f"No cache found in {args.source}")
+    same_dir = os.path.realpath(args.source) == os.path.realpath(args.dest)
+    if same_dir and source_shards == args.shards:
+        print(f"{args.source} already has {args.shards} shard(s); nothing to do.")
+        return
+    if cache_layout(args.dest) not in (0, source_shards if same_dir else 0):
+        sys.exit(f"{args.dest} already holds a cache in another layout; refusing to merge")
+
+    print(f"Copying {args.source} ({source_shards} shard(s)) -> {args.dest} ({args.shards})")
+    start = time.perf_counter()
+    settings = _cache_settings()
+    source = open_cache(args.source, source_shards, **settings)
+    # Nothing may be culled mid-copy; the configured limit is restored afterwards
+    dest = open_cache(args.dest, args.shards, **{**settings, "cull_limit": 0})
+    try:
+        copied, skipped = copy_entries(source, dest, args.batch_size)
+        dest.reset("cull_limit", settings["cull_limit"])
+    finally:
+        source.close()
+        dest.close()
+    print(
+        f"\nDone in {time.perf_counter() - start:.1f}s: copied {copied}, "
+        f"skipped {skipped} (expired)."
+    )
+    if args.remove_source:
+        remove_layout(args.source, source_shards)
+        print(f"Removed the {source_shards}-shard layout from {args.source}.")
+
+
+if __name__ == "__main__":
+    main()
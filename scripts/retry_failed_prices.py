@@ -25,6 +25,10 @@ Usage
     # Dry-run: list errors without retrying
     python scripts/retry_failed_prices.py --dry-run
 
+    # Only the first 100 errors (in block order), then the next 100
+    python scripts/retry_failed_prices.py --limit 100
+    python scripts/retry_failed_prices.py --limit 100 --after 18000000:0xabc...
+
     # Override cache directory
     CACHE_DIR=/path/to/cache python scripts/retry_failed_prices.py
 """
@@ -33,6 +37,7 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import itertools
 import sys
 from pathlib import Path
 
@@ -41,7 +46,7 @@ import httpx
 # Allow running from repo root without installing
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from src.cache import get_cached_errors
+from src.cache import CacheErrorHit, get_cached_errors, lookup_cached
 
 
 async def _retry_one(
@@ -87,9 +92,11 @@ async def retry_all(
     chain: str,
     concurrency: int,
     dry_run: bool,
+    limit: int | None = None,
+    after: tuple[int, str] | None = None,
 ) -> None:
     """Scan cache for error entries and retry each one."""
-    errors = list(get_cached_errors())
+    errors = list(itertools.islice(get_cached_errors(after=after), limit))
     if not errors:
         print("No error entries found in cache.")
         return
@@ -100,15 +107,23 @@ async def retry_all(
             print(
                 f"  {token}:{block}  error={entry.get('error')}  cached_at={entry.get('cached_at')}"
             )
+        _print_next_page(errors, limit)
         return
 
     sem = asyncio.Semaphore(concurrency)
     success_count = 0
     failure_count = 0
+    skipped_count = 0
 
     async def _bounded_retry(client: httpx.AsyncClient, token: str, block: int) -> None:
-        nonlocal success_count, failure_count
+        nonlocal success_count, failure_count, skipped_count
         async with sem:
+            # Re-read the entry right before retrying: it may have expired or been
+            # replaced by a real price since the scan.
+            if not isinstance(lookup_cached(token, block), CacheErrorHit):
+                print(f"  - {token}:{block}  no longer an error entry, skipped")
+                skipped_count += 1
+                return
             _, _, ok, msg = await _retry_one(client, base_url, chain, token, block, dry_run)
             status = "✓" if ok else "✗"
             print(f"  {status} {token}:{block}  {msg}")
@@ -124,9 +139,24 @@ async def retry_all(
         await asyncio.gather(*tasks)
 
     print(
-        f"\nDone: {success_count} succeeded, {failure_count} failed "
+        f"\nDone: {success_count} succeeded, {failure_count} failed, {skipped_count} skipped "
         f"(failed entries refreshed with new TTL)."
     )
+    _print_next_page(errors, limit)
+
+
+def _print_next_page(errors: list[tuple[str, int, dict[str, object]]], limit: int | None) -> None:
+    if limit is not None and len(errors) == limit:
+        token, block, _ = errors[-1]
+        print(f"More errors may remain; continue with --after {block}:{token}")
+
+
+def _parse_after(value: str) -> tuple[int, str]:
+    block, _, token = value.partition(":")
+    try:
+        return int(block), token.lower()
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected BLOCK:TOKEN") from None
 
 
 def main() -> None:
@@ -154,6 +184,19 @@ def main() -> None:
         action="store_true",
         help="List error entries without sending retry requests",
     )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Process at most this many error entries (in block order)",
+    )
+    parser.add_argument(
+        "--after",
+        type=_parse_after,
+        default=None,
+        metavar="BLOCK:TOKEN",
+        help="Start after this entry (as printed at the end of a --limit run)",
+    )
     args = parser.parse_args()
 
     asyncio.run(
@@ -162,6 +205,8 @@ def main() -> None:
             chain=args.chain,
             concurrency=args.concurrency,
             dry_run=args.dry_run,
+            limit=args.limit,
+            after=args.after,
         )
     )
 
@@ -56,4 +56,17 @@ echo "Network ${NETWORK_ID} registered successfully"
 
 export BROWNIE_NETWORK_ID="${NETWORK_ID}"
 
+# Seed the price cache from a snapshot before accepting traffic. The import is
+# resumable and a no-op once complete, so it is safe on every start; a failed
+# import only means a colder cache, so it never blocks startup.
+if [ -n "${CACHE_SNAPSHOT:-}" ]; then
+  if [ -f "${CACHE_SNAPSHOT}" ]; then
+    echo "Importing price cache snapshot ${CACHE_SNAPSHOT}..."
+    python scripts/cache_snapshot.py import "${CACHE_SNAPSHOT}" \
+      || echo "WARNING: cache snapshot import failed, starting with the existing cache"
+  else
+    echo "WARNING: CACHE_SNAPSHOT=${CACHE_SNAPSHOT} not found, skipping import"
+  fi
+fi
+
 exec uvicorn src.server:app --host 0.0.0.0 --port 8001 --loop asyncio --root-path "/${CHAIN_NAME}" --timeout-graceful-shutdown 300
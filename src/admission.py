@@ -0,0 +1,103 @@
+"""Admission control: refuse new compute work while the server is overloaded.
+
+Lookups the cache cannot answer become ypricemagic calls that keep running
+even after their client gives up (they are shielded so they can fill the
+cache), so when the RPC is degraded they pile up without limit.  Before a
+request starts new cache-miss work, :class:`AdmissionController` looks at
+the work already in the :class:`~src.scheduler.LaneScheduler` (running or
+queued) and how long the oldest queued lookup has waited, and sheds the
+request past the configured limits with a ``Retry-After`` estimate of when
+the backlog should have drained.  Requests answered from the cache never
+reach it.
+"""
+
+import math
+from dataclasses import dataclass
+
+from prometheus_client import Counter, Gauge
+
+from src.scheduler import PRIORITY_LOW, LaneScheduler
+
+admission_admitted_total = Counter(
+    "admission_admitted_total",
+    "Requests allowed to start cache-miss work",
+)
+load_shed_total = Counter(
+    "load_shed_total",
+    "Requests refused cache-miss work, by the limit that was exceeded and response status",
+    ["reason", "status"],
+)
+admission_in_flight = Gauge(
+    "admission_in_flight",
+    "Lookups running or queued, as of the last admission decision",
+)
+admission_queue_wait_seconds = Gauge(
+    "admission_queue_wait_seconds",
+    "Longest time a queued lookup had waited, as of the last admission decision",
+)
+
+# Low-priority work is shed (with 429) once load passes this share of the limits
+LOW_PRIORITY_SHARE = 0.5
+
+
+@dataclass(frozen=True)
+class Shed:
+    """Why a request was refused, the status to answer with, and when to retry (s)."""
+
+    status: int
+    reason: str
+    retry_after: int
+
+
+class AdmissionController:
+    """Decide whether a request may start new cache-miss work.
+
+    Past ``max_in_flight`` lookups running or queued, or once the oldest
+    queued lookup has waited ``max_queue_wait`` seconds, requests are refused
+    with 503.  Low-priority requests are refused earlier, at
+    ``LOW_PRIORITY_SHARE`` of either limit, with 429.  A limit of 0 disables
+    it.  ``Retry-After`` is the time for the work in flight to finish at the
+    scheduler's capacity and average service time (at least the current queue
+    wait), between 1 and ``max_retry_after`` seconds.
+    """
+
+    def __init__(
+        self,
+        scheduler: LaneScheduler,
+        max_in_flight: int,
+        max_queue_wait: float,
+        max_retry_after: int = 60,
+    ) -> None:
+        self._scheduler = scheduler
+        self.max_in_flight = max_in_flight
+        self.max_queue_wait = max_queue_wait
+        self.max_retry_after = max_retry_after
+
+    def check(self, priority: int) -> Shed | None:
+        """Return None to admit the request, or how to refuse it."""
+        in_flight = self._scheduler.in_flight()
+        queue_wait = self._scheduler.longest_wait()
+        admission_in_flight.set(in_flight)
+        admission_queue_wait_seconds.set(queue_wait)
+
+        status = 503
+        reason = self._exceeded(1.0, in_flight, queue_wait)
+        if reason is None and priority >= PRIORITY_LOW:
+            status = 429
+            reason = self._exceeded(LOW_PRIORITY_SHARE, in_flight, queue_wait)
+        if reason is None:
+            admission_admitted_total.inc()
+            return None
+        load_shed_total.labels(reason=reason, status=str(status)).inc()
+        return Shed(status, reason, self._retry_after(in_flight, queue_wait))
+
+    def _exceeded(self, share: float, in_flight: int, queue_wait: float) -> str | None:
+        if self.max_in_flight > 0 and in_flight >= self.max_in_flight * share:
+            return "in_flight"
+        if self.max_queue_wait > 0 and queue_wait >= self.max_queue_wait * share:
+            return "queue_wait"
+        return None
+
+    def _retry_after(self, in_flight: int, queue_wait: float) -> int:
+        drain = in_flight * self._scheduler.service_time / self._scheduler.capacity
+        return min(self.max_retry_after, max(1, math.ceil(max(drain, queue_wait))))
@@ -0,0 +1,101 @@
+"""Collect concurrent single-item async calls into batched dispatches."""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass, field
+
+from prometheus_client import Counter, Histogram
+
+micro_batch_size = Histogram(
+    "micro_batch_size",
+    "Items per dispatched micro-batch",
+    ["group"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+micro_batch_flushes_total = Counter(
+    "micro_batch_flushes_total",
+    "Micro-batches dispatched, by what triggered the flush",
+    ["group", "trigger"],
+)
+
+
+@dataclass
+class _Batch[I, R]:
+    items: list[I] = field(default_factory=list)
+    futures: list["asyncio.Future[R]"] = field(default_factory=list)
+    timer: asyncio.TimerHandle | None = None
+
+
+class MicroBatcher[K: Hashable, I, R]:
+    """Group items submitted under the same key within a short window.
+
+    The first item for a key opens a batch; the batch is dispatched when
+    ``window`` seconds have passed or it reaches ``max_size`` items, whichever
+    comes first.  ``dispatch(key, items)`` must return one result per item, in
+    order; each caller gets its own result.  If ``dispatch`` raises, every
+    caller in the batch gets the exception.  A caller that is cancelled stops
+    waiting, but its item is still dispatched with the rest of the batch.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        dispatch: Callable[[K, list[I]], Awaitable[list[R]]],
+        window: float,
+        max_size: int,
+    ) -> None:
+        self.name = name
+        self._dispatch = dispatch
+        self.window = window
+        self.max_size = max(1, max_size)
+        self._pending: dict[K, _Batch[I, R]] = {}
+        self._running: set[asyncio.Task[None]] = set()
+
+    async def submit(self, key: K, item: I) -> R:
+        loop = asyncio.get_running_loop()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = _Batch()
+            self._pending[key] = batch
+            batch.timer = loop.call_later(self.window, self._flush, key, batch, "window")
+        future: asyncio.Future[R] = loop.create_future()
+        batch.items.append(item)
+        batch.futures.append(future)
+        if len(batch.items) >= self.max_size:
+            self._flush(key, batch, "max_size")
+        return await future
+
+    def _flush(self, key: K, batch: _Batch[I, R], trigger: str) -> None:
+        if self._pending.get(key) is not batch:
+            return
+        del self._pending[key]
+        if batch.timer is not None:
+            batch.timer.cancel()
+        micro_batch_flushes_total.labels(group=self.name, trigger=trigger).inc()
+        micro_batch_size.labels(group=self.name).observe(len(batch.items))
+        task = asyncio.ensure_future(self._run(key, batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, key: K, batch: _Batch[I, R]) -> None:
+        try:
+            results = await self._dispatch(key, batch.items)
+            if len(results) != len(batch.items):
+                raise RuntimeError(
+                    f"{self.name} batch dispatch returned {len(results)} results "
+                    f"for {len(batch.items)} items"
+                )
+        except BaseException as e:
+            for future in batch.futures:
+                if future.done():
+                    continue
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for future, result in zip(batch.futures, results, strict=True):
+            if not future.done():
+                future.set_result(result)
@@ -1,11 +1,23 @@
+import asyncio
+import functools
+import json
+import math
 import os
+import struct
+import sys
 import threading
-from collections.abc import Iterator
-from datetime import UTC, datetime
-from typing import cast
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import Any, cast
 
 import diskcache
-from diskcache import JSONDisk
+from diskcache import UNKNOWN, Disk, JSONDisk
+from prometheus_client import Counter, Gauge, Histogram
 
 from src.logger import get_logger
 
@@ -13,55 +25,741 @@ logger = get_logger("cache")
 
 CACHE_DIR = os.environ.get("CACHE_DIR", "/data/cache")
 
+# Number of SQLite shards. 1 keeps the single-database layout; >1 spreads keys
+# over a diskcache.FanoutCache so concurrent writers don't share one write lock.
+CACHE_SHARDS = int(os.environ.get("CACHE_SHARDS", "1"))
+
+# SQLite busy timeout per shard, in seconds (diskcache.Cache's default)
+CACHE_TIMEOUT = 60.0
+
+# Disk budget for the price cache, in bytes (split evenly across shards). The
+# default is diskcache's own 1 GiB; set it to the space the volume can spare.
+CACHE_SIZE_LIMIT = int(os.environ.get("CACHE_SIZE_LIMIT", str(2**30)))
+# Which prices go first once the budget is exceeded: lrs (least recently
+# stored), lru (least recently used) or lfu (least frequently used). lru/lfu
+# turn every disk read into a write, so they cost read throughput.
+CACHE_EVICTION_POLICY = os.environ.get("CACHE_EVICTION_POLICY", "lrs")
+# Entries culled inline by each write once over budget, by the eviction policy
+# alone (so prices may go before error entries). The default 0 leaves all
+# eviction to enforce_size_limit(), which drops error entries before any price.
+CACHE_CULL_LIMIT = int(os.environ.get("CACHE_CULL_LIMIT", "0"))
+# Seconds between enforce_size_limit() runs in the server (0 disables).
+CACHE_EVICTION_INTERVAL = float(os.environ.get("CACHE_EVICTION_INTERVAL", "60"))
+
+_EVICTION_POLICIES = {
+    "lrs": "least-recently-stored",
+    "lru": "least-recently-used",
+    "lfu": "least-frequently-used",
+    "none": "none",
+}
+
+cache_evicted_bytes_total = Counter(
+    "cache_evicted_bytes_total",
+    "Bytes reclaimed from the price cache by eviction",
+    ["reason"],
+)
+cache_evicted_entries_total = Counter(
+    "cache_evicted_entries_total",
+    "Entries removed from the price cache by eviction",
+    ["reason"],
+)
+cache_volume_bytes = Gauge(
+    "cache_volume_bytes",
+    "Estimated on-disk size of the price cache",
+)
+
 # TTL for error cache entries (1 hour). After expiry the entry is evicted and
 # the next request will re-attempt the real price lookup.
 ERROR_CACHE_TTL = int(os.environ.get("ERROR_CACHE_TTL", "3600"))
 
-_cache: diskcache.Cache | None = None
+# In-process LRU tier in front of diskcache. Hot (token, block) pairs are
+# served from memory; set HOT_CACHE_MAXSIZE=0 to disable.
+HOT_CACHE_MAXSIZE = int(os.environ.get("HOT_CACHE_MAXSIZE", "100000"))
+HOT_CACHE_MAX_BYTES = int(os.environ.get("HOT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+hot_cache_lookups_total = Counter(
+    "hot_cache_lookups_total",
+    "In-memory price cache lookups",
+    ["result"],
+)
+hot_cache_evictions_total = Counter(
+    "hot_cache_evictions_total",
+    "Entries dropped from the in-memory price cache",
+    ["reason"],
+)
+
+# Worker threads for blocking diskcache calls made from async handlers.
+CACHE_IO_WORKERS = int(os.environ.get("CACHE_IO_WORKERS", "4"))
+
+cache_io_queue_depth = Gauge(
+    "cache_io_queue_depth",
+    "Cache operations queued or running on the cache I/O pool",
+)
+cache_io_duration_seconds = Histogram(
+    "cache_io_duration_seconds",
+    "Cache operation latency on the cache I/O pool, including queue wait",
+    ["op"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+type PriceCache = diskcache.Cache | diskcache.FanoutCache
+
+# Blocks within this many confirmations of the chain head can still be reorged,
+# so their prices are held in memory and only written to disk once final.
+# Set FINALITY_CONFIRMATIONS per chain container; 0 writes everything to disk.
+_DEFAULT_FINALITY_CONFIRMATIONS = {
+    "ethereum": 64,
+    "arbitrum": 20,
+    "optimism": 20,
+    "base": 20,
+    "bsc": 15,
+    "polygon": 128,
+    "fantom": 5,
+}
+FINALITY_CONFIRMATIONS = int(
+    os.environ.get(
+        "FINALITY_CONFIRMATIONS",
+        str(_DEFAULT_FINALITY_CONFIRMATIONS.get(os.environ.get("CHAIN_NAME", "ethereum"), 64)),
+    )
+)
+# Cap on provisional entries; past it, near-head prices go straight to disk.
+PROVISIONAL_MAXSIZE = int(os.environ.get("PROVISIONAL_MAXSIZE", "50000"))
+
+provisional_cache_entries = Gauge(
+    "provisional_cache_entries",
+    "Near-head prices held in memory until their block is final",
+)
+provisional_cache_resolved_total = Counter(
+    "provisional_cache_resolved_total",
+    "Provisional prices leaving the in-memory tier",
+    ["outcome"],
+)
+
+_cache: PriceCache | None = None
+_hot: "_HotCache | None" = None
+_io_pool: ThreadPoolExecutor | None = None
 _lock = threading.Lock()
 
 
-def get_cache() -> diskcache.Cache:
+def _entry_size(key: str, entry: dict[str, object]) -> int:
+    """Approximate in-memory footprint of a cache entry, in bytes."""
+    return sys.getsizeof(key) + sys.getsizeof(entry) + sum(sys.getsizeof(v) for v in entry.values())
+
+
+class _HotCache:
+    """Bounded LRU of cache entries, limited by entry count and approximate bytes.
+
+    Entries may carry an absolute expiry (``time.time()`` epoch, same clock as
+    diskcache) so error entries honour :data:`ERROR_CACHE_TTL` in memory too.
+    """
+
+    def __init__(self, maxsize: int, max_bytes: int) -> None:
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[dict[str, object], float | None, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, record_miss: bool = True) -> dict[str, object] | None:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                if record_miss:
+                    hot_cache_lookups_total.labels(result="miss").inc()
+                return None
+            entry, expires_at, size = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                self._bytes -= size
+                hot_cache_evictions_total.labels(reason="expired").inc()
+                if record_miss:
+                    hot_cache_lookups_total.labels(result="miss").inc()
+                return None
+            self._entries.move_to_end(key)
+            hot_cache_lookups_total.labels(result="hit").inc()
+            return entry
+
+    def set(self, key: str, entry: dict[str, object], expires_at: float | None = None) -> None:
+        size = _entry_size(key, entry)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (entry, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.maxsize or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                hot_cache_evictions_total.labels(reason="capacity").inc()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def get_hot_cache() -> _HotCache | None:
+    """Return the in-memory tier, or None when it is disabled."""
+    global _hot
+    if HOT_CACHE_MAXSIZE <= 0 or HOT_CACHE_MAX_BYTES <= 0:
+        return None
+    if _hot is None:
+        with _lock:
+            if _hot is None:
+                _hot = _HotCache(HOT_CACHE_MAXSIZE, HOT_CACHE_MAX_BYTES)
+    return _hot
+
+
+class _ProvisionalTier:
+    """Prices for blocks that aren't final yet, grouped by block.
+
+    Each block also remembers the block hash seen when its first price was
+    cached, so the promoter can tell a block that was reorged out.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.head: int | None = None
+        self._entries: dict[str, dict[str, object]] = {}
+        self._blocks: dict[int, list[str]] = {}
+        self._hashes: dict[int, str] = {}
+
+    def is_provisional(self, block: int) -> bool:
+        head = self.head
+        return (
+            FINALITY_CONFIRMATIONS > 0
+            and head is not None
+            and block > head - FINALITY_CONFIRMATIONS
+        )
+
+    def get(self, key: str) -> dict[str, object] | None:
+        return self._entries.get(key)
+
+    def add(self, key: str, block: int, entry: dict[str, object]) -> bool:
+        """Hold ``entry`` until ``block`` is final; False when the tier is full."""
+        with self._lock:
+            if key not in self._entries:
+                if len(self._entries) >= PROVISIONAL_MAXSIZE:
+                    return False
+                self._blocks.setdefault(block, []).append(key)
+            self._entries[key] = entry
+            provisional_cache_entries.set(len(self._entries))
+        return True
+
+    def set_head(self, height: int) -> None:
+        with self._lock:
+            if self.head is None or height > self.head:
+                self.head = height
+
+    def block_hash(self, block: int) -> str | None:
+        return self._hashes.get(block)
+
+    def set_block_hash(self, block: int, block_hash: str) -> None:
+        with self._lock:
+            self._hashes.setdefault(block, block_hash)
+
+    def final_blocks(self) -> list[int]:
+        with self._lock:
+            return sorted(b for b in self._blocks if not self.is_provisional(b))
+
+    def pop_block(self, block: int) -> tuple[list[tuple[str, dict[str, object]]], str | None]:
+        with self._lock:
+            keys = self._blocks.pop(block, [])
+            rows = [(key, self._entries.pop(key)) for key in keys]
+            provisional_cache_entries.set(len(self._entries))
+            return rows, self._hashes.pop(block, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.head = None
+            self._entries.clear()
+            self._blocks.clear()
+            self._hashes.clear()
+            provisional_cache_entries.set(0)
+
+
+_provisional = _ProvisionalTier()
+
+
+def set_chain_head(height: int) -> None:
+    """Record the latest block seen; the head never moves backwards."""
+    _provisional.set_head(height)
+
+
+def is_provisional(block: int) -> bool:
+    """True if prices at ``block`` are held in memory until it is final."""
+    return _provisional.is_provisional(block)
+
+
+def provisional_block_hash(block: int) -> str | None:
+    return _provisional.block_hash(block)
+
+
+def set_provisional_block_hash(block: int, block_hash: str) -> None:
+    """Record the hash ``block`` had when its prices were computed (first one wins)."""
+    _provisional.set_block_hash(block, block_hash)
+
+
+def final_provisional_blocks() -> list[int]:
+    """Blocks in the provisional tier that now have enough confirmations."""
+    return _provisional.final_blocks()
+
+
+def promote_provisional(block_hashes: dict[int, str | None]) -> None:
+    """Move final blocks from the provisional tier to disk.
+
+    ``block_hashes`` maps each block to its current canonical hash (None if
+    it couldn't be fetched).  A block whose hash differs from the one recorded
+    when its prices were cached was reorged out: its prices are dropped
+    instead of being persisted.
+    """
+    rows: list[tuple[str, dict[str, object]]] = []
+    for block, current_hash in block_hashes.items():
+        block_rows, recorded_hash = _provisional.pop_block(block)
+        if recorded_hash is not None and current_hash is not None and recorded_hash != current_hash:
+            logger.warning("provisional_block_reorged", block=block, entries=len(block_rows))
+            provisional_cache_resolved_total.labels(outcome="reorged").inc(len(block_rows))
+            continue
+        rows.extend(block_rows)
+    if rows:
+        _write_many(rows)
+        provisional_cache_resolved_total.labels(outcome="promoted").inc(len(rows))
+
+
+# Packed entry layout (little-endian): magic, price, block_timestamp,
+# cached_at (epoch microseconds), flags; error entries append the UTF-8 message.
+_PACKED_MAGIC = b"\xa7\x01"
+_PACKED_ENTRY = struct.Struct("<2sdqqB")
+_FLAG_ERROR = 0x01
+_FLAG_HAS_BLOCK_TIMESTAMP = 0x02
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+_MICROSECOND = timedelta(microseconds=1)
+_PRICE_KEYS = frozenset({"price", "cached_at", "block_timestamp"})
+_ERROR_KEYS = frozenset({"error", "cached_at", "block_timestamp"})
+
+
+def _pack_entry(value: object) -> bytes | None:
+    """Pack a price or error entry into the fixed binary layout.
+
+    Returns None for anything that doesn't match the entry schema, so the
+    caller can fall back to JSON.
+    """
+    if not isinstance(value, dict):
+        return None
+    keys = value.keys()
+    is_error = keys == _ERROR_KEYS
+    if not is_error and keys != _PRICE_KEYS:
+        return None
+    block_timestamp = value["block_timestamp"]
+    cached_at = value["cached_at"]
+    if not (block_timestamp is None or type(block_timestamp) is int):
+        return None
+    if not isinstance(cached_at, str):
+        return None
+    try:
+        cached_at_dt = datetime.fromisoformat(cached_at)
+    except ValueError:
+        return None
+    # Only pack UTC timestamps that round-trip exactly through isoformat()
+    if cached_at_dt.utcoffset() != timedelta(0) or cached_at_dt.isoformat() != cached_at:
+        return None
+    cached_at_us = (cached_at_dt - _EPOCH) // _MICROSECOND
+    flags = _FLAG_HAS_BLOCK_TIMESTAMP if block_timestamp is not None else 0
+    if is_error:
+        if not isinstance(value["error"], str):
+            return None
+        header = _PACKED_ENTRY.pack(
+            _PACKED_MAGIC, math.nan, block_timestamp or 0, cached_at_us, flags | _FLAG_ERROR
+        )
+        return header + value["error"].encode("utf-8")
+    price = value["price"]
+    if type(price) not in (float, int):
+        return None
+    return _PACKED_ENTRY.pack(_PACKED_MAGIC, price, block_timestamp or 0, cached_at_us, flags)
+
+
+def _unpack_entry(data: bytes) -> dict[str, object]:
+    _, price, block_timestamp, cached_at_us, flags = _PACKED_ENTRY.unpack_from(data)
+    entry: dict[str, object] = (
+        {"error": data[_PACKED_ENTRY.size :].decode("utf-8")}
+        if flags & _FLAG_ERROR
+        else {"price": price}
+    )
+    entry["cached_at"] = (_EPOCH + cached_at_us * _MICROSECOND).isoformat()
+    entry["block_timestamp"] = block_timestamp if flags & _FLAG_HAS_BLOCK_TIMESTAMP else None
+    return entry
+
+
+def is_packed_value(raw: object) -> bool:
+    """True if a raw stored value is already in the packed binary layout."""
+    return isinstance(raw, bytes) and raw[:2] == _PACKED_MAGIC
+
+
+class PriceDisk(JSONDisk):  # type: ignore[misc]
+    """diskcache Disk that stores price/error entries in a fixed binary layout.
+
+    Keys stay JSON-encoded (same as :class:`diskcache.JSONDisk`), so existing
+    cache directories keep working.  Values matching the entry schema are
+    packed into 27 bytes plus the error message, instead of a zlib-compressed
+    JSON dict; anything else, and every legacy entry, goes through JSON.
+    """
+
+    def store(self, value: Any, read: bool, key: Any = UNKNOWN) -> Any:
+        if not read:
+            packed = _pack_entry(value)
+            if packed is not None:
+                return Disk.store(self, packed, read, key=key)
+        return super().store(value, read, key=key)
+
+    def fetch(self, mode: int, filename: str | None, value: Any, read: bool) -> Any:
+        if read:
+            return super().fetch(mode, filename, value, read)
+        data = Disk.fetch(self, mode, filename, value, read)
+        if is_packed_value(data):
+            return _unpack_entry(data)
+        return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def cache_layout(directory: str) -> int:
+    """Shard count of the cache stored in ``directory``.
+
+    Returns 1 for a single-database cache, the number of shard directories
+    for a FanoutCache, and 0 if there is no cache there yet.  When both
+    layouts are present (an in-place reshard that kept its source), the one
+    matching CACHE_SHARDS wins.
+    """
+    single = os.path.exists(os.path.join(directory, "cache.db"))
+    shards = 0
+    while os.path.exists(os.path.join(directory, f"{shards:03d}", "cache.db")):
+        shards += 1
+    if single and shards != max(1, CACHE_SHARDS):
+        return 1
+    return shards
+
+
+def open_cache(directory: str, shards: int, **settings: object) -> PriceCache:
+    """Open a price cache with the given layout (``shards <= 1`` is unsharded).
+
+    ``settings`` are diskcache settings; they are persisted in the cache
+    directory and reused when it is opened again.  The tag index backing
+    :func:`get_cached_errors` is always enabled.
+    """
+    os.makedirs(directory, exist_ok=True)
+    settings.setdefault("tag_index", True)
+    if shards <= 1:
+        return diskcache.Cache(directory, timeout=CACHE_TIMEOUT, disk=PriceDisk, **settings)
+    return diskcache.FanoutCache(
+        directory, shards=shards, timeout=CACHE_TIMEOUT, disk=PriceDisk, **settings
+    )
+
+
+def _cache_settings() -> dict[str, object]:
+    """diskcache settings derived from the CACHE_* environment variables."""
+    policy = _EVICTION_POLICIES.get(CACHE_EVICTION_POLICY.lower(), CACHE_EVICTION_POLICY.lower())
+    if policy not in _EVICTION_POLICIES.values():
+        raise ValueError(
+            f"Invalid CACHE_EVICTION_POLICY {CACHE_EVICTION_POLICY!r}; "
+            f"expected one of {', '.join(_EVICTION_POLICIES)}"
+        )
+    return {
+        "size_limit": CACHE_SIZE_LIMIT,
+        "eviction_policy": policy,
+        "cull_limit": max(0, CACHE_CULL_LIMIT),
+    }
+
+
+def get_cache() -> PriceCache:
     global _cache
     if _cache is None:
         with _lock:
             if _cache is None:
-                os.makedirs(CACHE_DIR, exist_ok=True)
-                _cache = diskcache.Cache(CACHE_DIR, disk=JSONDisk)
+                shards = max(1, CACHE_SHARDS)
+                existing = cache_layout(CACHE_DIR)
+                if existing and existing != shards:
+                    logger.warning(
+                        "cache_layout_mismatch",
+                        cache_dir=CACHE_DIR,
+                        existing_shards=existing,
+                        configured_shards=shards,
+                        hint="run scripts/reshard_cache.py to migrate existing entries",
+                    )
+                _cache = open_cache(CACHE_DIR, shards, **_cache_settings())
     return _cache
 
 
+def shard_groups(cache: PriceCache, keys: Sequence[str]) -> list[tuple[diskcache.Cache, list[int]]]:
+    """Group key positions by the shard that stores them.
+
+    A FanoutCache transaction locks every shard, so bulk operations open one
+    transaction per shard instead and writers on other shards keep going.
+    """
+    if not isinstance(cache, diskcache.FanoutCache):
+        return [(cache, list(range(len(keys))))]
+    shards: tuple[diskcache.Cache, ...] = cache._shards
+    groups: dict[int, list[int]] = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(cache._hash(key) % len(shards), []).append(i)
+    return [(shards[n], positions) for n, positions in sorted(groups.items())]
+
+
 def close_cache() -> None:
-    global _cache
+    global _cache, _hot, _io_pool
     with _lock:
+        if _io_pool is not None:
+            _io_pool.shutdown(wait=True)
+            _io_pool = None
         if _cache is not None:
             _cache.close()
             _cache = None
+        _hot = None
+        _provisional.clear()
+
+
+def _get_io_pool() -> ThreadPoolExecutor:
+    global _io_pool
+    if _io_pool is None:
+        with _lock:
+            if _io_pool is None:
+                _io_pool = ThreadPoolExecutor(
+                    max_workers=max(1, CACHE_IO_WORKERS), thread_name_prefix="cache-io"
+                )
+    return _io_pool
+
+
+async def run_cache_io[T](fn: Callable[..., T], *args: object, **kwargs: object) -> T:
+    """Run a blocking cache call on the cache I/O pool.
+
+    Keeps SQLite reads/writes off the event loop so a slow disk or write-lock
+    contention doesn't stall every in-flight request.
+    """
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    cache_io_queue_depth.inc()
+    try:
+        return await loop.run_in_executor(_get_io_pool(), functools.partial(fn, *args, **kwargs))
+    finally:
+        cache_io_queue_depth.dec()
+        cache_io_duration_seconds.labels(op=getattr(fn, "__name__", "call")).observe(
+            time.monotonic() - start
+        )
 
 
 def make_key(token: str, block: int) -> str:
     return f"{token.lower()}:{block}"
 
 
-def get_cached_price(token: str, block: int) -> dict[str, object] | None:
-    """Return a cached price entry, or None if not found.
+def _read_entry(key: str) -> object | None:
+    """Read an entry through the in-memory tiers, falling back to disk.
 
-    Returns only *successful* price entries (those with a ``"price"`` key).
-    Error entries are ignored here — use :func:`get_cached_error` to retrieve them.
+    Disk hits are promoted into the in-memory tier together with their
+    remaining diskcache expiry.
     """
-    try:
-        cache = get_cache()
-        key = make_key(token, block)
-        entry = cache.get(key)
-        if entry is not None and isinstance(entry, dict) and "price" in entry:
-            # Ensure block_timestamp is present (backward compat with old entries)
-            if "block_timestamp" not in entry:
-                entry["block_timestamp"] = None
-            return cast(dict[str, object], entry)
+    provisional = _provisional.get(key)
+    if provisional is not None:
+        return provisional
+    hot = get_hot_cache()
+    if hot is not None:
+        entry = hot.get(key)
+        if entry is not None:
+            return entry
+    value, expire_time = get_cache().get(key, expire_time=True)
+    if hot is not None and isinstance(value, dict):
+        hot.set(key, value, expires_at=expire_time)
+    return cast(object | None, value)
+
+
+# Error entries are tagged "error:<zero-padded block>:<token>" so the tag index
+# lists them in block order without scanning price entries.  Writing a price
+# clears the tag, and expired rows are filtered on expire_time.
+_ERROR_TAG_PREFIX = "error:"
+_ERROR_TAG_END = "error;"  # first string sorting after every error tag
+_ERROR_PAGE_SIZE = 500
+
+
+def _error_tag(token: str, block: int) -> str:
+    return f"{_ERROR_TAG_PREFIX}{block:020d}:{token.lower()}"
+
+
+def entry_tag(key: str, entry: object) -> str | None:
+    """diskcache tag for an entry: set for error entries, None for prices."""
+    if not isinstance(entry, dict) or "error" not in entry:
         return None
+    token, _, block = key.rpartition(":")
+    return _error_tag(token, int(block))
+
+
+def _write_entry(key: str, entry: dict[str, object], expire: int | None = None) -> None:
+    """Write an entry to the in-memory tier and to disk."""
+    hot = get_hot_cache()
+    if hot is not None:
+        hot.set(key, entry, expires_at=time.time() + expire if expire is not None else None)
+    get_cache().set(key, entry, expire=expire, tag=entry_tag(key, entry))
+
+
+def _write_many(rows: Sequence[tuple[str, dict[str, object]]], expire: int | None = None) -> None:
+    """Write entries to the in-memory tier and to disk, one transaction per shard."""
+    hot = get_hot_cache()
+    if hot is not None:
+        expires_at = time.time() + expire if expire is not None else None
+        for key, entry in rows:
+            hot.set(key, entry, expires_at=expires_at)
+    for shard, positions in shard_groups(get_cache(), [key for key, _ in rows]):
+        with shard.transact():
+            for i in positions:
+                key, entry = rows[i]
+                shard.set(key, entry, expire=expire, tag=entry_tag(key, entry))
+
+
+def _hold_provisional(key: str, block: int, entry: dict[str, object]) -> bool:
+    """Keep a near-head price in memory instead of on disk; False if it must go to disk."""
+    if not _provisional.is_provisional(block):
+        return False
+    if _provisional.add(key, block, entry):
+        return True
+    provisional_cache_resolved_total.labels(outcome="overflow").inc()
+    return False
+
+
+@dataclass
+class CacheHit:
+    """A successful price entry (has a ``"price"`` key)."""
+
+    entry: dict[str, object]
+
+
+@dataclass
+class CacheErrorHit:
+    """An unexpired error entry (has an ``"error"`` key)."""
+
+    entry: dict[str, object]
+
+
+@dataclass
+class CacheMiss:
+    pass
+
+
+CacheLookup = CacheHit | CacheErrorHit | CacheMiss
+
+
+def _classify_entry(entry: object) -> CacheLookup:
+    """Tag a raw cache value as a price hit, an error hit, or a miss.
+
+    Entries are copied so callers can't mutate the shared in-memory entry.
+    """
+    if not isinstance(entry, dict):
+        return CacheMiss()
+    if "price" in entry:
+        # Ensure block_timestamp is present (backward compat with old entries)
+        return CacheHit({"block_timestamp": None, **cast(dict[str, object], entry)})
+    if "error" in entry:
+        return CacheErrorHit(dict(cast(dict[str, object], entry)))
+    return CacheMiss()
+
+
+def lookup_cached(token: str, block: int) -> CacheLookup:
+    """Look up ``(token, block)`` with a single cache read.
+
+    Returns :class:`CacheHit` for a cached price, :class:`CacheErrorHit` for a
+    cached (unexpired) error, or :class:`CacheMiss`.  Read failures are logged
+    and reported as a miss.
+    """
+    try:
+        return _classify_entry(_read_entry(make_key(token, block)))
     except Exception as e:
         logger.warning("cache_read_failed", error=str(e))
-        return None
+        return CacheMiss()
+
+
+def lookup_cached_many(tokens: Sequence[str], block: int) -> list[CacheLookup]:
+    """Look up many tokens at one block, positionally aligned with ``tokens``.
+
+    In-memory hits are answered first; the remaining disk reads share one
+    diskcache transaction per shard instead of one implicit transaction each.  On a read
+    failure the entries not yet read are reported as misses.
+    """
+    return _lookup_keys([make_key(token, block) for token in tokens])
+
+
+def lookup_cached_blocks(token: str, blocks: Sequence[int]) -> list[CacheLookup]:
+    """Look up one token at many blocks, positionally aligned with ``blocks``.
+
+    Same read path as :func:`lookup_cached_many`.
+    """
+    return _lookup_keys([make_key(token, block) for block in blocks])
+
+
+def lookup_cached_grid(tokens: Sequence[str], blocks: Sequence[int]) -> list[CacheLookup]:
+    """Look up every token at every block in one pass, block-major.
+
+    Result ``j * len(tokens) + i`` is ``tokens[i]`` at ``blocks[j]``.  Same
+    read path as :func:`lookup_cached_many`.
+    """
+    return _lookup_keys([make_key(token, block) for block in blocks for token in tokens])
+
+
+def _lookup_keys(keys: Sequence[str]) -> list[CacheLookup]:
+    results: list[CacheLookup] = [CacheMiss() for _ in keys]
+    try:
+        hot = get_hot_cache()
+        pending: list[int] = []
+        for i, key in enumerate(keys):
+            entry = _provisional.get(key)
+            if entry is None and hot is not None:
+                entry = hot.get(key)
+            if entry is not None:
+                results[i] = _classify_entry(entry)
+            else:
+                pending.append(i)
+        if pending:
+            pending_keys = [keys[i] for i in pending]
+            for shard, positions in shard_groups(get_cache(), pending_keys):
+                with shard.transact():
+                    for j in positions:
+                        i = pending[j]
+                        value, expire_time = shard.get(keys[i], expire_time=True)
+                        if hot is not None and isinstance(value, dict):
+                            hot.set(keys[i], value, expires_at=expire_time)
+                        results[i] = _classify_entry(value)
+    except Exception as e:
+        logger.warning("cache_read_many_failed", count=len(keys), error=str(e))
+    return results
+
+
+def get_cached_prices_many(tokens: Sequence[str], block: int) -> list[dict[str, object] | None]:
+    """Bulk :func:`get_cached_price`: one entry (or None) per token, in order."""
+    return [
+        result.entry if isinstance(result, CacheHit) else None
+        for result in lookup_cached_many(tokens, block)
+    ]
+
+
+def peek_cached(token: str, block: int) -> CacheLookup | None:
+    """Answer from the in-memory tier only; never touches disk.
+
+    Returns None when the in-memory tier has nothing for ``(token, block)``,
+    in which case callers should fall back to :func:`lookup_cached` (on the
+    cache I/O pool when called from async code).
+    """
+    key = make_key(token, block)
+    entry = _provisional.get(key)
+    if entry is None:
+        hot = get_hot_cache()
+        if hot is None:
+            return None
+        entry = hot.get(key, record_miss=False)
+    return _classify_entry(entry) if entry is not None else None
+
+
+def get_cached_price(token: str, block: int) -> dict[str, object] | None:
+    """Return a cached price entry, or None if not found.
+
+    Returns only *successful* price entries (those with a ``"price"`` key).
+    Error entries are ignored here — use :func:`get_cached_error` to retrieve them,
+    or :func:`lookup_cached` to get either from one read.
+    """
+    result = lookup_cached(token, block)
+    return result.entry if isinstance(result, CacheHit) else None
 
 
 def get_cached_error(token: str, block: int) -> dict[str, object] | None:
@@ -70,34 +768,50 @@ def get_cached_error(token: str, block: int) -> dict[str, object] | None:
     Error entries have an ``"error"`` key and a TTL set on them so they
     expire automatically and get retried.
     """
-    try:
-        cache = get_cache()
-        key = make_key(token, block)
-        entry = cache.get(key)
-        if entry is not None and isinstance(entry, dict) and "error" in entry:
-            return cast(dict[str, object], entry)
-        return None
-    except Exception as e:
-        logger.warning("cache_read_error_entry_failed", error=str(e))
-        return None
+    result = lookup_cached(token, block)
+    return result.entry if isinstance(result, CacheErrorHit) else None
 
 
 def set_cached_price(
     token: str, block: int, price: float, block_timestamp: int | None = None
 ) -> None:
     try:
-        cache = get_cache()
-        key = make_key(token, block)
         entry: dict[str, object] = {
             "price": price,
             "cached_at": datetime.now(UTC).isoformat(),
             "block_timestamp": block_timestamp,
         }
-        cache.set(key, entry)
+        key = make_key(token, block)
+        if not _hold_provisional(key, block, entry):
+            _write_entry(key, entry)
     except Exception as e:
         logger.warning("cache_write_failed", error=str(e))
 
 
+def set_cached_prices_many(entries: Iterable[tuple[str, int, float, int | None]]) -> None:
+    """Bulk :func:`set_cached_price` in one diskcache transaction per shard.
+
+    ``entries`` yields ``(token, block, price, block_timestamp)`` tuples.
+    Near-head prices go to the provisional tier, like :func:`set_cached_price`.
+    """
+    try:
+        cached_at = datetime.now(UTC).isoformat()
+        rows: list[tuple[str, dict[str, object]]] = []
+        for token, block, price, block_timestamp in entries:
+            key = make_key(token, block)
+            entry: dict[str, object] = {
+                "price": price,
+                "cached_at": cached_at,
+                "block_timestamp": block_timestamp,
+            }
+            if not _hold_provisional(key, block, entry):
+                rows.append((key, entry))
+        if rows:
+            _write_many(rows)
+    except Exception as e:
+        logger.warning("cache_write_many_failed", error=str(e))
+
+
 def set_cached_error(token: str, block: int, error: str) -> None:
     """Cache a failed price-lookup result with a TTL so it can be retried later.
 
@@ -109,25 +823,61 @@ def set_cached_error(token: str, block: int, error: str) -> None:
             "block_timestamp": None,
         }
 
-    The entry expires after :data:`ERROR_CACHE_TTL` seconds.  On expiry,
+    The entry expires after :data:`ERROR_CACHE_TTL` seconds, both on disk and
+    in the in-memory tier.  On expiry,
     :func:`get_cached_error` returns ``None`` and the next request will
     attempt a real lookup again.
     """
     try:
-        cache = get_cache()
-        key = make_key(token, block)
         entry: dict[str, object] = {
             "error": error,
             "cached_at": datetime.now(UTC).isoformat(),
             "block_timestamp": None,
         }
-        cache.set(key, entry, expire=ERROR_CACHE_TTL)
+        _write_entry(make_key(token, block), entry, expire=ERROR_CACHE_TTL)
     except Exception as e:
         logger.warning("cache_write_error_failed", error=str(e))
 
 
-def get_cached_errors() -> Iterator[tuple[str, int, dict[str, object]]]:
-    """Iterate over all unexpired error entries in the cache.
+def set_cached_errors_many(entries: Iterable[tuple[str, int, str]]) -> None:
+    """Bulk :func:`set_cached_error` in one diskcache transaction per shard.
+
+    ``entries`` yields ``(token, block, error)`` tuples.
+    """
+    try:
+        cached_at = datetime.now(UTC).isoformat()
+        rows: list[tuple[str, dict[str, object]]] = [
+            (
+                make_key(token, block),
+                {"error": error, "cached_at": cached_at, "block_timestamp": None},
+            )
+            for token, block, error in entries
+        ]
+        if rows:
+            _write_many(rows, expire=ERROR_CACHE_TTL)
+    except Exception as e:
+        logger.warning("cache_write_errors_many_failed", error=str(e))
+
+
+def _error_tags_after(shard: diskcache.Cache, after: str, limit: int) -> list[tuple[str, str]]:
+    """Next ``limit`` unexpired ``(tag, key)`` error rows of one shard, after ``after``.
+
+    diskcache has no public "keys by tag" query, so this reads the tag index
+    directly; it is a range scan over error rows only.
+    """
+    rows = shard._sql(
+        "SELECT tag, key, raw FROM Cache"
+        " WHERE tag > ? AND tag < ? AND (expire_time IS NULL OR expire_time > ?)"
+        " ORDER BY tag LIMIT ?",
+        (after, _ERROR_TAG_END, time.time(), limit),
+    ).fetchall()
+    return [(tag, shard.disk.get(key, raw)) for tag, key, raw in rows]
+
+
+def get_cached_errors(
+    after: tuple[int, str] | None = None,
+) -> Iterator[tuple[str, int, dict[str, object]]]:
+    """Iterate over all unexpired error entries in the cache, in block order.
 
     Yields ``(token, block, entry)`` tuples where:
 
@@ -136,24 +886,89 @@ def get_cached_errors() -> Iterator[tuple[str, int, dict[str, object]]]:
     - ``entry`` is the dict containing ``"error"``, ``"cached_at"``, and
       ``"block_timestamp"``.
 
-    Only yields entries that have an ``"error"`` key (i.e. error entries,
-    not successful price entries).
+    Entries are ordered by ``(block, token)``.  Pass the ``(block, token)`` of
+    the last entry seen as ``after`` to resume from there, e.g. to page
+    through the results with :func:`itertools.islice`.
+
+    Error entries are found through the diskcache tag index, so this costs
+    O(number of errors) rather than a scan of every cached price.  Error
+    entries written before the index existed are not listed; they expire
+    within :data:`ERROR_CACHE_TTL`.
     """
     try:
         cache = get_cache()
-        for key in cache:
-            try:
-                entry = cache.get(key)
-                if entry is None or not isinstance(entry, dict) or "error" not in entry:
-                    continue
-                # Key format: "<token_lower>:<block>"
-                parts = str(key).rsplit(":", 1)
-                if len(parts) != 2:
-                    continue
-                token_lower, block_str = parts
-                block = int(block_str)
-                yield token_lower, block, cast(dict[str, object], entry)
-            except Exception as e:
-                logger.warning("cache_iter_entry_failed", key=key, error=str(e))
+        shards = cache._shards if isinstance(cache, diskcache.FanoutCache) else (cache,)
+        cursor = _error_tag(after[1], after[0]) if after is not None else _ERROR_TAG_PREFIX
+        while True:
+            page = sorted(
+                (tag, key, shard)
+                for shard in shards
+                for tag, key in _error_tags_after(shard, cursor, _ERROR_PAGE_SIZE)
+            )[:_ERROR_PAGE_SIZE]
+            if not page:
+                return
+            for tag, key, shard in page:
+                try:
+                    entry = shard.get(key)
+                    # Expired or overwritten since the index read
+                    if not isinstance(entry, dict) or "error" not in entry:
+                        continue
+                    _, block_str, token_lower = tag.split(":", 2)
+                    yield token_lower, int(block_str), cast(dict[str, object], entry)
+                except Exception as e:
+                    logger.warning("cache_iter_entry_failed", key=key, error=str(e))
+            cursor = page[-1][0]
     except Exception as e:
         logger.warning("cache_iter_failed", error=str(e))
+
+
+def _evicted(reason: str, entries: int, before: int, after: int) -> None:
+    if entries:
+        cache_evicted_entries_total.labels(reason=reason).inc(entries)
+        cache_evicted_bytes_total.labels(reason=reason).inc(max(0, before - after))
+        logger.info("cache_evicted", reason=reason, entries=entries, bytes=max(0, before - after))
+
+
+def _enforce_shard_limit(shard: diskcache.Cache) -> int:
+    """Evict from one shard until it fits its size limit; returns its volume."""
+    limit = shard.size_limit
+    volume = shard.volume()
+    if volume <= limit:
+        return cast(int, volume)
+
+    before, removed = volume, shard.expire()
+    volume = shard.volume()
+    _evicted("expired", removed, before, volume)
+
+    # Error entries are cheap to recompute (they expire anyway), so they go
+    # before any successful price.
+    while volume > limit:
+        rows = _error_tags_after(shard, _ERROR_TAG_PREFIX, _ERROR_PAGE_SIZE)
+        if not rows:
+            break
+        with shard.transact():
+            for _, key in rows:
+                shard.delete(key)
+        before, volume = volume, shard.volume()
+        _evicted("error", len(rows), before, volume)
+
+    if volume > limit:
+        before, removed = volume, shard.cull()
+        volume = shard.volume()
+        _evicted("price", removed, before, volume)
+    return cast(int, volume)
+
+
+def enforce_size_limit() -> None:
+    """Bring the price cache under ``CACHE_SIZE_LIMIT``.
+
+    Evicts in order: expired entries, error entries, then prices according to
+    ``CACHE_EVICTION_POLICY``.  Updates the eviction and volume metrics.
+    Blocking; run it on the cache I/O pool from async code.
+    """
+    try:
+        cache = get_cache()
+        shards = cache._shards if isinstance(cache, diskcache.FanoutCache) else (cache,)
+        cache_volume_bytes.set(sum(_enforce_shard_limit(shard) for shard in shards))
+    except Exception as e:
+        logger.warning("cache_eviction_failed", error=str(e))
@@ -0,0 +1,390 @@
+"""Durable background jobs for long-running price lookups.
+
+A job is a request body accepted by ``POST /jobs`` and run later by one of a
+fixed pool of asyncio workers, so clients poll for the result instead of
+holding a connection open for the whole lookup.  Job state lives in a small
+SQLite file: the job row (kind, request, status, result) and the partial
+results emitted while it runs, kept after it finishes so a client can
+resume reading them.  On start, jobs that were queued or running
+when the process stopped are queued again (their partial results are
+discarded; prices already fetched come back from the price cache).
+Finished jobs are deleted after a retention period.
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from prometheus_client import Counter, Gauge
+
+from src.logger import get_logger, sanitize_error_message
+
+logger = get_logger("jobs")
+
+jobs_finished_total = Counter(
+    "jobs_finished_total",
+    "Jobs finished, by kind and outcome",
+    ["kind", "status"],
+)
+jobs_queued = Gauge("jobs_queued", "Jobs waiting for a worker")
+jobs_running = Gauge("jobs_running", "Jobs being run by a worker")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    request TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT,
+    error_status INTEGER,
+    client TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+# Seconds between purges of finished jobs: the retention period, within these bounds
+_PURGE_INTERVAL_MIN = 60.0
+_PURGE_INTERVAL_MAX = 3600.0
+
+
+class JobFailedError(Exception):
+    """Raised by a job executor to fail the job with an HTTP-style status."""
+
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class JobQueueFullError(Exception):
+    """Raised by :meth:`JobRunner.submit` when MAX_QUEUED_JOBS jobs are waiting."""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    request: dict[str, Any]
+    status: str
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: Any = None
+    error: str | None = None
+    error_status: int | None = None
+    # Client that submitted the job, charged for its lookups
+    client: str = ""
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+
+def _row_to_job(row: sqlite3.Row) -> Job:
+    return Job(
+        id=row["id"],
+        kind=row["kind"],
+        request=json.loads(row["request"]),
+        status=row["status"],
+        created_at=row["created_at"],
+        started_at=row["started_at"],
+        finished_at=row["finished_at"],
+        result=None if row["result"] is None else json.loads(row["result"]),
+        error=row["error"],
+        error_status=row["error_status"],
+        client=row["client"],
+    )
+
+
+class JobStore:
+    """SQLite-backed job state; every method is one short transaction.
+
+    Methods block on disk I/O and are meant to be called through
+    ``asyncio.to_thread``; a lock serialises them on the shared connection.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "client" not in columns:
+            # Job files written before jobs recorded their client
+            self._db.execute("ALTER TABLE jobs ADD COLUMN client TEXT NOT NULL DEFAULT ''")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def create(self, kind: str, request: dict[str, Any], client: str = "") -> Job:
+        job = Job(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            request=request,
+            status=QUEUED,
+            created_at=time.time(),
+            client=client,
+        )
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, request, status, created_at, client) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job.id, kind, json.dumps(request), QUEUED, job.created_at, client),
+            )
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else _row_to_job(row)
+
+    def mark_running(self, job_id: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+                (RUNNING, time.time(), job_id),
+            )
+
+    def mark_done(self, job_id: str, result: Any) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, result = ? WHERE id = ?",
+                (DONE, time.time(), json.dumps(result), job_id),
+            )
+
+    def mark_failed(self, job_id: str, error: str, error_status: int) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ?, error_status = ? "
+                "WHERE id = ?",
+                (FAILED, time.time(), error, error_status, job_id),
+            )
+
+    def append_items(self, job_id: str, start: int, items: Sequence[Any]) -> None:
+        """Store partial results ``start``, ``start + 1``, ... of a running job."""
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO job_items (job_id, seq, item) VALUES (?, ?, ?)",
+                [(job_id, start + i, json.dumps(item)) for i, item in enumerate(items)],
+            )
+
+    def items(self, job_id: str, after: int = 0) -> list[Any]:
+        """Partial results of a job, from position ``after`` on."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT item FROM job_items WHERE job_id = ? AND seq >= ? ORDER BY seq",
+                (job_id, after),
+            ).fetchall()
+        return [json.loads(row["item"]) for row in rows]
+
+    def recover(self) -> list[str]:
+        """Queue interrupted jobs again; returns every queued job id, oldest first."""
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._db.execute(
+                "DELETE FROM job_items WHERE job_id IN (SELECT id FROM jobs WHERE status = ?)",
+                (RUNNING,),
+            )
+            self._db.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING)
+            )
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def purge(self, finished_before: float) -> int:
+        """Delete jobs that finished before ``finished_before``; returns how many."""
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (finished_before,),
+            )
+            self._db.execute("DELETE FROM job_items WHERE job_id NOT IN (SELECT id FROM jobs)")
+        return cursor.rowcount
+
+
+# Called by an executor with each batch of partial results, in order
+type EmitItems = Callable[[Sequence[Any]], Awaitable[None]]
+type JobExecutor = Callable[[str, dict[str, Any], EmitItems, str], Awaitable[Any]]
+
+
+class JobRunner:
+    """Run stored jobs on a pool of ``workers`` asyncio tasks.
+
+    ``execute(kind, request, emit, client)`` does a job's work on behalf of
+    the client that submitted it and returns its result; it may call ``emit``
+    with partial results as they become available, and raises
+    :class:`JobFailedError` (or any exception) to fail the job.  At most
+    ``max_queued`` jobs wait for a worker.  Finished jobs are purged after
+    ``retention`` seconds.
+    """
+
+    def __init__(
+        self,
+        execute: JobExecutor,
+        workers: int,
+        max_queued: int,
+        retention: float,
+    ) -> None:
+        self._execute = execute
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention = retention
+        self._store: JobStore | None = None
+        self._queue: asyncio.Queue[str] | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+        # Set whenever a job emits items or finishes; replaced after each set
+        self._progress: dict[str, asyncio.Event] = {}
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            raise RuntimeError("job runner is not started")
+        return self._store
+
+    async def start(self, path: str) -> None:
+        """Open the job store, requeue interrupted jobs and start the workers."""
+        self._store = await asyncio.to_thread(JobStore, path)
+        purged = await asyncio.to_thread(self.store.purge, time.time() - self.retention)
+        queued = await asyncio.to_thread(self.store.recover)
+        self._queue = asyncio.Queue()
+        for job_id in queued:
+            self._queue.put_nowait(job_id)
+        jobs_queued.set(len(queued))
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purge_periodically()))
+        logger.info("jobs_started", path=path, requeued=len(queued), purged=purged)
+
+    async def stop(self) -> None:
+        """Stop the workers; running jobs are requeued on the next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    async def submit(self, kind: str, request: dict[str, Any], client: str = "") -> Job:
+        if self._queue is None:
+            raise RuntimeError("job runner is not started")
+        if self._queue.qsize() >= self.max_queued:
+            raise JobQueueFullError(f"{self._queue.qsize()} jobs are already queued")
+        job = await asyncio.to_thread(self.store.create, kind, request, client)
+        self._queue.put_nowait(job.id)
+        jobs_queued.inc()
+        return job
+
+    async def get(self, job_id: str) -> Job | None:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def items(self, job_id: str, after: int = 0) -> list[Any]:
+        return await asyncio.to_thread(self.store.items, job_id, after)
+
+    async def wait_for_progress(self, job_id: str, timeout: float) -> None:
+        """Wait until the job emits items or finishes, or ``timeout`` seconds pass."""
+        event = self._progress.setdefault(job_id, asyncio.Event())
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(event.wait(), timeout)
+
+    def _notify(self, job_id: str) -> None:
+        event = self._progress.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def _work(self) -> None:
+        assert self._queue is not None
+        while True:
+            job_id = await self._queue.get()
+            jobs_queued.dec()
+            jobs_running.inc()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                # A store call failed (e.g. a locked database); fail the job but
+                # keep this worker alive
+                logger.error("job_worker_error", job_id=job_id, error=str(e))
+                try:
+                    await asyncio.to_thread(
+                        self.store.mark_failed, job_id, "Internal error while running the job", 500
+                    )
+                except Exception as mark_error:
+                    logger.error("job_mark_failed_error", job_id=job_id, error=str(mark_error))
+            finally:
+                jobs_running.dec()
+                self._notify(job_id)
+
+    async def _run(self, job_id: str) -> None:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None or job.status != QUEUED:
+            return
+        await asyncio.to_thread(self.store.mark_running, job_id)
+        emitted = 0
+
+        async def emit(items: Sequence[Any]) -> None:
+            nonlocal emitted
+            if not items:
+                return
+            await asyncio.to_thread(self.store.append_items, job_id, emitted, items)
+            emitted += len(items)
+            self._notify(job_id)
+
+        start = time.monotonic()
+        try:
+            result = await self._execute(job.kind, job.request, emit, job.client)
+        except JobFailedError as e:
+            await asyncio.to_thread(self.store.mark_failed, job_id, str(e), e.status_code)
+            jobs_finished_total.labels(kind=job.kind, status=FAILED).inc()
+            logger.info("job_failed", job_id=job_id, kind=job.kind, error=str(e))
+            return
+        except Exception as e:
+            await asyncio.to_thread(
+                self.store.mark_failed, job_id, sanitize_error_message(str(e)), 500
+            )
+            jobs_finished_total.labels(kind=job.kind, status=FAILED).inc()
+            logger.error("job_crashed", job_id=job_id, kind=job.kind, error=str(e))
+            return
+        await asyncio.to_thread(self.store.mark_done, job_id, result)
+        jobs_finished_total.labels(kind=job.kind, status=DONE).inc()
+        logger.info(
+            "job_done",
+            job_id=job_id,
+            kind=job.kind,
+            duration_ms=int((time.monotonic() - start) * 1000),
+        )
+
+    async def _purge_periodically(self) -> None:
+        while True:
+            # A retention of 0 would otherwise purge in a busy loop
+            interval = min(max(self.retention, _PURGE_INTERVAL_MIN), _PURGE_INTERVAL_MAX)
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.store.purge, time.time() - self.retention)
@@ -1,3 +1,4 @@
+import os
 import re
 from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
@@ -21,6 +22,10 @@ class PriceParams:
     amount: float | None = None
     ignore_pools: tuple[str, ...] = ()
     timestamp: int | None = None
+    # Output token for quote mode
+    to: str | None = None
+    # Token to express the price in instead of USD
+    denominate: str | None = None
 
 
 @dataclass
@@ -29,11 +34,46 @@ class BatchParams:
     block: int | None = None
     amounts: tuple[float | None, ...] | None = None
     timestamp: int | None = None
+    force: bool = False
+    # Token to express prices in instead of USD
+    denominate: str | None = None
+
+
+@dataclass
+class SeriesParams:
+    """One token over either explicit blocks or timestamps (exactly one is set)."""
+
+    token: str
+    blocks: tuple[int, ...] | None = None
+    timestamps: tuple[int, ...] | None = None
+    force: bool = False
+
+
+@dataclass
+class MatrixParams:
+    """Tokens x either explicit blocks or timestamps (exactly one is set)."""
+
+    tokens: tuple[str, ...]
+    blocks: tuple[int, ...] | None = None
+    timestamps: tuple[int, ...] | None = None
+    force: bool = False
 
 
 # Maximum number of tokens allowed in a batch request
 MAX_BATCH_TOKENS = 100
 
+# Maximum number of tokens allowed in a JSON-body (POST) batch request
+MAX_BATCH_BODY_TOKENS = int(os.environ.get("MAX_BATCH_BODY_TOKENS", "10000"))
+
+# Maximum number of points in a /price_series request
+MAX_SERIES_POINTS = int(os.environ.get("MAX_SERIES_POINTS", "1000"))
+
+# Maximum number of cells (tokens x blocks) in a /price_matrix request
+MAX_MATRIX_CELLS = int(os.environ.get("MAX_MATRIX_CELLS", "100000"))
+
+# Longest client deadline (timeout / X-Request-Deadline), in seconds
+MAX_REQUEST_TIMEOUT = 300.0
+
 
 @dataclass
 class ParseSuccess:
@@ -124,6 +164,31 @@ def parse_timestamp(value: str | None) -> int | None | ParseError:
     return _parse_iso8601_timestamp(stripped)
 
 
+def parse_timeout(value: str | None, name: str = "timeout") -> float | ParseError | None:
+    """Parse a client deadline in seconds (e.g. '2' or '0.5').
+
+    Validates:
+    - Positive
+    - At most MAX_REQUEST_TIMEOUT
+
+    Returns seconds as float on success.
+    Returns None for missing/empty values.
+    Returns ParseError for invalid values.
+    """
+    if value is None or value.strip() == "":
+        return None
+    try:
+        parsed = float(value)
+    except ValueError:
+        return ParseError(f"Invalid {name}: '{value}'. Must be a number of seconds.")
+    if not 0 < parsed <= MAX_REQUEST_TIMEOUT:
+        return ParseError(
+            f"Invalid {name}: '{value}'. Must be more than 0 and at most "
+            f"{MAX_REQUEST_TIMEOUT:g} seconds."
+        )
+    return parsed
+
+
 def _parse_unix_timestamp(value: str) -> int | None | ParseError:
     """Parse Unix epoch timestamp string."""
     try:
@@ -216,12 +281,27 @@ def _parse_bool_with_default(value: str | None, name: str) -> bool | ParseError:
     return result if result is not None else False
 
 
+def _check_price_targets(to: str | None, denominate: str | None) -> ParseError | None:
+    """Validate the quote (``to``) and ``denominate`` addresses of /price."""
+    if to is not None and not is_valid_address(to):
+        return ParseError(f"Invalid to address: {to}")
+    if denominate is not None and not is_valid_address(denominate):
+        return ParseError(f"Invalid denominate address: {denominate}")
+    if to is not None and denominate is not None:
+        return ParseError(
+            "Parameters 'to' and 'denominate' are mutually exclusive. Provide only one."
+        )
+    return None
+
+
 def parse_price_params(
     token: str | None,
     block: str | None = None,
     amount: str | None = None,
     ignore_pools: str | None = None,
     timestamp: str | None = None,
+    to: str | None = None,
+    denominate: str | None = None,
 ) -> ParseResult:
     if not token:
         return ParseError("Missing required parameter: token")
@@ -229,6 +309,10 @@ def parse_price_params(
     if not is_valid_address(token):
         return ParseError(f"Invalid token address: {token}")
 
+    target_error = _check_price_targets(to, denominate)
+    if target_error is not None:
+        return target_error
+
     parsed_block = _parse_block(block)
     if isinstance(parsed_block, ParseError):
         return parsed_block
@@ -258,6 +342,8 @@ def parse_price_params(
             amount=parsed_amount,
             ignore_pools=parsed_ignore_pools,
             timestamp=parsed_timestamp,
+            to=to,
+            denominate=denominate,
         )
     )
 
@@ -345,6 +431,8 @@ def parse_batch_params(
     block: str | None = None,
     amounts: str | None = None,
     timestamp: str | None = None,
+    force: bool = False,
+    denominate: str | None = None,
 ) -> BatchParseResult:
     """Parse batch pricing parameters.
 
@@ -353,6 +441,9 @@ def parse_batch_params(
     - block: optional block number
     - amounts: optional comma-separated amounts (must match token count if provided)
     - timestamp: optional Unix/ISO timestamp (mutually exclusive with block)
+    - denominate: optional address to express prices in instead of USD
+
+    ``force`` (bypass cached errors) is passed through unchanged.
 
     Returns BatchParseSuccess with BatchParams on success.
     Returns ParseError on validation failure.
@@ -372,28 +463,417 @@ def parse_batch_params(
     if isinstance(parsed_amounts, ParseError):
         return parsed_amounts
 
+    return _build_batch_params(
+        parsed_tokens, parsed_block, parsed_amounts, timestamp, force, denominate
+    )
+
+
+def _build_batch_params(
+    tokens: tuple[str, ...],
+    block: int | None,
+    amounts: tuple[float | None, ...] | None,
+    timestamp: str | None,
+    force: bool,
+    denominate: str | None = None,
+) -> BatchParseResult:
+    """Cross-check parsed batch fields and build BatchParams."""
+    if denominate is not None and not is_valid_address(denominate):
+        return ParseError(f"Invalid denominate address: {denominate}")
+
     # Validate amounts count matches tokens count
-    if parsed_amounts is not None and len(parsed_amounts) != len(parsed_tokens):
+    if amounts is not None and len(amounts) != len(tokens):
         return ParseError(
-            f"Amounts count ({len(parsed_amounts)}) does not match tokens count ({len(parsed_tokens)})."
+            f"Amounts count ({len(amounts)}) does not match tokens count ({len(tokens)})."
         )
 
-    # Parse timestamp
     parsed_timestamp = parse_timestamp(timestamp)
     if isinstance(parsed_timestamp, ParseError):
         return parsed_timestamp
 
     # Mutual exclusivity check: timestamp and block cannot both be provided
-    if parsed_timestamp is not None and parsed_block is not None:
+    if parsed_timestamp is not None and block is not None:
         return ParseError(
             "Parameters 'timestamp' and 'block' are mutually exclusive. Provide only one."
         )
 
     return BatchParseSuccess(
         data=BatchParams(
-            tokens=tuple(parsed_tokens),
-            block=parsed_block,
-            amounts=parsed_amounts,
+            tokens=tokens,
+            block=block,
+            amounts=amounts,
             timestamp=parsed_timestamp,
+            force=force,
+            denominate=denominate,
         )
     )
+
+
+def _parse_token_list(value: object) -> tuple[str, ...] | ParseError:
+    """Parse the JSON ``tokens`` array of a batch body.
+
+    Same rules as _parse_tokens, with a MAX_BATCH_BODY_TOKENS limit.
+    """
+    if value is None:
+        return ParseError("Missing required field: tokens")
+    if not isinstance(value, list):
+        return ParseError("Field 'tokens' must be an array of token addresses.")
+    if len(value) == 0:
+        return ParseError("No valid token addresses provided.")
+    if len(value) > MAX_BATCH_BODY_TOKENS:
+        return ParseError(
+            f"Too many tokens: {len(value)}. Maximum allowed is {MAX_BATCH_BODY_TOKENS}."
+        )
+    for i, token in enumerate(value):
+        if not isinstance(token, str) or not is_valid_address(token.strip()):
+            return ParseError(f"Invalid token address at position {i + 1}: '{token}'")
+    return tuple(token.strip() for token in value)
+
+
+def _parse_amount_list(value: object) -> tuple[float | None, ...] | ParseError | None:
+    """Parse the JSON ``amounts`` array of a batch body; null entries mean 'no amount'."""
+    if value is None:
+        return None
+    if not isinstance(value, list):
+        return ParseError("Field 'amounts' must be an array of numbers or nulls.")
+    amounts: list[float | None] = []
+    for i, amount in enumerate(value):
+        if amount is None:
+            amounts.append(None)
+            continue
+        if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+            return ParseError(f"Invalid amount at position {i + 1}: '{amount}'")
+        if not amount > 0 or amount == float("inf"):
+            return ParseError(f"Invalid amount at position {i + 1}: '{amount}' (must be positive)")
+        amounts.append(float(amount))
+    return tuple(amounts) if amounts else None
+
+
+def _scalar_field(value: object) -> str | None:
+    """Render a JSON block/timestamp field the way it would appear in a query string."""
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+
+def parse_batch_body(body: object) -> BatchParseResult:
+    """Parse a JSON batch pricing body (POST /prices).
+
+    Expects an object with:
+    - tokens: array of addresses (required, max MAX_BATCH_BODY_TOKENS)
+    - amounts: optional array of positive numbers or nulls, aligned with tokens
+    - block: optional block number (integer or string)
+    - timestamp: optional Unix/ISO timestamp (mutually exclusive with block)
+    - force: optional boolean, bypass cached errors (default false)
+    - denominate: optional address to express prices in instead of USD
+
+    Returns BatchParseSuccess with BatchParams on success.
+    Returns ParseError on validation failure.
+    """
+    if not isinstance(body, dict):
+        return ParseError("Request body must be a JSON object.")
+
+    parsed_tokens = _parse_token_list(body.get("tokens"))
+    if isinstance(parsed_tokens, ParseError):
+        return parsed_tokens
+
+    block = body.get("block")
+    if isinstance(block, (bool, float)):
+        return ParseError(f"Invalid block number: {block}")
+    parsed_block = _parse_block(_scalar_field(block))
+    if isinstance(parsed_block, ParseError):
+        return parsed_block
+
+    parsed_amounts = _parse_amount_list(body.get("amounts"))
+    if isinstance(parsed_amounts, ParseError):
+        return parsed_amounts
+
+    force = body.get("force", False)
+    if not isinstance(force, bool):
+        return ParseError("Field 'force' must be a boolean.")
+
+    timestamp = body.get("timestamp")
+    if isinstance(timestamp, bool):
+        return ParseError(
+            f"Invalid timestamp format: '{timestamp}'. Expected Unix epoch or ISO 8601."
+        )
+    denominate = body.get("denominate")
+    if denominate is not None and not isinstance(denominate, str):
+        return ParseError(f"Invalid denominate address: {denominate}")
+    return _build_batch_params(
+        parsed_tokens, parsed_block, parsed_amounts, _scalar_field(timestamp), force, denominate
+    )
+
+
+@dataclass
+class SeriesParseSuccess:
+    data: SeriesParams
+
+
+SeriesParseResult = SeriesParseSuccess | ParseError
+
+
+def _parse_timestamps(value: str) -> tuple[int, ...] | ParseError:
+    """Parse comma-separated timestamps (each as accepted by parse_timestamp)."""
+    timestamps: list[int] = []
+    for i, segment in enumerate(value.split(",")):
+        stripped = segment.strip()
+        if stripped == "":
+            continue  # Drop empty segments
+        parsed = parse_timestamp(stripped)
+        if isinstance(parsed, ParseError):
+            return ParseError(f"Invalid timestamp at position {i + 1}: {parsed.error}")
+        if parsed is not None:
+            timestamps.append(parsed)
+    if len(timestamps) == 0:
+        return ParseError("No valid timestamps provided.")
+    if len(timestamps) > MAX_SERIES_POINTS:
+        return ParseError(
+            f"Too many points: {len(timestamps)}. Maximum allowed is {MAX_SERIES_POINTS}."
+        )
+    return tuple(timestamps)
+
+
+def _parse_block_range(
+    start_block: str | None, end_block: str | None, step: str | None
+) -> tuple[int, ...] | ParseError:
+    """Expand start_block..end_block (inclusive) every ``step`` blocks."""
+    if start_block is None or end_block is None:
+        return ParseError("Parameters 'start_block' and 'end_block' must be provided together.")
+    start = _parse_block(start_block)
+    if isinstance(start, ParseError):
+        return start
+    end = _parse_block(end_block)
+    if isinstance(end, ParseError):
+        return end
+    if start is None or end is None:
+        return ParseError("Parameters 'start_block' and 'end_block' must be provided together.")
+    if end < start:
+        return ParseError("Parameter 'end_block' must not be before 'start_block'.")
+    try:
+        parsed_step = int(step) if step is not None else 1
+    except ValueError:
+        return ParseError(f"Invalid step: {step}")
+    if parsed_step <= 0:
+        return ParseError(f"Invalid step: {step} (must be positive)")
+    count = (end - start) // parsed_step + 1
+    if count > MAX_SERIES_POINTS:
+        return ParseError(f"Too many points: {count}. Maximum allowed is {MAX_SERIES_POINTS}.")
+    return tuple(range(start, end + 1, parsed_step))
+
+
+def parse_series_params(
+    token: str | None,
+    start_block: str | None = None,
+    end_block: str | None = None,
+    step: str | None = None,
+    timestamps: str | None = None,
+    force: bool = False,
+) -> SeriesParseResult:
+    """Parse /price_series parameters.
+
+    Validates:
+    - token: address (required)
+    - start_block, end_block, step: inclusive block range, every ``step`` blocks (default 1)
+    - timestamps: comma-separated Unix/ISO timestamps (mutually exclusive with the range)
+    - at most MAX_SERIES_POINTS points
+
+    Returns SeriesParseSuccess with SeriesParams on success.
+    Returns ParseError on validation failure.
+    """
+    if not token:
+        return ParseError("Missing required parameter: token")
+
+    if not is_valid_address(token):
+        return ParseError(f"Invalid token address: {token}")
+
+    has_range = start_block is not None or end_block is not None or step is not None
+    if timestamps and has_range:
+        return ParseError(
+            "Parameters 'timestamps' and 'start_block'/'end_block'/'step' are mutually "
+            "exclusive. Provide only one."
+        )
+
+    if timestamps:
+        parsed_timestamps = _parse_timestamps(timestamps)
+        if isinstance(parsed_timestamps, ParseError):
+            return parsed_timestamps
+        return SeriesParseSuccess(
+            data=SeriesParams(token=token, timestamps=parsed_timestamps, force=force)
+        )
+
+    if not has_range:
+        return ParseError("Provide either 'start_block' and 'end_block', or 'timestamps'.")
+    parsed_blocks = _parse_block_range(start_block, end_block, step)
+    if isinstance(parsed_blocks, ParseError):
+        return parsed_blocks
+    return SeriesParseSuccess(data=SeriesParams(token=token, blocks=parsed_blocks, force=force))
+
+
+@dataclass
+class MatrixParseSuccess:
+    data: MatrixParams
+
+
+MatrixParseResult = MatrixParseSuccess | ParseError
+
+
+def _parse_block_list(value: list[object]) -> tuple[int, ...] | ParseError:
+    """Parse the JSON ``blocks`` array of a matrix body."""
+    blocks: list[int] = []
+    for i, block in enumerate(value):
+        if isinstance(block, (bool, float)):
+            return ParseError(f"Invalid block at position {i + 1}: '{block}'")
+        parsed = _parse_block(_scalar_field(block))
+        if parsed is None or isinstance(parsed, ParseError):
+            return ParseError(f"Invalid block at position {i + 1}: '{block}'")
+        blocks.append(parsed)
+    return tuple(blocks)
+
+
+def _parse_timestamp_list(value: list[object]) -> tuple[int, ...] | ParseError:
+    """Parse the JSON ``timestamps`` array of a matrix body."""
+    timestamps: list[int] = []
+    for i, timestamp in enumerate(value):
+        parsed = (
+            ParseError(f"Invalid timestamp format: '{timestamp}'.")
+            if isinstance(timestamp, bool)
+            else parse_timestamp(_scalar_field(timestamp))
+        )
+        if isinstance(parsed, ParseError):
+            return ParseError(f"Invalid timestamp at position {i + 1}: {parsed.error}")
+        if parsed is None:
+            return ParseError(f"Invalid timestamp at position {i + 1}: '{timestamp}'")
+        timestamps.append(parsed)
+    return tuple(timestamps)
+
+
+def parse_matrix_body(body: object) -> MatrixParseResult:
+    """Parse a JSON matrix pricing body (POST /price_matrix).
+
+    Expects an object with:
+    - tokens: array of addresses (required, max MAX_BATCH_BODY_TOKENS)
+    - blocks: array of block numbers, or
+    - timestamps: array of Unix/ISO timestamps (exactly one of the two)
+    - force: optional boolean, bypass cached errors (default false)
+
+    The matrix may hold at most MAX_MATRIX_CELLS cells (tokens x blocks).
+
+    Returns MatrixParseSuccess with MatrixParams on success.
+    Returns ParseError on validation failure.
+    """
+    if not isinstance(body, dict):
+        return ParseError("Request body must be a JSON object.")
+
+    parsed_tokens = _parse_token_list(body.get("tokens"))
+    if isinstance(parsed_tokens, ParseError):
+        return parsed_tokens
+
+    force = body.get("force", False)
+    if not isinstance(force, bool):
+        return ParseError("Field 'force' must be a boolean.")
+
+    column = _parse_matrix_column(body.get("blocks"), body.get("timestamps"), len(parsed_tokens))
+    if isinstance(column, ParseError):
+        return column
+    blocks, timestamps = column
+    return MatrixParseSuccess(
+        data=MatrixParams(tokens=parsed_tokens, blocks=blocks, timestamps=timestamps, force=force)
+    )
+
+
+def _parse_matrix_column(
+    blocks: object, timestamps: object, token_count: int
+) -> tuple[tuple[int, ...] | None, tuple[int, ...] | None] | ParseError:
+    """Parse the matrix columns: ``(blocks, None)`` or ``(None, timestamps)``."""
+    if blocks is not None and timestamps is not None:
+        return ParseError(
+            "Fields 'blocks' and 'timestamps' are mutually exclusive. Provide only one."
+        )
+    column = blocks if blocks is not None else timestamps
+    name = "blocks" if blocks is not None else "timestamps"
+    if column is None:
+        return ParseError("Provide either 'blocks' or 'timestamps'.")
+    if not isinstance(column, list) or len(column) == 0:
+        return ParseError(f"Field '{name}' must be a non-empty array.")
+    cells = token_count * len(column)
+    if cells > MAX_MATRIX_CELLS:
+        return ParseError(f"Too many cells: {cells}. Maximum allowed is {MAX_MATRIX_CELLS}.")
+    if blocks is not None:
+        parsed_blocks = _parse_block_list(column)
+        if isinstance(parsed_blocks, ParseError):
+            return parsed_blocks
+        return parsed_blocks, None
+    parsed_timestamps = _parse_timestamp_list(column)
+    if isinstance(parsed_timestamps, ParseError):
+        return parsed_timestamps
+    return None, parsed_timestamps
+
+
+JOB_KINDS = ("price", "batch", "series")
+
+
+@dataclass
+class JobParseSuccess:
+    kind: str
+    data: PriceParams | BatchParams | SeriesParams
+    # /price takes ``force`` beside its params rather than in them
+    force: bool = False
+
+
+JobParseResult = JobParseSuccess | ParseError
+
+
+def _joined_field(value: object) -> str | None:
+    """Render a JSON array field as the comma-separated query string value."""
+    if isinstance(value, list):
+        return ",".join(str(v) for v in value)
+    return _scalar_field(value)
+
+
+def parse_job_body(body: object) -> JobParseResult:
+    """Parse a JSON job body (POST /jobs).
+
+    ``kind`` selects the work and the remaining fields are its parameters:
+    - price: the /price query parameters (token, block, timestamp, amount,
+      ignore_pools, to, denominate, force)
+    - batch: the POST /prices body
+    - series: the /price_series query parameters (token, start_block,
+      end_block, step, timestamps, force); timestamps may be an array
+
+    Returns JobParseSuccess on success.
+    Returns ParseError on validation failure.
+    """
+    if not isinstance(body, dict):
+        return ParseError("Request body must be a JSON object.")
+    kind = body.get("kind")
+    if kind not in JOB_KINDS:
+        return ParseError(f"Field 'kind' must be one of: {', '.join(JOB_KINDS)}.")
+    force = body.get("force", False)
+    if not isinstance(force, bool):
+        return ParseError("Field 'force' must be a boolean.")
+
+    result: ParseResult | BatchParseResult | SeriesParseResult
+    if kind == "batch":
+        result = parse_batch_body(body)
+    elif kind == "series":
+        result = parse_series_params(
+            _scalar_field(body.get("token")),
+            _scalar_field(body.get("start_block")),
+            _scalar_field(body.get("end_block")),
+            _scalar_field(body.get("step")),
+            _joined_field(body.get("timestamps")),
+            force=force,
+        )
+    else:
+        result = parse_price_params(
+            _scalar_field(body.get("token")),
+            _scalar_field(body.get("block")),
+            _scalar_field(body.get("amount")),
+            _joined_field(body.get("ignore_pools")),
+            _scalar_field(body.get("timestamp")),
+            to=_scalar_field(body.get("to")),
+            denominate=_scalar_field(body.get("denominate")),
+        )
+    if isinstance(result, ParseError):
+        return result
+    return JobParseSuccess(kind=kind, data=result.data, force=force)
@@ -0,0 +1,149 @@
+"""Per-client token-bucket limits on cache-miss work.
+
+Only work the cache cannot answer is limited: cache hits are cheap, so they
+are never counted.  Each client has up to two buckets: one of requests
+(refilled at ``rate`` requests per second) taken once per request that starts
+new lookups, and one of compute seconds (refilled at ``compute_rate`` seconds
+per second) charged afterwards with the time its ypricemagic calls held a
+scheduler slot.  A client whose compute bucket is in debt is refused until it
+refills.  Clients are identified by API key (hashed, so keys never appear in
+logs) or IP address; a per-client weight scales both limits and the client's
+share of the fair queue (see :class:`~src.scheduler.LaneScheduler`).
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from prometheus_client import Counter
+
+client_rate_limited_total = Counter(
+    "client_rate_limited_total",
+    "Requests refused cache-miss work by a per-client limit, by limit",
+    ["limit"],
+)
+
+
+def api_key_client_id(api_key: str) -> str:
+    """Client id of an API key (a short hash, so it can be logged)."""
+    return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def parse_client_weights(value: str) -> dict[str, float]:
+    """Parse ``key=weight,key=weight`` (API keys) into weights by client id.
+
+    Raises ValueError on a malformed entry or a weight that is not positive.
+    """
+    weights: dict[str, float] = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        api_key, sep, weight = entry.rpartition("=")
+        if not sep or not api_key.strip():
+            raise ValueError(f"Invalid client weight entry: {entry.strip()!r}")
+        parsed = float(weight)
+        if parsed <= 0:
+            raise ValueError(f"Client weight must be positive: {entry.strip()!r}")
+        weights[api_key_client_id(api_key.strip())] = parsed
+    return weights
+
+
+class TokenBucket:
+    """``capacity`` tokens, refilled continuously at ``rate`` tokens per second."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens are available (0 if they are now)."""
+        self._refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount: float) -> None:
+        """Remove ``amount`` tokens; the bucket may go into debt."""
+        self._refill()
+        self.tokens -= amount
+
+
+@dataclass
+class _ClientBuckets:
+    requests: TokenBucket | None
+    compute: TokenBucket | None
+
+
+class ClientLimiter:
+    """Token-bucket limits per client, in requests/s and compute seconds/s.
+
+    A rate of 0 disables that limit.  ``weights`` maps client ids to a
+    multiplier of both rates and bursts (default 1).  Buckets of at most
+    ``max_clients`` clients are kept, least recently seen first out (a
+    forgotten client starts again with full buckets).
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        compute_rate: float,
+        compute_burst: float,
+        weights: dict[str, float] | None = None,
+        max_clients: int = 10_000,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.compute_rate = compute_rate
+        self.compute_burst = compute_burst
+        self.weights = weights or {}
+        self.max_clients = max(1, max_clients)
+        self._clients: OrderedDict[str, _ClientBuckets] = OrderedDict()
+
+    def weight(self, client: str) -> float:
+        return self.weights.get(client, 1.0)
+
+    def _buckets(self, client: str) -> _ClientBuckets:
+        buckets = self._clients.get(client)
+        if buckets is None:
+            weight = self.weight(client)
+            buckets = _ClientBuckets(
+                requests=TokenBucket(self.rate * weight, max(1.0, self.burst * weight))
+                if self.rate > 0
+                else None,
+                compute=TokenBucket(self.compute_rate * weight, self.compute_burst * weight)
+                if self.compute_rate > 0
+                else None,
+            )
+            self._clients[client] = buckets
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        self._clients.move_to_end(client)
+        return buckets
+
+    def admit(self, client: str) -> tuple[str, float] | None:
+        """Take one request from the client's budget, or return the exceeded limit
+        and the seconds until it allows another request."""
+        buckets = self._buckets(client)
+        # The compute bucket may be in debt; allow work again once it is repaid
+        if buckets.compute is not None and (wait := buckets.compute.wait_time(0)) > 0:
+            client_rate_limited_total.labels(limit="compute").inc()
+            return "compute", wait
+        if buckets.requests is not None:
+            if (wait := buckets.requests.wait_time(1)) > 0:
+                client_rate_limited_total.labels(limit="requests").inc()
+                return "requests", wait
+            buckets.requests.take(1)
+        return None
+
+    def charge_compute(self, client: str, seconds: float) -> None:
+        """Charge compute time spent on the client's behalf."""
+        buckets = self._buckets(client)
+        if buckets.compute is not None:
+            buckets.compute.take(seconds)
@@ -0,0 +1,281 @@
+"""Schedule ypricemagic calls into lanes by expected cost.
+
+Cache misses are priced in one of three lanes (``fast``, ``default``,
+``slow``), each with its own concurrency limit, so a burst of slow lookups
+(Curve LPs, vaults) fills the slow lane and waits there instead of taking the
+slots cheap lookups (stablecoins, Chainlink feeds) need.  :class:`CostModel`
+picks the lane for a token from its observed latency, falling back to its
+pricing bucket; :class:`LaneScheduler` enforces the limits and hands free
+slots to waiters in priority order, sharing each lane fairly between clients.
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterable
+from dataclasses import dataclass, field
+
+from prometheus_client import Counter, Gauge, Histogram
+
+FAST = "fast"
+DEFAULT = "default"
+SLOW = "slow"
+LANES = (FAST, DEFAULT, SLOW)
+
+# Lower values are served first within a lane
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+PRIORITY_NORMAL = PRIORITIES["normal"]
+PRIORITY_LOW = PRIORITIES["low"]
+
+# check_bucket results priced from a single feed or a fixed ratio
+CHEAP_BUCKETS = frozenset(
+    {
+        "stable usd",
+        "chainlink feed",
+        "chainlink and band",
+        "one to one",
+        "wrapped gas coin",
+        "wsteth",
+    }
+)
+# check_bucket results that price every underlying token or scan pool events
+EXPENSIVE_BUCKETS = frozenset(
+    {
+        "curve lp",
+        "balancer pool",
+        "uni v3 lp",
+        "yearn or yearn-like",
+        "convex",
+        "pickle lp",
+        "ellipsis lp",
+        "saddle",
+        "mstable feeder pool",
+        "popsicle",
+        "pendle lp",
+        "token set",
+    }
+)
+
+scheduler_wait_seconds = Histogram(
+    "scheduler_wait_seconds",
+    "Time price lookups waited for a lane slot",
+    ["lane"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0),
+)
+scheduler_lookups_total = Counter(
+    "scheduler_lookups_total",
+    "Price lookups scheduled, by lane",
+    ["lane"],
+)
+scheduler_running = Gauge("scheduler_running", "Price lookups holding a lane slot", ["lane"])
+scheduler_queued = Gauge("scheduler_queued", "Price lookups waiting for a lane slot", ["lane"])
+
+
+class CostModel:
+    """Expected cost of pricing a token, from its bucket and latency history.
+
+    Latency is an exponentially weighted moving average of observed lookup
+    durations (weight ``alpha`` for the newest).  A token whose average is at
+    least ``slow_latency`` seconds goes to the slow lane and one at most
+    ``fast_latency`` to the fast lane; in between, or without history, its
+    bucket decides (unknown buckets go to the default lane).  A token that
+    could not be classified is remembered as such, so it is not classified
+    again.  At most ``max_tokens`` tokens are remembered, least recently
+    updated first out.
+    """
+
+    def __init__(
+        self,
+        fast_latency: float,
+        slow_latency: float,
+        alpha: float = 0.3,
+        max_tokens: int = 100_000,
+    ) -> None:
+        self.fast_latency = fast_latency
+        self.slow_latency = slow_latency
+        self.alpha = alpha
+        self.max_tokens = max(1, max_tokens)
+        self._buckets: OrderedDict[str, str] = OrderedDict()
+        self._latency: OrderedDict[str, float] = OrderedDict()
+
+    def _remember[V](self, table: "OrderedDict[str, V]", token: str, value: V) -> None:
+        table[token] = value
+        table.move_to_end(token)
+        if len(table) > self.max_tokens:
+            table.popitem(last=False)
+
+    def record_bucket(self, token: str, bucket: str | None) -> None:
+        self._remember(self._buckets, token.lower(), bucket or "")
+
+    def known(self, token: str) -> bool:
+        """Whether the token has a bucket (or failed classification) or latency history."""
+        token = token.lower()
+        return token in self._buckets or token in self._latency
+
+    def record_latency(self, token: str, seconds: float) -> None:
+        token = token.lower()
+        previous = self._latency.get(token)
+        if previous is not None:
+            seconds = self.alpha * seconds + (1 - self.alpha) * previous
+        self._remember(self._latency, token, seconds)
+
+    def latency(self, token: str) -> float | None:
+        return self._latency.get(token.lower())
+
+    def lane(self, token: str) -> str:
+        latency = self.latency(token)
+        if latency is not None and latency >= self.slow_latency:
+            return SLOW
+        if latency is not None and latency <= self.fast_latency:
+            return FAST
+        bucket = self._buckets.get(token.lower())
+        if bucket in EXPENSIVE_BUCKETS:
+            return SLOW
+        if bucket in CHEAP_BUCKETS:
+            return FAST
+        return DEFAULT
+
+    def estimate(self, tokens: Iterable[str], default: float) -> float:
+        """Expected seconds of a call pricing ``tokens`` together (``default`` without history)."""
+        return max((self.latency(t) or default for t in tokens), default=default)
+
+    def lane_for(self, tokens: Iterable[str]) -> str:
+        """Lane of a call pricing all ``tokens`` together: the slowest of theirs."""
+        return max((self.lane(t) for t in tokens), key=LANES.index, default=DEFAULT)
+
+
+# Client finish tags kept per lane before those already passed are dropped
+_MAX_CLIENT_TAGS = 10_000
+
+
+@dataclass
+class _Lane:
+    limit: int
+    running: int = 0
+    # (priority, start_tag, arrival, enqueued_at, future) heap; cancelled
+    # waiters are skipped on release
+    waiters: list[tuple[int, float, int, float, "asyncio.Future[None]"]] = field(
+        default_factory=list
+    )
+    # Start tag of the work most recently given a slot
+    virtual_time: float = 0.0
+    # Finish tag of each client's latest work
+    finish_tags: dict[str, float] = field(default_factory=dict)
+
+    def tag(self, client: str, weight: float, cost: float) -> float:
+        """Start-time fair queueing: the start tag of a client's new work."""
+        start = max(self.virtual_time, self.finish_tags.get(client, 0.0))
+        self.finish_tags[client] = start + cost / max(weight, 1e-9)
+        if len(self.finish_tags) > _MAX_CLIENT_TAGS:
+            self.finish_tags = {c: f for c, f in self.finish_tags.items() if f > self.virtual_time}
+        return start
+
+
+class LaneScheduler:
+    """Limit concurrent work per lane; waiting work is admitted by priority.
+
+    ``limits`` maps lane names to their concurrency limit.  Within a lane,
+    waiters with a lower priority value go first.  Waiters of equal priority
+    are ordered by weighted fair queueing across clients (start-time fair
+    queueing): each piece of work is tagged with its client's virtual start
+    time, which advances by ``cost / weight`` per piece, so a client with a
+    long backlog cannot delay another client's work by more than about one
+    piece each.  A freed slot is handed directly to the next waiter, so newly
+    arriving work cannot overtake work that is already queued.  ``service_time`` is a moving
+    average of how long work holds a slot (``alpha`` weights the newest),
+    starting from ``initial_service_time`` seconds.
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, int],
+        alpha: float = 0.1,
+        initial_service_time: float = 1.0,
+    ) -> None:
+        self._lanes = {name: _Lane(max(1, limit)) for name, limit in limits.items()}
+        self._arrivals = itertools.count()
+        self.alpha = alpha
+        self.service_time = initial_service_time
+
+    @property
+    def capacity(self) -> int:
+        """Slots across all lanes."""
+        return sum(state.limit for state in self._lanes.values())
+
+    def running(self, lane: str) -> int:
+        return self._lanes[lane].running
+
+    def queued(self, lane: str) -> int:
+        return sum(1 for *_, f in self._lanes[lane].waiters if not f.done())
+
+    def in_flight(self) -> int:
+        """Work holding or waiting for a slot, across all lanes."""
+        return sum(state.running + self.queued(name) for name, state in self._lanes.items())
+
+    def longest_wait(self) -> float:
+        """Seconds the longest-waiting work has been queued (0 with an empty queue)."""
+        enqueued = [
+            enqueued_at
+            for state in self._lanes.values()
+            for *_, enqueued_at, f in state.waiters
+            if not f.done()
+        ]
+        return time.monotonic() - min(enqueued) if enqueued else 0.0
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self,
+        lane: str,
+        priority: int = PRIORITY_NORMAL,
+        client: str = "",
+        weight: float = 1.0,
+        cost: float = 1.0,
+    ) -> AsyncIterator[None]:
+        """Hold a slot in ``lane`` for work by ``client`` expected to take ``cost`` seconds."""
+        state = self._lanes[lane]
+        scheduler_lookups_total.labels(lane=lane).inc()
+        start = time.monotonic()
+        await self._acquire(lane, state, priority, state.tag(client, weight, cost))
+        acquired = time.monotonic()
+        scheduler_wait_seconds.labels(lane=lane).observe(acquired - start)
+        try:
+            yield
+        finally:
+            self._release(lane, state)
+            held = time.monotonic() - acquired
+            self.service_time = self.alpha * held + (1 - self.alpha) * self.service_time
+
+    async def _acquire(self, lane: str, state: _Lane, priority: int, tag: float) -> None:
+        if state.running < state.limit and not state.waiters:
+            state.running += 1
+            state.virtual_time = max(state.virtual_time, tag)
+            scheduler_running.labels(lane=lane).inc()
+            return
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            state.waiters, (priority, tag, next(self._arrivals), time.monotonic(), future)
+        )
+        scheduler_queued.labels(lane=lane).inc()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation
+            if future.done() and not future.cancelled():
+                self._release(lane, state)
+            raise
+        finally:
+            scheduler_queued.labels(lane=lane).dec()
+
+    def _release(self, lane: str, state: _Lane) -> None:
+        while state.waiters:
+            _, tag, *_, future = heapq.heappop(state.waiters)
+            if not future.done():
+                # The slot passes to the waiter; the running count is unchanged
+                state.virtual_time = max(state.virtual_time, tag)
+                future.set_result(None)
+                return
+        state.running -= 1
+        scheduler_running.labels(lane=lane).dec()
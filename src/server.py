@@ -1,14 +1,19 @@
 import asyncio
+import json
 import logging
 import math
 import os
 import signal
 import time
 import uuid
+from array import array
+from collections.abc import AsyncIterator, Awaitable, Callable, Coroutine, Sequence
 from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 from importlib.metadata import PackageNotFoundError
 from importlib.metadata import version as _pkg_version
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, Literal, cast
 
 import sentry_sdk
 import structlog
@@ -16,7 +21,7 @@ from fastapi import FastAPI, Query, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import get_redoc_html, get_swagger_ui_html
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from prometheus_client import Counter, Histogram, make_asgi_app
 from tenacity import (
     RetryError,
@@ -26,23 +31,68 @@ from tenacity import (
     wait_exponential,
 )
 
+from src import cache as price_cache
+from src.admission import AdmissionController
+from src.batching import MicroBatcher
 from src.cache import (
+    CACHE_EVICTION_INTERVAL,
+    CacheErrorHit,
+    CacheHit,
+    CacheLookup,
     close_cache,
-    get_cached_error,
-    get_cached_price,
+    enforce_size_limit,
+    final_provisional_blocks,
+    is_provisional,
+    lookup_cached,
+    lookup_cached_blocks,
+    lookup_cached_grid,
+    lookup_cached_many,
+    peek_cached,
+    promote_provisional,
+    provisional_block_hash,
+    run_cache_io,
     set_cached_error,
+    set_cached_errors_many,
     set_cached_price,
+    set_cached_prices_many,
+    set_chain_head,
+    set_provisional_block_hash,
+)
+from src.jobs import (
+    DONE,
+    EmitItems,
+    Job,
+    JobFailedError,
+    JobQueueFullError,
+    JobRunner,
 )
 from src.logger import configure_logging, get_logger, sanitize_error_message
 from src.params import (
     ParseError,
     is_valid_address,
+    parse_batch_body,
     parse_batch_params,
+    parse_job_body,
+    parse_matrix_body,
     parse_price_params,
+    parse_series_params,
+    parse_timeout,
+)
+from src.ratelimit import ClientLimiter, api_key_client_id, parse_client_weights
+from src.scheduler import (
+    DEFAULT,
+    FAST,
+    PRIORITIES,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    SLOW,
+    CostModel,
+    LaneScheduler,
 )
+from src.singleflight import SingleFlight
 
 if TYPE_CHECKING:
-    from src.params import BatchParams
+    from src.params import BatchParams, MatrixParams, SeriesParams
 
 configure_logging()
 logger = get_logger("server")
@@ -72,6 +122,87 @@ except PackageNotFoundError:
     _VERSION = "dev"
 
 PRICE_TIMEOUT = 300.0
+# Request header with the client's deadline for a /price request, in seconds
+# (as the `timeout` query parameter; the shorter of the two applies)
+DEADLINE_HEADER = "X-Request-Deadline"
+
+# Opt-in micro-batching of concurrent /price cache misses at the same block into
+# one get_prices call: collection window in ms (0 disables) and max batch size.
+PRICE_BATCH_WINDOW_MS = float(os.environ.get("PRICE_BATCH_WINDOW_MS", "0"))
+PRICE_BATCH_MAX_SIZE = int(os.environ.get("PRICE_BATCH_MAX_SIZE", "100"))
+
+# Batch cache misses are priced in get_prices chunks of BATCH_CHUNK_SIZE tokens,
+# with at most BATCH_PARALLELISM chunks in flight per request.
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", "100"))
+BATCH_PARALLELISM = int(os.environ.get("BATCH_PARALLELISM", "4"))
+
+# Seconds a get_prices chunk may take before its tokens are priced one by one
+BATCH_CHUNK_TIMEOUT = float(os.environ.get("BATCH_CHUNK_TIMEOUT", "60"))
+
+# Seconds each batch token may take before it is reported as timed out (by
+# default the PRICE_TIMEOUT a whole batch used to have); up to
+# BATCH_BACKGROUND_MAX timed-out lookups keep running to fill the cache.
+BATCH_TOKEN_TIMEOUT = float(os.environ.get("BATCH_TOKEN_TIMEOUT", "300"))
+BATCH_BACKGROUND_MAX = int(os.environ.get("BATCH_BACKGROUND_MAX", "100"))
+
+# Concurrent block resolutions and price lookups per /price_series request
+SERIES_CONCURRENCY = int(os.environ.get("SERIES_CONCURRENCY", "8"))
+
+# Blocks priced at once (one get_prices call each) across all /price_matrix requests
+MATRIX_CONCURRENCY = int(os.environ.get("MATRIX_CONCURRENCY", "4"))
+
+# Background jobs (POST /jobs): SQLite state file (default: $CACHE_DIR/jobs.sqlite3),
+# jobs run at once, jobs waiting before submissions are refused, and how long
+# finished jobs are kept (s)
+JOBS_DB = os.environ.get("JOBS_DB", "")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", "1000"))
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", "86400"))
+# Longest wait between checks for new results while streaming a job
+JOB_STREAM_POLL_INTERVAL = 1.0
+
+# ypricemagic calls run in cost lanes (see src/scheduler.py), each with its own
+# concurrency limit.  Tokens averaging at most LANE_FAST_LATENCY seconds per
+# lookup use the fast lane and those averaging at least LANE_SLOW_LATENCY the
+# slow lane; tokens without history are placed by their check_bucket result,
+# asked of ypricemagic (for at most LANE_BUCKET_TIMEOUT seconds) the first time
+# a token is priced.
+LANE_FAST_CONCURRENCY = int(os.environ.get("LANE_FAST_CONCURRENCY", "32"))
+LANE_DEFAULT_CONCURRENCY = int(os.environ.get("LANE_DEFAULT_CONCURRENCY", "16"))
+LANE_SLOW_CONCURRENCY = int(os.environ.get("LANE_SLOW_CONCURRENCY", "4"))
+LANE_FAST_LATENCY = float(os.environ.get("LANE_FAST_LATENCY", "0.5"))
+LANE_SLOW_LATENCY = float(os.environ.get("LANE_SLOW_LATENCY", "5"))
+LANE_BUCKET_TIMEOUT = float(os.environ.get("LANE_BUCKET_TIMEOUT", "2"))
+# Request header selecting the priority of a request's lookups within their lane
+PRIORITY_HEADER = "X-Priority"
+
+# Admission control (src/admission.py): requests needing new cache-miss work are
+# refused with 503 past this many lookups running or queued, or once the oldest
+# queued lookup has waited this many seconds (0 disables either limit);
+# low-priority requests are refused with 429 at half of either.
+MAX_INFLIGHT_LOOKUPS = int(os.environ.get("MAX_INFLIGHT_LOOKUPS", "1000"))
+MAX_QUEUE_WAIT = float(os.environ.get("MAX_QUEUE_WAIT", "30"))
+
+# Per-client limits on cache-miss work (src/ratelimit.py); clients are identified
+# by API_KEY_HEADER if the key is listed in CLIENT_WEIGHTS, else by IP.  Requests
+# per second (and burst) and compute seconds per second (and burst); a rate of 0
+# disables that limit.  CLIENT_WEIGHTS ("key=weight,...") scales a client's
+# limits and fair-queue share.  TRUSTED_PROXY_HOPS is the number of proxies in
+# front of the server that append to X-Forwarded-For (0, the default, ignores
+# the header, which a client talking to the server directly could forge).
+API_KEY_HEADER = "X-API-Key"
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", "0"))
+CLIENT_RATE = float(os.environ.get("CLIENT_RATE", "0"))
+CLIENT_BURST = float(os.environ.get("CLIENT_BURST", "20"))
+CLIENT_COMPUTE_RATE = float(os.environ.get("CLIENT_COMPUTE_RATE", "0"))
+CLIENT_COMPUTE_BURST = float(os.environ.get("CLIENT_COMPUTE_BURST", "60"))
+CLIENT_WEIGHTS = parse_client_weights(os.environ.get("CLIENT_WEIGHTS", ""))
+
+# Batch requests sent with this Accept type get results streamed as NDJSON
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Seconds between promoting final blocks out of the provisional (near-head) tier
+PROVISIONAL_PROMOTE_INTERVAL = float(os.environ.get("PROVISIONAL_PROMOTE_INTERVAL", "12"))
 
 # Prometheus metrics
 price_requests_total = Counter(
@@ -94,6 +225,41 @@ batch_request_duration_seconds = Histogram(
     "Batch request duration",
     ["chain"],
 )
+cross_rate_requests_total = Counter(
+    "cross_rate_requests_total",
+    "Total cross-rate requests",
+    ["chain", "status"],
+)
+matrix_requests_total = Counter(
+    "matrix_requests_total",
+    "Total price matrix requests",
+    ["chain", "status"],
+)
+matrix_request_duration_seconds = Histogram(
+    "matrix_request_duration_seconds",
+    "Price matrix request duration",
+    ["chain"],
+)
+series_requests_total = Counter(
+    "series_requests_total",
+    "Total price series requests",
+    ["chain", "status"],
+)
+series_request_duration_seconds = Histogram(
+    "series_request_duration_seconds",
+    "Price series request duration",
+    ["chain"],
+)
+price_deadlines_exceeded_total = Counter(
+    "price_deadlines_exceeded_total",
+    "Price requests that missed the client's deadline, by whether the work kept running",
+    ["chain", "outcome"],
+)
+batch_token_timeouts_total = Counter(
+    "batch_token_timeouts_total",
+    "Batch tokens that missed their deadline, by whether the lookup kept running",
+    ["chain", "outcome"],
+)
 check_bucket_requests_total = Counter(
     "check_bucket_requests_total",
     "Total check_bucket requests",
@@ -112,6 +278,53 @@ check_bucket_request_duration_seconds = Histogram(
 _bucket_locks: dict[str, asyncio.Lock] = {}
 _bucket_locks_guard = asyncio.Lock()
 
+# Concurrent identical /price lookups (token, block, amount, ignore_pools) share
+# one ypricemagic call (counted in singleflight_calls_total{group="price"}).
+_price_flights: SingleFlight[tuple[float, list[dict[str, Any]] | None, int | None] | None] = (
+    SingleFlight("price")
+)
+
+# Lane placement and limits for ypricemagic calls
+_cost_model = CostModel(fast_latency=LANE_FAST_LATENCY, slow_latency=LANE_SLOW_LATENCY)
+_scheduler = LaneScheduler(
+    {
+        FAST: LANE_FAST_CONCURRENCY,
+        DEFAULT: LANE_DEFAULT_CONCURRENCY,
+        SLOW: LANE_SLOW_CONCURRENCY,
+    }
+)
+# Priority of the lookups made for the current request (set from PRIORITY_HEADER)
+_request_priority: ContextVar[int] = ContextVar("request_priority", default=PRIORITY_NORMAL)
+_admission = AdmissionController(_scheduler, MAX_INFLIGHT_LOOKUPS, MAX_QUEUE_WAIT)
+# Set while running a POST /jobs job, which was admitted when it was submitted
+_admission_exempt: ContextVar[bool] = ContextVar("admission_exempt", default=False)
+_limiter = ClientLimiter(
+    CLIENT_RATE, CLIENT_BURST, CLIENT_COMPUTE_RATE, CLIENT_COMPUTE_BURST, CLIENT_WEIGHTS
+)
+# Client making the current request (see _client_id)
+_request_client: ContextVar[str] = ContextVar("request_client", default="")
+
+# Batch lookups that outlived their deadline and are finishing to fill the cache
+_batch_background: set["asyncio.Task[None]"] = set()
+
+# /price requests that missed their client deadline with continue_in_background
+# set, finishing to fill the cache
+_deadline_background: set["asyncio.Task[Any]"] = set()
+# False while running a /price request whose client asked for its work to stop
+# at the deadline; shared lookups are then cancelled once no caller wants them
+_keep_running_lookups: ContextVar[bool] = ContextVar("keep_running_lookups", default=True)
+
+# Streamed batches price their cache misses in a task that outlives a client
+# disconnect (to fill the cache); hold references until it finishes.
+_stream_producers: set["asyncio.Task[None]"] = set()
+
+# /price_series misses run as tasks for the same reason: a client that goes
+# away mid-series still gets its points cached.
+_series_fetches: set["asyncio.Task[dict[str, Any]]"] = set()
+
+# Shared by every /price_matrix request, so MATRIX_CONCURRENCY is a process-wide cap
+_matrix_block_slots = asyncio.Semaphore(max(1, MATRIX_CONCURRENCY))
+
 
 async def _get_token_lock(token: str) -> asyncio.Lock:
     """Get or create a per-token lock. Thread-safe via _bucket_locks_guard."""
@@ -286,6 +499,30 @@ async def _prewarm_with_shutdown(curve_registry: Any) -> None:
         shutdown_waiter.cancel()
 
 
+async def _promote_provisional_periodically() -> None:
+    """Persist near-head prices once their block is final, dropping reorged ones."""
+    from brownie import chain
+
+    while True:
+        await asyncio.sleep(PROVISIONAL_PROMOTE_INTERVAL)
+        try:
+            set_chain_head(await asyncio.to_thread(lambda: chain.height))
+            blocks = final_provisional_blocks()
+            if not blocks:
+                continue
+            hashes = await asyncio.gather(*(_fetch_block_hash(b) for b in blocks))
+            await run_cache_io(promote_provisional, dict(zip(blocks, hashes, strict=True)))
+        except Exception as e:
+            logger.warning("provisional_promotion_failed", error=str(e))
+
+
+async def _enforce_cache_size_periodically() -> None:
+    """Keep the price cache within its disk budget (see ``enforce_size_limit``)."""
+    while True:
+        await asyncio.sleep(CACHE_EVICTION_INTERVAL)
+        await run_cache_io(enforce_size_limit)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> Any:
     # Install after uvicorn has configured its loggers (CLI resets them at startup).
@@ -356,8 +593,22 @@ async def lifespan(app: FastAPI) -> Any:
         )
         logger.info("sentry_initialized")
 
+    background_tasks: list[asyncio.Task[None]] = []
+    if CACHE_EVICTION_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(_enforce_cache_size_periodically()))
+    if PROVISIONAL_PROMOTE_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(_promote_provisional_periodically()))
+
+    await _jobs.start(JOBS_DB or os.path.join(price_cache.CACHE_DIR, "jobs.sqlite3"))
+
     yield
 
+    # Running jobs stay "running" in the job store and are requeued on the next start
+    await _jobs.stop()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    # Provisional (near-head) prices are dropped here; they are recomputed on demand.
     close_cache()
     logger.info("shutdown", chain=CHAIN_NAME)
 
@@ -422,11 +673,39 @@ _cors_origins: list[str] = (
 app.add_middleware(
     CORSMiddleware,
     allow_origins=_cors_origins,
-    allow_methods=["GET", "OPTIONS"],
+    allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
 )
 
 
+def _client_id(request: Request) -> str:
+    """The requesting client: its API key (hashed) if it is a configured key,
+    else its IP address.
+
+    Unknown keys are ignored, so sending a new key does not get a client fresh
+    buckets.  Behind the proxy the IP is the X-Forwarded-For entry appended by
+    the outermost trusted proxy (``TRUSTED_PROXY_HOPS`` from the end); entries
+    before it are written by the client and cannot be trusted.
+    """
+    api_key = request.headers.get(API_KEY_HEADER)
+    if api_key and (client := api_key_client_id(api_key)) in _limiter.weights:
+        return client
+    peer = request.client.host if request.client else ""
+    hops = [h.strip() for h in request.headers.get("X-Forwarded-For", "").split(",")]
+    if TRUSTED_PROXY_HOPS > 0 and len(hops) >= TRUSTED_PROXY_HOPS:
+        peer = hops[-TRUSTED_PROXY_HOPS] or peer
+    return "ip:" + peer
+
+
+@app.middleware("http")
+async def request_context_middleware(request: Request, call_next: Any) -> Any:
+    # Unknown priorities fall back to normal
+    priority = PRIORITIES.get(request.headers.get(PRIORITY_HEADER, "").lower(), PRIORITY_NORMAL)
+    _request_priority.set(priority)
+    _request_client.set(_client_id(request))
+    return await call_next(request)
+
+
 @app.middleware("http")
 async def request_id_middleware(request: Request, call_next: Any) -> Any:
     request_id = request.headers.get("X-Request-ID", str(uuid.uuid4()))
@@ -446,6 +725,7 @@ async def health() -> dict[str, Any]:
         from brownie import chain
 
         height = chain.height
+        set_chain_head(height)
     except Exception as e:
         logger.error("health_check_failed", error=str(e))
         return JSONResponse(  # type: ignore[return-value]
@@ -489,6 +769,64 @@ def _serialize_trade_path(result: Any) -> list[dict[str, Any]] | None:
     ]
 
 
+async def _classify_for_lanes(tokens: Sequence[str]) -> None:
+    """Record ypricemagic's bucket for tokens the cost model knows nothing about.
+
+    ypricemagic caches check_bucket results, so this is cheap after a token's
+    first classification.  A token that cannot be classified within
+    LANE_BUCKET_TIMEOUT is remembered as unclassified and left to the default
+    lane until its latency is known.
+    """
+    from y import check_bucket as y_check_bucket
+
+    async def classify(token: str) -> None:
+        async with await _get_token_lock(token):
+            if _cost_model.known(token):
+                return
+            try:
+                bucket = await asyncio.wait_for(
+                    y_check_bucket(token, sync=False), timeout=LANE_BUCKET_TIMEOUT
+                )
+            except Exception as e:
+                logger.debug("lane_classification_failed", token=token, error=str(e))
+                bucket = None
+            _cost_model.record_bucket(token, bucket)
+
+    await asyncio.gather(*(classify(t) for t in tokens if not _cost_model.known(t)))
+
+
+async def _run_in_lane[T](tokens: Sequence[str], call: Callable[[], Awaitable[T]]) -> T:
+    """Run one ypricemagic call pricing ``tokens`` in their cost lane, under PRICE_TIMEOUT.
+
+    Tokens the cost model has not seen are classified first.  Low-priority
+    requests (backfills) always use the slow lane, and waiters are queued
+    fairly across clients by their weight.  The call's duration is charged to
+    the client's compute budget.  It is recorded as the token's latency only
+    for single-token calls, since a multi-token call takes as long as its
+    slowest token.
+    """
+    priority = _request_priority.get()
+    client = _request_client.get()
+    if priority != PRIORITY_LOW:
+        await _classify_for_lanes(tokens)
+    lane = SLOW if priority == PRIORITY_LOW else _cost_model.lane_for(tokens)
+    async with _scheduler.slot(
+        lane,
+        priority,
+        client=client,
+        weight=_limiter.weight(client),
+        cost=_cost_model.estimate(tokens, _scheduler.service_time),
+    ):
+        start = time.monotonic()
+        try:
+            return await asyncio.wait_for(call(), timeout=PRICE_TIMEOUT)
+        finally:
+            elapsed = time.monotonic() - start
+            _limiter.charge_compute(client, elapsed)
+            if len(tokens) == 1:
+                _cost_model.record_latency(tokens[0], elapsed)
+
+
 @retry(
     stop=stop_after_attempt(2),
     wait=wait_exponential(multiplier=1, min=1, max=4),
@@ -513,7 +851,7 @@ async def _fetch_price(
         kwargs["ignore_pools"] = ignore_pools
 
     logger.debug("fetch_price_start", token=token, block=block, kwargs=list(kwargs.keys()))
-    p = await asyncio.wait_for(get_price(token, block, **kwargs), timeout=PRICE_TIMEOUT)
+    p = await _run_in_lane((token,), lambda: get_price(token, block, **kwargs))
     logger.debug("fetch_price_done", token=token, block=block, result_type=type(p).__name__)
     if p is None:
         return None
@@ -533,13 +871,28 @@ async def _fetch_price_and_cache(
     ignore_pools: tuple[str, ...] = (),
 ) -> tuple[float, list[dict[str, Any]] | None, int | None] | None:
     """Fetch price, timestamp, and write cache in one shieldable coroutine."""
-    result = await _fetch_price(token, block, amount=amount, ignore_pools=ignore_pools)
+    await _record_provisional_block_hash(block)
+    result: tuple[float, list[dict[str, Any]] | None] | None
+    if PRICE_BATCH_WINDOW_MS > 0 and not ignore_pools:
+        try:
+            result = await _price_batcher.submit(block, (token, amount))
+        except TimeoutError:
+            raise
+        except Exception as e:
+            # One failed get_prices call must not fail (or cache "not found" for)
+            # every lookup batched with it; price this token on its own
+            logger.warning("price_batch_fallback", token=token, block=block, error=str(e))
+            result = await _fetch_price(token, block, amount=amount)
+    else:
+        result = await _fetch_price(token, block, amount=amount, ignore_pools=ignore_pools)
     if result is None:
         return None
     price_float, trade_path = result
     block_timestamp = await _fetch_block_timestamp(block)
     if amount is None:
-        set_cached_price(token, block, price_float, block_timestamp=block_timestamp)
+        await run_cache_io(
+            set_cached_price, token, block, price_float, block_timestamp=block_timestamp
+        )
     return price_float, trade_path, block_timestamp
 
 
@@ -547,11 +900,14 @@ async def _fetch_batch_prices(
     tokens: tuple[str, ...],
     block: int,
     amounts: tuple[float | None, ...] | None = None,
+    raise_errors: bool = False,
 ) -> list[tuple[float, list[dict[str, Any]] | None] | None]:
     """Fetch prices for multiple tokens in parallel.
 
     Returns a list of (price, trade_path) tuples or None for tokens that couldn't be priced.
-    Does not raise exceptions - errors are logged and None is returned for that token.
+    Timeouts are raised.  Other errors are logged and None is returned for every
+    token, unless ``raise_errors``, in which case they (and invalid price
+    values) are raised, so that None always means ypricemagic found no price.
     """
     from y import get_prices
 
@@ -563,7 +919,7 @@ async def _fetch_batch_prices(
         kwargs["amounts"] = amounts
 
     try:
-        results = await asyncio.wait_for(get_prices(tokens, block, **kwargs), timeout=PRICE_TIMEOUT)
+        results = await _run_in_lane(tokens, lambda: get_prices(tokens, block, **kwargs))
         prices: list[tuple[float, list[dict[str, Any]] | None] | None] = []
         for i, p in enumerate(results):
             if p is None:
@@ -571,6 +927,10 @@ async def _fetch_batch_prices(
             else:
                 price_float = float(p)
                 if math.isnan(price_float) or math.isinf(price_float) or price_float < 0:
+                    if raise_errors:
+                        raise ValueError(
+                            f"Invalid price value {p} for {tokens[i]} at block {block}"
+                        )
                     logger.warning(
                         "batch_invalid_price",
                         token=tokens[i],
@@ -587,9 +947,36 @@ async def _fetch_batch_prices(
         raise
     except Exception as e:
         logger.error("batch_fetch_failed", block=block, error=str(e))
+        if raise_errors:
+            raise
         return [None] * len(tokens)
 
 
+async def _dispatch_price_batch(
+    block: int, items: list[tuple[str, float | None]]
+) -> list[tuple[float, list[dict[str, Any]] | None] | None]:
+    """Price micro-batched /price lookups for one block with a single get_prices call."""
+    tokens = tuple(token for token, _ in items)
+    amounts = tuple(amount for _, amount in items)
+    logger.debug("price_batch_dispatch", block=block, size=len(items))
+    return await _fetch_batch_prices(
+        tokens,
+        block,
+        amounts=amounts if any(a is not None for a in amounts) else None,
+        raise_errors=True,
+    )
+
+
+_price_batcher: MicroBatcher[
+    int, tuple[str, float | None], tuple[float, list[dict[str, Any]] | None] | None
+] = MicroBatcher(
+    "price",
+    _dispatch_price_batch,
+    window=PRICE_BATCH_WINDOW_MS / 1000,
+    max_size=PRICE_BATCH_MAX_SIZE,
+)
+
+
 async def _fetch_block_timestamp(block: int) -> int | None:
     """Fetch the Unix epoch timestamp for a block.
 
@@ -608,6 +995,34 @@ async def _fetch_block_timestamp(block: int) -> int | None:
         return None
 
 
+async def _fetch_block_hash(block: int) -> str | None:
+    """Fetch the current canonical hash of a block, or None on failure."""
+    try:
+        from brownie import web3
+
+        header = await asyncio.to_thread(web3.eth.get_block, block)
+        return str(header["hash"].hex())
+    except Exception as e:
+        logger.warning("block_hash_fetch_failed", block=block, error=str(e))
+        return None
+
+
+async def _record_provisional_block_hash(block: int) -> None:
+    """Remember the hash of a near-head block whose prices are about to be looked up.
+
+    Called before the lookup starts, so the hash is that of the chain state
+    the prices are computed on.  The promoter compares it with the canonical
+    hash once the block is final and drops the block's prices if it was
+    reorged out (a hash recorded after the lookup could already be the new
+    canonical one).
+    """
+    if not is_provisional(block) or provisional_block_hash(block) is not None:
+        return
+    block_hash = await _fetch_block_hash(block)
+    if block_hash is not None:
+        set_provisional_block_hash(block, block_hash)
+
+
 async def _resolve_block_from_timestamp(timestamp: int) -> int:
     """Resolve a Unix timestamp to a block number.
 
@@ -631,6 +1046,44 @@ def _make_timeout_response() -> JSONResponse:
     return _make_error_response(504, f"Price lookup timed out after {PRICE_TIMEOUT:.0f} seconds")
 
 
+def _retry_later_response(status: int, message: str, retry_after: int) -> JSONResponse:
+    response = _make_error_response(status, f"{message}, retry in {retry_after}s")
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def _refuse_compute() -> JSONResponse | None:
+    """Admit new cache-miss work (None), or the 429/503 response refusing it.
+
+    Refused when the server is overloaded (src/admission.py) or the client
+    is over its limits (src/ratelimit.py).
+    """
+    if _admission_exempt.get():
+        return None
+    shed = _admission.check(_request_priority.get())
+    if shed is not None:
+        logger.warning(
+            "load_shed",
+            chain=CHAIN_NAME,
+            reason=shed.reason,
+            status=shed.status,
+            retry_after=shed.retry_after,
+        )
+        return _retry_later_response(
+            shed.status,
+            f"Server is overloaded ({shed.reason.replace('_', ' ')} limit reached)",
+            shed.retry_after,
+        )
+    client = _request_client.get()
+    limited = _limiter.admit(client)
+    if limited is None:
+        return None
+    limit, wait = limited
+    retry_after = max(1, math.ceil(wait))
+    logger.info("client_rate_limited", chain=CHAIN_NAME, client=client, limit=limit)
+    return _retry_later_response(429, f"Rate limit exceeded ({limit})", retry_after)
+
+
 def _handle_price_error(e: Exception, token: str, block: int, duration_ms: int) -> JSONResponse:
     """Handle exceptions from price fetching and return appropriate response."""
     inner = e.last_attempt.exception() if isinstance(e, RetryError) else e
@@ -659,7 +1112,11 @@ async def _resolve_price_block(params: Any) -> int | JSONResponse:
     from brownie import chain as brownie_chain
 
     if params.timestamp is None:
-        block = params.block if params.block is not None else brownie_chain.height
+        if params.block is not None:
+            block = params.block
+        else:
+            block = brownie_chain.height
+            set_chain_head(block)
         logger.debug("resolve_block", source="param_or_latest", block=block)
         return block
 
@@ -678,10 +1135,50 @@ async def _resolve_price_block(params: Any) -> int | JSONResponse:
         )
 
 
+def _not_found_message(token: str, block: int) -> str:
+    return f"No price found for {token} at block {block} on {CHAIN_NAME}"
+
+
+async def _fetch_price_and_cache_outcome(
+    token: str,
+    block: int,
+    amount: float | None = None,
+    ignore_pools: tuple[str, ...] = (),
+) -> tuple[float, list[dict[str, Any]] | None, int | None] | None:
+    """:func:`_fetch_price_and_cache`, also caching failures and "not found".
+
+    This is the unit of work shared by coalesced ``/price`` callers, so the
+    error entry is written once per lookup rather than once per caller.
+    """
+    try:
+        result = await _fetch_price_and_cache(
+            token, block, amount=amount, ignore_pools=ignore_pools
+        )
+    except Exception as e:
+        # Cache the error so immediate retries are fast (TTL-limited)
+        if amount is None:
+            inner = e.last_attempt.exception() if isinstance(e, RetryError) else e
+            await run_cache_io(set_cached_error, token, block, str(inner))
+        raise
+    if result is None and amount is None:
+        # Cache the "not found" outcome so repeated requests don't re-trigger lookups
+        await run_cache_io(set_cached_error, token, block, _not_found_message(token, block))
+    return result
+
+
+async def _lookup_cached(token: str, block: int) -> CacheLookup:
+    """Serve in-memory hits inline; send disk reads to the cache I/O pool."""
+    peeked = peek_cached(token, block)
+    if peeked is not None:
+        return peeked
+    return await run_cache_io(lookup_cached, token, block)
+
+
 async def _handle_price_request(params: Any, actual_block: int, force: bool = False) -> Any:
     if params.amount is None:
-        cached = get_cached_price(params.token, actual_block)
-        if cached is not None:
+        lookup = await _lookup_cached(params.token, actual_block)
+        if isinstance(lookup, CacheHit):
+            cached = lookup.entry
             logger.info(
                 "cache_hit",
                 chain=CHAIN_NAME,
@@ -703,58 +1200,54 @@ async def _handle_price_request(params: Any, actual_block: int, force: bool = Fa
 
         # Return a cached error immediately (avoids re-fetching until TTL expires).
         # When force=True, skip this check and proceed to a real price lookup.
-        if not force:
-            cached_err = get_cached_error(params.token, actual_block)
-            if cached_err is not None:
-                logger.info(
-                    "cache_error_hit",
-                    chain=CHAIN_NAME,
-                    token=params.token,
-                    block=actual_block,
-                    error=cached_err.get("error"),
-                )
-                price_requests_total.labels(chain=CHAIN_NAME, status="cache_error_hit").inc()
-                return _make_error_response(
-                    404,
-                    f"No price found for {params.token} at block {actual_block} on {CHAIN_NAME} "
-                    f"(cached error: {cached_err.get('error')})",
-                )
-        else:
+        if force:
             logger.info(
                 "force_bypass_error_cache",
                 chain=CHAIN_NAME,
                 token=params.token,
                 block=actual_block,
             )
+        elif isinstance(lookup, CacheErrorHit):
+            cached_err = lookup.entry
+            logger.info(
+                "cache_error_hit",
+                chain=CHAIN_NAME,
+                token=params.token,
+                block=actual_block,
+                error=cached_err.get("error"),
+            )
+            price_requests_total.labels(chain=CHAIN_NAME, status="cache_error_hit").inc()
+            return _make_error_response(
+                404,
+                f"No price found for {params.token} at block {actual_block} on {CHAIN_NAME} "
+                f"(cached error: {cached_err.get('error')})",
+            )
+
+    flight = (params.token.lower(), actual_block, params.amount, params.ignore_pools)
+    # Joining a lookup already in flight adds no work, so it is always admitted
+    if flight not in _price_flights and (refused := _refuse_compute()) is not None:
+        price_requests_total.labels(chain=CHAIN_NAME, status="overloaded").inc()
+        return refused
 
     start = time.monotonic()
     try:
-        fetch_result = await asyncio.shield(
-            _fetch_price_and_cache(
+        fetch_result = await _price_flights.do(
+            flight,
+            lambda: _fetch_price_and_cache_outcome(
                 params.token,
                 actual_block,
                 amount=params.amount,
                 ignore_pools=params.ignore_pools,
-            )
+            ),
+            keep_running=_keep_running_lookups.get(),
         )
     except Exception as e:
         duration_ms = int((time.monotonic() - start) * 1000)
-        # Cache the error so immediate retries are fast (TTL-limited)
-        if params.amount is None:
-            inner = e.last_attempt.exception() if isinstance(e, RetryError) else e
-            set_cached_error(params.token, actual_block, str(inner))
         return _handle_price_error(e, params.token, actual_block, duration_ms)
 
     if fetch_result is None:
         price_requests_total.labels(chain=CHAIN_NAME, status="not_found").inc()
         logger.warning("price_not_found", token=params.token, block=actual_block)
-        # Cache the "not found" outcome so repeated requests don't re-trigger lookups
-        if params.amount is None:
-            set_cached_error(
-                params.token,
-                actual_block,
-                f"No price found for {params.token} at block {actual_block} on {CHAIN_NAME}",
-            )
         return _make_error_response(
             404,
             f"No price found for {params.token} at block {actual_block} on {CHAIN_NAME}",
@@ -785,6 +1278,228 @@ async def _handle_price_request(params: Any, actual_block: int, force: bool = Fa
     }
 
 
+@dataclass
+class _QuoteLeg:
+    """One side of a quote: a token's USD price at the quote block."""
+
+    token: str
+    amount: float | None
+    price: float | None = None
+    block_timestamp: int | None = None
+    # Error message when the price was answered from the error cache
+    cached_error: str | None = None
+    cached: bool = False
+
+
+def _read_quote_legs(legs: list[_QuoteLeg], block: int, force: bool) -> None:
+    """Fill cached prices (and, unless ``force``, cached errors) into the legs in one read."""
+    cacheable = [leg for leg in legs if leg.amount is None]
+    lookups = lookup_cached_many([leg.token for leg in cacheable], block) if cacheable else []
+    for leg, lookup in zip(cacheable, lookups, strict=True):
+        if isinstance(lookup, CacheHit):
+            leg.price = float(cast(float, lookup.entry["price"]))
+            block_timestamp = lookup.entry.get("block_timestamp")
+            leg.block_timestamp = block_timestamp if isinstance(block_timestamp, int) else None
+            leg.cached = True
+        elif isinstance(lookup, CacheErrorHit) and not force:
+            leg.cached_error = str(lookup.entry.get("error"))
+            leg.cached = True
+
+
+async def _fetch_quote_prices(
+    legs: list[_QuoteLeg], block: int, ignore_pools: tuple[str, ...]
+) -> list[tuple[float, list[dict[str, Any]] | None] | None]:
+    """Price the legs with one get_prices call (get_price per leg when pools are excluded)."""
+    if ignore_pools:
+        return list(
+            await asyncio.gather(
+                *(
+                    _fetch_price(leg.token, block, amount=leg.amount, ignore_pools=ignore_pools)
+                    for leg in legs
+                )
+            )
+        )
+    amounts = tuple(leg.amount for leg in legs)
+    return await _fetch_batch_prices(
+        tuple(leg.token for leg in legs),
+        block,
+        amounts=amounts if any(a is not None for a in amounts) else None,
+        raise_errors=True,
+    )
+
+
+def _cache_quote_legs(legs: list[_QuoteLeg], block: int, block_timestamp: int | None) -> None:
+    """Cache the fetched legs priced without an amount (and "not found" for the unpriced)."""
+    cacheable = [leg for leg in legs if leg.amount is None]
+    set_cached_prices_many(
+        (leg.token, block, leg.price, block_timestamp) for leg in cacheable if leg.price is not None
+    )
+    set_cached_errors_many(
+        (leg.token, block, _not_found_message(leg.token, block))
+        for leg in cacheable
+        if leg.price is None
+    )
+
+
+async def _price_quote_legs(
+    legs: list[_QuoteLeg], block: int, ignore_pools: tuple[str, ...]
+) -> int | None:
+    """Fetch the legs the cache didn't answer, together; returns the block timestamp."""
+    missing = [leg for leg in legs if leg.price is None and leg.cached_error is None]
+    known = next((leg.block_timestamp for leg in legs if leg.block_timestamp is not None), None)
+    if not missing:
+        return known if known is not None else await _fetch_block_timestamp(block)
+    await _record_provisional_block_hash(block)
+    results, block_timestamp = await asyncio.gather(
+        _fetch_quote_prices(missing, block, ignore_pools), _fetch_block_timestamp(block)
+    )
+    for leg, result in zip(missing, results, strict=True):
+        leg.price = result[0] if result is not None else None
+    await run_cache_io(_cache_quote_legs, missing, block, block_timestamp)
+    return cast(int | None, block_timestamp)
+
+
+async def _price_legs(
+    params: Any, legs: list[_QuoteLeg], block: int, force: bool
+) -> int | JSONResponse | None:
+    """Price every leg in USD at ``block``, from the cache or one get_prices call.
+
+    The last leg is the divisor (the token quoted or denominated in).  Returns
+    the block timestamp, or an error response if a leg has no price or the
+    divisor's price is not positive.
+    """
+    start = time.monotonic()
+    await run_cache_io(_read_quote_legs, legs, block, force)
+    if (
+        any(leg.price is None and leg.cached_error is None for leg in legs)
+        and (refused := _refuse_compute()) is not None
+    ):
+        price_requests_total.labels(chain=CHAIN_NAME, status="overloaded").inc()
+        return refused
+    try:
+        block_timestamp = await _price_quote_legs(legs, block, params.ignore_pools)
+    except Exception as e:
+        duration_ms = int((time.monotonic() - start) * 1000)
+        return _handle_price_error(e, params.token, block, duration_ms)
+    unpriced = next((leg for leg in legs if leg.price is None), None)
+    if unpriced is not None:
+        price_requests_total.labels(chain=CHAIN_NAME, status="not_found").inc()
+        message = _not_found_message(unpriced.token, block)
+        if unpriced.cached_error is not None:
+            message += f" (cached error: {unpriced.cached_error})"
+        return _make_error_response(404, message)
+    divisor = legs[-1]
+    if cast(float, divisor.price) <= 0:
+        price_requests_total.labels(chain=CHAIN_NAME, status="zero_divisor").inc()
+        return _make_error_response(
+            422,
+            f"Cannot price in {divisor.token}: its USD price at block {block} is {divisor.price:g}",
+        )
+    return block_timestamp
+
+
+def _record_two_leg_request(
+    event: str, params: Any, block: int, start: float, **fields: Any
+) -> None:
+    duration_ms = int((time.monotonic() - start) * 1000)
+    price_requests_total.labels(chain=CHAIN_NAME, status="ok").inc()
+    price_request_duration_seconds.labels(chain=CHAIN_NAME).observe(duration_ms / 1000)
+    logger.info(
+        event,
+        chain=CHAIN_NAME,
+        token=params.token,
+        block=block,
+        duration_ms=duration_ms,
+        **fields,
+    )
+
+
+async def _handle_quote_request(params: Any, actual_block: int, force: bool = False) -> Any:
+    """Quote ``amount`` (default 1) of ``token`` in ``to`` at one block.
+
+    Both legs are priced in USD at the same block from the cache or one
+    get_prices call, then divided: ``output_amount = amount * from_price /
+    to_price``.  The ``token`` leg is priced at ``amount`` (for price
+    impact), so it is only cached when no amount is given.
+    """
+    amount = params.amount if params.amount is not None else 1.0
+    start = time.monotonic()
+    if params.token.lower() == params.to.lower():
+        block_timestamp = await _fetch_block_timestamp(actual_block)
+        output_amount, route = amount, "identity"
+    else:
+        legs = [_QuoteLeg(params.token, params.amount), _QuoteLeg(params.to, None)]
+        priced = await _price_legs(params, legs, actual_block, force)
+        if isinstance(priced, JSONResponse):
+            return priced
+        block_timestamp = priced
+        from_price, to_price = (cast(float, leg.price) for leg in legs)
+        output_amount, route = amount * (from_price / to_price), "divide"
+
+    _record_two_leg_request(
+        "quote_fetched",
+        params,
+        actual_block,
+        start,
+        to=params.to,
+        amount=amount,
+        output_amount=output_amount,
+    )
+    return {
+        "from": params.token,
+        "to": params.to,
+        "amount": amount,
+        "output_amount": output_amount,
+        "block": actual_block,
+        "chain": CHAIN_NAME,
+        "block_timestamp": block_timestamp,
+        "route": route,
+    }
+
+
+async def _handle_denominated_price_request(
+    params: Any, actual_block: int, force: bool = False
+) -> Any:
+    """Price ``token`` in units of ``denominate`` instead of USD.
+
+    Both USD prices come from the cache or one get_prices call at the same
+    block; a token denominated in itself is 1 without any lookup.
+    """
+    start = time.monotonic()
+    if params.token.lower() == params.denominate.lower():
+        block_timestamp = await _fetch_block_timestamp(actual_block)
+        price_float, usd_price, cached = 1.0, None, False
+    else:
+        legs = [_QuoteLeg(params.token, params.amount), _QuoteLeg(params.denominate, None)]
+        priced = await _price_legs(params, legs, actual_block, force)
+        if isinstance(priced, JSONResponse):
+            return priced
+        block_timestamp = priced
+        usd_price, denomination_price = (cast(float, leg.price) for leg in legs)
+        price_float = usd_price / denomination_price
+        cached = all(leg.cached for leg in legs)
+
+    _record_two_leg_request(
+        "denominated_price_fetched",
+        params,
+        actual_block,
+        start,
+        denominate=params.denominate,
+        price=price_float,
+    )
+    return {
+        "token": params.token,
+        "price": price_float,
+        "block": actual_block,
+        "chain": CHAIN_NAME,
+        "block_timestamp": block_timestamp,
+        "cached": cached,
+        "trade_path": None,
+        "denominate": params.denominate,
+        "usd_price": usd_price,
+    }
+
+
 async def _resolve_batch_block(
     params: "BatchParams",
 ) -> int | tuple[int, JSONResponse]:
@@ -811,120 +1526,626 @@ async def _resolve_batch_block(
                     f"Failed to resolve timestamp {params.timestamp} to block: {e}",
                 ),
             )
-    return params.block if params.block is not None else brownie_chain.height
+    if params.block is not None:
+        return params.block
+    height: int = brownie_chain.height
+    set_chain_head(height)
+    return height
 
 
-def _prepare_batch_cache_check(
-    params: "BatchParams",
-    block: int,
-) -> tuple[list[dict[str, Any]], list[str], list[int]]:
-    """Prepare batch results by checking cache for each token.
+_NO_TIMESTAMP = -1
+
+TIMED_OUT: Literal["timed_out"] = "timed_out"
 
-    Returns:
-    - results: list of result dicts (with placeholders for tokens to fetch)
-    - tokens_to_fetch: list of tokens that need fetching
-    - indices_to_fetch: original indices of tokens to fetch
+# A fetched batch lookup: (price, trade_path), None if unpriceable, or TIMED_OUT
+type BatchTokenResult = tuple[float, list[dict[str, Any]] | None] | Literal["timed_out"] | None
+
+
+@dataclass
+class _BatchPlan:
+    """Array-backed working state for one batch request.
+
+    Repeated ``(token, amount)`` pairs are priced once: ``tokens`` and
+    ``amounts`` hold the unique lookups and ``slots[i]`` maps input position
+    ``i`` to one of them.  Per-lookup results live in flat arrays (NaN price
+    means unpriced, -1 timestamp means unknown), so a batch of thousands of
+    tokens holds no per-token dicts until the response is built.
     """
-    results: list[dict[str, Any]] = []
-    tokens_to_fetch: list[str] = []
-    indices_to_fetch: list[int] = []
 
+    tokens: list[str]
+    amounts: list[float | None]
+    has_amounts: bool
+    slots: array[int]
+    prices: array[float]
+    timestamps: array[int]
+    cached: bytearray
+    trade_paths: dict[int, list[dict[str, Any]] | None] = field(default_factory=dict)
+    # Why an unpriced lookup has no price, when it isn't a plain failure
+    reasons: dict[int, str] = field(default_factory=dict)
+    # Error messages of lookups answered from the error cache
+    cached_errors: dict[int, str] = field(default_factory=dict)
+    # Lookup whose USD price the results are divided by (``denominate``)
+    denominator: int | None = None
+
+
+def _plan_batch(params: "BatchParams") -> _BatchPlan:
+    """Deduplicate the requested tokens into a _BatchPlan."""
+    index: dict[tuple[str, float | None], int] = {}
+    tokens: list[str] = []
+    amounts: list[float | None] = []
+    slots = array("I")
     for i, token in enumerate(params.tokens):
-        token_amount = params.amounts[i] if params.amounts is not None else None
-
-        # Check cache only if: no amount
-        if token_amount is None:
-            cached = get_cached_price(token, block)
-            if cached is not None:
-                results.append(
-                    {
-                        "token": token,
-                        "block": block,
-                        "price": cached["price"],
-                        "block_timestamp": cached.get("block_timestamp"),
-                        "cached": True,
-                    }
-                )
-                continue
+        amount = params.amounts[i] if params.amounts is not None else None
+        key = (token.lower(), amount)
+        slot = index.get(key)
+        if slot is None:
+            slot = index[key] = len(tokens)
+            tokens.append(token)
+            amounts.append(amount)
+        slots.append(slot)
+    # The denominator is one more lookup, shared with a requested token when there is one
+    denominator = None
+    if params.denominate is not None:
+        denominator = index.get((params.denominate.lower(), None))
+        if denominator is None:
+            denominator = len(tokens)
+            tokens.append(params.denominate)
+            amounts.append(None)
+    n = len(tokens)
+    return _BatchPlan(
+        tokens=tokens,
+        amounts=amounts,
+        has_amounts=params.amounts is not None,
+        slots=slots,
+        prices=array("d", [math.nan]) * n,
+        timestamps=array("q", [_NO_TIMESTAMP]) * n,
+        cached=bytearray(n),
+        denominator=denominator,
+    )
 
-        # Need to fetch this token
-        tokens_to_fetch.append(token)
-        indices_to_fetch.append(i)
-        results.append({})  # Placeholder
 
-    return results, tokens_to_fetch, indices_to_fetch
+def _read_batch_cache(plan: _BatchPlan, block: int, force: bool = False) -> list[int]:
+    """Fill cached prices and errors into the plan in one cache read.
+
+    Returns the lookups still to fetch.  Only lookups without an amount are
+    cacheable.  With ``force``, cached errors are ignored and refetched, as
+    on /price.
+    """
+    cacheable = [u for u, amount in enumerate(plan.amounts) if amount is None]
+    lookups = lookup_cached_many([plan.tokens[u] for u in cacheable], block) if cacheable else []
+    for u, lookup in zip(cacheable, lookups, strict=True):
+        if isinstance(lookup, CacheErrorHit) and not force:
+            plan.cached_errors[u] = str(lookup.entry.get("error"))
+            plan.cached[u] = 1
+            continue
+        if not isinstance(lookup, CacheHit):
+            continue
+        entry = lookup.entry
+        block_timestamp = entry.get("block_timestamp")
+        plan.prices[u] = float(cast(float, entry["price"]))
+        plan.timestamps[u] = block_timestamp if isinstance(block_timestamp, int) else _NO_TIMESTAMP
+        plan.cached[u] = 1
+    return [u for u in range(len(plan.tokens)) if not plan.cached[u]]
+
+
+async def _fetch_batch_token(
+    token: str, block: int, amount: float | None
+) -> tuple[float, list[dict[str, Any]] | None] | None:
+    """Price one batch token on its own; failures become None like get_prices(fail_to_None)."""
+    try:
+        return await _fetch_price(token, block, amount=amount)
+    except Exception as e:
+        logger.warning("batch_token_fetch_failed", token=token, block=block, error=str(e))
+        return None
 
 
-def _fill_batch_results(
-    results: list[dict[str, Any]],
-    tokens_to_fetch: list[str],
-    indices_to_fetch: list[int],
-    prices: list[tuple[float, list[dict[str, Any]] | None] | None],
+async def _cache_after_deadline(
+    lookup: "asyncio.Task[tuple[float, list[dict[str, Any]] | None] | None]",
+    token: str,
     block: int,
-    block_timestamp: int | None,
-    params: "BatchParams",
 ) -> None:
-    """Fill in batch results with fetched prices and cache them."""
-    for idx, token in enumerate(tokens_to_fetch):
-        i = indices_to_fetch[idx]
-        price_entry = prices[idx]
-        token_amount = params.amounts[i] if params.amounts is not None else None
-
-        if price_entry is None:
-            price_val = None
-            trade_path = None
-        else:
-            price_val, trade_path = price_entry
+    """Cache the price of a lookup that outlived its batch deadline.
 
-        results[i] = {
-            "token": token,
-            "block": block,
-            "price": price_val,
-            "block_timestamp": block_timestamp,
-            "cached": False,
-            "trade_path": trade_path,
-        }
+    The batch recorded the block's hash before starting the lookup.
+    """
+    result = await lookup
+    if result is None:
+        return
+    try:
+        block_timestamp = await _fetch_block_timestamp(block)
+        await run_cache_io(
+            set_cached_price, token, block, result[0], block_timestamp=block_timestamp
+        )
+    except Exception as e:
+        logger.warning("batch_background_cache_failed", token=token, block=block, error=str(e))
 
-        # Cache only if: price found AND no amount
-        if price_val is not None and token_amount is None:
-            set_cached_price(token, block, price_val, block_timestamp=block_timestamp)
 
+async def _fetch_batch_token_by_deadline(
+    token: str, block: int, amount: float | None
+) -> BatchTokenResult:
+    """Price one batch token, giving up on it after BATCH_TOKEN_TIMEOUT seconds.
 
-@app.get(
-    "/price",
-    description="Get the USD price of an ERC-20 token at a given block or timestamp. "
-    "Set `amount` to price a specific quantity (affects on-chain path selection for price impact). "
-    "Use `ignore_pools` (comma-separated addresses) to exclude specific liquidity pools. "
-    "Block and timestamp are mutually exclusive; omit both for latest block. "
-    "Set `force=true` to bypass any cached error entry and attempt a fresh price lookup.",
-)
-async def price(
-    token: str | None = Query(None, description="ERC-20 token address (0x...)"),
-    block: str | None = Query(None, description="Block number (mutually exclusive with timestamp)"),
-    amount: str | None = Query(None, description="Token amount to price (default: 1)"),
-    ignore_pools: str | None = Query(None, description="Comma-separated pool addresses to exclude"),
-    timestamp: str | None = Query(
-        None, description="Unix epoch or ISO 8601 timestamp (mutually exclusive with block)"
-    ),
-    force: bool = Query(
-        False,
-        description="Bypass cached error entries and attempt a fresh price lookup (default: false)",
-    ),
-) -> Any:
-    logger.debug("price_request", token=token, block=block, timestamp=timestamp, force=force)
-    result = parse_price_params(token, block, amount, ignore_pools, timestamp)
-    if isinstance(result, ParseError):
-        price_requests_total.labels(chain=CHAIN_NAME, status="bad_request").inc()
-        return _make_error_response(400, result.error)
+    A lookup that misses its deadline is reported as TIMED_OUT.  If it has no
+    amount (so its price is cacheable) and fewer than BATCH_BACKGROUND_MAX
+    such lookups are already running, it is left to finish in the background
+    and cache its price for the next request; otherwise it is cancelled.
+    """
+    lookup = asyncio.ensure_future(_fetch_batch_token(token, block, amount))
+    done, _ = await asyncio.wait({lookup}, timeout=BATCH_TOKEN_TIMEOUT)
+    if lookup in done:
+        return lookup.result()
+    if amount is None and len(_batch_background) < BATCH_BACKGROUND_MAX:
+        task = asyncio.ensure_future(_cache_after_deadline(lookup, token, block))
+        _batch_background.add(task)
+        task.add_done_callback(_batch_background.discard)
+        outcome = "background"
+    else:
+        lookup.cancel()
+        outcome = "cancelled"
+    batch_token_timeouts_total.labels(chain=CHAIN_NAME, outcome=outcome).inc()
+    logger.warning("batch_token_timed_out", token=token, block=block, outcome=outcome)
+    return TIMED_OUT
 
-    params = result.data
-    actual_block = await _resolve_price_block(params)
-    if isinstance(actual_block, JSONResponse):
-        return actual_block
 
-    logger.debug("price_resolved", token=params.token, block=actual_block)
+async def _fetch_batch_chunk(
+    plan: _BatchPlan, chunk: list[int], block: int
+) -> list[BatchTokenResult]:
+    """Price one chunk of missed lookups with a single get_prices call.
 
-    return await _handle_price_request(params, actual_block, force=force)
+    If the call fails or takes longer than BATCH_CHUNK_TIMEOUT, it is
+    cancelled and each of the chunk's tokens is priced on its own with its
+    own deadline, so only the slow tokens time out.
+    """
+    tokens = tuple(plan.tokens[u] for u in chunk)
+    amounts = tuple(plan.amounts[u] for u in chunk) if plan.has_amounts else None
+    try:
+        return list(
+            await asyncio.wait_for(
+                _fetch_batch_prices(tokens, block, amounts=amounts, raise_errors=True),
+                BATCH_CHUNK_TIMEOUT,
+            )
+        )
+    except TimeoutError:
+        logger.warning("batch_chunk_timed_out", block=block, tokens=len(chunk))
+    except Exception as e:
+        logger.warning("batch_chunk_failed", block=block, tokens=len(chunk), error=str(e))
+    return list(
+        await asyncio.gather(
+            *(_fetch_batch_token_by_deadline(plan.tokens[u], block, plan.amounts[u]) for u in chunk)
+        )
+    )
+
+
+async def _fetch_batch_chunks(
+    plan: _BatchPlan, misses: list[int], block: int
+) -> list[BatchTokenResult]:
+    """Price the missed lookups in concurrent get_prices chunks, in ``misses`` order.
+
+    Chunks hold BATCH_CHUNK_SIZE tokens and at most BATCH_PARALLELISM run at once.
+    """
+    semaphore = asyncio.Semaphore(max(1, BATCH_PARALLELISM))
+    chunk_size = max(1, BATCH_CHUNK_SIZE)
+
+    async def fetch_chunk(chunk: list[int]) -> list[BatchTokenResult]:
+        async with semaphore:
+            return await _fetch_batch_chunk(plan, chunk, block)
+
+    chunks = [misses[i : i + chunk_size] for i in range(0, len(misses), chunk_size)]
+    results = await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks))
+    return [price for chunk_prices in results for price in chunk_prices]
+
+
+def _fill_batch_result(
+    plan: _BatchPlan, u: int, result: BatchTokenResult, block_timestamp: int | None
+) -> None:
+    """Record the outcome of fetching lookup ``u`` in the plan."""
+    plan.timestamps[u] = block_timestamp if block_timestamp is not None else _NO_TIMESTAMP
+    if isinstance(result, tuple):
+        plan.prices[u], plan.trade_paths[u] = result
+        return
+    plan.trade_paths[u] = None
+    if result == TIMED_OUT:
+        plan.reasons[u] = TIMED_OUT
+
+
+def _fill_batch_results(
+    plan: _BatchPlan,
+    misses: list[int],
+    prices: list[BatchTokenResult],
+    block: int,
+    block_timestamp: int | None,
+) -> None:
+    """Fill fetched prices into the plan and cache them (and "not found" errors)."""
+    to_cache: list[tuple[str, int, float, int | None]] = []
+    errors: list[tuple[str, int, str]] = []
+    for u, result in zip(misses, prices, strict=True):
+        _fill_batch_result(plan, u, result, block_timestamp)
+        # Cache only if: no amount
+        if plan.amounts[u] is not None:
+            continue
+        if isinstance(result, tuple):
+            to_cache.append((plan.tokens[u], block, result[0], block_timestamp))
+        elif result is None:
+            errors.append((plan.tokens[u], block, _not_found_message(plan.tokens[u], block)))
+
+    if to_cache:
+        set_cached_prices_many(to_cache)
+    if errors:
+        set_cached_errors_many(errors)
+
+
+def _batch_result(plan: _BatchPlan, token: str, u: int, block: int) -> dict[str, Any]:
+    """Build the result dict for one requested token from its lookup ``u``."""
+    price_val = plan.prices[u]
+    block_timestamp = plan.timestamps[u]
+    result: dict[str, Any] = {
+        "token": token,
+        "block": block,
+        "price": None if math.isnan(price_val) else price_val,
+        "block_timestamp": None if block_timestamp == _NO_TIMESTAMP else block_timestamp,
+        "cached": bool(plan.cached[u]),
+    }
+    if u in plan.cached_errors:
+        result["cached_error"] = True
+        result["error"] = plan.cached_errors[u]
+    elif not plan.cached[u]:
+        result["trade_path"] = plan.trade_paths.get(u)
+    if u in plan.reasons:
+        result["reason"] = plan.reasons[u]
+    if plan.denominator is not None:
+        _denominate_batch_result(plan, result)
+    return result
+
+
+def _denominate_batch_result(plan: _BatchPlan, result: dict[str, Any]) -> None:
+    """Divide a result's USD price by the denominator's, keeping it as ``usd_price``."""
+    usd_price = result["price"]
+    denomination_price = plan.prices[cast(int, plan.denominator)]
+    result["usd_price"] = usd_price
+    if usd_price is None:
+        return
+    if math.isnan(denomination_price) or denomination_price <= 0:
+        result["price"] = None
+        result.setdefault("reason", "denomination_unpriced")
+        return
+    result["price"] = usd_price / denomination_price
+
+
+def _batch_results(plan: _BatchPlan, params: "BatchParams", block: int) -> list[dict[str, Any]]:
+    """Expand the plan into one result dict per requested token, in input order."""
+    return [
+        _batch_result(plan, token, u, block)
+        for token, u in zip(params.tokens, plan.slots, strict=True)
+    ]
+
+
+async def _price_batch_misses(plan: _BatchPlan, misses: list[int], block: int) -> None:
+    """Fetch the lookups the cache missed and fill them into the plan (and the cache)."""
+    if not misses:
+        return
+    await _record_provisional_block_hash(block)
+    prices = await asyncio.shield(_fetch_batch_chunks(plan, misses, block))
+
+    # Fetch block timestamp once for all
+    block_timestamp = await _fetch_block_timestamp(block)
+
+    # Fill in results and write the cache (off the event loop)
+    await run_cache_io(_fill_batch_results, plan, misses, prices, block, block_timestamp)
+
+
+async def _handle_batch_request(params: "BatchParams", stream: bool = False) -> Any:
+    """Price a parsed batch (shared by GET and POST /prices).
+
+    With ``stream`` the results are sent as NDJSON while lookups resolve;
+    see _stream_batch.
+    """
+    # Determine the block to use
+    block_result = await _resolve_batch_block(params)
+    if isinstance(block_result, tuple):
+        return block_result[1]
+    actual_block = block_result
+
+    start = time.monotonic()
+
+    # Deduplicate and check the cache (off the event loop)
+    plan = _plan_batch(params)
+    misses = await run_cache_io(_read_batch_cache, plan, actual_block, params.force)
+    if misses and (refused := _refuse_compute()) is not None:
+        batch_requests_total.labels(chain=CHAIN_NAME, status="overloaded").inc()
+        return refused
+
+    if stream:
+        # Every streamed line is denominated, so price the denominator first
+        if plan.denominator in misses:
+            await _price_batch_misses(plan, [plan.denominator], actual_block)
+            misses = [u for u in misses if u != plan.denominator]
+        return StreamingResponse(
+            _stream_batch(plan, params, misses, actual_block, start),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
+
+    await _price_batch_misses(plan, misses, actual_block)
+
+    results = _batch_results(plan, params, actual_block)
+
+    duration_ms = int((time.monotonic() - start) * 1000)
+    batch_requests_total.labels(chain=CHAIN_NAME, status="ok").inc()
+    batch_request_duration_seconds.labels(chain=CHAIN_NAME).observe(duration_ms / 1000)
+
+    # Count success/failure
+    success_count = sum(1 for r in results if r["price"] is not None)
+    logger.info(
+        "batch_fetched",
+        chain=CHAIN_NAME,
+        total_tokens=len(params.tokens),
+        unique_tokens=len(plan.tokens),
+        success_count=success_count,
+        cached_error_count=len(plan.cached_errors),
+        block=actual_block,
+        duration_ms=duration_ms,
+    )
+
+    return results
+
+
+async def _produce_batch_prices(
+    plan: _BatchPlan,
+    misses: list[int],
+    block: int,
+    block_timestamp: "asyncio.Future[int | None]",
+    window: asyncio.Semaphore,
+    queue: "asyncio.Queue[tuple[int, BatchTokenResult]]",
+    consumer_gone: asyncio.Event,
+) -> None:
+    """Price each missed lookup as its own task and queue results as they resolve.
+
+    A lookup holds a ``window`` slot from when it starts until the consumer
+    has sent it, so at most that many results are in flight or buffered.  If
+    the consumer goes away, the remaining lookups still run to fill the cache.
+    Fetched prices and "not found" errors are cached once every lookup has
+    finished.
+    """
+    to_cache: list[tuple[int, float]] = []
+    not_found: list[int] = []
+
+    async def fetch(u: int) -> None:
+        await window.acquire()
+        result = await _fetch_batch_token_by_deadline(plan.tokens[u], block, plan.amounts[u])
+        if plan.amounts[u] is None:
+            if isinstance(result, tuple):
+                to_cache.append((u, result[0]))
+            elif result is None:
+                not_found.append(u)
+        if consumer_gone.is_set():
+            window.release()
+        else:
+            queue.put_nowait((u, result))
+
+    await asyncio.gather(*(fetch(u) for u in misses))
+    timestamp = await block_timestamp
+    if to_cache:
+        await run_cache_io(
+            set_cached_prices_many,
+            [(plan.tokens[u], block, price, timestamp) for u, price in to_cache],
+        )
+    if not_found:
+        await run_cache_io(
+            set_cached_errors_many,
+            [(plan.tokens[u], block, _not_found_message(plan.tokens[u], block)) for u in not_found],
+        )
+
+
+async def _stream_batch(
+    plan: _BatchPlan,
+    params: "BatchParams",
+    misses: list[int],
+    block: int,
+    start: float,
+) -> AsyncIterator[bytes]:
+    """Yield one NDJSON line per requested token, cache hits first.
+
+    Each line is a /prices result plus ``index``, the token's position in the
+    request.  Missed lookups are not grouped into chunks, so each line can be
+    sent as soon as its price resolves (or its deadline passes); at most
+    BATCH_CHUNK_SIZE * BATCH_PARALLELISM lookups are running or waiting to
+    be sent at any time.
+    """
+
+    def lines(positions: list[int], u: int) -> bytes:
+        return b"".join(
+            json.dumps({"index": i, **_batch_result(plan, params.tokens[i], u, block)}).encode()
+            + b"\n"
+            for i in positions
+        )
+
+    missed_positions: dict[int, list[int]] = {u: [] for u in misses}
+    hits: list[int] = []
+    for i, u in enumerate(plan.slots):
+        if u in missed_positions:
+            missed_positions[u].append(i)
+        else:
+            hits.append(i)
+    for i in hits:
+        yield lines([i], plan.slots[i])
+
+    success_count = sum(1 for i in hits if not math.isnan(plan.prices[plan.slots[i]]))
+    if misses:
+        await _record_provisional_block_hash(block)
+        block_timestamp = asyncio.ensure_future(_fetch_block_timestamp(block))
+        window = asyncio.Semaphore(max(1, BATCH_CHUNK_SIZE * BATCH_PARALLELISM))
+        queue: asyncio.Queue[tuple[int, BatchTokenResult]] = asyncio.Queue()
+        consumer_gone = asyncio.Event()
+        producer = asyncio.ensure_future(
+            _produce_batch_prices(
+                plan, misses, block, block_timestamp, window, queue, consumer_gone
+            )
+        )
+        _stream_producers.add(producer)
+        producer.add_done_callback(_stream_producers.discard)
+        try:
+            timestamp = await asyncio.shield(block_timestamp)
+            for _ in misses:
+                u, result = await queue.get()
+                _fill_batch_result(plan, u, result, timestamp)
+                if isinstance(result, tuple):
+                    success_count += len(missed_positions[u])
+                yield lines(missed_positions[u], u)
+                window.release()
+        finally:
+            consumer_gone.set()
+            while not queue.empty():
+                queue.get_nowait()
+                window.release()
+
+    duration_ms = int((time.monotonic() - start) * 1000)
+    batch_requests_total.labels(chain=CHAIN_NAME, status="ok").inc()
+    batch_request_duration_seconds.labels(chain=CHAIN_NAME).observe(duration_ms / 1000)
+    logger.info(
+        "batch_streamed",
+        chain=CHAIN_NAME,
+        total_tokens=len(params.tokens),
+        unique_tokens=len(plan.tokens),
+        success_count=success_count,
+        block=block,
+        duration_ms=duration_ms,
+    )
+
+
+def _wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+@app.get(
+    "/price",
+    description="Get the USD price of an ERC-20 token at a given block or timestamp. "
+    "Set `amount` to price a specific quantity (affects on-chain path selection for price impact). "
+    "Use `ignore_pools` (comma-separated addresses) to exclude specific liquidity pools. "
+    "Block and timestamp are mutually exclusive; omit both for latest block. "
+    "Set `to` to quote `amount` of `token` in another token instead of USD, or `denominate` "
+    "to express the price in another token. "
+    "Set `force=true` to bypass any cached error entry and attempt a fresh price lookup. "
+    "Set `timeout` (or the `X-Request-Deadline` header) to a number of seconds to get a 504 "
+    "once it passes; the lookup is cancelled unless `continue_in_background=true`.",
+)
+async def price(
+    request: Request,
+    token: str | None = Query(None, description="ERC-20 token address (0x...)"),
+    to: str | None = Query(None, description="Output token address; switches to quote mode"),
+    denominate: str | None = Query(
+        None, description="Token address to express the price in instead of USD"
+    ),
+    block: str | None = Query(None, description="Block number (mutually exclusive with timestamp)"),
+    amount: str | None = Query(None, description="Token amount to price (default: 1)"),
+    ignore_pools: str | None = Query(None, description="Comma-separated pool addresses to exclude"),
+    timestamp: str | None = Query(
+        None, description="Unix epoch or ISO 8601 timestamp (mutually exclusive with block)"
+    ),
+    force: bool = Query(
+        False,
+        description="Bypass cached error entries and attempt a fresh price lookup (default: false)",
+    ),
+    timeout: str | None = Query(
+        None, description="Seconds to wait for the price before returning 504 (max 300)"
+    ),
+    continue_in_background: bool = Query(
+        False,
+        description="Keep pricing after the timeout to fill the cache (default: false)",
+    ),
+) -> Any:
+    logger.debug("price_request", token=token, block=block, timestamp=timestamp, force=force)
+    result = parse_price_params(
+        token, block, amount, ignore_pools, timestamp, to=to, denominate=denominate
+    )
+    if isinstance(result, ParseError):
+        price_requests_total.labels(chain=CHAIN_NAME, status="bad_request").inc()
+        return _make_error_response(400, result.error)
+    budget = _parse_deadline(timeout, request.headers.get(DEADLINE_HEADER))
+    if isinstance(budget, ParseError):
+        price_requests_total.labels(chain=CHAIN_NAME, status="bad_request").inc()
+        return _make_error_response(400, budget.error)
+
+    work = _resolve_and_dispatch_price(result.data, force)
+    if budget is None:
+        return await work
+    return await _run_with_deadline(work, budget, continue_in_background)
+
+
+async def _resolve_and_dispatch_price(params: Any, force: bool = False) -> Any:
+    actual_block = await _resolve_price_block(params)
+    if isinstance(actual_block, JSONResponse):
+        return actual_block
+    logger.debug("price_resolved", token=params.token, block=actual_block)
+    return await _dispatch_price_request(params, actual_block, force=force)
+
+
+def _parse_deadline(timeout: str | None, header: str | None) -> float | ParseError | None:
+    """The client's time budget in seconds: the shorter of ``timeout`` and the header."""
+    budgets: list[float] = []
+    for value, name in ((timeout, "timeout"), (header, DEADLINE_HEADER)):
+        parsed = parse_timeout(value, name)
+        if isinstance(parsed, ParseError):
+            return parsed
+        if parsed is not None:
+            budgets.append(parsed)
+    return min(budgets, default=None)
+
+
+def _finish_deadline_background(task: "asyncio.Task[Any]") -> None:
+    _deadline_background.discard(task)
+    if not task.cancelled() and (exc := task.exception()) is not None:
+        logger.warning("price_background_failed", error=str(exc))
+
+
+async def _run_with_deadline(
+    work: Coroutine[Any, Any, Any], budget: float, continue_in_background: bool
+) -> Response:
+    """Run a /price request's work (block resolution, cache I/O and lookups) within
+    ``budget`` seconds.
+
+    Past the deadline the client gets 504.  The work is cancelled, along with
+    any shared lookup no other caller is waiting for, unless
+    ``continue_in_background``, in which case it finishes and fills the
+    cache.  The budget and the time left are reported in Server-Timing.
+    """
+    start = time.monotonic()
+    keep = _keep_running_lookups.set(continue_in_background)
+    task = asyncio.ensure_future(work)
+    _keep_running_lookups.reset(keep)
+    response: Response
+    try:
+        result = await asyncio.wait_for(asyncio.shield(task), budget)
+    except TimeoutError:
+        outcome = "continued" if continue_in_background else "cancelled"
+        if continue_in_background:
+            _deadline_background.add(task)
+            task.add_done_callback(_finish_deadline_background)
+        else:
+            task.cancel()
+        price_deadlines_exceeded_total.labels(chain=CHAIN_NAME, outcome=outcome).inc()
+        price_requests_total.labels(chain=CHAIN_NAME, status="deadline_exceeded").inc()
+        logger.warning("price_deadline_exceeded", budget=budget, outcome=outcome)
+        response = _make_error_response(504, f"Price lookup exceeded the {budget:g}s deadline")
+    except asyncio.CancelledError:
+        # The client went away; its work stops with it unless asked to continue
+        if not continue_in_background:
+            task.cancel()
+        raise
+    else:
+        response = result if isinstance(result, Response) else JSONResponse(content=result)
+    remaining = max(0.0, budget - (time.monotonic() - start))
+    response.headers["Server-Timing"] = (
+        f"deadline;dur={budget * 1000:.0f}, remaining;dur={remaining * 1000:.0f}"
+    )
+    return response
+
+
+async def _dispatch_price_request(params: Any, actual_block: int, force: bool = False) -> Any:
+    """Run a /price request in USD, quote (``to``) or ``denominate`` mode."""
+    if params.to is not None:
+        return await _handle_quote_request(params, actual_block, force=force)
+    if params.denominate is not None:
+        return await _handle_denominated_price_request(params, actual_block, force=force)
+    return await _handle_price_request(params, actual_block, force=force)
 
 
 @app.get(
@@ -932,9 +2153,15 @@ async def price(
     description="Batch-price multiple ERC-20 tokens in a single request. "
     "Returns a JSON array with one entry per token containing price (or null on failure), "
     "block, and block_timestamp. "
-    "Partial failures return 200 with null prices for failed tokens. Max 100 tokens per call.",
+    "Partial failures return 200 with null prices for failed tokens. Max 100 tokens per call. "
+    "Send `Accept: application/x-ndjson` to stream one JSON line per token (with its `index` "
+    "in the request) as prices resolve, cache hits first. "
+    "Tokens with a cached error return `cached_error: true` without a new lookup; "
+    "set `force=true` to retry them. "
+    "Set `denominate` to express prices in another token (the USD price moves to `usd_price`).",
 )
 async def prices(
+    request: Request,
     tokens: str | None = Query(
         None, description="Comma-separated ERC-20 token addresses (max 100)"
     ),
@@ -946,74 +2173,674 @@ async def prices(
     timestamp: str | None = Query(
         None, description="Unix epoch or ISO 8601 timestamp (mutually exclusive with block)"
     ),
+    force: bool = Query(
+        False,
+        description="Bypass cached error entries and attempt fresh price lookups (default: false)",
+    ),
+    denominate: str | None = Query(
+        None, description="Token address to express prices in instead of USD"
+    ),
 ) -> Any:
-    result = parse_batch_params(tokens, block, amounts, timestamp)
+    result = parse_batch_params(
+        tokens, block, amounts, timestamp, force=force, denominate=denominate
+    )
     if isinstance(result, ParseError):
         batch_requests_total.labels(chain=CHAIN_NAME, status="bad_request").inc()
         return _make_error_response(400, result.error)
 
+    return await _handle_batch_request(result.data, stream=_wants_ndjson(request))
+
+
+@app.post(
+    "/prices",
+    description="Batch-price ERC-20 tokens from a JSON body, for batches too large for a query string. "
+    "The body is an object with `tokens` (array of addresses), optional `amounts` "
+    "(array aligned with tokens; null means 'no amount'), optional `block` or `timestamp`, "
+    "optional `force` (bypass cached errors) and optional `denominate` (token to price in). "
+    "Accepts up to MAX_BATCH_BODY_TOKENS tokens (default 10000); repeated tokens are priced once. "
+    "The response has the same shape as GET /prices, and can be streamed the same way.",
+)
+async def prices_post(request: Request) -> Any:
+    try:
+        body = await request.json()
+    except ValueError:
+        batch_requests_total.labels(chain=CHAIN_NAME, status="bad_request").inc()
+        return _make_error_response(400, "Request body must be valid JSON.")
+    result = parse_batch_body(body)
+    if isinstance(result, ParseError):
+        batch_requests_total.labels(chain=CHAIN_NAME, status="bad_request").inc()
+        return _make_error_response(400, result.error)
+    return await _handle_batch_request(result.data, stream=_wants_ndjson(request))
+
+
+def _cross_rates(plan: _BatchPlan) -> list[list[float | None]]:
+    """``rates[i][j]``: requested token i priced in requested token j, from their USD prices."""
+    usd = [plan.prices[u] for u in plan.slots]
+    return [
+        [
+            None
+            if math.isnan(base) or math.isnan(quote) or quote <= 0
+            else (1.0 if u == v else base / quote)
+            for quote, v in zip(usd, plan.slots, strict=True)
+        ]
+        for base, u in zip(usd, plan.slots, strict=True)
+    ]
+
+
+@app.get(
+    "/cross_rates",
+    description="Cross-rate table for a set of ERC-20 tokens at one block: `rates[i][j]` is the "
+    "price of `tokens[i]` in units of `tokens[j]` (null when either has no USD price). "
+    "All rates come from one batched USD lookup; each distinct token is priced once. "
+    "Max 100 tokens per call. Block and timestamp are mutually exclusive.",
+)
+async def cross_rates(
+    tokens: str | None = Query(
+        None, description="Comma-separated ERC-20 token addresses (max 100)"
+    ),
+    block: str | None = Query(None, description="Block number (mutually exclusive with timestamp)"),
+    timestamp: str | None = Query(
+        None, description="Unix epoch or ISO 8601 timestamp (mutually exclusive with block)"
+    ),
+    force: bool = Query(
+        False,
+        description="Bypass cached error entries and attempt fresh price lookups (default: false)",
+    ),
+) -> Any:
+    result = parse_batch_params(tokens, block, None, timestamp, force=force)
+    if isinstance(result, ParseError):
+        cross_rate_requests_total.labels(chain=CHAIN_NAME, status="bad_request").inc()
+        return _make_error_response(400, result.error)
     params = result.data
 
-    # Determine the block to use
     block_result = await _resolve_batch_block(params)
     if isinstance(block_result, tuple):
         return block_result[1]
     actual_block = block_result
 
     start = time.monotonic()
+    plan = _plan_batch(params)
+    misses = await run_cache_io(_read_batch_cache, plan, actual_block, params.force)
+    if misses and (refused := _refuse_compute()) is not None:
+        cross_rate_requests_total.labels(chain=CHAIN_NAME, status="overloaded").inc()
+        return refused
+    await _price_batch_misses(plan, misses, actual_block)
+    usd_prices = [None if math.isnan(p := plan.prices[u]) else p for u in plan.slots]
+    block_timestamp = max(plan.timestamps, default=_NO_TIMESTAMP)
+
+    duration_ms = int((time.monotonic() - start) * 1000)
+    cross_rate_requests_total.labels(chain=CHAIN_NAME, status="ok").inc()
+    logger.info(
+        "cross_rates_fetched",
+        chain=CHAIN_NAME,
+        tokens=len(params.tokens),
+        unique_tokens=len(plan.tokens),
+        fetched=len(misses),
+        block=actual_block,
+        duration_ms=duration_ms,
+    )
+    return {
+        "chain": CHAIN_NAME,
+        "block": actual_block,
+        "block_timestamp": None if block_timestamp == _NO_TIMESTAMP else block_timestamp,
+        "tokens": list(params.tokens),
+        "usd_prices": usd_prices,
+        "rates": _cross_rates(plan),
+    }
+
+
+async def _resolve_timestamp_blocks(timestamps: tuple[int, ...]) -> list[int]:
+    """Resolve every distinct timestamp to a block, SERIES_CONCURRENCY at a time.
+
+    Raises on RPC failure.
+    """
+    semaphore = asyncio.Semaphore(max(1, SERIES_CONCURRENCY))
+    distinct = list(dict.fromkeys(timestamps))
+
+    async def resolve(timestamp: int) -> int:
+        async with semaphore:
+            return await _resolve_block_from_timestamp(timestamp)
+
+    blocks = await asyncio.gather(*(resolve(timestamp) for timestamp in distinct))
+    by_timestamp = dict(zip(distinct, blocks, strict=True))
+    return [by_timestamp[timestamp] for timestamp in timestamps]
+
+
+def _series_point_from_cache(block: int, lookup: CacheLookup) -> dict[str, Any] | None:
+    """A series point answered by the cache, or None for a miss."""
+    if isinstance(lookup, CacheHit):
+        return {
+            "block": block,
+            "block_timestamp": lookup.entry.get("block_timestamp"),
+            "price": float(cast(float, lookup.entry["price"])),
+            "cached": True,
+        }
+    if isinstance(lookup, CacheErrorHit):
+        return {
+            "block": block,
+            "block_timestamp": None,
+            "price": None,
+            "cached": True,
+            "cached_error": True,
+            "error": str(lookup.entry.get("error")),
+        }
+    return None
+
+
+async def _fetch_series_point(token: str, block: int) -> dict[str, Any]:
+    """Price one series point through the /price lookup path (coalesced, cached)."""
+    try:
+        result = await _price_flights.do(
+            (token.lower(), block, None, ()),
+            lambda: _fetch_price_and_cache_outcome(token, block),
+        )
+    except Exception as e:
+        logger.warning("series_point_failed", token=token, block=block, error=str(e))
+        inner = e.last_attempt.exception() if isinstance(e, RetryError) else e
+        return _failed_series_point(block, sanitize_error_message(str(inner)))
+    if result is None:
+        return _failed_series_point(block, _not_found_message(token, block))
+    price_float, _, block_timestamp = result
+    return {
+        "block": block,
+        "block_timestamp": block_timestamp,
+        "price": price_float,
+        "cached": False,
+    }
+
+
+def _read_series_cache(
+    token: str, blocks: list[int], force: bool
+) -> tuple[dict[int, dict[str, Any]], list[int]]:
+    """Read the distinct ``blocks`` for ``token`` in one pass: (cached points, misses)."""
+    points: dict[int, dict[str, Any]] = {}
+    for block, lookup in zip(blocks, lookup_cached_blocks(token, blocks), strict=True):
+        if force and isinstance(lookup, CacheErrorHit):
+            continue
+        point = _series_point_from_cache(block, lookup)
+        if point is not None:
+            points[block] = point
+    return points, [block for block in blocks if block not in points]
+
+
+def _failed_series_point(block: int, error: str) -> dict[str, Any]:
+    return {"block": block, "block_timestamp": None, "price": None, "cached": False, "error": error}
+
+
+def _series_line(params: "SeriesParams", i: int, point: dict[str, Any]) -> dict[str, Any]:
+    """A point as returned for request position ``i`` (with its timestamp, if given)."""
+    if params.timestamps is None:
+        return point
+    return {**point, "timestamp": params.timestamps[i]}
+
+
+async def _stream_series(
+    params: "SeriesParams",
+    blocks: list[int],
+    points: dict[int, dict[str, Any]],
+    fetches: Sequence["asyncio.Task[dict[str, Any]]"],
+    finish: Callable[[], None],
+) -> AsyncIterator[bytes]:
+    """Yield one NDJSON line (with ``index``) per point, cached points first.
+
+    The fetches keep running if the client disconnects, so their points
+    still reach the cache.
+    """
+    positions: dict[int, list[int]] = {}
+    for i, block in enumerate(blocks):
+        positions.setdefault(block, []).append(i)
+    for i, block in enumerate(blocks):
+        if block in points:
+            yield _ndjson_line({"index": i, **_series_line(params, i, points[block])})
+    for next_point in asyncio.as_completed(fetches):
+        point = await next_point
+        for i in positions[point["block"]]:
+            yield _ndjson_line({"index": i, **_series_line(params, i, point)})
+    finish()
+
+
+async def _handle_series_request(params: "SeriesParams", stream: bool = False) -> Any:
+    """Price one token at every requested block or timestamp.
+
+    Blocks are resolved in bulk, distinct blocks are read from the cache in
+    one pass, and misses are fetched SERIES_CONCURRENCY at a time.  Points
+    come back in request order; with ``stream`` they are sent as NDJSON
+    lines as they resolve, cached points first.
+    """
+    start = time.monotonic()
+    if params.timestamps is not None:
+        try:
+            blocks = await _resolve_timestamp_blocks(params.timestamps)
+        except Exception as e:
+            logger.error("series_timestamp_resolution_failed", error=str(e))
+            series_requests_total.labels(chain=CHAIN_NAME, status="error").inc()
+            return _make_error_response(502, f"Failed to resolve timestamps to blocks: {e}")
+    else:
+        blocks = list(params.blocks or ())
+
+    points, misses = await run_cache_io(
+        _read_series_cache, params.token, list(dict.fromkeys(blocks)), params.force
+    )
+    if misses and (refused := _refuse_compute()) is not None:
+        series_requests_total.labels(chain=CHAIN_NAME, status="overloaded").inc()
+        return refused
+    semaphore = asyncio.Semaphore(max(1, SERIES_CONCURRENCY))
+
+    async def fetch(block: int) -> dict[str, Any]:
+        async with semaphore:
+            return await _fetch_series_point(params.token, block)
+
+    def finish() -> None:
+        duration_ms = int((time.monotonic() - start) * 1000)
+        series_requests_total.labels(chain=CHAIN_NAME, status="ok").inc()
+        series_request_duration_seconds.labels(chain=CHAIN_NAME).observe(duration_ms / 1000)
+        logger.info(
+            "series_fetched",
+            chain=CHAIN_NAME,
+            token=params.token,
+            points=len(blocks),
+            fetched=len(misses),
+            duration_ms=duration_ms,
+        )
+
+    fetches = [asyncio.ensure_future(fetch(block)) for block in misses]
+    for task in fetches:
+        _series_fetches.add(task)
+        task.add_done_callback(_series_fetches.discard)
+    if stream:
+        return StreamingResponse(
+            _stream_series(params, blocks, points, fetches, finish),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
+    for point in await asyncio.gather(*map(asyncio.shield, fetches)):
+        points[point["block"]] = point
+    finish()
+    return {
+        "token": params.token,
+        "chain": CHAIN_NAME,
+        "points": [_series_line(params, i, points[block]) for i, block in enumerate(blocks)],
+    }
+
+
+def _ndjson_line(obj: dict[str, Any]) -> bytes:
+    return json.dumps(obj).encode() + b"\n"
+
+
+@app.get(
+    "/price_series",
+    description="Price one ERC-20 token over many blocks: either an inclusive block range "
+    "(`start_block`, `end_block`, optional `step`) or a comma-separated list of `timestamps`. "
+    "Returns the points in request order; points that fail have a null price and an `error`. "
+    "Send `Accept: application/x-ndjson` to stream points (with their `index`) as they resolve. "
+    "Set `force=true` to retry points with a cached error.",
+)
+async def price_series(
+    request: Request,
+    token: str | None = Query(None, description="ERC-20 token address (0x...)"),
+    start_block: str | None = Query(None, description="First block of the range"),
+    end_block: str | None = Query(None, description="Last block of the range (inclusive)"),
+    step: str | None = Query(None, description="Blocks between points (default: 1)"),
+    timestamps: str | None = Query(
+        None,
+        description="Comma-separated Unix epoch or ISO 8601 timestamps (instead of a block range)",
+    ),
+    force: bool = Query(
+        False,
+        description="Bypass cached error entries and attempt fresh price lookups (default: false)",
+    ),
+) -> Any:
+    result = parse_series_params(token, start_block, end_block, step, timestamps, force=force)
+    if isinstance(result, ParseError):
+        series_requests_total.labels(chain=CHAIN_NAME, status="bad_request").inc()
+        return _make_error_response(400, result.error)
+    return await _handle_series_request(result.data, stream=_wants_ndjson(request))
+
+
+@dataclass
+class _Matrix:
+    """Dense working state for one /price_matrix request.
+
+    ``tokens`` and ``blocks`` are the distinct requested values; cell
+    ``j * len(tokens) + i`` holds ``tokens[i]`` at ``blocks[j]`` (NaN when
+    unpriced), like the block-major result of lookup_cached_grid.
+    """
+
+    tokens: list[str]
+    blocks: list[int]
+    prices: array[float]
+    block_timestamps: array[int]
+
 
-    # Prepare results - check cache for each token
-    results, tokens_to_fetch, indices_to_fetch = _prepare_batch_cache_check(params, actual_block)
+def _distinct(values: Sequence[Any], key: Callable[[Any], Any]) -> tuple[list[Any], list[int]]:
+    """Distinct ``values`` (by ``key``, first spelling kept) and each value's index among them."""
+    index: dict[Any, int] = {}
+    distinct: list[Any] = []
+    slots: list[int] = []
+    for value in values:
+        slot = index.get(key(value))
+        if slot is None:
+            slot = index[key(value)] = len(distinct)
+            distinct.append(value)
+        slots.append(slot)
+    return distinct, slots
 
-    # Fetch prices for tokens not in cache
-    if tokens_to_fetch:
-        # Prepare amounts for the tokens we need to fetch (preserve positional correspondence)
-        fetch_amounts: tuple[float | None, ...] | None = None
-        if params.amounts is not None:
-            fetch_amounts = tuple(params.amounts[i] for i in indices_to_fetch)
 
+def _read_matrix_cache(matrix: _Matrix, force: bool) -> dict[int, list[int]]:
+    """Fill cached cells in one cache read; returns the missing token indices per block index.
+
+    Cached errors count as answered (price stays NaN) unless ``force``.
+    """
+    n = len(matrix.tokens)
+    misses: dict[int, list[int]] = {}
+    for cell, lookup in enumerate(lookup_cached_grid(matrix.tokens, matrix.blocks)):
+        j, i = divmod(cell, n)
+        if isinstance(lookup, CacheHit):
+            matrix.prices[cell] = float(cast(float, lookup.entry["price"]))
+            block_timestamp = lookup.entry.get("block_timestamp")
+            if isinstance(block_timestamp, int):
+                matrix.block_timestamps[j] = block_timestamp
+        elif not isinstance(lookup, CacheErrorHit) or force:
+            misses.setdefault(j, []).append(i)
+    return misses
+
+
+def _fill_matrix_block(
+    matrix: _Matrix,
+    j: int,
+    missing: list[int],
+    results: list[tuple[float, list[dict[str, Any]] | None] | None],
+    block_timestamp: int | None,
+) -> None:
+    """Fill one block's fetched prices into the matrix and cache them (and "not found" errors)."""
+    block = matrix.blocks[j]
+    if block_timestamp is not None:
+        matrix.block_timestamps[j] = block_timestamp
+    base = j * len(matrix.tokens)
+    to_cache: list[tuple[str, int, float, int | None]] = []
+    errors: list[tuple[str, int, str]] = []
+    for i, result in zip(missing, results, strict=True):
+        token = matrix.tokens[i]
+        if result is None:
+            errors.append((token, block, _not_found_message(token, block)))
+            continue
+        matrix.prices[base + i] = result[0]
+        to_cache.append((token, block, result[0], block_timestamp))
+    if to_cache:
+        set_cached_prices_many(to_cache)
+    if errors:
+        set_cached_errors_many(errors)
+
+
+async def _fetch_matrix_block(matrix: _Matrix, j: int, missing: list[int]) -> bool:
+    """Price one block's missing tokens with a single get_prices call.
+
+    Waits for one of the process-wide MATRIX_CONCURRENCY slots.  Returns
+    False if the call timed out or failed (those cells stay unpriced and
+    uncached, so a transient error is not cached as "not found").
+    """
+    block = matrix.blocks[j]
+    async with _matrix_block_slots:
+        await _record_provisional_block_hash(block)
         try:
-            prices = await asyncio.shield(
+            results, block_timestamp = await asyncio.gather(
                 _fetch_batch_prices(
-                    tuple(tokens_to_fetch),
-                    actual_block,
-                    amounts=fetch_amounts,
-                )
+                    tuple(matrix.tokens[i] for i in missing), block, raise_errors=True
+                ),
+                _fetch_block_timestamp(block),
             )
         except TimeoutError:
-            batch_requests_total.labels(chain=CHAIN_NAME, status="timeout").inc()
-            return _make_timeout_response()
+            return False
+        except Exception as e:
+            logger.warning("matrix_block_failed", block=block, error=str(e))
+            return False
+    await run_cache_io(_fill_matrix_block, matrix, j, missing, results, block_timestamp)
+    return True
 
-        # Fetch block timestamp once for all
-        block_timestamp = await _fetch_block_timestamp(actual_block)
 
-        # Fill in results
-        _fill_batch_results(
-            results,
-            tokens_to_fetch,
-            indices_to_fetch,
-            prices,
-            actual_block,
-            block_timestamp,
-            params,
-        )
+async def _handle_matrix_request(params: "MatrixParams") -> Any:
+    """Price every requested token at every requested block or timestamp.
 
-    duration_ms = int((time.monotonic() - start) * 1000)
-    batch_requests_total.labels(chain=CHAIN_NAME, status="ok").inc()
-    batch_request_duration_seconds.labels(chain=CHAIN_NAME).observe(duration_ms / 1000)
+    Timestamps are resolved in bulk, all cells are read from the cache in
+    one pass, and each block's misses are priced with one get_prices call,
+    at most MATRIX_CONCURRENCY blocks at a time across all requests.
+    """
+    start = time.monotonic()
+    if params.timestamps is not None:
+        try:
+            blocks = await _resolve_timestamp_blocks(params.timestamps)
+        except Exception as e:
+            logger.error("matrix_timestamp_resolution_failed", error=str(e))
+            matrix_requests_total.labels(chain=CHAIN_NAME, status="error").inc()
+            return _make_error_response(502, f"Failed to resolve timestamps to blocks: {e}")
+    else:
+        blocks = list(params.blocks or ())
+
+    tokens, token_slots = _distinct(params.tokens, str.lower)
+    distinct_blocks, block_slots = _distinct(blocks, int)
+    matrix = _Matrix(
+        tokens=tokens,
+        blocks=distinct_blocks,
+        prices=array("d", [math.nan]) * (len(tokens) * len(distinct_blocks)),
+        block_timestamps=array("q", [_NO_TIMESTAMP]) * len(distinct_blocks),
+    )
+    misses = await run_cache_io(_read_matrix_cache, matrix, params.force)
+    if misses and (refused := _refuse_compute()) is not None:
+        matrix_requests_total.labels(chain=CHAIN_NAME, status="overloaded").inc()
+        return refused
+    completed = await asyncio.shield(
+        asyncio.gather(*(_fetch_matrix_block(matrix, j, missing) for j, missing in misses.items()))
+    )
 
-    # Count success/failure
-    success_count = sum(1 for r in results if r.get("price") is not None)
+    n = len(tokens)
+    response: dict[str, Any] = {
+        "chain": CHAIN_NAME,
+        "tokens": list(params.tokens),
+        "blocks": blocks,
+    }
+    if params.timestamps is not None:
+        response["timestamps"] = list(params.timestamps)
+    response["block_timestamps"] = [
+        None if matrix.block_timestamps[j] == _NO_TIMESTAMP else matrix.block_timestamps[j]
+        for j in block_slots
+    ]
+    # Columnar: one price column (over the requested blocks) per requested token
+    response["prices"] = [
+        [None if math.isnan(p := matrix.prices[j * n + i]) else p for j in block_slots]
+        for i in token_slots
+    ]
+
+    duration_ms = int((time.monotonic() - start) * 1000)
+    matrix_requests_total.labels(chain=CHAIN_NAME, status="ok").inc()
+    matrix_request_duration_seconds.labels(chain=CHAIN_NAME).observe(duration_ms / 1000)
     logger.info(
-        "batch_fetched",
+        "matrix_fetched",
         chain=CHAIN_NAME,
-        total_tokens=len(params.tokens),
-        success_count=success_count,
-        block=actual_block,
+        tokens=n,
+        blocks=len(distinct_blocks),
+        fetched_blocks=len(misses),
+        fetched_cells=sum(len(missing) for missing in misses.values()),
+        failed_blocks=completed.count(False),
         duration_ms=duration_ms,
     )
+    return response
 
-    return results
+
+@app.post(
+    "/price_matrix",
+    description="Price many ERC-20 tokens at many blocks. JSON body: `tokens` (array of "
+    "addresses) and either `blocks` (array of block numbers) or `timestamps` (array of Unix "
+    "epoch or ISO 8601 timestamps), plus optional `force`. Returns a dense columnar matrix: "
+    "`prices[i][j]` is `tokens[i]` at `blocks[j]`, null when it could not be priced.",
+)
+async def price_matrix(request: Request) -> Any:
+    try:
+        body = await request.json()
+    except ValueError:
+        matrix_requests_total.labels(chain=CHAIN_NAME, status="bad_request").inc()
+        return _make_error_response(400, "Request body must be valid JSON.")
+    result = parse_matrix_body(body)
+    if isinstance(result, ParseError):
+        matrix_requests_total.labels(chain=CHAIN_NAME, status="bad_request").inc()
+        return _make_error_response(400, result.error)
+    return await _handle_matrix_request(result.data)
+
+
+async def _collect_ndjson(response: StreamingResponse, emit: EmitItems) -> list[dict[str, Any]]:
+    """Drain a streaming NDJSON response, emitting its lines as they arrive."""
+    items: list[dict[str, Any]] = []
+    buffer = b""
+    async for chunk in response.body_iterator:
+        buffer += chunk if isinstance(chunk, bytes) else str(chunk).encode()
+        *lines, buffer = buffer.split(b"\n")
+        batch = [json.loads(line) for line in lines if line]
+        items.extend(batch)
+        await emit(batch)
+    return items
+
+
+def _ordered_without_index(items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    return [
+        {k: v for k, v in item.items() if k != "index"}
+        for item in sorted(items, key=lambda item: item["index"])
+    ]
+
+
+async def _run_job(kind: str, request: dict[str, Any], emit: EmitItems, client: str) -> Any:
+    """Execute a stored POST /jobs body with the same handlers as the endpoints.
+
+    Batch and series jobs run in streaming mode, so each result is emitted
+    (and stored) as it resolves; the final result has the endpoint's shape.
+    Jobs are background work, so their lookups run at low priority.  They run
+    as the client that submitted them, which is charged for their compute
+    time and shares the fair queue with them; admission control and client
+    limits were applied on submission, so an accepted job is not shed.
+    """
+    _request_priority.set(PRIORITY_LOW)
+    # Jobs stored before jobs recorded their client share one
+    _request_client.set(client or "jobs")
+    _admission_exempt.set(True)
+    parsed = parse_job_body(request)
+    if isinstance(parsed, ParseError):
+        raise JobFailedError(400, parsed.error)
+    response: Any
+    if parsed.kind == "price":
+        response = await _resolve_and_dispatch_price(parsed.data, force=parsed.force)
+    elif parsed.kind == "batch":
+        response = await _handle_batch_request(cast("BatchParams", parsed.data), stream=True)
+    else:
+        response = await _handle_series_request(cast("SeriesParams", parsed.data), stream=True)
+
+    if isinstance(response, JSONResponse):
+        raise JobFailedError(response.status_code, json.loads(bytes(response.body))["error"])
+    if not isinstance(response, StreamingResponse):
+        return response
+    items = _ordered_without_index(await _collect_ndjson(response, emit))
+    if parsed.kind == "batch":
+        return items
+    return {"token": cast("SeriesParams", parsed.data).token, "chain": CHAIN_NAME, "points": items}
+
+
+_jobs = JobRunner(
+    _run_job, workers=JOB_WORKERS, max_queued=MAX_QUEUED_JOBS, retention=JOB_RETENTION
+)
+
+
+def _job_view(job: Job) -> dict[str, Any]:
+    """A job's status fields, plus its error when it failed."""
+    view: dict[str, Any] = {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if job.error is not None:
+        view["error"] = job.error
+        view["error_status"] = job.error_status
+    return view
+
+
+async def _stream_job(job_id: str, after: int) -> AsyncIterator[bytes]:
+    """Yield a job's partial results as NDJSON while it runs, then its final status line.
+
+    The final line is the job view; for price jobs it carries the ``result``.
+    """
+    seq = after
+    while True:
+        job = await _jobs.get(job_id)
+        if job is None:
+            return
+        items = await _jobs.items(job_id, seq)
+        for item in items:
+            yield _ndjson_line(item)
+        seq += len(items)
+        if job.finished:
+            final = _job_view(job)
+            if job.kind == "price" and job.status == DONE:
+                final["result"] = job.result
+            yield _ndjson_line(final)
+            return
+        await _jobs.wait_for_progress(job_id, JOB_STREAM_POLL_INTERVAL)
+
+
+@app.post(
+    "/jobs",
+    status_code=202,
+    description="Queue a long-running lookup and return its job id immediately. "
+    "The JSON body has `kind` (`price`, `batch` or `series`) plus that endpoint's "
+    "parameters: /price query parameters, the POST /prices body, or /price_series query "
+    "parameters. Poll `GET /jobs/{id}` for the result. Jobs are stored on disk and survive "
+    "a restart.",
+)
+async def submit_job(request: Request) -> Any:
+    try:
+        body = await request.json()
+    except ValueError:
+        return _make_error_response(400, "Request body must be valid JSON.")
+    parsed = parse_job_body(body)
+    if isinstance(parsed, ParseError):
+        return _make_error_response(400, parsed.error)
+    # Jobs are admitted like the low-priority requests they will run as
+    _request_priority.set(PRIORITY_LOW)
+    refused = _refuse_compute()
+    if refused is not None:
+        return refused
+    try:
+        job = await _jobs.submit(parsed.kind, body, client=_request_client.get())
+    except JobQueueFullError:
+        return _make_error_response(503, "Job queue is full, retry later.")
+    logger.info("job_submitted", job_id=job.id, kind=job.kind)
+    return JSONResponse(status_code=202, content=_job_view(job))
+
+
+@app.get(
+    "/jobs/{job_id}",
+    description="Status of a job from `POST /jobs`: `queued`, `running`, `done` (with "
+    "`result`, shaped like the endpoint's response) or `failed` (with `error` and "
+    "`error_status`). While a batch or series job runs, `items` holds the results resolved "
+    "so far (with their `index`), from position `after`. Send "
+    "`Accept: application/x-ndjson` to stream those results as they resolve, followed by "
+    "a final status line.",
+)
+async def get_job(
+    request: Request,
+    job_id: str,
+    after: int = Query(0, ge=0, description="Skip this many partial results"),
+) -> Any:
+    job = await _jobs.get(job_id)
+    if job is None:
+        return _make_error_response(404, f"Unknown job: {job_id}")
+    if _wants_ndjson(request):
+        return StreamingResponse(_stream_job(job_id, after), media_type=NDJSON_MEDIA_TYPE)
+    view = _job_view(job)
+    if job.status == DONE:
+        view["result"] = job.result
+    elif not job.finished and job.kind != "price":
+        items = await _jobs.items(job_id, after)
+        view["items"] = items
+        view["next"] = after + len(items)
+    return view
 
 
 @app.get(
@@ -1039,6 +2866,7 @@ async def check_bucket(
             from y import check_bucket as y_check_bucket
 
             bucket = await y_check_bucket(token, sync=False)
+            _cost_model.record_bucket(token, bucket)
             duration_ms = int((time.monotonic() - start) * 1000)
             check_bucket_requests_total.labels(chain=CHAIN_NAME, status="ok").inc()
             check_bucket_request_duration_seconds.labels(chain=CHAIN_NAME).observe(
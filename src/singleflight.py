@@ -0,0 +1,75 @@
+"""Coalesce concurrent identical async calls into one in-flight task."""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+
+from prometheus_client import Counter
+
+singleflight_calls_total = Counter(
+    "singleflight_calls_total",
+    "Calls through a single-flight group, by whether they started the work or joined it",
+    ["group", "role"],
+)
+
+
+class SingleFlight[V]:
+    """Run at most one call per key at a time; concurrent callers share its result.
+
+    The first caller for a key (the leader) starts ``fn()`` as a task; callers
+    arriving while it runs (followers) await the same task.  Every caller
+    awaits through :func:`asyncio.shield`, so a caller that is cancelled (e.g.
+    the client disconnected) stops waiting without cancelling the shared work,
+    which runs to completion for the others and for its side effects (cache
+    writes).  Only if every caller passed ``keep_running=False`` is the work
+    cancelled once the last of them stops waiting.  Results and exceptions are
+    delivered to every caller.  The key is released as soon as the task
+    finishes, so failures are not cached here.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Task[V]] = {}
+        # Callers still awaiting each task, and tasks some caller wants finished
+        self._callers: dict[asyncio.Task[V], int] = {}
+        self._kept: set[asyncio.Task[V]] = set()
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(
+        self, key: Hashable, fn: Callable[[], Awaitable[V]], keep_running: bool = True
+    ) -> V:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._release(key, t))
+            singleflight_calls_total.labels(group=self.name, role="leader").inc()
+        else:
+            singleflight_calls_total.labels(group=self.name, role="coalesced").inc()
+        if keep_running:
+            self._kept.add(task)
+        self._callers[task] = self._callers.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._leave(task)
+
+    def _leave(self, task: "asyncio.Task[V]") -> None:
+        self._callers[task] -= 1
+        if self._callers[task] > 0:
+            return
+        del self._callers[task]
+        if not task.done() and task not in self._kept:
+            task.cancel()
+
+    def _release(self, key: Hashable, task: "asyncio.Task[V]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        self._kept.discard(task)
+        # Mark the exception retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
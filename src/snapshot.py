@@ -0,0 +1,263 @@
+"""Compact, sorted snapshots of the price cache for seeding new replicas.
+
+A snapshot is a gzip stream holding a small JSON header followed by
+fixed-size records, one per cached price, sorted by ``(token, block)``::
+
+    SNAPSHOT_MAGIC | u32 header length | header JSON | record*
+
+    record = token (20 bytes) | block u64 | price f64 | block_timestamp i64
+             (big-endian, block_timestamp -1 when unknown)
+
+Only successful prices are exported; error entries are transient and are
+left out.  Export sorts with bounded memory (sorted runs spilled to temp
+files, then merged).  Import writes straight into diskcache in batched
+per-shard transactions, never overwrites an existing entry, and records its
+progress in the cache directory so an interrupted import resumes where it
+stopped and a completed one is a no-op.
+"""
+
+import gzip
+import heapq
+import itertools
+import json
+import os
+import struct
+import tempfile
+from collections.abc import Callable, Iterator
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from typing import BinaryIO, cast
+
+from src import cache as price_cache
+from src.logger import get_logger
+
+logger = get_logger("snapshot")
+
+SNAPSHOT_MAGIC = b"YPMSNAP1"
+_HEADER_LENGTH = struct.Struct(">I")
+# Big-endian so that sorting packed records as bytes sorts by (token, block)
+_RECORD = struct.Struct(">20sQdq")
+_NO_TIMESTAMP = -1
+# Records held in memory per sorted run during export
+_SORT_RUN_SIZE = 1_000_000
+_PROGRESS_FILE = ".snapshot-import.json"
+
+
+class SnapshotError(Exception):
+    """Raised for unreadable or mismatched snapshot files."""
+
+
+@dataclass
+class SnapshotHeader:
+    chain: str
+    created_at: str
+    count: int
+
+    @property
+    def identity(self) -> str:
+        return f"{self.chain}:{self.created_at}:{self.count}"
+
+
+@dataclass
+class ImportResult:
+    imported: int
+    existing: int
+    resumed_from: int
+
+
+def _pack_record(key: str, entry: dict[str, object]) -> bytes | None:
+    """Pack one cache entry, or None if it isn't a price for an address key."""
+    token, _, block = key.rpartition(":")
+    price = entry.get("price")
+    if not (token.startswith("0x") and len(token) == 42) or not isinstance(price, (int, float)):
+        return None
+    try:
+        token_bytes = bytes.fromhex(token[2:])
+        block_number = int(block)
+    except ValueError:
+        return None
+    block_timestamp = entry.get("block_timestamp")
+    return _RECORD.pack(
+        token_bytes,
+        block_number,
+        float(price),
+        block_timestamp if isinstance(block_timestamp, int) else _NO_TIMESTAMP,
+    )
+
+
+def _unpack_record(record: bytes) -> tuple[str, int, float, int | None]:
+    token_bytes, block, price, block_timestamp = _RECORD.unpack(record)
+    return (
+        "0x" + token_bytes.hex(),
+        block,
+        price,
+        None if block_timestamp == _NO_TIMESTAMP else block_timestamp,
+    )
+
+
+def _read_records(f: BinaryIO) -> Iterator[bytes]:
+    while record := f.read(_RECORD.size):
+        if len(record) != _RECORD.size:
+            raise SnapshotError("truncated snapshot record")
+        yield record
+
+
+def _spill_run(run: list[bytes], directory: str) -> str:
+    run.sort()
+    fd, path = tempfile.mkstemp(prefix="run-", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"".join(run))
+    run.clear()
+    return path
+
+
+def export_snapshot(
+    path: str, chain: str, progress: Callable[[int], None] | None = None
+) -> SnapshotHeader:
+    """Write every cached price to a snapshot file at ``path``.
+
+    The file is written under a temporary name and renamed into place, so a
+    failed export never leaves a partial snapshot behind.  ``progress`` is
+    called with the number of entries scanned so far, every sorted run.
+    """
+    cache = price_cache.get_cache()
+    with tempfile.TemporaryDirectory(prefix="snapshot-", dir=os.path.dirname(path) or ".") as tmp:
+        runs: list[str] = []
+        run: list[bytes] = []
+        scanned = count = 0
+        for key in cache:
+            scanned += 1
+            entry = cache.get(key)
+            if not isinstance(key, str) or not isinstance(entry, dict):
+                continue
+            record = _pack_record(key, cast(dict[str, object], entry))
+            if record is None:
+                continue
+            run.append(record)
+            count += 1
+            if len(run) >= _SORT_RUN_SIZE:
+                runs.append(_spill_run(run, tmp))
+                if progress is not None:
+                    progress(scanned)
+        runs.append(_spill_run(run, tmp))
+
+        header = SnapshotHeader(chain=chain, created_at=datetime.now(UTC).isoformat(), count=count)
+        header_bytes = json.dumps(asdict(header)).encode()
+        partial = f"{path}.partial"
+        with ExitStack() as stack:
+            files = [stack.enter_context(open(run_path, "rb")) for run_path in runs]
+            out = stack.enter_context(gzip.open(partial, "wb", compresslevel=6))
+            out.write(SNAPSHOT_MAGIC + _HEADER_LENGTH.pack(len(header_bytes)) + header_bytes)
+            for record in heapq.merge(*(_read_records(f) for f in files)):
+                out.write(record)
+        os.replace(partial, path)
+    logger.info("snapshot_exported", path=path, chain=chain, count=count, scanned=scanned)
+    return header
+
+
+def _read_header(f: BinaryIO) -> SnapshotHeader:
+    if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        raise SnapshotError("not a price cache snapshot")
+    (length,) = _HEADER_LENGTH.unpack(f.read(_HEADER_LENGTH.size))
+    try:
+        return SnapshotHeader(**json.loads(f.read(length)))
+    except (TypeError, ValueError) as e:
+        raise SnapshotError(f"invalid snapshot header: {e}") from e
+
+
+def read_snapshot_header(path: str) -> SnapshotHeader:
+    with gzip.open(path, "rb") as f:
+        return _read_header(cast(BinaryIO, f))
+
+
+def iter_snapshot(path: str) -> Iterator[tuple[str, int, float, int | None]]:
+    """Yield ``(token, block, price, block_timestamp)`` from a snapshot, in order."""
+    with gzip.open(path, "rb") as f:
+        _read_header(cast(BinaryIO, f))
+        for record in _read_records(cast(BinaryIO, f)):
+            yield _unpack_record(record)
+
+
+def _progress_path() -> str:
+    return os.path.join(price_cache.CACHE_DIR, _PROGRESS_FILE)
+
+
+def _load_progress(identity: str) -> tuple[int, bool]:
+    """Records already imported from this snapshot, and whether it finished."""
+    try:
+        with open(_progress_path()) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return 0, False
+    if state.get("snapshot") != identity:
+        return 0, False
+    return int(state.get("records", 0)), bool(state.get("complete", False))
+
+
+def _save_progress(identity: str, records: int, complete: bool) -> None:
+    tmp = f"{_progress_path()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"snapshot": identity, "records": records, "complete": complete}, f)
+    os.replace(tmp, _progress_path())
+
+
+def _add_batch(cache: price_cache.PriceCache, batch: list[tuple[str, dict[str, object]]]) -> int:
+    """Add entries missing from the cache, one transaction per shard; returns how many."""
+    added = 0
+    for shard, positions in price_cache.shard_groups(cache, [key for key, _ in batch]):
+        with shard.transact():
+            for i in positions:
+                key, entry = batch[i]
+                added += bool(shard.add(key, entry))
+    return added
+
+
+def import_snapshot(
+    path: str,
+    chain: str | None = None,
+    batch_size: int = 10_000,
+    progress: Callable[[int, int], None] | None = None,
+) -> ImportResult:
+    """Load a snapshot into the price cache.
+
+    Entries already in the cache are kept as they are.  If ``chain`` is given
+    it must match the snapshot's chain.  ``progress`` is called with
+    ``(records done, total)`` after every batch.
+    """
+    header = read_snapshot_header(path)
+    if chain is not None and header.chain != chain:
+        raise SnapshotError(f"snapshot is for chain {header.chain!r}, not {chain!r}")
+    cache = price_cache.get_cache()
+    done, complete = _load_progress(header.identity)
+    if complete:
+        logger.info("snapshot_already_imported", path=path, count=header.count)
+        return ImportResult(imported=0, existing=0, resumed_from=done)
+    if done:
+        logger.info("snapshot_import_resumed", path=path, records=done, count=header.count)
+
+    result = ImportResult(imported=0, existing=0, resumed_from=done)
+    records = itertools.islice(iter_snapshot(path), done, None)
+    while batch := [
+        (
+            price_cache.make_key(token, block),
+            {"price": price, "cached_at": header.created_at, "block_timestamp": block_timestamp},
+        )
+        for token, block, price, block_timestamp in itertools.islice(records, batch_size)
+    ]:
+        added = _add_batch(cache, batch)
+        result.imported += added
+        result.existing += len(batch) - added
+        done += len(batch)
+        _save_progress(header.identity, done, complete=False)
+        if progress is not None:
+            progress(done, header.count)
+    _save_progress(header.identity, done, complete=True)
+    logger.info(
+        "snapshot_imported",
+        path=path,
+        imported=result.imported,
+        existing=result.existing,
+        count=header.count,
+    )
+    return result
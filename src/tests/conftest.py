@@ -2,6 +2,7 @@
 
 import json
 import sys
+from collections.abc import Generator
 from pathlib import Path
 from typing import Any
 from unittest.mock import MagicMock
@@ -57,6 +58,22 @@ def ensure_tokenlist_fixture() -> None:
         tokenlist_path.write_text(json.dumps(MINIMAL_TOKENLIST, indent=2))
 
 
+@pytest.fixture(autouse=True)
+def isolated_price_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Generator[None]:
+    """Give every test its own on-disk and in-memory price cache.
+
+    Without this, server tests share ``/data/cache`` and the process-wide
+    in-memory tier, so a price cached by one test leaks into the next.
+    """
+    import src.cache
+
+    monkeypatch.setattr(src.cache, "CACHE_DIR", str(tmp_path / "price-cache"))
+    monkeypatch.setattr(src.cache, "_cache", None)
+    monkeypatch.setattr(src.cache, "_hot", None)
+    yield
+    src.cache.close_cache()
+
+
 @pytest.fixture(autouse=True)
 def mock_y_module(monkeypatch: pytest.MonkeyPatch) -> None:
     """Mock the y module to avoid brownie network requirement during tests."""
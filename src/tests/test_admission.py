@@ -0,0 +1,65 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from src.admission import AdmissionController, Shed, load_shed_total
+from src.scheduler import DEFAULT, PRIORITIES, LaneScheduler
+
+
+def _shed_count(reason: str, status: int) -> float:
+    value: float = load_shed_total.labels(reason=reason, status=str(status))._value.get()
+    return value
+
+
+class TestAdmissionController:
+    def test_admits_below_limits(self) -> None:
+        controller = AdmissionController(LaneScheduler({DEFAULT: 4}), 10, 5.0)
+        assert controller.check(PRIORITIES["normal"]) is None
+        assert controller.check(PRIORITIES["low"]) is None
+
+    def test_sheds_past_in_flight_limit(self) -> None:
+        scheduler = LaneScheduler({DEFAULT: 4}, initial_service_time=2.0)
+        controller = AdmissionController(scheduler, 10, 0)
+        before = _shed_count("in_flight", 503)
+        with patch.object(scheduler, "in_flight", return_value=12):
+            shed = controller.check(PRIORITIES["high"])
+        # 12 lookups at 2s each over 4 slots drain in 6s
+        assert shed == Shed(status=503, reason="in_flight", retry_after=6)
+        assert _shed_count("in_flight", 503) == before + 1
+
+    def test_sheds_low_priority_first_with_429(self) -> None:
+        scheduler = LaneScheduler({DEFAULT: 4})
+        controller = AdmissionController(scheduler, 0, 10.0)
+        with patch.object(scheduler, "longest_wait", return_value=6.5):
+            assert controller.check(PRIORITIES["normal"]) is None
+            shed = controller.check(PRIORITIES["low"])
+        assert shed == Shed(status=429, reason="queue_wait", retry_after=7)
+
+    def test_retry_after_is_capped(self) -> None:
+        scheduler = LaneScheduler({DEFAULT: 1}, initial_service_time=30.0)
+        controller = AdmissionController(scheduler, 5, 0, max_retry_after=60)
+        with patch.object(scheduler, "in_flight", return_value=100):
+            shed = controller.check(PRIORITIES["normal"])
+        assert shed is not None
+        assert shed.retry_after == 60
+
+    @pytest.mark.asyncio
+    async def test_reads_load_from_scheduler(self) -> None:
+        scheduler = LaneScheduler({DEFAULT: 1})
+        controller = AdmissionController(scheduler, 3, 0)
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with scheduler.slot(DEFAULT):
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold()) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert scheduler.in_flight() == 3
+        assert scheduler.longest_wait() > 0
+        shed = controller.check(PRIORITIES["normal"])
+        release.set()
+        await asyncio.gather(*tasks)
+        assert shed is not None and shed.reason == "in_flight"
+        assert controller.check(PRIORITIES["normal"]) is None
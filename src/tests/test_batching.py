@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from src.batching import MicroBatcher
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.calls: list[tuple[int, list[str]]] = []
+
+    async def dispatch(self, key: int, items: list[str]) -> list[str]:
+        self.calls.append((key, list(items)))
+        await asyncio.sleep(0)
+        return [f"{key}:{item}" for item in items]
+
+
+class TestMicroBatcher:
+    @pytest.mark.asyncio
+    async def test_concurrent_items_share_one_dispatch(self) -> None:
+        recorder = _Recorder()
+        batcher: MicroBatcher[int, str, str] = MicroBatcher(
+            "test", recorder.dispatch, window=0.01, max_size=100
+        )
+        results = await asyncio.gather(*(batcher.submit(1, t) for t in ("a", "b", "c")))
+        assert results == ["1:a", "1:b", "1:c"]
+        assert recorder.calls == [(1, ["a", "b", "c"])]
+
+    @pytest.mark.asyncio
+    async def test_keys_are_batched_separately(self) -> None:
+        recorder = _Recorder()
+        batcher: MicroBatcher[int, str, str] = MicroBatcher(
+            "test", recorder.dispatch, window=0.01, max_size=100
+        )
+        results = await asyncio.gather(batcher.submit(1, "a"), batcher.submit(2, "a"))
+        assert list(results) == ["1:a", "2:a"]
+        assert sorted(recorder.calls) == [(1, ["a"]), (2, ["a"])]
+
+    @pytest.mark.asyncio
+    async def test_flushes_at_max_size_without_waiting_for_window(self) -> None:
+        recorder = _Recorder()
+        batcher: MicroBatcher[int, str, str] = MicroBatcher(
+            "test", recorder.dispatch, window=60, max_size=2
+        )
+        results = await asyncio.wait_for(
+            asyncio.gather(batcher.submit(1, "a"), batcher.submit(1, "b")), timeout=1
+        )
+        assert list(results) == ["1:a", "1:b"]
+
+    @pytest.mark.asyncio
+    async def test_dispatch_error_reaches_every_caller(self) -> None:
+        async def failing(key: int, items: list[str]) -> list[str]:
+            raise RuntimeError("rpc down")
+
+        batcher: MicroBatcher[int, str, str] = MicroBatcher(
+            "test", failing, window=0.01, max_size=100
+        )
+        results = await asyncio.gather(
+            batcher.submit(1, "a"), batcher.submit(1, "b"), return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    @pytest.mark.asyncio
+    async def test_result_count_mismatch_is_an_error(self) -> None:
+        async def short(key: int, items: list[str]) -> list[str]:
+            return []
+
+        batcher: MicroBatcher[int, str, str] = MicroBatcher(
+            "test", short, window=0.01, max_size=100
+        )
+        with pytest.raises(RuntimeError, match="returned 0 results"):
+            await batcher.submit(1, "a")
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_break_the_batch(self) -> None:
+        recorder = _Recorder()
+        batcher: MicroBatcher[int, str, str] = MicroBatcher(
+            "test", recorder.dispatch, window=0.01, max_size=100
+        )
+        cancelled = asyncio.create_task(batcher.submit(1, "a"))
+        kept = asyncio.create_task(batcher.submit(1, "b"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        assert await kept == "1:b"
+        assert recorder.calls == [(1, ["a", "b"])]
@@ -1,23 +1,65 @@
+import asyncio
+import threading
+import time
 from collections.abc import Generator
+from datetime import datetime
 from pathlib import Path
+from typing import Any
 from unittest.mock import patch
 
+import diskcache
 import pytest
 
 from src.cache import (
+    ERROR_CACHE_TTL,
+    CacheErrorHit,
+    CacheHit,
+    CacheMiss,
+    PriceDisk,
+    _HotCache,
+    _read_entry,
+    cache_evicted_entries_total,
+    cache_io_queue_depth,
+    cache_layout,
+    close_cache,
+    enforce_size_limit,
+    final_provisional_blocks,
+    get_cache,
     get_cached_error,
     get_cached_errors,
     get_cached_price,
+    get_cached_prices_many,
+    get_hot_cache,
+    hot_cache_evictions_total,
+    hot_cache_lookups_total,
+    is_packed_value,
+    is_provisional,
+    lookup_cached,
+    lookup_cached_blocks,
+    lookup_cached_grid,
+    lookup_cached_many,
     make_key,
+    open_cache,
+    peek_cached,
+    promote_provisional,
+    run_cache_io,
     set_cached_error,
+    set_cached_errors_many,
     set_cached_price,
+    set_cached_prices_many,
+    set_chain_head,
+    set_provisional_block_hash,
 )
 
 
 @pytest.fixture(autouse=True)
 def isolated_cache(tmp_path: Path) -> Generator[None]:
     """Each test gets a fresh cache in a temp directory."""
-    with patch("src.cache.CACHE_DIR", str(tmp_path)), patch("src.cache._cache", None):
+    with (
+        patch("src.cache.CACHE_DIR", str(tmp_path)),
+        patch("src.cache._cache", None),
+        patch("src.cache._hot", None),
+    ):
         yield
 
 
@@ -112,6 +154,116 @@ class TestBlockTimestampInCache:
             assert result.get("block_timestamp") is None
 
 
+class TestLookupCached:
+    """Tests for the single-read tagged lookup."""
+
+    def test_miss(self) -> None:
+        assert isinstance(lookup_cached("0xtoken", 1), CacheMiss)
+
+    def test_price_hit(self) -> None:
+        set_cached_price("0xToken", 1, 3.5, block_timestamp=1700000000)
+        result = lookup_cached("0xtoken", 1)
+        assert isinstance(result, CacheHit)
+        assert result.entry["price"] == 3.5
+        assert result.entry["block_timestamp"] == 1700000000
+
+    def test_error_hit(self) -> None:
+        set_cached_error("0xtoken", 1, "no price")
+        result = lookup_cached("0xtoken", 1)
+        assert isinstance(result, CacheErrorHit)
+        assert result.entry["error"] == "no price"
+
+    def test_single_disk_read(self) -> None:
+        set_cached_error("0xtoken", 1, "no price")
+        with patch("src.cache._read_entry", wraps=_read_entry) as r:
+            lookup_cached("0xtoken", 1)
+        assert r.call_count == 1
+
+    def test_read_error_is_a_miss(self) -> None:
+        with (
+            patch("src.cache.HOT_CACHE_MAXSIZE", 0),
+            patch("src.cache.get_cache", side_effect=RuntimeError("disk full")),
+        ):
+            assert isinstance(lookup_cached("0xtoken", 1), CacheMiss)
+
+
+class TestBulkCacheOps:
+    """Tests for get_cached_prices_many / set_cached_prices_many."""
+
+    def test_set_many_then_get_many_preserves_order(self) -> None:
+        set_cached_prices_many([("0xa", 10, 1.0, 100), ("0xb", 10, 2.0, 100)])
+        results = get_cached_prices_many(["0xb", "0xmissing", "0xa"], 10)
+        assert results[0] is not None and results[0]["price"] == 2.0
+        assert results[1] is None
+        assert results[2] is not None and results[2]["price"] == 1.0
+        assert results[2]["block_timestamp"] == 100
+
+    def test_entries_readable_individually(self) -> None:
+        set_cached_prices_many([("0xA", 10, 1.5, None)])
+        result = get_cached_price("0xa", 10)
+        assert result is not None
+        assert result["price"] == 1.5
+        assert "cached_at" in result
+
+    def test_lookup_many_tags_errors(self) -> None:
+        set_cached_error("0xerr", 10, "nope")
+        set_cached_price("0xok", 10, 1.0)
+        results = lookup_cached_many(["0xerr", "0xok", "0xnone"], 10)
+        assert isinstance(results[0], CacheErrorHit)
+        assert isinstance(results[1], CacheHit)
+        assert isinstance(results[2], CacheMiss)
+
+    def test_lookup_blocks_for_one_token(self) -> None:
+        set_cached_price("0xa", 10, 1.0)
+        set_cached_error("0xa", 20, "nope")
+        results = lookup_cached_blocks("0xA", [20, 30, 10])
+        assert isinstance(results[0], CacheErrorHit)
+        assert isinstance(results[1], CacheMiss)
+        assert isinstance(results[2], CacheHit)
+        assert results[2].entry["price"] == 1.0
+
+    def test_lookup_grid_is_block_major(self) -> None:
+        set_cached_price("0xa", 20, 1.0)
+        set_cached_price("0xb", 10, 2.0)
+        results = lookup_cached_grid(["0xa", "0xb"], [10, 20])
+        assert [type(r) for r in results] == [CacheMiss, CacheHit, CacheHit, CacheMiss]
+        assert isinstance(results[1], CacheHit) and results[1].entry["price"] == 2.0
+
+    def test_disk_reads_share_one_transaction(self) -> None:
+        set_cached_prices_many([(f"0x{i}", 10, float(i), None) for i in range(5)])
+        with patch("src.cache.HOT_CACHE_MAXSIZE", 0):
+            cache = get_cache()
+            with patch.object(cache, "transact", wraps=cache.transact) as transact:
+                results = get_cached_prices_many([f"0x{i}" for i in range(5)], 10)
+        assert transact.call_count == 1
+        assert [r["price"] for r in results if r is not None] == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+    def test_memory_hits_skip_disk(self) -> None:
+        set_cached_prices_many([("0xa", 10, 1.0, None)])
+        with patch("src.cache.get_cache", side_effect=AssertionError("disk read")):
+            results = get_cached_prices_many(["0xa"], 10)
+        assert results[0] is not None
+
+    def test_read_failure_returns_misses(self) -> None:
+        with (
+            patch("src.cache.HOT_CACHE_MAXSIZE", 0),
+            patch("src.cache.get_cache", side_effect=RuntimeError("disk full")),
+        ):
+            assert get_cached_prices_many(["0xa", "0xb"], 10) == [None, None]
+
+    def test_write_failure_does_not_raise(self) -> None:
+        with patch("src.cache.get_cache", side_effect=RuntimeError("disk full")):
+            set_cached_prices_many([("0xa", 10, 1.0, None)])  # must not raise
+
+    def test_set_errors_many_tagged_and_expiring(self) -> None:
+        set_cached_errors_many([("0xa", 10, "no route"), ("0xb", 10, "no pool")])
+        results = lookup_cached_many(["0xa", "0xb"], 10)
+        assert all(isinstance(r, CacheErrorHit) for r in results)
+        assert [(t, b) for t, b, _ in get_cached_errors()] == [("0xa", 10), ("0xb", 10)]
+        with patch("src.cache.time.time", return_value=time.time() + ERROR_CACHE_TTL + 1):
+            assert get_cache().get(make_key("0xa", 10)) is None
+
+
 class TestGetCachedError:
     """Tests for error entry reads."""
 
@@ -199,3 +351,474 @@ class TestGetCachedErrors:
         assert token == "0xtoken"
         assert block == 77
         assert entry["error"] == "test error message"
+
+    def test_ordered_by_block_then_token(self) -> None:
+        set_cached_error("0xb", 1000, "e")
+        set_cached_error("0xa", 1000, "e")
+        set_cached_error("0xc", 99, "e")
+        results = [(t, b) for t, b, _ in get_cached_errors()]
+        assert results == [("0xc", 99), ("0xa", 1000), ("0xb", 1000)]
+
+    def test_resumes_after_cursor(self) -> None:
+        for block in range(5):
+            set_cached_error("0xtoken", block, "e")
+        results = [b for _, b, _ in get_cached_errors(after=(2, "0xtoken"))]
+        assert results == [3, 4]
+
+    def test_pages_larger_than_one_query(self) -> None:
+        with patch("src.cache._ERROR_PAGE_SIZE", 3):
+            for block in range(10):
+                set_cached_error("0xtoken", block, "e")
+            results = [b for _, b, _ in get_cached_errors()]
+        assert results == list(range(10))
+
+    def test_overwritten_by_price_drops_out(self) -> None:
+        set_cached_error("0xtoken", 1, "e")
+        set_cached_error("0xbulk", 1, "e")
+        set_cached_price("0xtoken", 1, 1.0)
+        set_cached_prices_many([("0xbulk", 1, 2.0, None)])
+        assert list(get_cached_errors()) == []
+
+    def test_expired_errors_are_skipped(self) -> None:
+        with patch("src.cache.ERROR_CACHE_TTL", 1):
+            set_cached_error("0xtoken", 1, "e")
+        with patch("src.cache.time.time", return_value=time.time() + 5):
+            assert list(get_cached_errors()) == []
+
+    def test_does_not_decode_price_entries(self) -> None:
+        set_cached_prices_many((f"0x{i:040x}", 1, 1.0, None) for i in range(100))
+        set_cached_error("0xerr", 1, "fail")
+        with patch.object(PriceDisk, "fetch", autospec=True, side_effect=PriceDisk.fetch) as fetch:
+            results = list(get_cached_errors())
+        assert [t for t, _, _ in results] == ["0xerr"]
+        assert fetch.call_count == 1
+
+
+class TestHotCache:
+    """Tests for the in-process LRU tier in front of diskcache."""
+
+    def test_hit_served_without_disk_read(self) -> None:
+        set_cached_price("0xtoken", 1, 5.0, block_timestamp=1700000000)
+        with patch("src.cache.get_cache", side_effect=RuntimeError("disk gone")):
+            result = get_cached_price("0xtoken", 1)
+        assert result is not None
+        assert result["price"] == 5.0
+        assert result["block_timestamp"] == 1700000000
+
+    def test_disk_hit_is_promoted(self) -> None:
+        set_cached_price("0xtoken", 1, 5.0)
+        hot = get_hot_cache()
+        assert hot is not None
+        hot._entries.clear()
+        assert get_cached_price("0xtoken", 1) is not None  # read-through from disk
+        with patch("src.cache.get_cache", side_effect=RuntimeError("disk gone")):
+            assert get_cached_price("0xtoken", 1) is not None
+
+    def test_returned_entry_is_a_copy(self) -> None:
+        set_cached_price("0xtoken", 1, 5.0)
+        first = get_cached_price("0xtoken", 1)
+        assert first is not None
+        first["price"] = 0.0
+        second = get_cached_price("0xtoken", 1)
+        assert second is not None
+        assert second["price"] == 5.0
+
+    def test_error_entry_expires_in_memory(self) -> None:
+        with patch("src.cache.ERROR_CACHE_TTL", 60):
+            set_cached_error("0xtoken", 1, "boom")
+        assert get_cached_error("0xtoken", 1) is not None
+        with (
+            patch("src.cache.time.time", return_value=time.time() + 61),
+            patch("src.cache.get_cache") as mock_get_cache,
+        ):
+            mock_get_cache.return_value.get.return_value = (None, None)
+            assert get_cached_error("0xtoken", 1) is None
+
+    def test_disabled_when_maxsize_zero(self) -> None:
+        with patch("src.cache.HOT_CACHE_MAXSIZE", 0):
+            assert get_hot_cache() is None
+            set_cached_price("0xtoken", 1, 5.0)
+            assert get_cached_price("0xtoken", 1) is not None
+
+    def test_lru_evicts_oldest_by_count(self) -> None:
+        hot = _HotCache(maxsize=2, max_bytes=1 << 20)
+        hot.set("a", {"price": 1.0})
+        hot.set("b", {"price": 2.0})
+        hot.get("a")  # "a" becomes most recently used
+        hot.set("c", {"price": 3.0})
+        assert hot.get("b") is None
+        assert hot.get("a") is not None
+        assert hot.get("c") is not None
+
+    def test_byte_limit_bounds_size(self) -> None:
+        hot = _HotCache(maxsize=1000, max_bytes=2000)
+        for i in range(100):
+            hot.set(f"key{i}", {"price": float(i), "cached_at": "2024-01-01T00:00:00+00:00"})
+        assert 0 < len(hot) < 100
+        assert hot._bytes <= 2000
+
+    def test_counters_track_hits_misses_evictions(self) -> None:
+        def sample(counter: Any, **labels: str) -> float:
+            return float(counter.labels(**labels)._value.get())
+
+        hits = sample(hot_cache_lookups_total, result="hit")
+        misses = sample(hot_cache_lookups_total, result="miss")
+        evictions = sample(hot_cache_evictions_total, reason="capacity")
+
+        hot = _HotCache(maxsize=1, max_bytes=1 << 20)
+        hot.get("a")
+        hot.set("a", {"price": 1.0})
+        hot.get("a")
+        hot.set("b", {"price": 2.0})
+
+        assert sample(hot_cache_lookups_total, result="hit") == hits + 1
+        assert sample(hot_cache_lookups_total, result="miss") == misses + 1
+        assert sample(hot_cache_evictions_total, reason="capacity") == evictions + 1
+
+
+class TestPeekCached:
+    """Tests for the memory-only lookup used on the event loop."""
+
+    def test_none_when_not_in_memory(self) -> None:
+        assert peek_cached("0xtoken", 1) is None
+
+    def test_hit_after_write(self) -> None:
+        set_cached_price("0xtoken", 1, 2.0)
+        result = peek_cached("0xtoken", 1)
+        assert isinstance(result, CacheHit)
+        assert result.entry["price"] == 2.0
+
+    def test_error_hit_after_write(self) -> None:
+        set_cached_error("0xtoken", 1, "nope")
+        assert isinstance(peek_cached("0xtoken", 1), CacheErrorHit)
+
+    def test_never_reads_disk(self) -> None:
+        with patch("src.cache.get_cache", side_effect=AssertionError("disk read")):
+            assert peek_cached("0xtoken", 1) is None
+
+
+class TestRunCacheIo:
+    """Tests for the async cache I/O facade."""
+
+    @pytest.mark.asyncio
+    async def test_runs_off_the_event_loop_thread(self) -> None:
+        thread_name = await run_cache_io(lambda: threading.current_thread().name)
+        assert thread_name.startswith("cache-io")
+
+    @pytest.mark.asyncio
+    async def test_round_trip_through_pool(self) -> None:
+        await run_cache_io(set_cached_price, "0xtoken", 1, 7.0, block_timestamp=1700000000)
+        result = await run_cache_io(lookup_cached, "0xtoken", 1)
+        assert isinstance(result, CacheHit)
+        assert result.entry["price"] == 7.0
+
+    @pytest.mark.asyncio
+    async def test_queue_depth_returns_to_baseline(self) -> None:
+        before = cache_io_queue_depth._value.get()
+        await asyncio.gather(*(run_cache_io(lookup_cached, "0xtoken", i) for i in range(20)))
+        assert cache_io_queue_depth._value.get() == before
+
+    @pytest.mark.asyncio
+    async def test_exceptions_propagate(self) -> None:
+        def boom() -> None:
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError, match="boom"):
+            await run_cache_io(boom)
+        assert cache_io_queue_depth._value.get() == 0
+
+
+class TestPriceDisk:
+    """Tests for the packed binary value encoding."""
+
+    def _raw(self, token: str, block: int) -> Any:
+        get_cache()  # make sure the cache exists before reading raw values
+        return get_cache().get(make_key(token, block), read=True)
+
+    def test_price_entry_round_trips(self) -> None:
+        set_cached_price("0xtoken", 1, 1234.5678, block_timestamp=1700000000)
+        stored = get_cache().get(make_key("0xtoken", 1))
+        assert stored["price"] == 1234.5678
+        assert stored["block_timestamp"] == 1700000000
+        assert datetime.fromisoformat(stored["cached_at"]).tzinfo is not None
+        assert is_packed_value(self._raw("0xtoken", 1))
+
+    def test_missing_block_timestamp_round_trips_as_none(self) -> None:
+        set_cached_price("0xtoken", 1, 2.0)
+        assert get_cache().get(make_key("0xtoken", 1))["block_timestamp"] is None
+
+    def test_zero_block_timestamp_is_not_none(self) -> None:
+        set_cached_price("0xtoken", 1, 2.0, block_timestamp=0)
+        assert get_cache().get(make_key("0xtoken", 1))["block_timestamp"] == 0
+
+    def test_error_entry_round_trips(self) -> None:
+        set_cached_error("0xtoken", 1, "no route ✗")
+        stored = get_cache().get(make_key("0xtoken", 1))
+        assert stored["error"] == "no route ✗"
+        assert stored["block_timestamp"] is None
+        assert "price" not in stored
+        assert is_packed_value(self._raw("0xtoken", 1))
+
+    def test_packed_entry_is_smaller_than_json(self, tmp_path: Path) -> None:
+        entry = {
+            "price": 1234.5678,
+            "cached_at": "2026-01-01T00:00:00.123456+00:00",
+            "block_timestamp": 1700000000,
+        }
+        legacy = diskcache.Cache(str(tmp_path / "legacy"), disk=diskcache.JSONDisk)
+        packed = diskcache.Cache(str(tmp_path / "packed"), disk=PriceDisk)
+        legacy.set("k", entry)
+        packed.set("k", entry)
+        assert len(packed.get("k", read=True)) < len(legacy.get("k", read=True))
+        assert packed.get("k") == entry
+        legacy.close()
+        packed.close()
+
+    def test_reads_legacy_json_entries(self, tmp_path: Path) -> None:
+        """Entries written by the old JSONDisk cache are still readable."""
+        cache_dir = str(tmp_path / "mixed")
+        legacy = diskcache.Cache(cache_dir, disk=diskcache.JSONDisk)
+        legacy_entry = {
+            "price": 3.0,
+            "cached_at": "2025-01-01T00:00:00+00:00",
+            "block_timestamp": None,
+        }
+        legacy.set(make_key("0xtoken", 1), legacy_entry)
+        legacy.close()
+        with patch("src.cache.CACHE_DIR", cache_dir), patch("src.cache._cache", None):
+            try:
+                assert get_cached_price("0xtoken", 1) == legacy_entry
+                set_cached_price("0xother", 1, 4.0)
+                result = get_cached_price("0xother", 1)
+                assert result is not None
+                assert result["price"] == 4.0
+            finally:
+                close_cache()
+
+    def test_non_entry_values_fall_back_to_json(self) -> None:
+        cache = get_cache()
+        odd = {"price": "1.5", "cached_at": "x", "block_timestamp": None}
+        cache.set("odd", odd)
+        cache.set("list", [1, 2, 3])
+        assert cache.get("odd") == odd
+        assert cache.get("list") == [1, 2, 3]
+        assert not is_packed_value(cache.get("odd", read=True))
+
+    def test_naive_cached_at_falls_back_to_json(self) -> None:
+        cache = get_cache()
+        entry = {"price": 1.0, "cached_at": "2026-01-01T00:00:00", "block_timestamp": None}
+        cache.set("naive", entry)
+        assert cache.get("naive") == entry
+
+
+class TestShardedCache:
+    """Tests for the FanoutCache layout selected by CACHE_SHARDS."""
+
+    @pytest.fixture(autouse=True)
+    def sharded(self) -> Generator[None]:
+        with patch("src.cache.CACHE_SHARDS", 4), patch("src.cache.HOT_CACHE_MAXSIZE", 0):
+            yield
+        close_cache()
+
+    def test_get_cache_returns_fanout_cache(self, tmp_path: Path) -> None:
+        assert isinstance(get_cache(), diskcache.FanoutCache)
+        assert cache_layout(str(tmp_path)) == 4
+
+    def test_single_and_bulk_ops_round_trip(self) -> None:
+        set_cached_price("0xtoken", 1, 1.5, block_timestamp=1700000000)
+        set_cached_error("0xbad", 1, "no route")
+        tokens = [f"0x{i:040x}" for i in range(50)]
+        set_cached_prices_many((t, 1, float(i), None) for i, t in enumerate(tokens))
+
+        assert isinstance(lookup_cached("0xtoken", 1), CacheHit)
+        assert isinstance(lookup_cached("0xbad", 1), CacheErrorHit)
+        results = get_cached_prices_many([*tokens, "0xmissing"], 1)
+        assert [r["price"] if r else None for r in results] == [*map(float, range(50)), None]
+        assert [(t, b) for t, b, _ in get_cached_errors()] == [("0xbad", 1)]
+
+    def test_entries_spread_over_shards(self) -> None:
+        set_cached_prices_many((f"0x{i:040x}", 1, 1.0, None) for i in range(100))
+        shard_counts = [len(shard) for shard in get_cache()._shards]
+        assert sum(shard_counts) == 100
+        assert all(shard_counts)
+
+    def test_layout_mismatch_is_logged(self, tmp_path: Path) -> None:
+        open_cache(str(tmp_path), 1).close()
+        with patch("src.cache.logger") as mock_logger:
+            get_cache()
+        mock_logger.warning.assert_called_once()
+        assert mock_logger.warning.call_args.args[0] == "cache_layout_mismatch"
+
+
+class TestCacheLayout:
+    def test_empty_directory(self, tmp_path: Path) -> None:
+        assert cache_layout(str(tmp_path)) == 0
+
+    def test_single_database(self, tmp_path: Path) -> None:
+        open_cache(str(tmp_path), 1).close()
+        assert cache_layout(str(tmp_path)) == 1
+
+    @pytest.mark.parametrize(("configured", "expected"), [(1, 1), (4, 4), (8, 1)])
+    def test_both_layouts_prefer_configured(
+        self, tmp_path: Path, configured: int, expected: int
+    ) -> None:
+        open_cache(str(tmp_path), 1).close()
+        open_cache(str(tmp_path), 4).close()
+        with patch("src.cache.CACHE_SHARDS", configured):
+            assert cache_layout(str(tmp_path)) == expected
+
+
+class TestCacheSettings:
+    """Tests for the env-driven diskcache settings."""
+
+    def test_defaults(self) -> None:
+        cache = get_cache()
+        assert cache.size_limit == 2**30
+        assert cache.eviction_policy == "least-recently-stored"
+        assert cache.cull_limit == 0
+
+    def test_env_overrides(self) -> None:
+        with (
+            patch("src.cache.CACHE_SIZE_LIMIT", 10 * 2**20),
+            patch("src.cache.CACHE_EVICTION_POLICY", "lfu"),
+            patch("src.cache.CACHE_CULL_LIMIT", 10),
+        ):
+            cache = get_cache()
+        assert cache.size_limit == 10 * 2**20
+        assert cache.eviction_policy == "least-frequently-used"
+        assert cache.cull_limit == 10
+
+    def test_invalid_policy_raises(self) -> None:
+        with patch("src.cache.CACHE_EVICTION_POLICY", "random"), pytest.raises(ValueError):
+            get_cache()
+
+
+class TestEnforceSizeLimit:
+    """Tests for budget enforcement that evicts error entries before prices."""
+
+    @pytest.fixture(autouse=True)
+    def no_inline_cull(self) -> Generator[None]:
+        with patch("src.cache.CACHE_CULL_LIMIT", 0), patch("src.cache.HOT_CACHE_MAXSIZE", 0):
+            yield
+
+    def _fill(self) -> tuple[int, int]:
+        """Write 500 prices then 500 errors; return the volume after each."""
+        cache = get_cache()
+        set_cached_prices_many((f"0x{i:040x}", 1, float(i), None) for i in range(500))
+        prices_volume = cache.volume()
+        for i in range(500):
+            set_cached_error(f"0x{i:040x}", 2, "x" * 200)
+        return prices_volume, cache.volume()
+
+    def _counts(self) -> tuple[int, int]:
+        prices = sum(
+            r is not None for r in get_cached_prices_many([f"0x{i:040x}" for i in range(500)], 1)
+        )
+        return prices, len(list(get_cached_errors()))
+
+    def test_noop_under_limit(self) -> None:
+        self._fill()
+        enforce_size_limit()
+        assert self._counts() == (500, 500)
+
+    def test_errors_evicted_before_prices(self) -> None:
+        prices_volume, full_volume = self._fill()
+        get_cache().reset("size_limit", (prices_volume + full_volume) // 2)
+        before = cache_evicted_entries_total.labels(reason="error")._value.get()
+        enforce_size_limit()
+        prices, errors = self._counts()
+        assert prices == 500
+        assert errors < 500
+        assert cache_evicted_entries_total.labels(reason="error")._value.get() > before
+
+    def test_prices_culled_once_errors_are_gone(self) -> None:
+        prices_volume, _ = self._fill()
+        get_cache().reset("size_limit", prices_volume // 2)
+        enforce_size_limit()
+        prices, errors = self._counts()
+        assert errors == 0
+        assert prices < 500
+        assert get_cache().volume() <= prices_volume // 2
+
+
+class TestProvisionalTier:
+    """Tests for holding near-head prices in memory until their block is final."""
+
+    @pytest.fixture(autouse=True)
+    def confirmations(self) -> Generator[None]:
+        with patch("src.cache.FINALITY_CONFIRMATIONS", 64):
+            yield
+        close_cache()
+
+    def _on_disk(self, token: str, block: int) -> bool:
+        return get_cache().get(make_key(token, block)) is not None
+
+    def test_nothing_provisional_until_head_known(self) -> None:
+        assert not is_provisional(1000)
+        set_cached_price("0xtoken", 1000, 1.0)
+        assert self._on_disk("0xtoken", 1000)
+
+    def test_near_head_price_stays_in_memory(self) -> None:
+        set_chain_head(1000)
+        assert is_provisional(990)
+        assert not is_provisional(936)
+        set_cached_price("0xtoken", 990, 1.0)
+        set_cached_price("0xtoken", 900, 2.0)
+        assert isinstance(lookup_cached("0xtoken", 990), CacheHit)
+        assert isinstance(peek_cached("0xtoken", 990), CacheHit)
+        assert not self._on_disk("0xtoken", 990)
+        assert self._on_disk("0xtoken", 900)
+
+    def test_bulk_write_splits_provisional_rows(self) -> None:
+        set_chain_head(1000)
+        set_cached_prices_many([("0xa", 990, 1.0, None), ("0xb", 500, 2.0, None)])
+        assert not self._on_disk("0xa", 990)
+        assert self._on_disk("0xb", 500)
+        assert [r["price"] if r else None for r in get_cached_prices_many(["0xa"], 990)] == [1.0]
+
+    def test_head_never_moves_backwards(self) -> None:
+        set_chain_head(1000)
+        set_chain_head(10)
+        assert is_provisional(990)
+
+    def test_promotes_final_blocks_to_disk(self) -> None:
+        set_chain_head(1000)
+        set_cached_price("0xtoken", 990, 1.0, block_timestamp=1700000000)
+        set_chain_head(1100)
+        assert final_provisional_blocks() == [990]
+        promote_provisional({990: None})
+        assert self._on_disk("0xtoken", 990)
+        assert final_provisional_blocks() == []
+        result = lookup_cached("0xtoken", 990)
+        assert isinstance(result, CacheHit)
+        assert result.entry["block_timestamp"] == 1700000000
+
+    def test_reorged_block_is_dropped(self) -> None:
+        set_chain_head(1000)
+        set_provisional_block_hash(990, "0xaaa")
+        set_cached_price("0xtoken", 990, 1.0)
+        set_chain_head(1100)
+        promote_provisional({990: "0xbbb"})
+        assert not self._on_disk("0xtoken", 990)
+        assert isinstance(lookup_cached("0xtoken", 990), CacheMiss)
+
+    def test_matching_hash_is_promoted(self) -> None:
+        set_chain_head(1000)
+        set_provisional_block_hash(990, "0xaaa")
+        set_cached_price("0xtoken", 990, 1.0)
+        set_chain_head(1100)
+        promote_provisional({990: "0xaaa"})
+        assert self._on_disk("0xtoken", 990)
+
+    def test_full_tier_writes_through_to_disk(self) -> None:
+        set_chain_head(1000)
+        with patch("src.cache.PROVISIONAL_MAXSIZE", 1):
+            set_cached_price("0xa", 990, 1.0)
+            set_cached_price("0xb", 990, 2.0)
+        assert not self._on_disk("0xa", 990)
+        assert self._on_disk("0xb", 990)
+
+    def test_disabled_with_zero_confirmations(self) -> None:
+        set_chain_head(1000)
+        with patch("src.cache.FINALITY_CONFIRMATIONS", 0):
+            assert not is_provisional(1000)
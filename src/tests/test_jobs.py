@@ -0,0 +1,269 @@
+import asyncio
+import sqlite3
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+
+from src.jobs import (
+    DONE,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    EmitItems,
+    JobFailedError,
+    JobQueueFullError,
+    JobRunner,
+    JobStore,
+)
+
+
+@pytest.fixture
+def db_path(tmp_path: Path) -> str:
+    return str(tmp_path / "jobs" / "jobs.sqlite3")
+
+
+class TestJobStore:
+    def test_create_and_get(self, db_path: str) -> None:
+        store = JobStore(db_path)
+        job = store.create("price", {"kind": "price", "token": "0xa"})
+        loaded = store.get(job.id)
+        assert loaded is not None
+        assert loaded.status == QUEUED
+        assert loaded.request == {"kind": "price", "token": "0xa"}
+        assert store.get("missing") is None
+
+    def test_items_and_result(self, db_path: str) -> None:
+        store = JobStore(db_path)
+        job = store.create("batch", {})
+        store.mark_running(job.id)
+        store.append_items(job.id, 0, [{"index": 1}, {"index": 0}])
+        store.append_items(job.id, 2, [{"index": 2}])
+        assert store.items(job.id, after=1) == [{"index": 0}, {"index": 2}]
+        store.mark_done(job.id, [1, 2, 3])
+        loaded = store.get(job.id)
+        assert loaded is not None
+        assert (loaded.status, loaded.result) == (DONE, [1, 2, 3])
+        assert len(store.items(job.id)) == 3
+
+    def test_recover_requeues_interrupted_jobs(self, db_path: str) -> None:
+        store = JobStore(db_path)
+        first = store.create("batch", {})
+        second = store.create("price", {})
+        done = store.create("price", {})
+        store.mark_running(first.id)
+        store.append_items(first.id, 0, [{"index": 0}])
+        store.mark_done(done.id, {})
+        store.close()
+
+        reopened = JobStore(db_path)
+        assert reopened.recover() == [first.id, second.id]
+        loaded = reopened.get(first.id)
+        assert loaded is not None
+        assert loaded.status == QUEUED
+        assert reopened.items(first.id) == []
+
+    def test_purge_deletes_old_finished_jobs(self, db_path: str) -> None:
+        store = JobStore(db_path)
+        old = store.create("price", {})
+        pending = store.create("price", {})
+        store.mark_failed(old.id, "boom", 500)
+        store.append_items(old.id, 0, [1])
+        assert store.purge(finished_before=0) == 0
+        assert store.purge(finished_before=float("inf")) == 1
+        assert store.get(old.id) is None
+        assert store.items(old.id) == []
+        assert store.get(pending.id) is not None
+
+    def test_adds_client_column_to_older_files(self, db_path: str) -> None:
+        import os
+        import sqlite3
+
+        os.makedirs(os.path.dirname(db_path))
+        db = sqlite3.connect(db_path)
+        db.execute(
+            "CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, request TEXT NOT NULL, "
+            "status TEXT NOT NULL, created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+            "result TEXT, error TEXT, error_status INTEGER)"
+        )
+        db.execute(
+            "INSERT INTO jobs VALUES ('old', 'price', '{}', 'queued', 1, NULL, NULL, NULL, NULL, NULL)"
+        )
+        db.commit()
+        db.close()
+
+        store = JobStore(db_path)
+        old = store.get("old")
+        assert old is not None and old.client == ""
+        new = store.get(store.create("price", {}, client="ip:1.2.3.4").id)
+        assert new is not None and new.client == "ip:1.2.3.4"
+
+
+async def _wait_finished(runner: JobRunner, job_id: str) -> Any:
+    for _ in range(100):
+        job = await runner.get(job_id)
+        if job is not None and job.finished:
+            return job
+        await runner.wait_for_progress(job_id, 0.05)
+    raise AssertionError("job did not finish")
+
+
+class TestJobRunner:
+    @pytest.mark.asyncio
+    async def test_runs_jobs_and_stores_partial_results(self, db_path: str) -> None:
+        async def execute(kind: str, request: dict[str, Any], emit: EmitItems, client: str) -> Any:
+            await emit([{"index": 0}])
+            await emit([{"index": 1}])
+            return request["n"] * 2
+
+        runner = JobRunner(execute, workers=2, max_queued=10, retention=60)
+        await runner.start(db_path)
+        try:
+            job = await runner.submit("batch", {"n": 21})
+            finished = await _wait_finished(runner, job.id)
+            assert (finished.status, finished.result) == (DONE, 42)
+            assert await runner.items(job.id) == [{"index": 0}, {"index": 1}]
+        finally:
+            await runner.stop()
+
+    @pytest.mark.asyncio
+    async def test_failures_are_recorded(self, db_path: str) -> None:
+        async def execute(kind: str, request: dict[str, Any], emit: EmitItems, client: str) -> Any:
+            if kind == "price":
+                raise JobFailedError(404, "No price found")
+            raise RuntimeError("boom")
+
+        runner = JobRunner(execute, workers=1, max_queued=10, retention=60)
+        await runner.start(db_path)
+        try:
+            not_found = await runner.submit("price", {})
+            crashed = await runner.submit("batch", {})
+            first = await _wait_finished(runner, not_found.id)
+            second = await _wait_finished(runner, crashed.id)
+        finally:
+            await runner.stop()
+        assert (first.status, first.error, first.error_status) == (FAILED, "No price found", 404)
+        assert (second.status, second.error_status) == (FAILED, 500)
+
+    @pytest.mark.asyncio
+    async def test_crash_errors_are_sanitized(
+        self, db_path: str, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setenv("RPC_URL", "https://rpc.example/secret-key")
+
+        async def execute(kind: str, request: dict[str, Any], emit: EmitItems, client: str) -> Any:
+            raise RuntimeError("request to https://rpc.example/secret-key failed")
+
+        runner = JobRunner(execute, workers=1, max_queued=10, retention=60)
+        await runner.start(db_path)
+        try:
+            job = await runner.submit("price", {})
+            finished = await _wait_finished(runner, job.id)
+        finally:
+            await runner.stop()
+        assert finished.error == "request to [REDACTED_URL] failed"
+
+    @pytest.mark.asyncio
+    async def test_store_errors_do_not_kill_workers(self, db_path: str) -> None:
+        async def execute(kind: str, request: dict[str, Any], emit: EmitItems, client: str) -> Any:
+            return kind
+
+        runner = JobRunner(execute, workers=1, max_queued=10, retention=60)
+        await runner.start(db_path)
+        mark_done = runner.store.mark_done
+        calls = 0
+
+        def flaky_mark_done(job_id: str, result: Any) -> None:
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise sqlite3.OperationalError("database is locked")
+            mark_done(job_id, result)
+
+        try:
+            with patch.object(runner.store, "mark_done", side_effect=flaky_mark_done):
+                broken = await runner.submit("price", {})
+                failed = await _wait_finished(runner, broken.id)
+                healthy = await runner.submit("batch", {})
+                done = await _wait_finished(runner, healthy.id)
+        finally:
+            await runner.stop()
+        assert (failed.status, failed.error_status) == (FAILED, 500)
+        assert done.status == DONE
+
+    @pytest.mark.asyncio
+    async def test_bounded_workers_and_queue(self, db_path: str) -> None:
+        running = 0
+        peak = 0
+        release = asyncio.Event()
+
+        async def execute(kind: str, request: dict[str, Any], emit: EmitItems, client: str) -> Any:
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await release.wait()
+            running -= 1
+            return None
+
+        runner = JobRunner(execute, workers=2, max_queued=2, retention=60)
+        await runner.start(db_path)
+        try:
+            jobs = [await runner.submit("price", {}) for _ in range(4)]
+            await asyncio.sleep(0.05)
+            with pytest.raises(JobQueueFullError):
+                for _ in range(3):
+                    await runner.submit("price", {})
+            release.set()
+            for job in jobs:
+                await _wait_finished(runner, job.id)
+        finally:
+            await runner.stop()
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_zero_retention_does_not_busy_loop_purges(self, db_path: str) -> None:
+        async def execute(kind: str, request: dict[str, Any], emit: EmitItems, client: str) -> Any:
+            return None
+
+        runner = JobRunner(execute, workers=1, max_queued=10, retention=0)
+        await runner.start(db_path)
+        try:
+            with patch("src.jobs.JobStore.purge", return_value=0) as purge:
+                await asyncio.sleep(0.05)
+        finally:
+            await runner.stop()
+        assert purge.call_count == 0
+
+    @pytest.mark.asyncio
+    async def test_jobs_survive_restart(self, db_path: str) -> None:
+        started = asyncio.Event()
+
+        async def hang(kind: str, request: dict[str, Any], emit: EmitItems, client: str) -> Any:
+            await emit([{"index": 0}])
+            started.set()
+            await asyncio.Event().wait()
+
+        runner = JobRunner(hang, workers=1, max_queued=10, retention=60)
+        await runner.start(db_path)
+        job = await runner.submit("series", {"n": 1}, client="key:abc")
+        await started.wait()
+        await runner.stop()
+
+        seen: list[Sequence[Any]] = []
+
+        async def finish(kind: str, request: dict[str, Any], emit: EmitItems, client: str) -> Any:
+            seen.append([kind, request, client])
+            return "ok"
+
+        restarted = JobRunner(finish, workers=1, max_queued=10, retention=60)
+        await restarted.start(db_path)
+        try:
+            interrupted = await restarted.get(job.id)
+            assert interrupted is not None and interrupted.status in (QUEUED, RUNNING)
+            finished = await _wait_finished(restarted, job.id)
+        finally:
+            await restarted.stop()
+        assert finished.result == "ok"
+        assert seen == [["series", {"n": 1}, "key:abc"]]
@@ -1,14 +1,28 @@
 from src.params import (
+    MAX_BATCH_BODY_TOKENS,
     MAX_BATCH_TOKENS,
     MAX_BLOCK,
+    MAX_MATRIX_CELLS,
+    MAX_SERIES_POINTS,
+    BatchParams,
     BatchParseSuccess,
+    JobParseSuccess,
+    MatrixParseSuccess,
     ParseError,
     ParseSuccess,
+    PriceParams,
+    SeriesParams,
+    SeriesParseSuccess,
     is_valid_address,
+    parse_batch_body,
     parse_batch_params,
     parse_bool_param,
     parse_ignore_pools,
+    parse_job_body,
+    parse_matrix_body,
     parse_price_params,
+    parse_series_params,
+    parse_timeout,
     parse_timestamp,
 )
 
@@ -377,6 +391,48 @@ class TestParseTimestamp:
         assert isinstance(result, ParseError)
 
 
+class TestParsePriceParamsQuote:
+    def test_to_address(self) -> None:
+        result = parse_price_params(DAI, "18000000", "1000", to=WETH)
+        assert isinstance(result, ParseSuccess)
+        assert result.data.to == WETH
+        assert result.data.amount == 1000.0
+
+    def test_to_default_none(self) -> None:
+        result = parse_price_params(DAI)
+        assert isinstance(result, ParseSuccess)
+        assert result.data.to is None
+
+    def test_to_invalid_address(self) -> None:
+        result = parse_price_params(DAI, to="0x123")
+        assert isinstance(result, ParseError)
+        assert "Invalid to address" in result.error
+
+
+class TestParseDenominate:
+    def test_price_denominate(self) -> None:
+        result = parse_price_params(DAI, denominate=WETH)
+        assert isinstance(result, ParseSuccess)
+        assert result.data.denominate == WETH
+
+    def test_price_denominate_excludes_to(self) -> None:
+        result = parse_price_params(DAI, to=USDC, denominate=WETH)
+        assert isinstance(result, ParseError)
+        assert "mutually exclusive" in result.error
+
+    def test_batch_denominate(self) -> None:
+        result = parse_batch_params(f"{DAI},{USDC}", denominate=WETH)
+        assert isinstance(result, BatchParseSuccess)
+        assert result.data.denominate == WETH
+        assert isinstance(parse_batch_params(DAI, denominate="0x1"), ParseError)
+
+    def test_batch_body_denominate(self) -> None:
+        result = parse_batch_body({"tokens": [DAI], "denominate": WETH})
+        assert isinstance(result, BatchParseSuccess)
+        assert result.data.denominate == WETH
+        assert isinstance(parse_batch_body({"tokens": [DAI], "denominate": 1}), ParseError)
+
+
 class TestParsePriceParamsTimestamp:
     """Tests for timestamp parameter in parse_price_params."""
 
@@ -696,3 +752,217 @@ class TestParseBatchParamsCombined:
         assert result.data.timestamp == 1700000000
         assert result.data.amounts == (1000.0, 500.0)
         assert result.data.block is None
+
+
+class TestParseBatchBody:
+    """Tests for the JSON body of POST /prices."""
+
+    def test_tokens_amounts_and_block(self) -> None:
+        result = parse_batch_body(
+            {"tokens": [DAI, USDC], "amounts": [1000, None], "block": 18000000}
+        )
+        assert isinstance(result, BatchParseSuccess)
+        assert result.data.tokens == (DAI, USDC)
+        assert result.data.amounts == (1000.0, None)
+        assert result.data.block == 18000000
+
+    def test_block_and_timestamp_as_strings(self) -> None:
+        result = parse_batch_body({"tokens": [DAI], "block": "18000000"})
+        assert isinstance(result, BatchParseSuccess)
+        assert result.data.block == 18000000
+        result = parse_batch_body({"tokens": [DAI], "timestamp": "2023-11-14T22:13:20Z"})
+        assert isinstance(result, BatchParseSuccess)
+        assert result.data.timestamp == 1700000000
+
+    def test_accepts_more_than_query_limit(self) -> None:
+        tokens = [f"0x{i:040x}" for i in range(MAX_BATCH_TOKENS + 1)]
+        result = parse_batch_body({"tokens": tokens})
+        assert isinstance(result, BatchParseSuccess)
+        assert len(result.data.tokens) == MAX_BATCH_TOKENS + 1
+
+    def test_too_many_tokens(self) -> None:
+        result = parse_batch_body({"tokens": [DAI] * (MAX_BATCH_BODY_TOKENS + 1)})
+        assert isinstance(result, ParseError)
+        assert "too many" in result.error.lower()
+
+    def test_not_an_object(self) -> None:
+        result = parse_batch_body([DAI])
+        assert isinstance(result, ParseError)
+        assert "object" in result.error.lower()
+
+    def test_missing_or_empty_tokens(self) -> None:
+        assert isinstance(parse_batch_body({}), ParseError)
+        assert isinstance(parse_batch_body({"tokens": []}), ParseError)
+        assert isinstance(parse_batch_body({"tokens": DAI}), ParseError)
+
+    def test_invalid_address_position(self) -> None:
+        result = parse_batch_body({"tokens": [DAI, "0x123"]})
+        assert isinstance(result, ParseError)
+        assert "position 2" in result.error
+
+    def test_invalid_amounts(self) -> None:
+        for amount in (0, -1, "1", True):
+            result = parse_batch_body({"tokens": [DAI], "amounts": [amount]})
+            assert isinstance(result, ParseError), amount
+
+    def test_amounts_count_mismatch(self) -> None:
+        result = parse_batch_body({"tokens": [DAI, USDC], "amounts": [1]})
+        assert isinstance(result, ParseError)
+        assert "does not match" in result.error
+
+    def test_invalid_block(self) -> None:
+        for block in (1.5, True, "abc", 0):
+            result = parse_batch_body({"tokens": [DAI], "block": block})
+            assert isinstance(result, ParseError), block
+
+    def test_timestamp_and_block_mutually_exclusive(self) -> None:
+        result = parse_batch_body({"tokens": [DAI], "block": 1, "timestamp": 1700000000})
+        assert isinstance(result, ParseError)
+        assert "mutually exclusive" in result.error.lower()
+
+    def test_force(self) -> None:
+        result = parse_batch_body({"tokens": [DAI], "force": True})
+        assert isinstance(result, BatchParseSuccess)
+        assert result.data.force is True
+        result = parse_batch_body({"tokens": [DAI], "force": "yes"})
+        assert isinstance(result, ParseError)
+
+
+class TestParseSeriesParams:
+    """Tests for /price_series parameters."""
+
+    def test_block_range_with_step(self) -> None:
+        result = parse_series_params(DAI, start_block="100", end_block="130", step="10")
+        assert isinstance(result, SeriesParseSuccess)
+        assert result.data.blocks == (100, 110, 120, 130)
+        assert result.data.timestamps is None
+
+    def test_step_defaults_to_one(self) -> None:
+        result = parse_series_params(DAI, start_block="5", end_block="7")
+        assert isinstance(result, SeriesParseSuccess)
+        assert result.data.blocks == (5, 6, 7)
+
+    def test_timestamps_keep_order_and_duplicates(self) -> None:
+        result = parse_series_params(DAI, timestamps="1700000600,2023-11-14T22:13:20Z,1700000600")
+        assert isinstance(result, SeriesParseSuccess)
+        assert result.data.timestamps == (1700000600, 1700000000, 1700000600)
+        assert result.data.blocks is None
+
+    def test_range_and_timestamps_are_exclusive(self) -> None:
+        result = parse_series_params(DAI, start_block="1", end_block="2", timestamps="1700000000")
+        assert isinstance(result, ParseError)
+        assert "mutually exclusive" in result.error
+
+    def test_requires_range_or_timestamps(self) -> None:
+        assert isinstance(parse_series_params(DAI), ParseError)
+        assert isinstance(parse_series_params(DAI, start_block="1"), ParseError)
+
+    def test_rejects_bad_ranges(self) -> None:
+        assert isinstance(parse_series_params(DAI, start_block="10", end_block="5"), ParseError)
+        assert isinstance(
+            parse_series_params(DAI, start_block="1", end_block="5", step="0"), ParseError
+        )
+        assert isinstance(parse_series_params(None, start_block="1", end_block="5"), ParseError)
+
+    def test_rejects_too_many_points(self) -> None:
+        result = parse_series_params(DAI, start_block="1", end_block=str(MAX_SERIES_POINTS + 1))
+        assert isinstance(result, ParseError)
+        assert "Too many points" in result.error
+
+
+class TestParseTimeout:
+    def test_missing_is_none(self) -> None:
+        assert parse_timeout(None) is None
+        assert parse_timeout(" ") is None
+
+    def test_accepts_fractional_seconds(self) -> None:
+        assert parse_timeout("0.5") == 0.5
+        assert parse_timeout("300") == 300.0
+
+    def test_rejects_non_positive_or_too_long(self) -> None:
+        for value in ("0", "-1", "300.5"):
+            result = parse_timeout(value)
+            assert isinstance(result, ParseError)
+            assert "at most 300 seconds" in result.error
+
+    def test_error_names_the_source(self) -> None:
+        result = parse_timeout("soon", "X-Request-Deadline")
+        assert isinstance(result, ParseError)
+        assert result.error == "Invalid X-Request-Deadline: 'soon'. Must be a number of seconds."
+
+
+class TestParseMatrixBody:
+    """Tests for the JSON body of POST /price_matrix."""
+
+    def test_tokens_and_blocks(self) -> None:
+        result = parse_matrix_body({"tokens": [DAI, USDC], "blocks": [100, "200"]})
+        assert isinstance(result, MatrixParseSuccess)
+        assert result.data.tokens == (DAI, USDC)
+        assert result.data.blocks == (100, 200)
+        assert result.data.timestamps is None
+        assert result.data.force is False
+
+    def test_timestamps(self) -> None:
+        result = parse_matrix_body(
+            {"tokens": [DAI], "timestamps": [1700000000, "2023-11-14T22:13:20Z"], "force": True}
+        )
+        assert isinstance(result, MatrixParseSuccess)
+        assert result.data.timestamps == (1700000000, 1700000000)
+        assert result.data.blocks is None
+        assert result.data.force is True
+
+    def test_requires_exactly_one_column_kind(self) -> None:
+        assert isinstance(parse_matrix_body({"tokens": [DAI]}), ParseError)
+        result = parse_matrix_body({"tokens": [DAI], "blocks": [1], "timestamps": [1700000000]})
+        assert isinstance(result, ParseError)
+        assert "mutually exclusive" in result.error
+        assert isinstance(parse_matrix_body({"tokens": [DAI], "blocks": []}), ParseError)
+
+    def test_rejects_invalid_entries(self) -> None:
+        result = parse_matrix_body({"tokens": [DAI], "blocks": [100, 1.5]})
+        assert isinstance(result, ParseError)
+        assert "position 2" in result.error
+        assert isinstance(parse_matrix_body({"tokens": [DAI], "timestamps": [True]}), ParseError)
+        assert isinstance(parse_matrix_body({"tokens": ["0x12"], "blocks": [1]}), ParseError)
+        assert isinstance(parse_matrix_body([DAI]), ParseError)
+
+    def test_rejects_too_many_cells(self) -> None:
+        blocks = list(range(1, MAX_MATRIX_CELLS // 2 + 2))
+        result = parse_matrix_body({"tokens": [DAI, USDC], "blocks": blocks})
+        assert isinstance(result, ParseError)
+        assert "Too many cells" in result.error
+
+
+class TestParseJobBody:
+    def test_price_job(self) -> None:
+        result = parse_job_body(
+            {"kind": "price", "token": DAI, "block": 18000000, "ignore_pools": [USDC, WETH]}
+        )
+        assert isinstance(result, JobParseSuccess)
+        assert result.kind == "price"
+        assert isinstance(result.data, PriceParams)
+        assert result.data.block == 18000000
+        assert result.data.ignore_pools == (USDC, WETH)
+
+    def test_batch_job(self) -> None:
+        result = parse_job_body({"kind": "batch", "tokens": [DAI, USDC], "force": True})
+        assert isinstance(result, JobParseSuccess)
+        assert isinstance(result.data, BatchParams)
+        assert result.data.tokens == (DAI, USDC)
+        assert result.force is True
+
+    def test_series_job_timestamps_array(self) -> None:
+        result = parse_job_body(
+            {"kind": "series", "token": DAI, "timestamps": [1700000000, 1700003600]}
+        )
+        assert isinstance(result, JobParseSuccess)
+        assert isinstance(result.data, SeriesParams)
+        assert result.data.timestamps == (1700000000, 1700003600)
+
+    def test_invalid_kind_and_fields(self) -> None:
+        assert isinstance(parse_job_body([]), ParseError)
+        assert isinstance(parse_job_body({"kind": "matrix"}), ParseError)
+        assert isinstance(
+            parse_job_body({"kind": "price", "token": DAI, "force": "yes"}), ParseError
+        )
+        assert isinstance(parse_job_body({"kind": "price", "token": "0x1"}), ParseError)
@@ -0,0 +1,93 @@
+from collections.abc import Generator
+from unittest.mock import patch
+
+import pytest
+
+from src.ratelimit import (
+    ClientLimiter,
+    TokenBucket,
+    api_key_client_id,
+    parse_client_weights,
+)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> Generator[_Clock]:
+    clock = _Clock()
+    with patch("src.ratelimit.time.monotonic", clock):
+        yield clock
+
+
+class TestTokenBucket:
+    def test_refills_up_to_capacity(self, clock: _Clock) -> None:
+        bucket = TokenBucket(rate=2.0, capacity=4.0)
+        bucket.take(4)
+        assert bucket.wait_time(1) == 0.5
+        clock.now += 10
+        assert bucket.wait_time(4) == 0
+        assert bucket.wait_time(5) == 0.5
+
+    def test_debt_is_repaid_before_more_work(self, clock: _Clock) -> None:
+        bucket = TokenBucket(rate=1.0, capacity=2.0)
+        bucket.take(5)
+        assert bucket.wait_time(0) == 3.0
+        clock.now += 3
+        assert bucket.wait_time(0) == 0
+
+
+class TestClientLimiter:
+    def test_request_rate_per_client(self, clock: _Clock) -> None:
+        limiter = ClientLimiter(rate=1.0, burst=2, compute_rate=0, compute_burst=0)
+        assert limiter.admit("a") is None
+        assert limiter.admit("a") is None
+        assert limiter.admit("a") == ("requests", 1.0)
+        assert limiter.admit("b") is None
+        clock.now += 1
+        assert limiter.admit("a") is None
+
+    def test_compute_seconds(self, clock: _Clock) -> None:
+        limiter = ClientLimiter(rate=0, burst=0, compute_rate=0.5, compute_burst=10)
+        assert limiter.admit("a") is None
+        limiter.charge_compute("a", 14.0)
+        assert limiter.admit("a") == ("compute", 8.0)
+        clock.now += 8
+        assert limiter.admit("a") is None
+
+    def test_weights_scale_limits(self, clock: _Clock) -> None:
+        limiter = ClientLimiter(
+            rate=1.0, burst=1, compute_rate=0, compute_burst=0, weights={"big": 3.0}
+        )
+        assert [limiter.admit("big") for _ in range(4)] == [None, None, None, ("requests", 1 / 3)]
+        assert limiter.weight("other") == 1.0
+
+    def test_disabled_limits_admit_everything(self) -> None:
+        limiter = ClientLimiter(rate=0, burst=0, compute_rate=0, compute_burst=0)
+        limiter.charge_compute("a", 1e9)
+        assert all(limiter.admit("a") is None for _ in range(100))
+
+
+class TestClientIds:
+    def test_api_key_is_hashed(self) -> None:
+        client = api_key_client_id("secret")
+        assert client.startswith("key:")
+        assert "secret" not in client
+        assert client == api_key_client_id("secret")
+
+    def test_parse_client_weights(self) -> None:
+        assert parse_client_weights("") == {}
+        assert parse_client_weights("alpha=2, beta=0.5") == {
+            api_key_client_id("alpha"): 2.0,
+            api_key_client_id("beta"): 0.5,
+        }
+        with pytest.raises(ValueError):
+            parse_client_weights("alpha")
+        with pytest.raises(ValueError):
+            parse_client_weights("alpha=0")
@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+
+from src.scheduler import (
+    DEFAULT,
+    FAST,
+    PRIORITIES,
+    SLOW,
+    CostModel,
+    LaneScheduler,
+)
+
+
+class TestCostModel:
+    def test_bucket_places_tokens_without_history(self) -> None:
+        model = CostModel(fast_latency=0.5, slow_latency=5)
+        model.record_bucket("0xAA", "stable usd")
+        model.record_bucket("0xbb", "curve lp")
+        model.record_bucket("0xcc", "something new")
+        assert model.lane("0xaa") == FAST
+        assert model.lane("0xBB") == SLOW
+        assert model.lane("0xcc") == DEFAULT
+        assert model.lane("0xdd") == DEFAULT
+
+    def test_known_includes_unclassified_tokens(self) -> None:
+        model = CostModel(fast_latency=0.5, slow_latency=5)
+        model.record_bucket("0xAA", None)
+        model.record_latency("0xbb", 1.0)
+        assert model.known("0xaa") and model.known("0xBB")
+        assert not model.known("0xcc")
+        assert model.lane("0xaa") == DEFAULT
+
+    def test_latency_history_overrides_bucket(self) -> None:
+        model = CostModel(fast_latency=0.5, slow_latency=5, alpha=0.5)
+        model.record_bucket("0xaa", "stable usd")
+        model.record_latency("0xaa", 12.0)
+        assert model.lane("0xaa") == SLOW
+        model.record_latency("0xaa", 0.0)
+        assert model.latency("0xaa") == 6.0
+        model.record_latency("0xaa", 0.0)
+        assert model.lane("0xaa") == FAST
+        model.record_latency("0xaa", 4.0)
+        assert model.lane("0xaa") == FAST  # 2.75s average: bucket decides
+
+    def test_lane_for_many_tokens_is_the_slowest(self) -> None:
+        model = CostModel(fast_latency=0.5, slow_latency=5)
+        model.record_bucket("0xaa", "stable usd")
+        model.record_bucket("0xbb", "curve lp")
+        assert model.lane_for(["0xaa"]) == FAST
+        assert model.lane_for(["0xaa", "0xcc"]) == DEFAULT
+        assert model.lane_for(["0xaa", "0xbb", "0xcc"]) == SLOW
+
+    def test_forgets_least_recent_tokens(self) -> None:
+        model = CostModel(fast_latency=0.5, slow_latency=5, max_tokens=2)
+        for token in ("0xaa", "0xbb", "0xcc"):
+            model.record_latency(token, 10.0)
+        assert model.latency("0xaa") is None
+        assert model.lane("0xcc") == SLOW
+
+
+class TestLaneScheduler:
+    @pytest.mark.asyncio
+    async def test_limits_concurrency_per_lane(self) -> None:
+        scheduler = LaneScheduler({FAST: 3, SLOW: 1})
+        running = {FAST: 0, SLOW: 0}
+        peak = {FAST: 0, SLOW: 0}
+        release = asyncio.Event()
+
+        async def work(lane: str) -> None:
+            async with scheduler.slot(lane):
+                running[lane] += 1
+                peak[lane] = max(peak[lane], running[lane])
+                await release.wait()
+                running[lane] -= 1
+
+        tasks = [asyncio.create_task(work(lane)) for lane in [FAST] * 5 + [SLOW] * 3]
+        await asyncio.sleep(0)
+        assert (scheduler.running(FAST), scheduler.queued(FAST)) == (3, 2)
+        assert (scheduler.running(SLOW), scheduler.queued(SLOW)) == (1, 2)
+        release.set()
+        await asyncio.gather(*tasks)
+        assert peak == {FAST: 3, SLOW: 1}
+        assert scheduler.running(FAST) == scheduler.running(SLOW) == 0
+
+    @pytest.mark.asyncio
+    async def test_waiters_admitted_by_priority_then_arrival(self) -> None:
+        scheduler = LaneScheduler({SLOW: 1})
+        order: list[str] = []
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with scheduler.slot(SLOW):
+                await release.wait()
+
+        async def work(name: str, priority: str) -> None:
+            async with scheduler.slot(SLOW, PRIORITIES[priority]):
+                order.append(name)
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(work(name, priority))
+            for name, priority in [
+                ("low", "low"),
+                ("n1", "normal"),
+                ("high", "high"),
+                ("n2", "normal"),
+            ]
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(holder, *tasks)
+        assert order == ["high", "n1", "n2", "low"]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_leak_slot(self) -> None:
+        scheduler = LaneScheduler({DEFAULT: 1})
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with scheduler.slot(DEFAULT):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        await asyncio.gather(holder, waiter, return_exceptions=True)
+        assert scheduler.running(DEFAULT) == 0
+        async with scheduler.slot(DEFAULT):
+            assert scheduler.running(DEFAULT) == 1
+
+
+class TestFairQueueing:
+    @staticmethod
+    async def _run_order(scheduler: LaneScheduler, work: list[tuple[str, float]]) -> list[str]:
+        """Queue ``(client, weight)`` work behind a held slot; return the service order."""
+        order: list[str] = []
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with scheduler.slot(DEFAULT, client="holder"):
+                await release.wait()
+
+        async def run(client: str, weight: float) -> None:
+            async with scheduler.slot(DEFAULT, client=client, weight=weight):
+                order.append(client)
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(run(client, weight)) for client, weight in work]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(holder, *tasks)
+        return order
+
+    @pytest.mark.asyncio
+    async def test_backlog_does_not_starve_other_clients(self) -> None:
+        scheduler = LaneScheduler({DEFAULT: 1})
+        order = await self._run_order(scheduler, [("a", 1.0)] * 4 + [("b", 1.0)] * 2)
+        assert order == ["a", "b", "a", "b", "a", "a"]
+
+    @pytest.mark.asyncio
+    async def test_weight_sets_share(self) -> None:
+        scheduler = LaneScheduler({DEFAULT: 1})
+        order = await self._run_order(scheduler, [("a", 1.0)] * 3 + [("b", 2.0)] * 4)
+        assert order == ["a", "b", "b", "a", "b", "b", "a"]
@@ -1,15 +1,36 @@
 """Tests for server._fetch_price behavior."""
 
 import asyncio
-from unittest.mock import AsyncMock, patch
+from collections.abc import AsyncGenerator, Callable, Iterable, Sequence
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from src.cache import CacheErrorHit, CacheHit, CacheLookup, CacheMiss
+
 DAI = "0x6B175474E89094C44Da98b954EedeAC495271d0F"
 USDC = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
 WETH = "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"
 
 
+def _no_cached_lookups(tokens: Sequence[str], block: int) -> list[CacheLookup]:
+    return [CacheMiss() for _ in tokens]
+
+
+def _lookups_from(
+    get_many: Callable[[Sequence[str], int], list[dict[str, object] | None]],
+) -> Callable[[Sequence[str], int], list[CacheLookup]]:
+    """Adapt a fake price-entry reader into a lookup_cached_many replacement."""
+
+    def lookup_many(tokens: Sequence[str], block: int) -> list[CacheLookup]:
+        return [CacheMiss() if e is None else CacheHit(e) for e in get_many(tokens, block)]
+
+    return lookup_many
+
+
 class TestTimestampResolution:
     """Tests for timestamp parameter resolution in the price endpoint."""
 
@@ -521,806 +542,2694 @@ class TestFetchBlockTimestamp:
             assert result is None
 
 
-class TestHealthEndpoint:
-    """Tests for the enhanced /health endpoint with node sync status."""
+class TestPriceSingleFlight:
+    """Tests for coalescing concurrent identical /price lookups."""
 
     @pytest.mark.asyncio
-    async def test_synced_true_when_node_synced(self, mock_y_module: None) -> None:
-        """When check_node_async succeeds, health returns synced=True."""
-        from src.server import health
+    async def test_concurrent_identical_lookups_fetch_once(self) -> None:
+        from src.params import PriceParams
+        from src.server import _handle_price_request
 
-        mock_check_node_async = AsyncMock(return_value=None)
-        mock_chain = type("MockChain", (), {"height": 18000000})()
+        release = asyncio.Event()
 
+        async def slow_fetch(*args: object, **kwargs: object) -> tuple[float, None, int]:
+            await release.wait()
+            return 1.5, None, 1700000000
+
+        mock_fetch = AsyncMock(side_effect=slow_fetch)
         with (
-            patch("y.time.check_node_async", mock_check_node_async),
-            patch("brownie.chain", mock_chain),
+            patch("src.server._fetch_price_and_cache", mock_fetch),
+            patch("src.server.lookup_cached", return_value=CacheMiss()),
         ):
-            result = await health()
-            assert result["status"] == "ok"
-            assert result["chain"] == "ethereum"
-            assert result["block"] == 18000000
-            assert result["synced"] is True
+            waiters = [
+                asyncio.create_task(_handle_price_request(PriceParams(token=DAI), 18000000))
+                for _ in range(10)
+            ]
+            await asyncio.sleep(0.05)
+            release.set()
+            results = await asyncio.gather(*waiters)
+
+        assert mock_fetch.call_count == 1
+        assert all(r["price"] == 1.5 and r["cached"] is False for r in results)
 
     @pytest.mark.asyncio
-    async def test_synced_false_when_node_not_synced(self, mock_y_module: None) -> None:
-        """When check_node_async raises NodeNotSynced, health returns synced=False."""
-        from src.server import health
+    async def test_different_amounts_are_not_coalesced(self) -> None:
+        from src.params import PriceParams
+        from src.server import _handle_price_request
+
+        mock_fetch = AsyncMock(return_value=(1.5, None, 1700000000))
+        with patch("src.server._fetch_price_and_cache", mock_fetch):
+            await asyncio.gather(
+                _handle_price_request(PriceParams(token=DAI, amount=1.0), 18000000),
+                _handle_price_request(PriceParams(token=DAI, amount=2.0), 18000000),
+            )
+        assert mock_fetch.call_count == 2
 
-        # Create a NodeNotSynced exception matching ypricemagic's name
-        class NodeNotSynced(Exception):  # noqa: N818
-            pass
+    @pytest.mark.asyncio
+    async def test_error_cached_once_for_coalesced_failure(self) -> None:
+        from src.params import PriceParams
+        from src.server import _handle_price_request
 
-        mock_check_node_async = AsyncMock(side_effect=NodeNotSynced("Node is behind"))
-        mock_chain = type("MockChain", (), {"height": 18000000})()
+        async def failing(*args: object, **kwargs: object) -> None:
+            await asyncio.sleep(0.01)
+            raise RuntimeError("no route")
 
+        mock_set_error = MagicMock()
         with (
-            patch("y.time.check_node_async", mock_check_node_async),
-            patch("brownie.chain", mock_chain),
+            patch("src.server._fetch_price_and_cache", AsyncMock(side_effect=failing)),
+            patch("src.server.lookup_cached", return_value=CacheMiss()),
+            patch("src.server.set_cached_error", mock_set_error),
         ):
-            result = await health()
-            assert result["status"] == "ok"
-            assert result["synced"] is False
+            responses = await asyncio.gather(
+                *(_handle_price_request(PriceParams(token=DAI), 18000000) for _ in range(5))
+            )
 
-    @pytest.mark.asyncio
-    async def test_synced_none_on_other_exception(self, mock_y_module: None) -> None:
-        """When check_node_async raises unexpected exception, health returns synced=None."""
-        from src.server import health
+        assert all(r.status_code == 500 for r in responses)
+        mock_set_error.assert_called_once()
 
-        mock_check_node_async = AsyncMock(side_effect=RuntimeError("Unexpected error"))
-        mock_chain = type("MockChain", (), {"height": 18000000})()
 
-        with (
-            patch("y.time.check_node_async", mock_check_node_async),
-            patch("brownie.chain", mock_chain),
-        ):
-            result = await health()
-            assert result["status"] == "ok"
-            assert result["synced"] is None
+class TestQuoteMode:
+    """Tests for /price with `to` (quote mode)."""
 
     @pytest.mark.asyncio
-    async def test_503_on_chain_height_failure(self, mock_y_module: None) -> None:
-        """When chain.height fails, health returns 503 (existing behavior preserved)."""
-        from fastapi.responses import JSONResponse
+    async def test_both_legs_priced_with_one_get_prices_call(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
 
-        from src.server import health
+        from src.cache import get_cached_price
+        from src.server import app
 
-        mock_chain = type(
-            "MockChain",
-            (),
-            {"height": property(lambda self: (_ for _ in ()).throw(ConnectionError("RPC failed")))},
-        )()
+        mock_get_prices = AsyncMock(return_value=[1.0, 2000.0])
+        mock_get_price = AsyncMock()
 
-        with patch("brownie.chain", mock_chain):
-            result = await health()
-            assert isinstance(result, JSONResponse)
-            assert result.status_code == 503
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_price", mock_get_price),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/price", params={"token": DAI, "to": WETH, "amount": "1000", "block": "18000000"}
+            )
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "from": DAI,
+            "to": WETH,
+            "amount": 1000.0,
+            "output_amount": 0.5,
+            "block": 18000000,
+            "chain": "ethereum",
+            "block_timestamp": 1700000000,
+            "route": "divide",
+        }
+        mock_get_prices.assert_called_once()
+        assert mock_get_prices.call_args.args == ((DAI, WETH), 18000000)
+        assert mock_get_prices.call_args.kwargs["amounts"] == (1000.0, None)
+        mock_get_price.assert_not_called()
+        assert get_cached_price(DAI, 18000000) is None
+        assert get_cached_price(WETH, 18000000) is not None
 
     @pytest.mark.asyncio
-    async def test_existing_fields_preserved(self, mock_y_module: None) -> None:
-        """Health response retains status, chain, block fields. synced is additive."""
-        from src.server import health
+    @pytest.mark.parametrize(
+        ("usd", "status", "output"), [([0.0, 2000.0], 200, 0.0), ([1.0, 0.0], 422, None)]
+    )
+    async def test_zero_prices(
+        self, mock_y_module: None, usd: list[float], status: int, output: float | None
+    ) -> None:
+        from fastapi.testclient import TestClient
 
-        mock_check_node_async = AsyncMock(return_value=None)
-        mock_chain = type("MockChain", (), {"height": 18000000})()
+        from src.server import app
 
         with (
-            patch("y.time.check_node_async", mock_check_node_async),
-            patch("brownie.chain", mock_chain),
+            patch("y.get_prices", AsyncMock(return_value=usd)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
         ):
-            result = await health()
-            # All required fields present
-            assert "status" in result
-            assert "chain" in result
-            assert "block" in result
-            assert "synced" in result
-            # Values correct
-            assert result["status"] == "ok"
-            assert result["block"] == 18000000
-            assert result["synced"] is True
-
-    @pytest.mark.asyncio
-    async def test_timeout_protection(self, mock_y_module: None) -> None:
-        """check_node_async timeout doesn't hang health endpoint."""
-        import asyncio
+            client = TestClient(app)
+            response = client.get("/price", params={"token": DAI, "to": WETH, "block": "18000000"})
 
-        from src.server import health
+        # A worthless token quotes at 0; a worthless quote token cannot be divided by
+        assert response.status_code == status
+        if output is not None:
+            assert response.json()["output_amount"] == output
+        else:
+            assert response.json()["error"].startswith(f"Cannot price in {WETH}")
 
-        async def slow_check() -> None:
-            await asyncio.sleep(10)  # Would hang without timeout
+    @pytest.mark.asyncio
+    async def test_failed_get_prices_is_not_cached_as_not_found(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
 
-        mock_check_node_async = AsyncMock(side_effect=slow_check)
-        mock_chain = type("MockChain", (), {"height": 18000000})()
+        from src.cache import get_cached_error
+        from src.server import app
 
         with (
-            patch("y.time.check_node_async", mock_check_node_async),
-            patch("brownie.chain", mock_chain),
+            patch("y.get_prices", AsyncMock(side_effect=RuntimeError("rpc reset"))),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
         ):
-            # Should complete within reasonable time (timeout is 5s)
-            result = await health()
-            # Timeout should result in synced=None
-            assert result["synced"] is None
+            client = TestClient(app)
+            response = client.get("/price", params={"token": DAI, "to": WETH, "block": "18000000"})
 
-    @pytest.mark.asyncio
-    async def test_synced_check_only_after_height_success(self, mock_y_module: None) -> None:
-        """synced check only runs if we can get block height (503 path unchanged)."""
-        from fastapi.responses import JSONResponse
+        assert response.status_code == 500
+        assert get_cached_error(WETH, 18000000) is None
 
-        from src.server import health
+    @pytest.mark.asyncio
+    async def test_cached_legs_need_no_lookup(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
 
-        # Simulate chain.height failing
-        mock_chain = type(
-            "MockChain",
-            (),
-            {"height": property(lambda self: (_ for _ in ()).throw(ConnectionError("RPC failed")))},
-        )()
-        mock_check_node_async = AsyncMock(return_value=None)
+        from src.cache import set_cached_price
+        from src.server import app
 
-        with (
-            patch("brownie.chain", mock_chain),
-            patch("y.time.check_node_async", mock_check_node_async),
-        ):
-            result = await health()
-            # Should return 503, not call check_node_async
-            assert isinstance(result, JSONResponse)
-            assert result.status_code == 503
-            # check_node_async should not have been called
-            mock_check_node_async.assert_not_called()
+        set_cached_price(DAI, 18000000, 1.0, block_timestamp=1700000000)
+        set_cached_price(WETH, 18000000, 2000.0, block_timestamp=1700000000)
+        mock_get_prices = AsyncMock()
 
+        with patch("y.get_prices", mock_get_prices):
+            client = TestClient(app)
+            response = client.get("/price", params={"token": DAI, "to": WETH, "block": "18000000"})
 
-class TestBatchPricesEndpoint:
-    """Tests for GET /prices batch pricing endpoint."""
+        assert response.status_code == 200
+        assert response.json()["amount"] == 1.0
+        assert response.json()["output_amount"] == 0.0005
+        assert response.json()["block_timestamp"] == 1700000000
+        mock_get_prices.assert_not_called()
 
     @pytest.mark.asyncio
-    async def test_single_token_returns_array_of_one(self, mock_y_module: None) -> None:
-        """Single token returns 200 with JSON array containing one result."""
+    async def test_only_missing_leg_is_fetched(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
+        from src.cache import set_cached_price
         from src.server import app
 
+        set_cached_price(WETH, 18000000, 2000.0)
         mock_get_prices = AsyncMock(return_value=[1.0])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
-        mock_chain = type("MockChain", (), {"height": 19000000})()
 
         with (
             patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
-            patch("brownie.chain", mock_chain),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
         ):
             client = TestClient(app)
-            response = client.get("/prices", params={"tokens": DAI})
+            response = client.get(
+                "/price", params={"token": DAI, "to": WETH, "amount": "4000", "block": "18000000"}
+            )
 
-            assert response.status_code == 200
-            data = response.json()
-            assert isinstance(data, list)
-            assert len(data) == 1
-            assert data[0]["token"] == DAI
-            assert data[0]["price"] == 1.0
-            assert data[0]["cached"] is False
+        assert response.json()["output_amount"] == 2.0
+        assert mock_get_prices.call_args.args == ((DAI,), 18000000)
 
     @pytest.mark.asyncio
-    async def test_multiple_tokens_preserve_order(self, mock_y_module: None) -> None:
-        """Multiple tokens return ordered results preserving input order."""
+    async def test_identity_quote(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
         from src.server import app
 
-        mock_get_prices = AsyncMock(return_value=[1.0, 1.0])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
-        mock_chain = type("MockChain", (), {"height": 19000000})()
+        mock_get_prices = AsyncMock()
 
         with (
             patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
-            patch("brownie.chain", mock_chain),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
         ):
             client = TestClient(app)
-            response = client.get("/prices", params={"tokens": f"{DAI},{USDC}"})
+            response = client.get(
+                "/price",
+                params={"token": DAI, "to": DAI.lower(), "amount": "5", "block": "18000000"},
+            )
 
-            assert response.status_code == 200
-            data = response.json()
-            assert len(data) == 2
-            assert data[0]["token"] == DAI
-            assert data[1]["token"] == USDC
+        assert response.status_code == 200
+        assert response.json()["output_amount"] == 5.0
+        assert response.json()["route"] == "identity"
+        mock_get_prices.assert_not_called()
 
     @pytest.mark.asyncio
-    async def test_missing_tokens_returns_400(self, mock_y_module: None) -> None:
-        """Missing tokens param returns 400."""
+    async def test_unpriced_leg_returns_404(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
+        from src.cache import get_cached_error
         from src.server import app
 
-        mock_chain = type("MockChain", (), {"height": 19000000})()
-
-        with patch("brownie.chain", mock_chain):
+        with (
+            patch("y.get_prices", AsyncMock(return_value=[1.0, None])),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
             client = TestClient(app)
-            response = client.get("/prices")
+            response = client.get("/price", params={"token": DAI, "to": WETH, "block": "18000000"})
 
-            assert response.status_code == 400
-            data = response.json()
-            assert "tokens" in data["error"].lower()
+        assert response.status_code == 404
+        assert WETH in response.json()["error"]
+        assert get_cached_error(WETH, 18000000) is not None
 
-    @pytest.mark.asyncio
-    async def test_invalid_address_returns_400(self, mock_y_module: None) -> None:
-        """Invalid address in list returns 400."""
+    def test_invalid_to_returns_400(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
         from src.server import app
 
-        mock_chain = type("MockChain", (), {"height": 19000000})()
+        client = TestClient(app)
+        response = client.get("/price", params={"token": DAI, "to": "0xnope"})
 
-        with patch("brownie.chain", mock_chain):
-            client = TestClient(app)
-            response = client.get("/prices", params={"tokens": f"{DAI},INVALID"})
+        assert response.status_code == 400
 
-            assert response.status_code == 400
-            data = response.json()
-            assert "INVALID" in data["error"]
+
+class TestDenominate:
+    """Tests for `denominate` on /price and /prices, and /cross_rates."""
 
     @pytest.mark.asyncio
-    async def test_block_applies_to_all_tokens(self, mock_y_module: None) -> None:
-        """Block param applies to all tokens."""
+    async def test_price_in_another_token(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
+        from src.cache import set_cached_price
         from src.server import app
 
-        mock_get_prices = AsyncMock(return_value=[1.0, 1.0])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
-        mock_chain = type("MockChain", (), {"height": 19000000})()
+        set_cached_price(WETH, 18000000, 2000.0, block_timestamp=1700000000)
+        mock_get_prices = AsyncMock(return_value=[1.0])
 
         with (
             patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
-            patch("brownie.chain", mock_chain),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
         ):
             client = TestClient(app)
             response = client.get(
-                "/prices", params={"tokens": f"{DAI},{USDC}", "block": "18000000"}
+                "/price", params={"token": DAI, "denominate": WETH, "block": "18000000"}
             )
 
-            assert response.status_code == 200
-            data = response.json()
-            assert all(r["block"] == 18000000 for r in data)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["price"] == 0.0005
+        assert data["usd_price"] == 1.0
+        assert data["denominate"] == WETH
+        assert data["cached"] is False
+        assert mock_get_prices.call_args.args == ((DAI,), 18000000)
 
-    @pytest.mark.asyncio
-    async def test_partial_failure_returns_null_prices(self, mock_y_module: None) -> None:
-        """Partial failure returns 200 with null prices for failed tokens."""
+    def test_price_denominated_in_itself(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
         from src.server import app
 
-        # First token succeeds, second fails
-        mock_get_prices = AsyncMock(return_value=[1.0, None])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
-        mock_chain = type("MockChain", (), {"height": 19000000})()
+        mock_get_prices = AsyncMock()
 
         with (
             patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
-            patch("brownie.chain", mock_chain),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
         ):
             client = TestClient(app)
-            response = client.get("/prices", params={"tokens": f"{DAI},{USDC}"})
+            response = client.get(
+                "/price", params={"token": DAI, "denominate": DAI, "block": "18000000"}
+            )
 
-            assert response.status_code == 200
-            data = response.json()
-            assert len(data) == 2
-            assert data[0]["price"] == 1.0
-            assert data[1]["price"] is None
+        assert response.json()["price"] == 1.0
+        mock_get_prices.assert_not_called()
+
+    def test_to_and_denominate_are_exclusive(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        client = TestClient(app)
+        response = client.get("/price", params={"token": DAI, "to": USDC, "denominate": WETH})
+
+        assert response.status_code == 400
 
     @pytest.mark.asyncio
-    async def test_all_failures_returns_200(self, mock_y_module: None) -> None:
-        """All-failures also returns 200 with null prices."""
+    async def test_batch_prices_each_token_once(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
         from src.server import app
 
-        mock_get_prices = AsyncMock(return_value=[None, None])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
-        mock_chain = type("MockChain", (), {"height": 19000000})()
+        usd = {DAI: 1.0, USDC: 1.0, WETH: 2000.0}
+        mock_get_prices = AsyncMock(
+            side_effect=lambda tokens, block, **kw: [usd[token] for token in tokens]
+        )
 
         with (
             patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
-            patch("brownie.chain", mock_chain),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/prices",
+                params={"tokens": f"{DAI},{WETH},{DAI}", "denominate": WETH, "block": "18000000"},
+            )
+            post = client.post(
+                "/prices", json={"tokens": [USDC], "block": 18000000, "denominate": WETH}
+            )
+
+        data = response.json()
+        assert [(r["price"], r["usd_price"]) for r in data] == [
+            (0.0005, 1.0),
+            (1.0, 2000.0),
+            (0.0005, 1.0),
+        ]
+        priced = sorted(token for call in mock_get_prices.call_args_list for token in call.args[0])
+        assert priced == [DAI, USDC, WETH]
+        assert post.json()[0]["price"] == 0.0005
+        assert post.json()[0]["cached"] is False
+
+    @pytest.mark.asyncio
+    async def test_batch_unpriced_denomination(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        with (
+            patch(
+                "y.get_prices",
+                AsyncMock(
+                    side_effect=lambda tokens, block, **kw: [
+                        1.0 if t == DAI else None for t in tokens
+                    ]
+                ),
+            ),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/prices", params={"tokens": DAI, "denominate": WETH, "block": "18000000"}
+            )
+
+        (result,) = response.json()
+        assert result["price"] is None
+        assert result["usd_price"] == 1.0
+        assert result["reason"] == "denomination_unpriced"
+
+    @pytest.mark.asyncio
+    async def test_stream_prices_denominator_first(self, mock_y_module: None) -> None:
+        import json
+
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        usd = {DAI: 1.0, USDC: 1.0, WETH: 2000.0}
+
+        with (
+            patch("y.get_price", AsyncMock(side_effect=lambda token, block, **kw: usd[token])),
+            patch(
+                "y.get_prices",
+                AsyncMock(side_effect=lambda tokens, block, **kw: [usd[t] for t in tokens]),
+            ),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/prices",
+                params={"tokens": f"{DAI},{WETH}", "denominate": WETH, "block": "18000000"},
+                headers={"Accept": "application/x-ndjson"},
+            )
+
+        lines = {r["index"]: r for r in map(json.loads, response.text.splitlines())}
+        assert lines[0]["price"] == 0.0005
+        assert lines[1]["price"] == 1.0
+        assert lines[1]["cached"] is False
+
+    @pytest.mark.asyncio
+    async def test_cross_rates(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.cache import set_cached_price
+        from src.server import app
+
+        set_cached_price(DAI, 18000000, 1.0, block_timestamp=1700000000)
+        usd = {USDC: 0.5, WETH: 2000.0}
+        mock_get_prices = AsyncMock(
+            side_effect=lambda tokens, block, **kw: [usd.get(t) for t in tokens]
+        )
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/cross_rates",
+                params={"tokens": f"{DAI},{WETH},{DAI.lower()},{USDC}", "block": "18000000"},
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["usd_prices"] == [1.0, 2000.0, 1.0, 0.5]
+        assert data["block_timestamp"] == 1700000000
+        assert data["rates"][0] == [1.0, 0.0005, 1.0, 2.0]
+        assert data["rates"][1] == [2000.0, 1.0, 2000.0, 4000.0]
+        assert data["rates"][3][0] == 0.5
+        assert sorted(mock_get_prices.call_args.args[0]) == [USDC, WETH]
+
+    def test_cross_rates_unpriced_token_is_null(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        with (
+            patch(
+                "y.get_prices",
+                AsyncMock(
+                    side_effect=lambda tokens, block, **kw: [
+                        1.0 if t == DAI else None for t in tokens
+                    ]
+                ),
+            ),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/cross_rates", params={"tokens": f"{DAI},{WETH}", "block": "18000000"}
+            )
+
+        assert response.json()["rates"] == [[1.0, None], [None, None]]
+
+
+class TestPriceMicroBatching:
+    """Tests for batching concurrent /price cache misses into get_prices calls."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_batch_fetch(self) -> None:
+        from src.params import PriceParams
+        from src.server import _handle_price_request
+
+        tokens = [f"0x{i:040x}" for i in range(1, 4)]
+        mock_batch = AsyncMock(return_value=[(1.0, None), None, (3.0, None)])
+        mock_single = AsyncMock()
+        with (
+            patch("src.server.PRICE_BATCH_WINDOW_MS", 20.0),
+            patch("src.server._price_batcher.window", 0.02),
+            patch("src.server._fetch_batch_prices", mock_batch),
+            patch("src.server._fetch_price", mock_single),
+            patch("src.server._fetch_block_timestamp", AsyncMock(return_value=1700000000)),
+            patch("src.server.lookup_cached", return_value=CacheMiss()),
+        ):
+            responses = await asyncio.gather(
+                *(_handle_price_request(PriceParams(token=t), 18000000) for t in tokens)
+            )
+
+        mock_batch.assert_called_once()
+        assert mock_batch.call_args.args == (tuple(tokens), 18000000)
+        assert mock_batch.call_args.kwargs == {"amounts": None, "raise_errors": True}
+        mock_single.assert_not_called()
+        assert responses[0]["price"] == 1.0
+        assert responses[1].status_code == 404
+        assert responses[2]["price"] == 3.0
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_falls_back_per_token_without_caching_not_found(
+        self, mock_y_module: None
+    ) -> None:
+        from src.params import PriceParams
+        from src.server import _handle_price_request
+
+        tokens = [f"0x{i:040x}" for i in range(1, 3)]
+        mock_set_error = MagicMock()
+        with (
+            patch("src.server.PRICE_BATCH_WINDOW_MS", 20.0),
+            patch("src.server._price_batcher.window", 0.02),
+            patch("y.get_prices", AsyncMock(side_effect=RuntimeError("rpc reset"))),
+            patch(
+                "y.get_price",
+                AsyncMock(side_effect=lambda token, *a, **kw: 2.0 if token == tokens[0] else None),
+            ),
+            patch("src.server._fetch_block_timestamp", AsyncMock(return_value=1700000000)),
+            patch("src.server.lookup_cached", return_value=CacheMiss()),
+            patch("src.server.set_cached_error", mock_set_error),
+        ):
+            responses = await asyncio.gather(
+                *(_handle_price_request(PriceParams(token=t), 18000000) for t in tokens)
+            )
+
+        assert responses[0]["price"] == 2.0
+        # Only the token ypricemagic itself found no price for is cached as not found
+        assert responses[1].status_code == 404
+        mock_set_error.assert_called_once()
+        assert mock_set_error.call_args.args[0] == tokens[1]
+
+    @pytest.mark.asyncio
+    async def test_ignore_pools_bypasses_batching(self) -> None:
+        from src.params import PriceParams
+        from src.server import _handle_price_request
+
+        mock_batch = AsyncMock()
+        mock_single = AsyncMock(return_value=(2.0, None))
+        with (
+            patch("src.server.PRICE_BATCH_WINDOW_MS", 20.0),
+            patch("src.server._fetch_batch_prices", mock_batch),
+            patch("src.server._fetch_price", mock_single),
+            patch("src.server._fetch_block_timestamp", AsyncMock(return_value=None)),
+            patch("src.server.lookup_cached", return_value=CacheMiss()),
+        ):
+            params = PriceParams(token=DAI, ignore_pools=("0x" + "11" * 20,))
+            response = await _handle_price_request(params, 18000000)
+
+        assert response["price"] == 2.0
+        mock_batch.assert_not_called()
+
+
+class TestLaneScheduling:
+    """Tests for cost-lane placement of ypricemagic calls."""
+
+    @staticmethod
+    def _spy_lanes(lanes: list[tuple[str, int]]) -> Any:
+        from src.server import _scheduler
+
+        real_slot = _scheduler.slot
+
+        def slot(lane: str, priority: int, **kwargs: Any) -> Any:
+            lanes.append((lane, priority))
+            return real_slot(lane, priority, **kwargs)
+
+        return patch.object(_scheduler, "slot", slot)
+
+    def test_lane_from_bucket_and_priority_header(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.scheduler import CostModel
+        from src.server import app
+
+        lanes: list[tuple[str, int]] = []
+        with (
+            patch("src.server._cost_model", CostModel(fast_latency=-1, slow_latency=999)),
+            patch(
+                "y.check_bucket",
+                AsyncMock(side_effect=lambda token, **kw: "stable usd" if token == DAI else None),
+            ),
+            patch("y.classes.common.ERC20", side_effect=Exception("skip metadata")),
+            patch("y.get_price", AsyncMock(return_value=1.0)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+            self._spy_lanes(lanes),
+        ):
+            client = TestClient(app)
+            assert client.get("/check_bucket", params={"token": DAI}).status_code == 200
+            client.get("/price", params={"token": DAI, "block": "18000001"})
+            client.get(
+                "/price", params={"token": DAI, "block": "18000002"}, headers={"X-Priority": "high"}
+            )
+            client.get(
+                "/price", params={"token": DAI, "block": "18000003"}, headers={"X-Priority": "low"}
+            )
+            client.get("/price", params={"token": USDC, "block": "18000004"})
+
+        assert lanes == [("fast", 1), ("fast", 0), ("slow", 2), ("default", 1)]
+
+    @pytest.mark.asyncio
+    async def test_unseen_token_is_classified_before_choosing_lane(
+        self, mock_y_module: None
+    ) -> None:
+        from src.scheduler import CostModel
+        from src.server import _fetch_batch_prices, _fetch_price
+
+        model = CostModel(fast_latency=-1, slow_latency=999)
+        lanes: list[tuple[str, int]] = []
+        buckets = {DAI: "stable usd", WETH: "curve lp"}
+        mock_check_bucket = AsyncMock(side_effect=lambda token, **kw: buckets.get(token))
+
+        with (
+            patch("src.server._cost_model", model),
+            patch("y.check_bucket", mock_check_bucket),
+            patch("y.get_price", AsyncMock(return_value=1.0)),
+            patch("y.get_prices", AsyncMock(return_value=[1.0, 1.0])),
+            self._spy_lanes(lanes),
+        ):
+            await _fetch_price(DAI, 18000000)
+            await _fetch_price(USDC, 18000000)
+            await _fetch_batch_prices((DAI, WETH), 18000000)
+            await _fetch_price(DAI, 18000001)
+
+        assert [lane for lane, _ in lanes] == ["fast", "default", "slow", "fast"]
+        # Each token is classified once, including the one with no bucket
+        assert sorted(c.args[0] for c in mock_check_bucket.call_args_list) == sorted(
+            [DAI, USDC, WETH]
+        )
+
+    @pytest.mark.asyncio
+    async def test_latency_history_moves_token_to_slow_lane(self, mock_y_module: None) -> None:
+        from src.scheduler import CostModel
+        from src.server import _fetch_batch_prices, _fetch_price
+
+        model = CostModel(fast_latency=0.0, slow_latency=0.01)
+        lanes: list[tuple[str, int]] = []
+
+        async def slow_price(*args: Any, **kwargs: Any) -> float:
+            await asyncio.sleep(0.02)
+            return 1.0
+
+        with (
+            patch("src.server._cost_model", model),
+            patch("y.get_price", slow_price),
+            patch("y.get_prices", AsyncMock(return_value=[1.0, 1.0])),
+            self._spy_lanes(lanes),
+        ):
+            await _fetch_price(DAI, 18000000)
+            await _fetch_price(DAI, 18000001)
+            await _fetch_batch_prices((USDC, DAI), 18000000)
+
+        assert [lane for lane, _ in lanes] == ["default", "slow", "slow"]
+        assert model.latency(USDC) is None  # multi-token calls are not attributed
+
+
+class TestLoadShedding:
+    """Tests for admission control of cache-miss work."""
+
+    def test_cache_miss_shed_but_cache_hit_served(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.cache import set_cached_price
+        from src.server import _scheduler, app
+
+        set_cached_price(DAI, 18000000, 1.0, block_timestamp=1700000000)
+        mock_get_price = AsyncMock(return_value=1.0)
+
+        with (
+            patch.object(_scheduler, "in_flight", return_value=5000),
+            patch("y.get_price", mock_get_price),
+        ):
+            client = TestClient(app)
+            hit = client.get("/price", params={"token": DAI, "block": "18000000"})
+            miss = client.get("/price", params={"token": USDC, "block": "18000000"})
+            low = client.get(
+                "/price",
+                params={"token": USDC, "block": "18000000"},
+                headers={"X-Priority": "low"},
+            )
+
+        assert hit.status_code == 200
+        assert hit.json()["cached"] is True
+        assert miss.status_code == 503
+        assert int(miss.headers["Retry-After"]) >= 1
+        assert "overloaded" in miss.json()["error"]
+        assert low.status_code == 503
+        mock_get_price.assert_not_called()
+
+    def test_low_priority_shed_first_with_429(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import _scheduler, app
+
+        with (
+            patch.object(_scheduler, "longest_wait", return_value=20.0),
+            patch("src.server._admission.max_queue_wait", 30.0),
+            patch("y.get_price", AsyncMock(return_value=1.0)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            normal = client.get("/price", params={"token": USDC, "block": "18000000"})
+            low = client.get(
+                "/price",
+                params={"token": DAI, "block": "18000000"},
+                headers={"X-Priority": "low"},
+            )
+
+        assert normal.status_code == 200
+        assert low.status_code == 429
+        assert low.headers["Retry-After"] == "20"
+
+    def test_batch_with_misses_shed_fully_cached_served(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.cache import set_cached_price
+        from src.server import _scheduler, app
+
+        set_cached_price(DAI, 18000000, 1.0, block_timestamp=1700000000)
+
+        with (
+            patch.object(_scheduler, "in_flight", return_value=5000),
+            patch("y.get_prices", AsyncMock(return_value=[1.0])),
+        ):
+            client = TestClient(app)
+            cached = client.get("/prices", params={"tokens": DAI, "block": "18000000"})
+            shed = client.get("/prices", params={"tokens": f"{DAI},{USDC}", "block": "18000000"})
+            series = client.get(
+                "/price_series", params={"token": DAI, "start_block": 1, "end_block": 2}
+            )
+
+        assert cached.status_code == 200
+        assert cached.json()[0]["price"] == 1.0
+        assert shed.status_code == 503
+        assert "Retry-After" in shed.headers
+        assert series.status_code == 503
+
+
+class TestClientLimits:
+    """Tests for per-client limits on cache-miss work."""
+
+    def test_misses_limited_per_client_hits_unthrottled(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.cache import set_cached_price
+        from src.ratelimit import ClientLimiter, parse_client_weights
+        from src.server import app
+
+        set_cached_price(DAI, 18000000, 1.0, block_timestamp=1700000000)
+        limiter = ClientLimiter(
+            rate=0.01,
+            burst=1,
+            compute_rate=0,
+            compute_burst=0,
+            weights=parse_client_weights("alice=1,bob=1"),
+        )
+
+        with (
+            patch("src.server._limiter", limiter),
+            patch("y.get_price", AsyncMock(return_value=2.0)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            alice = {"X-API-Key": "alice"}
+            first = client.get("/price", params={"token": USDC, "block": "1"}, headers=alice)
+            second = client.get("/price", params={"token": USDC, "block": "2"}, headers=alice)
+            hits = [
+                client.get("/price", params={"token": DAI, "block": "18000000"}, headers=alice)
+                for _ in range(5)
+            ]
+            bob = client.get(
+                "/price", params={"token": USDC, "block": "2"}, headers={"X-API-Key": "bob"}
+            )
+
+        assert first.status_code == 200
+        assert second.status_code == 429
+        assert second.headers["Retry-After"] == "100"
+        assert "requests" in second.json()["error"]
+        assert all(r.status_code == 200 for r in hits)
+        assert bob.status_code == 200
+
+    def test_compute_time_charged_to_client(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.ratelimit import ClientLimiter, api_key_client_id
+        from src.server import app
+
+        limiter = ClientLimiter(
+            rate=0,
+            burst=0,
+            compute_rate=1.0,
+            compute_burst=0,
+            weights={api_key_client_id("k"): 1.0},
+        )
+
+        with (
+            patch("src.server._limiter", limiter),
+            patch("y.get_price", AsyncMock(return_value=2.0)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            client.get("/price", params={"token": USDC, "block": "1"}, headers={"X-API-Key": "k"})
+            limiter.charge_compute(api_key_client_id("k"), 5.0)
+            limited = client.get(
+                "/price", params={"token": USDC, "block": "2"}, headers={"X-API-Key": "k"}
+            )
+
+        assert limited.status_code == 429
+        assert "compute" in limited.json()["error"]
+
+    def test_spoofed_forwarded_for_or_unknown_key_keeps_buckets(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.ratelimit import ClientLimiter
+        from src.server import app
+
+        limiter = ClientLimiter(rate=0.01, burst=1, compute_rate=0, compute_burst=0)
+
+        with (
+            patch("src.server._limiter", limiter),
+            patch("src.server.TRUSTED_PROXY_HOPS", 1),
+            patch("y.get_price", AsyncMock(return_value=2.0)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+
+            def get(block: int, headers: dict[str, str]) -> int:
+                params = {"token": USDC, "block": str(block)}
+                status: int = client.get("/price", params=params, headers=headers).status_code
+                return status
+
+            # The proxy appends the caller's address after whatever it sent
+            proxied = {"X-Forwarded-For": "9.9.9.9"}
+            assert get(1, proxied) == 200
+            assert get(2, {"X-Forwarded-For": "1.1.1.1, 9.9.9.9"}) == 429
+            assert get(3, {**proxied, "X-API-Key": "random"}) == 429
+            assert get(4, {"X-Forwarded-For": "8.8.8.8"}) == 200
+
+    def test_client_id_from_known_api_key_or_forwarded_ip(self) -> None:
+        from starlette.requests import Request
+
+        from src.ratelimit import ClientLimiter, api_key_client_id
+        from src.server import _client_id
+
+        def request(headers: dict[str, str]) -> Request:
+            return Request(
+                {
+                    "type": "http",
+                    "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+                    "client": ("10.0.0.9", 1234),
+                }
+            )
+
+        limiter = ClientLimiter(0, 0, 0, 0, weights={api_key_client_id("abc"): 2.0})
+        with patch("src.server._limiter", limiter):
+            assert _client_id(request({"X-API-Key": "abc"})) == api_key_client_id("abc")
+            assert _client_id(request({"X-API-Key": "xyz"})) == "ip:10.0.0.9"
+        assert _client_id(request({"X-Forwarded-For": "1.2.3.4"})) == "ip:10.0.0.9"
+        with patch("src.server.TRUSTED_PROXY_HOPS", 1):
+            assert _client_id(request({"X-Forwarded-For": "1.2.3.4, 10.0.0.1"})) == "ip:10.0.0.1"
+            assert _client_id(request({})) == "ip:10.0.0.9"
+        with patch("src.server.TRUSTED_PROXY_HOPS", 2):
+            assert _client_id(request({"X-Forwarded-For": "1.2.3.4, 10.0.0.1"})) == "ip:1.2.3.4"
+            assert _client_id(request({"X-Forwarded-For": "10.0.0.1"})) == "ip:10.0.0.9"
+
+
+class TestProvisionalBlockHash:
+    """Tests for recording near-head block hashes for reorg detection."""
+
+    @pytest.mark.asyncio
+    async def test_records_hash_for_provisional_block_once(self) -> None:
+        from src.cache import provisional_block_hash, set_chain_head
+        from src.server import _record_provisional_block_hash
+
+        set_chain_head(1000)
+        mock_fetch = AsyncMock(return_value="0xabc")
+        with patch("src.server._fetch_block_hash", mock_fetch):
+            await _record_provisional_block_hash(990)
+            await _record_provisional_block_hash(990)
+        assert provisional_block_hash(990) == "0xabc"
+        mock_fetch.assert_called_once_with(990)
+
+    @pytest.mark.asyncio
+    async def test_skips_final_blocks(self) -> None:
+        from src.cache import set_chain_head
+        from src.server import _record_provisional_block_hash
+
+        set_chain_head(1000)
+        mock_fetch = AsyncMock(return_value="0xabc")
+        with patch("src.server._fetch_block_hash", mock_fetch):
+            await _record_provisional_block_hash(100)
+        mock_fetch.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_hash_recorded_before_lookup(self, mock_y_module: None) -> None:
+        from src.cache import provisional_block_hash, set_chain_head
+        from src.params import BatchParams
+        from src.server import _fetch_price_and_cache, _handle_batch_request
+
+        set_chain_head(1000)
+        # Each block is reorged while its prices are being looked up
+        reorged: set[int] = set()
+
+        async def get_price(token: str, block: int, **kwargs: object) -> float:
+            reorged.add(block)
+            return 1.0
+
+        async def get_prices(tokens: tuple[str, ...], block: int, **kwargs: object) -> list[float]:
+            reorged.add(block)
+            return [1.0] * len(tokens)
+
+        async def block_hash(block: int) -> str:
+            return "0xnew" if block in reorged else "0xold"
+
+        with (
+            patch("src.server._fetch_block_hash", block_hash),
+            patch("y.get_price", AsyncMock(side_effect=get_price)),
+            patch("y.get_prices", AsyncMock(side_effect=get_prices)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+            patch("src.server.lookup_cached_many", side_effect=_no_cached_lookups),
+        ):
+            await _fetch_price_and_cache(DAI, 995)
+            await _handle_batch_request(BatchParams(tokens=(DAI, USDC), block=996))
+
+        assert provisional_block_hash(995) == "0xold"
+        assert provisional_block_hash(996) == "0xold"
+
+
+class TestHealthEndpoint:
+    """Tests for the enhanced /health endpoint with node sync status."""
+
+    @pytest.mark.asyncio
+    async def test_synced_true_when_node_synced(self, mock_y_module: None) -> None:
+        """When check_node_async succeeds, health returns synced=True."""
+        from src.server import health
+
+        mock_check_node_async = AsyncMock(return_value=None)
+        mock_chain = type("MockChain", (), {"height": 18000000})()
+
+        with (
+            patch("y.time.check_node_async", mock_check_node_async),
+            patch("brownie.chain", mock_chain),
+        ):
+            result = await health()
+            assert result["status"] == "ok"
+            assert result["chain"] == "ethereum"
+            assert result["block"] == 18000000
+            assert result["synced"] is True
+
+    @pytest.mark.asyncio
+    async def test_synced_false_when_node_not_synced(self, mock_y_module: None) -> None:
+        """When check_node_async raises NodeNotSynced, health returns synced=False."""
+        from src.server import health
+
+        # Create a NodeNotSynced exception matching ypricemagic's name
+        class NodeNotSynced(Exception):  # noqa: N818
+            pass
+
+        mock_check_node_async = AsyncMock(side_effect=NodeNotSynced("Node is behind"))
+        mock_chain = type("MockChain", (), {"height": 18000000})()
+
+        with (
+            patch("y.time.check_node_async", mock_check_node_async),
+            patch("brownie.chain", mock_chain),
+        ):
+            result = await health()
+            assert result["status"] == "ok"
+            assert result["synced"] is False
+
+    @pytest.mark.asyncio
+    async def test_synced_none_on_other_exception(self, mock_y_module: None) -> None:
+        """When check_node_async raises unexpected exception, health returns synced=None."""
+        from src.server import health
+
+        mock_check_node_async = AsyncMock(side_effect=RuntimeError("Unexpected error"))
+        mock_chain = type("MockChain", (), {"height": 18000000})()
+
+        with (
+            patch("y.time.check_node_async", mock_check_node_async),
+            patch("brownie.chain", mock_chain),
+        ):
+            result = await health()
+            assert result["status"] == "ok"
+            assert result["synced"] is None
+
+    @pytest.mark.asyncio
+    async def test_503_on_chain_height_failure(self, mock_y_module: None) -> None:
+        """When chain.height fails, health returns 503 (existing behavior preserved)."""
+        from fastapi.responses import JSONResponse
+
+        from src.server import health
+
+        mock_chain = type(
+            "MockChain",
+            (),
+            {"height": property(lambda self: (_ for _ in ()).throw(ConnectionError("RPC failed")))},
+        )()
+
+        with patch("brownie.chain", mock_chain):
+            result = await health()
+            assert isinstance(result, JSONResponse)
+            assert result.status_code == 503
+
+    @pytest.mark.asyncio
+    async def test_existing_fields_preserved(self, mock_y_module: None) -> None:
+        """Health response retains status, chain, block fields. synced is additive."""
+        from src.server import health
+
+        mock_check_node_async = AsyncMock(return_value=None)
+        mock_chain = type("MockChain", (), {"height": 18000000})()
+
+        with (
+            patch("y.time.check_node_async", mock_check_node_async),
+            patch("brownie.chain", mock_chain),
+        ):
+            result = await health()
+            # All required fields present
+            assert "status" in result
+            assert "chain" in result
+            assert "block" in result
+            assert "synced" in result
+            # Values correct
+            assert result["status"] == "ok"
+            assert result["block"] == 18000000
+            assert result["synced"] is True
+
+    @pytest.mark.asyncio
+    async def test_timeout_protection(self, mock_y_module: None) -> None:
+        """check_node_async timeout doesn't hang health endpoint."""
+        import asyncio
+
+        from src.server import health
+
+        async def slow_check() -> None:
+            await asyncio.sleep(10)  # Would hang without timeout
+
+        mock_check_node_async = AsyncMock(side_effect=slow_check)
+        mock_chain = type("MockChain", (), {"height": 18000000})()
+
+        with (
+            patch("y.time.check_node_async", mock_check_node_async),
+            patch("brownie.chain", mock_chain),
+        ):
+            # Should complete within reasonable time (timeout is 5s)
+            result = await health()
+            # Timeout should result in synced=None
+            assert result["synced"] is None
+
+    @pytest.mark.asyncio
+    async def test_synced_check_only_after_height_success(self, mock_y_module: None) -> None:
+        """synced check only runs if we can get block height (503 path unchanged)."""
+        from fastapi.responses import JSONResponse
+
+        from src.server import health
+
+        # Simulate chain.height failing
+        mock_chain = type(
+            "MockChain",
+            (),
+            {"height": property(lambda self: (_ for _ in ()).throw(ConnectionError("RPC failed")))},
+        )()
+        mock_check_node_async = AsyncMock(return_value=None)
+
+        with (
+            patch("brownie.chain", mock_chain),
+            patch("y.time.check_node_async", mock_check_node_async),
+        ):
+            result = await health()
+            # Should return 503, not call check_node_async
+            assert isinstance(result, JSONResponse)
+            assert result.status_code == 503
+            # check_node_async should not have been called
+            mock_check_node_async.assert_not_called()
+
+
+class TestBatchPricesEndpoint:
+    """Tests for GET /prices batch pricing endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_single_token_returns_array_of_one(self, mock_y_module: None) -> None:
+        """Single token returns 200 with JSON array containing one result."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[1.0])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+        ):
+            client = TestClient(app)
+            response = client.get("/prices", params={"tokens": DAI})
+
+            assert response.status_code == 200
+            data = response.json()
+            assert isinstance(data, list)
+            assert len(data) == 1
+            assert data[0]["token"] == DAI
+            assert data[0]["price"] == 1.0
+            assert data[0]["cached"] is False
+
+    @pytest.mark.asyncio
+    async def test_multiple_tokens_preserve_order(self, mock_y_module: None) -> None:
+        """Multiple tokens return ordered results preserving input order."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[1.0, 1.0])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+        ):
+            client = TestClient(app)
+            response = client.get("/prices", params={"tokens": f"{DAI},{USDC}"})
+
+            assert response.status_code == 200
+            data = response.json()
+            assert len(data) == 2
+            assert data[0]["token"] == DAI
+            assert data[1]["token"] == USDC
+
+    @pytest.mark.asyncio
+    async def test_missing_tokens_returns_400(self, mock_y_module: None) -> None:
+        """Missing tokens param returns 400."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with patch("brownie.chain", mock_chain):
+            client = TestClient(app)
+            response = client.get("/prices")
+
+            assert response.status_code == 400
+            data = response.json()
+            assert "tokens" in data["error"].lower()
+
+    @pytest.mark.asyncio
+    async def test_invalid_address_returns_400(self, mock_y_module: None) -> None:
+        """Invalid address in list returns 400."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with patch("brownie.chain", mock_chain):
+            client = TestClient(app)
+            response = client.get("/prices", params={"tokens": f"{DAI},INVALID"})
+
+            assert response.status_code == 400
+            data = response.json()
+            assert "INVALID" in data["error"]
+
+    @pytest.mark.asyncio
+    async def test_block_applies_to_all_tokens(self, mock_y_module: None) -> None:
+        """Block param applies to all tokens."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[1.0, 1.0])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/prices", params={"tokens": f"{DAI},{USDC}", "block": "18000000"}
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert all(r["block"] == 18000000 for r in data)
+
+    @pytest.mark.asyncio
+    async def test_partial_failure_returns_null_prices(self, mock_y_module: None) -> None:
+        """Partial failure returns 200 with null prices for failed tokens."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        # First token succeeds, second fails
+        mock_get_prices = AsyncMock(return_value=[1.0, None])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+        ):
+            client = TestClient(app)
+            response = client.get("/prices", params={"tokens": f"{DAI},{USDC}"})
+
+            assert response.status_code == 200
+            data = response.json()
+            assert len(data) == 2
+            assert data[0]["price"] == 1.0
+            assert data[1]["price"] is None
+
+    @pytest.mark.asyncio
+    async def test_all_failures_returns_200(self, mock_y_module: None) -> None:
+        """All-failures also returns 200 with null prices."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[None, None])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+        ):
+            client = TestClient(app)
+            response = client.get("/prices", params={"tokens": f"{DAI},{USDC}"})
+
+            assert response.status_code == 200
+            data = response.json()
+            assert all(r["price"] is None for r in data)
+
+    @pytest.mark.asyncio
+    async def test_batch_with_timestamp_resolves_correctly(self, mock_y_module: None) -> None:
+        """Batch with timestamp resolves to block and prices all tokens."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_block_at_timestamp = AsyncMock(return_value=18000000)
+        mock_get_prices = AsyncMock(return_value=[1.0, 1.0])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_block_at_timestamp", mock_get_block_at_timestamp),
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/prices", params={"tokens": f"{DAI},{USDC}", "timestamp": "1700000000"}
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert all(r["block"] == 18000000 for r in data)
+            mock_get_block_at_timestamp.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_batch_timestamp_converted_to_datetime(self, mock_y_module: None) -> None:
+        """Batch endpoint converts Unix epoch to datetime before calling get_block_at_timestamp."""
+        from datetime import UTC, datetime
+
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_block_at_timestamp = AsyncMock(return_value=18000000)
+        mock_get_prices = AsyncMock(return_value=[1.0, 1.0])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_block_at_timestamp", mock_get_block_at_timestamp),
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/prices", params={"tokens": f"{DAI},{USDC}", "timestamp": "1700000000"}
+            )
+
+            assert response.status_code == 200
+            # Verify get_block_at_timestamp was called with a datetime object
+            mock_get_block_at_timestamp.assert_called_once()
+            call_args = mock_get_block_at_timestamp.call_args
+            dt_arg = call_args[0][0]
+            assert isinstance(dt_arg, datetime)
+            assert dt_arg == datetime.fromtimestamp(1700000000, tz=UTC)
+            assert dt_arg.tzinfo is not None
+
+    @pytest.mark.asyncio
+    async def test_batch_with_timestamp_and_amounts(self, mock_y_module: None) -> None:
+        """Batch with timestamp and amounts combined works."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_block_at_timestamp = AsyncMock(return_value=18000000)
+        mock_get_prices = AsyncMock(return_value=[1.0, 2.0])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_block_at_timestamp", mock_get_block_at_timestamp),
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/prices",
+                params={
+                    "tokens": f"{DAI},{USDC}",
+                    "timestamp": "1700000000",
+                    "amounts": "1000,500",
+                },
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert len(data) == 2
+            # Verify amounts were passed to get_prices
+            mock_get_prices.assert_called_once()
+            call_kwargs = mock_get_prices.call_args[1]
+            assert call_kwargs.get("amounts") == (1000.0, 500.0)
+
+    @pytest.mark.asyncio
+    async def test_too_many_tokens_returns_400(self, mock_y_module: None) -> None:
+        """More than 100 tokens returns 400."""
+        from fastapi.testclient import TestClient
+
+        from src.params import MAX_BATCH_TOKENS
+        from src.server import app
+
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+        tokens = ",".join([DAI] * (MAX_BATCH_TOKENS + 1))
+
+        with patch("brownie.chain", mock_chain):
+            client = TestClient(app)
+            response = client.get("/prices", params={"tokens": tokens})
+
+            assert response.status_code == 400
+            data = response.json()
+            assert "Too many" in data["error"]
+
+    @pytest.mark.asyncio
+    async def test_batch_results_include_block_timestamp(self, mock_y_module: None) -> None:
+        """Each element in batch response includes block_timestamp field."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[1.0, 1.0])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
         ):
             client = TestClient(app)
             response = client.get("/prices", params={"tokens": f"{DAI},{USDC}"})
 
             assert response.status_code == 200
             data = response.json()
-            assert all(r["price"] is None for r in data)
+            assert all("block_timestamp" in r for r in data)
+            assert all(r["block_timestamp"] == 1700000000 for r in data)
+
+
+class TestBatchPricesAmounts:
+    """Tests for amounts parameter in batch pricing."""
+
+    @pytest.mark.asyncio
+    async def test_amounts_matching_count(self, mock_y_module: None) -> None:
+        """Amounts with matching count work for price impact."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[0.99, 1.01])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/prices", params={"tokens": f"{DAI},{USDC}", "amounts": "1000,500"}
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert len(data) == 2
+            # Verify amounts were passed
+            call_kwargs = mock_get_prices.call_args[1]
+            assert call_kwargs.get("amounts") == (1000.0, 500.0)
+
+    @pytest.mark.asyncio
+    async def test_amounts_count_mismatch_returns_400(self, mock_y_module: None) -> None:
+        """Amounts count mismatch returns 400."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with patch("brownie.chain", mock_chain):
+            client = TestClient(app)
+            response = client.get("/prices", params={"tokens": f"{DAI},{USDC}", "amounts": "1000"})
+
+            assert response.status_code == 400
+            data = response.json()
+            assert "does not match" in data["error"].lower()
+
+    @pytest.mark.asyncio
+    async def test_invalid_amount_returns_400(self, mock_y_module: None) -> None:
+        """Invalid amount values return 400."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with patch("brownie.chain", mock_chain):
+            client = TestClient(app)
+            response = client.get(
+                "/prices", params={"tokens": f"{DAI},{USDC}", "amounts": "1000,abc"}
+            )
+
+            assert response.status_code == 400
+            data = response.json()
+            assert "amount" in data["error"].lower()
+
+
+class TestBatchPricesCaching:
+    """Tests for caching behavior in batch pricing."""
+
+    @pytest.mark.asyncio
+    async def test_cache_hit_for_single_token(self, mock_y_module: None) -> None:
+        """Individual results are cached and retrievable via single /price."""
+        from unittest.mock import patch
+
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[1.0])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        # Mock cache functions
+        cached_data: dict[str, dict[str, object]] = {}
+
+        def mock_get_cached_prices_many(
+            tokens: Sequence[str], block: int
+        ) -> list[dict[str, object] | None]:
+            return [cached_data.get(f"{token}:{block}") for token in tokens]
+
+        def mock_set_cached_prices_many(
+            entries: Iterable[tuple[str, int, float, int | None]],
+        ) -> None:
+            for token, block, price, block_timestamp in entries:
+                cached_data[f"{token}:{block}"] = {
+                    "price": price,
+                    "block_timestamp": block_timestamp,
+                }
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", _lookups_from(mock_get_cached_prices_many)),
+            patch("src.server.set_cached_prices_many", mock_set_cached_prices_many),
+        ):
+            client = TestClient(app)
+
+            # First request - should fetch
+            response = client.get("/prices", params={"tokens": DAI, "block": "18000000"})
+            assert response.status_code == 200
+            data = response.json()
+            assert data[0]["cached"] is False
+
+            # Verify it was cached
+            assert f"{DAI}:18000000" in cached_data
+
+    @pytest.mark.asyncio
+    async def test_amounts_bypass_cache_write(self, mock_y_module: None) -> None:
+        """Results with amounts are NOT cached."""
+        from unittest.mock import patch
+
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[1.0])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        cached_data: dict[str, dict[str, object]] = {}
+
+        def mock_set_cached_prices_many(
+            entries: Iterable[tuple[str, int, float, int | None]],
+        ) -> None:
+            for token, block, price, block_timestamp in entries:
+                cached_data[f"{token}:{block}"] = {
+                    "price": price,
+                    "block_timestamp": block_timestamp,
+                }
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", side_effect=_no_cached_lookups),
+            patch("src.server.set_cached_prices_many", mock_set_cached_prices_many),
+        ):
+            client = TestClient(app)
+
+            # Request with amount - should NOT cache
+            response = client.get(
+                "/prices", params={"tokens": DAI, "block": "18000000", "amounts": "1000"}
+            )
+            assert response.status_code == 200
+
+            # Verify it was NOT cached
+            assert f"{DAI}:18000000" not in cached_data
+
+    @pytest.mark.asyncio
+    async def test_batch_uses_one_bulk_read_and_one_bulk_write(self, mock_y_module: None) -> None:
+        """The cache pass and the cache fill are one bulk call each, not one per token."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[1.0, 2.0, 3.0])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+        mock_get_many = MagicMock(side_effect=_no_cached_lookups)
+        mock_set_many = MagicMock()
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", mock_get_many),
+            patch("src.server.set_cached_prices_many", mock_set_many),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/prices", params={"tokens": f"{DAI},{USDC},{WETH}", "block": "18000000"}
+            )
+
+        assert response.status_code == 200
+        mock_get_many.assert_called_once_with([DAI, USDC, WETH], 18000000)
+        mock_set_many.assert_called_once()
+        written = mock_set_many.call_args[0][0]
+        assert [(t, b, p) for t, b, p, _ in written] == [
+            (DAI, 18000000, 1.0),
+            (USDC, 18000000, 2.0),
+            (WETH, 18000000, 3.0),
+        ]
+
+
+class TestBatchPricesParams:
+    """Tests for ignored params in batch pricing."""
+
+
+class TestBatchPricesMixedAmounts:
+    """Tests for mixed amounts lists (some None) - documenting intended semantics.
+
+    This documents the behavior where some tokens in a batch have amounts
+    specified and others don't. Tokens with None amounts are cached normally,
+    while tokens with amounts skip caching (since price depends on amount).
+    """
+
+    @pytest.mark.asyncio
+    async def test_mixed_amounts_passed_to_get_prices(self, mock_y_module: None) -> None:
+        """Mixed amounts list with None values is passed to get_prices correctly."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[1.0, 2.0, 3.0])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", side_effect=_no_cached_lookups),
+        ):
+            client = TestClient(app)
+            # DAI has amount 1000, USDC has None, WETH has amount 500
+            response = client.get(
+                "/prices",
+                params={
+                    "tokens": f"{DAI},{USDC},{WETH}",
+                    "amounts": "1000,,500",
+                    "block": "18000000",
+                },
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert len(data) == 3
+
+            # Verify amounts were passed correctly to get_prices
+            call_kwargs = mock_get_prices.call_args[1]
+            assert call_kwargs.get("amounts") == (1000.0, None, 500.0)
+
+    @pytest.mark.asyncio
+    async def test_mixed_amounts_caching_semantics(self, mock_y_module: None) -> None:
+        """Tokens with None amounts are cached, tokens with amounts are not."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[1.0, 2.0, 3.0])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        cached_data: dict[str, dict[str, object]] = {}
+
+        def mock_get_cached_prices_many(
+            tokens: Sequence[str], block: int
+        ) -> list[dict[str, object] | None]:
+            return [cached_data.get(f"{token}:{block}") for token in tokens]
+
+        def mock_set_cached_prices_many(
+            entries: Iterable[tuple[str, int, float, int | None]],
+        ) -> None:
+            for token, block, price, block_timestamp in entries:
+                cached_data[f"{token}:{block}"] = {
+                    "price": price,
+                    "block_timestamp": block_timestamp,
+                }
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", _lookups_from(mock_get_cached_prices_many)),
+            patch("src.server.set_cached_prices_many", mock_set_cached_prices_many),
+        ):
+            client = TestClient(app)
+            # DAI has amount, USDC has None, WETH has amount
+            response = client.get(
+                "/prices",
+                params={
+                    "tokens": f"{DAI},{USDC},{WETH}",
+                    "amounts": "1000,,500",
+                    "block": "18000000",
+                },
+            )
+
+            assert response.status_code == 200
+
+            # USDC (with None amount) should be cached
+            assert f"{USDC}:18000000" in cached_data
+
+            # DAI and WETH (with amounts) should NOT be cached
+            assert f"{DAI}:18000000" not in cached_data
+            assert f"{WETH}:18000000" not in cached_data
+
+    @pytest.mark.asyncio
+    async def test_all_none_amounts_all_cached(self, mock_y_module: None) -> None:
+        """When all amounts are None, all results are cached."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[1.0, 2.0])
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        cached_data: dict[str, dict[str, object]] = {}
+
+        def mock_set_cached_prices_many(
+            entries: Iterable[tuple[str, int, float, int | None]],
+        ) -> None:
+            for token, block, price, block_timestamp in entries:
+                cached_data[f"{token}:{block}"] = {
+                    "price": price,
+                    "block_timestamp": block_timestamp,
+                }
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", side_effect=_no_cached_lookups),
+            patch("src.server.set_cached_prices_many", mock_set_cached_prices_many),
+        ):
+            client = TestClient(app)
+            # Both tokens have None amounts
+            response = client.get(
+                "/prices",
+                params={
+                    "tokens": f"{DAI},{USDC}",
+                    "amounts": ",",
+                    "block": "18000000",
+                },
+            )
+
+            assert response.status_code == 200
+
+            # Both should be cached
+            assert f"{DAI}:18000000" in cached_data
+            assert f"{USDC}:18000000" in cached_data
+
+    @pytest.mark.asyncio
+    async def test_none_amount_token_uses_cache_on_hit(self, mock_y_module: None) -> None:
+        """Tokens with None amounts can get cache hits."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[1.0])  # Only for WETH
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        # DAI already cached
+        def mock_get_cached_prices_many(
+            tokens: Sequence[str], block: int
+        ) -> list[dict[str, object] | None]:
+            return [
+                {"price": 1.0, "block_timestamp": 1700000000} if token == DAI else None
+                for token in tokens
+            ]
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", _lookups_from(mock_get_cached_prices_many)),
+            patch("src.server.set_cached_prices_many", lambda entries: None),
+        ):
+            client = TestClient(app)
+            # DAI has None amount (can use cache), WETH has amount (must fetch)
+            response = client.get(
+                "/prices",
+                params={
+                    "tokens": f"{DAI},{WETH}",
+                    "amounts": ",500",
+                    "block": "18000000",
+                },
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert len(data) == 2
+
+            # DAI should be from cache
+            assert data[0]["token"] == DAI
+            assert data[0]["cached"] is True
+
+            # WETH should be fresh
+            assert data[1]["token"] == WETH
+            assert data[1]["cached"] is False
+
+            # get_prices should only be called for WETH
+            mock_get_prices.assert_called_once()
+            call_args = mock_get_prices.call_args
+            # The tokens passed should just be WETH
+            assert call_args[0][0] == (WETH,)
+
+
+class TestBatchPricesPost:
+    """Tests for POST /prices with a JSON body."""
+
+    @pytest.mark.asyncio
+    async def test_json_body_matches_get_shape(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[1.0, 2.0])
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", side_effect=_no_cached_lookups),
+        ):
+            client = TestClient(app)
+            response = client.post(
+                "/prices", json={"tokens": [DAI, USDC], "amounts": [None, 500], "block": 18000000}
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [(r["token"], r["price"], r["block"]) for r in data] == [
+            (DAI, 1.0, 18000000),
+            (USDC, 2.0, 18000000),
+        ]
+        assert mock_get_prices.call_args.kwargs["amounts"] == (None, 500.0)
+
+    @pytest.mark.asyncio
+    async def test_repeated_tokens_priced_once(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(return_value=[1.0, 2.0])
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", side_effect=_no_cached_lookups),
+        ):
+            client = TestClient(app)
+            response = client.post(
+                "/prices", json={"tokens": [DAI, USDC, DAI.lower(), DAI], "block": 18000000}
+            )
+
+        assert response.status_code == 200
+        assert mock_get_prices.call_args.args[0] == (DAI, USDC)
+        data = response.json()
+        assert [r["token"] for r in data] == [DAI, USDC, DAI.lower(), DAI]
+        assert [r["price"] for r in data] == [1.0, 2.0, 1.0, 1.0]
+
+    @pytest.mark.asyncio
+    async def test_misses_fetched_in_bounded_chunks(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        tokens = [f"0x{i:040x}" for i in range(1, 8)]
+        in_flight = peak = 0
+
+        async def fake_get_prices(
+            chunk: tuple[str, ...], block: int, **kwargs: object
+        ) -> list[float]:
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return [float(int(token, 16)) for token in chunk]
+
+        mock_get_prices = AsyncMock(side_effect=fake_get_prices)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", side_effect=_no_cached_lookups),
+            patch("src.server.BATCH_CHUNK_SIZE", 2),
+            patch("src.server.BATCH_PARALLELISM", 2),
+        ):
+            client = TestClient(app)
+            response = client.post("/prices", json={"tokens": tokens, "block": 18000000})
+
+        assert response.status_code == 200
+        assert [len(c.args[0]) for c in mock_get_prices.call_args_list] == [2, 2, 2, 1]
+        assert peak == 2
+        assert [r["price"] for r in response.json()] == [float(i) for i in range(1, 8)]
+
+    @pytest.mark.asyncio
+    async def test_invalid_json_returns_400(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        client = TestClient(app)
+        response = client.post(
+            "/prices", content=b"{not json", headers={"Content-Type": "application/json"}
+        )
+
+        assert response.status_code == 400
+        assert "json" in response.json()["error"].lower()
+
+    @pytest.mark.asyncio
+    async def test_invalid_body_returns_400(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        client = TestClient(app)
+        response = client.post("/prices", json={"tokens": ["0x123"]})
+
+        assert response.status_code == 400
+        assert "position 1" in response.json()["error"]
+
+
+class TestBatchErrorCache:
+    """Tests for the negative (error) cache in batch pricing."""
+
+    @pytest.mark.asyncio
+    async def test_unpriceable_token_cached_and_not_refetched(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_prices = AsyncMock(
+            side_effect=lambda tokens, block, **kw: [None if t == USDC else 1.0 for t in tokens]
+        )
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            params = {"tokens": f"{DAI},{USDC}", "block": "18000000"}
+            first = client.get("/prices", params=params).json()
+            second = client.get("/prices", params=params).json()
+
+        assert first[1]["price"] is None
+        assert "cached_error" not in first[1]
+        mock_get_prices.assert_called_once()
+        assert second[0]["cached"] is True
+        assert second[1]["price"] is None
+        assert second[1]["cached_error"] is True
+        assert "No price found" in second[1]["error"]
+
+    @pytest.mark.asyncio
+    async def test_force_retries_cached_errors(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.cache import set_cached_error
+        from src.server import app
+
+        set_cached_error(USDC, 18000000, "no route")
+        mock_get_prices = AsyncMock(return_value=[2.0])
+
+        with (
+            patch("y.get_prices", mock_get_prices),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            cached = client.get("/prices", params={"tokens": USDC, "block": "18000000"}).json()
+            forced = client.post(
+                "/prices", json={"tokens": [USDC], "block": 18000000, "force": True}
+            ).json()
+
+        assert cached[0]["cached_error"] is True
+        assert cached[0]["error"] == "no route"
+        assert forced[0]["price"] == 2.0
+        assert "cached_error" not in forced[0]
+        mock_get_prices.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_amount_lookups_skip_error_cache(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.cache import get_cached_error
+        from src.server import app
+
+        with (
+            patch("y.get_prices", AsyncMock(return_value=[None])),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/prices", params={"tokens": DAI, "amounts": "1000", "block": "18000000"}
+            )
+
+        assert response.json()[0]["price"] is None
+        assert get_cached_error(DAI, 18000000) is None
+
+    @pytest.mark.asyncio
+    async def test_streamed_misses_populate_error_cache(self, mock_y_module: None) -> None:
+        import json
+
+        from fastapi.testclient import TestClient
+
+        from src.cache import get_cached_error
+        from src.server import app
+
+        with (
+            patch("y.get_price", AsyncMock(return_value=None)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            headers = {"Accept": "application/x-ndjson"}
+            params = {"tokens": DAI, "block": "18000000"}
+            client.get("/prices", params=params, headers=headers)
+            response = client.get("/prices", params=params, headers=headers)
+
+        assert get_cached_error(DAI, 18000000) is not None
+        (line,) = [json.loads(line) for line in response.text.splitlines()]
+        assert line["cached_error"] is True
+
+
+class TestBatchTokenDeadline:
+    """Tests for per-token deadlines in batch pricing."""
+
+    @pytest.mark.asyncio
+    async def test_slow_token_times_out_rest_of_batch_returns(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        async def slow_get_prices(tokens: tuple[str, ...], block: int, **kwargs: object) -> None:
+            await asyncio.sleep(1)
+
+        async def fake_get_price(token: str, block: int, **kwargs: object) -> float:
+            if token == USDC:
+                await asyncio.sleep(1)
+            return 1.0
+
+        mock_get_price = AsyncMock(side_effect=fake_get_price)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+
+        with (
+            patch("y.get_prices", AsyncMock(side_effect=slow_get_prices)),
+            patch("y.get_price", mock_get_price),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", side_effect=_no_cached_lookups),
+            patch("src.server.BATCH_CHUNK_TIMEOUT", 0.05),
+            patch("src.server.BATCH_TOKEN_TIMEOUT", 0.05),
+        ):
+            client = TestClient(app)
+            response = client.get(
+                "/prices", params={"tokens": f"{DAI},{USDC}", "block": "18000000"}
+            )
+
+        assert response.status_code == 200
+        dai, usdc = response.json()
+        assert dai["price"] == 1.0
+        assert "reason" not in dai
+        assert usdc["price"] is None
+        assert usdc["reason"] == "timed_out"
+        # The timed-out chunk fell back to one lookup per token
+        assert sorted(c.args[0] for c in mock_get_price.call_args_list) == sorted([DAI, USDC])
 
     @pytest.mark.asyncio
-    async def test_batch_with_timestamp_resolves_correctly(self, mock_y_module: None) -> None:
-        """Batch with timestamp resolves to block and prices all tokens."""
+    async def test_failed_chunk_falls_back_per_token(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
         from src.server import app
 
-        mock_get_block_at_timestamp = AsyncMock(return_value=18000000)
-        mock_get_prices = AsyncMock(return_value=[1.0, 1.0])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
         mock_chain = type("MockChain", (), {"height": 19000000})()
 
         with (
-            patch("y.get_block_at_timestamp", mock_get_block_at_timestamp),
-            patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("y.get_prices", AsyncMock(side_effect=RuntimeError("multicall reverted"))),
+            patch("y.get_price", AsyncMock(side_effect=lambda token, block, **kw: 2.0)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
             patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", side_effect=_no_cached_lookups),
         ):
             client = TestClient(app)
             response = client.get(
-                "/prices", params={"tokens": f"{DAI},{USDC}", "timestamp": "1700000000"}
+                "/prices", params={"tokens": f"{DAI},{USDC}", "block": "18000000"}
             )
 
-            assert response.status_code == 200
-            data = response.json()
-            assert all(r["block"] == 18000000 for r in data)
-            mock_get_block_at_timestamp.assert_called_once()
+        assert response.status_code == 200
+        assert [r["price"] for r in response.json()] == [2.0, 2.0]
 
     @pytest.mark.asyncio
-    async def test_batch_timestamp_converted_to_datetime(self, mock_y_module: None) -> None:
-        """Batch endpoint converts Unix epoch to datetime before calling get_block_at_timestamp."""
-        from datetime import UTC, datetime
+    async def test_timed_out_lookup_finishes_in_background_and_caches(
+        self, mock_y_module: None
+    ) -> None:
+        from src.server import TIMED_OUT, _batch_background, _fetch_batch_token_by_deadline
+
+        release = asyncio.Event()
+
+        async def fake_get_price(token: str, block: int, **kwargs: object) -> float:
+            await release.wait()
+            return 2.0
+
+        mock_set_price = MagicMock()
+        with (
+            patch("y.get_price", AsyncMock(side_effect=fake_get_price)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+            patch("src.server.set_cached_price", mock_set_price),
+            patch("src.server.BATCH_TOKEN_TIMEOUT", 0.01),
+        ):
+            assert await _fetch_batch_token_by_deadline(DAI, 18000000, None) == TIMED_OUT
+            assert len(_batch_background) == 1
+            release.set()
+            await asyncio.gather(*_batch_background)
+
+        mock_set_price.assert_called_once_with(DAI, 18000000, 2.0, block_timestamp=1700000000)
+
+    @pytest.mark.asyncio
+    async def test_timed_out_lookup_cancelled_when_background_full_or_uncacheable(
+        self, mock_y_module: None
+    ) -> None:
+        from src.server import TIMED_OUT, _batch_background, _fetch_batch_token_by_deadline
+
+        cancelled = 0
+
+        async def fake_get_price(token: str, block: int, **kwargs: object) -> float:
+            nonlocal cancelled
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled += 1
+                raise
+            return 1.0
+
+        with (
+            patch("y.get_price", AsyncMock(side_effect=fake_get_price)),
+            patch("src.server.BATCH_TOKEN_TIMEOUT", 0.01),
+        ):
+            with patch("src.server.BATCH_BACKGROUND_MAX", 0):
+                assert await _fetch_batch_token_by_deadline(DAI, 18000000, None) == TIMED_OUT
+            assert await _fetch_batch_token_by_deadline(DAI, 18000000, 5.0) == TIMED_OUT
+            await asyncio.sleep(0)
+
+        assert cancelled == 2
+        assert not _batch_background
+
+
+class TestBatchPricesStream:
+    """Tests for NDJSON streaming of /prices (Accept: application/x-ndjson)."""
+
+    @pytest.mark.asyncio
+    async def test_cache_hits_first_then_misses_as_they_resolve(self, mock_y_module: None) -> None:
+        import json
 
         from fastapi.testclient import TestClient
 
         from src.server import app
 
-        mock_get_block_at_timestamp = AsyncMock(return_value=18000000)
-        mock_get_prices = AsyncMock(return_value=[1.0, 1.0])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        async def fake_get_price(token: str, block: int, **kwargs: object) -> float:
+            await asyncio.sleep(0.05 if token == USDC else 0)
+            return 2.0 if token == USDC else 3.0
+
+        def cached_dai(tokens: Sequence[str], block: int) -> list[dict[str, object] | None]:
+            return [
+                {"price": 1.0, "block_timestamp": 1600000000} if t == DAI else None for t in tokens
+            ]
+
+        mock_set_many = MagicMock()
         mock_chain = type("MockChain", (), {"height": 19000000})()
 
         with (
-            patch("y.get_block_at_timestamp", mock_get_block_at_timestamp),
-            patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("y.get_price", AsyncMock(side_effect=fake_get_price)),
+            patch("y.get_prices", AsyncMock()) as mock_get_prices,
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
             patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", side_effect=_lookups_from(cached_dai)),
+            patch("src.server.set_cached_prices_many", mock_set_many),
         ):
             client = TestClient(app)
-            response = client.get(
-                "/prices", params={"tokens": f"{DAI},{USDC}", "timestamp": "1700000000"}
+            response = client.post(
+                "/prices",
+                json={"tokens": [USDC, WETH, DAI, USDC], "block": 18000000},
+                headers={"Accept": "application/x-ndjson"},
             )
 
-            assert response.status_code == 200
-            # Verify get_block_at_timestamp was called with a datetime object
-            mock_get_block_at_timestamp.assert_called_once()
-            call_args = mock_get_block_at_timestamp.call_args
-            dt_arg = call_args[0][0]
-            assert isinstance(dt_arg, datetime)
-            assert dt_arg == datetime.fromtimestamp(1700000000, tz=UTC)
-            assert dt_arg.tzinfo is not None
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [(r["index"], r["price"], r["cached"]) for r in lines] == [
+            (2, 1.0, True),
+            (1, 3.0, False),
+            (0, 2.0, False),
+            (3, 2.0, False),
+        ]
+        assert lines[0]["block_timestamp"] == 1600000000
+        assert lines[1]["block_timestamp"] == 1700000000
+        mock_get_prices.assert_not_called()
+        (written,) = mock_set_many.call_args.args
+        assert sorted(written) == [
+            (USDC, 18000000, 2.0, 1700000000),
+            (WETH, 18000000, 3.0, 1700000000),
+        ]
 
     @pytest.mark.asyncio
-    async def test_batch_with_timestamp_and_amounts(self, mock_y_module: None) -> None:
-        """Batch with timestamp and amounts combined works."""
+    async def test_failed_token_streams_null_price(self, mock_y_module: None) -> None:
+        import json
+
         from fastapi.testclient import TestClient
 
         from src.server import app
 
-        mock_get_block_at_timestamp = AsyncMock(return_value=18000000)
-        mock_get_prices = AsyncMock(return_value=[1.0, 2.0])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
         mock_chain = type("MockChain", (), {"height": 19000000})()
 
         with (
-            patch("y.get_block_at_timestamp", mock_get_block_at_timestamp),
-            patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("y.get_price", AsyncMock(return_value=None)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
             patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", side_effect=_no_cached_lookups),
         ):
             client = TestClient(app)
             response = client.get(
                 "/prices",
-                params={
-                    "tokens": f"{DAI},{USDC}",
-                    "timestamp": "1700000000",
-                    "amounts": "1000,500",
-                },
+                params={"tokens": DAI, "block": "18000000"},
+                headers={"Accept": "application/x-ndjson"},
             )
 
-            assert response.status_code == 200
-            data = response.json()
-            assert len(data) == 2
-            # Verify amounts were passed to get_prices
-            mock_get_prices.assert_called_once()
-            call_kwargs = mock_get_prices.call_args[1]
-            assert call_kwargs.get("amounts") == (1000.0, 500.0)
+        assert response.status_code == 200
+        (line,) = [json.loads(line) for line in response.text.splitlines()]
+        assert line["index"] == 0
+        assert line["price"] is None
+        assert line["trade_path"] is None
 
     @pytest.mark.asyncio
-    async def test_too_many_tokens_returns_400(self, mock_y_module: None) -> None:
-        """More than 100 tokens returns 400."""
-        from fastapi.testclient import TestClient
-
-        from src.params import MAX_BATCH_TOKENS
-        from src.server import app
-
-        mock_chain = type("MockChain", (), {"height": 19000000})()
-        tokens = ",".join([DAI] * (MAX_BATCH_TOKENS + 1))
+    async def test_producer_finishes_and_caches_after_client_leaves(
+        self, mock_y_module: None
+    ) -> None:
+        from src.params import BatchParams
+        from src.server import BatchTokenResult, _plan_batch, _produce_batch_prices
+
+        plan = _plan_batch(BatchParams(tokens=(DAI, USDC, WETH)))
+        queue: asyncio.Queue[tuple[int, BatchTokenResult]] = asyncio.Queue()
+        window = asyncio.Semaphore(1)
+        consumer_gone = asyncio.Event()
+        consumer_gone.set()
+        block_timestamp: asyncio.Future[int | None] = asyncio.Future()
+        block_timestamp.set_result(1700000000)
+        mock_set_many = MagicMock()
 
-        with patch("brownie.chain", mock_chain):
-            client = TestClient(app)
-            response = client.get("/prices", params={"tokens": tokens})
+        with (
+            patch("y.get_price", AsyncMock(return_value=1.0)),
+            patch("src.server.set_cached_prices_many", mock_set_many),
+        ):
+            await asyncio.wait_for(
+                _produce_batch_prices(
+                    plan, [0, 1, 2], 18000000, block_timestamp, window, queue, consumer_gone
+                ),
+                timeout=5,
+            )
 
-            assert response.status_code == 400
-            data = response.json()
-            assert "Too many" in data["error"]
+        assert queue.empty()
+        assert len(mock_set_many.call_args.args[0]) == 3
 
     @pytest.mark.asyncio
-    async def test_batch_results_include_block_timestamp(self, mock_y_module: None) -> None:
-        """Each element in batch response includes block_timestamp field."""
+    async def test_without_accept_header_returns_array(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
         from src.server import app
 
-        mock_get_prices = AsyncMock(return_value=[1.0, 1.0])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
         mock_chain = type("MockChain", (), {"height": 19000000})()
 
         with (
-            patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("y.get_prices", AsyncMock(return_value=[1.0])),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
             patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached_many", side_effect=_no_cached_lookups),
         ):
             client = TestClient(app)
-            response = client.get("/prices", params={"tokens": f"{DAI},{USDC}"})
+            response = client.get("/prices", params={"tokens": DAI, "block": "18000000"})
 
-            assert response.status_code == 200
-            data = response.json()
-            assert all("block_timestamp" in r for r in data)
-            assert all(r["block_timestamp"] == 1700000000 for r in data)
+        assert response.headers["content-type"].startswith("application/json")
+        assert isinstance(response.json(), list)
 
 
-class TestBatchPricesAmounts:
-    """Tests for amounts parameter in batch pricing."""
+class TestPriceSeries:
+    """Tests for /price_series."""
 
     @pytest.mark.asyncio
-    async def test_amounts_matching_count(self, mock_y_module: None) -> None:
-        """Amounts with matching count work for price impact."""
+    async def test_block_range_mixes_cache_hits_and_fetches(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
+        from src.cache import get_cached_price, set_cached_error, set_cached_price
         from src.server import app
 
-        mock_get_prices = AsyncMock(return_value=[0.99, 1.01])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
-        mock_chain = type("MockChain", (), {"height": 19000000})()
+        set_cached_price(DAI, 100, 1.5, block_timestamp=1600000000)
+        set_cached_error(DAI, 120, "no route")
+        mock_get_price = AsyncMock(side_effect=lambda token, block, **kw: block / 100)
 
         with (
-            patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
-            patch("brownie.chain", mock_chain),
+            patch("y.get_price", mock_get_price),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
         ):
             client = TestClient(app)
             response = client.get(
-                "/prices", params={"tokens": f"{DAI},{USDC}", "amounts": "1000,500"}
+                "/price_series",
+                params={"token": DAI, "start_block": "100", "end_block": "130", "step": "10"},
             )
 
-            assert response.status_code == 200
-            data = response.json()
-            assert len(data) == 2
-            # Verify amounts were passed
-            call_kwargs = mock_get_prices.call_args[1]
-            assert call_kwargs.get("amounts") == (1000.0, 500.0)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["token"] == DAI
+        assert [(p["block"], p["price"], p["cached"]) for p in data["points"]] == [
+            (100, 1.5, True),
+            (110, 1.1, False),
+            (120, None, True),
+            (130, 1.3, False),
+        ]
+        assert data["points"][2]["cached_error"] is True
+        assert data["points"][1]["block_timestamp"] == 1700000000
+        assert sorted(call.args[1] for call in mock_get_price.call_args_list) == [110, 130]
+        assert get_cached_price(DAI, 110) is not None
 
     @pytest.mark.asyncio
-    async def test_amounts_count_mismatch_returns_400(self, mock_y_module: None) -> None:
-        """Amounts count mismatch returns 400."""
+    async def test_timestamps_resolved_once_per_distinct_value(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
         from src.server import app
 
-        mock_chain = type("MockChain", (), {"height": 19000000})()
+        resolved = {1700000000: 18000000, 1700000600: 18000050}
 
-        with patch("brownie.chain", mock_chain):
+        async def fake_block_at(dt: datetime, **kwargs: object) -> int:
+            return resolved[int(dt.timestamp())]
+
+        mock_block_at = AsyncMock(side_effect=fake_block_at)
+        mock_get_price = AsyncMock(return_value=1.0)
+
+        with (
+            patch("y.get_block_at_timestamp", mock_block_at),
+            patch("y.get_price", mock_get_price),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
             client = TestClient(app)
-            response = client.get("/prices", params={"tokens": f"{DAI},{USDC}", "amounts": "1000"})
+            response = client.get(
+                "/price_series",
+                params={"token": DAI, "timestamps": "1700000600,1700000000,1700000600"},
+            )
 
-            assert response.status_code == 400
-            data = response.json()
-            assert "does not match" in data["error"].lower()
+        assert response.status_code == 200
+        points = response.json()["points"]
+        assert [(p["timestamp"], p["block"]) for p in points] == [
+            (1700000600, 18000050),
+            (1700000000, 18000000),
+            (1700000600, 18000050),
+        ]
+        assert mock_block_at.call_count == 2
+        assert mock_get_price.call_count == 2
 
     @pytest.mark.asyncio
-    async def test_invalid_amount_returns_400(self, mock_y_module: None) -> None:
-        """Invalid amount values return 400."""
+    async def test_streams_cached_points_first(self, mock_y_module: None) -> None:
+        import json
+
         from fastapi.testclient import TestClient
 
+        from src.cache import set_cached_price
         from src.server import app
 
-        mock_chain = type("MockChain", (), {"height": 19000000})()
+        set_cached_price(DAI, 102, 1.0)
 
-        with patch("brownie.chain", mock_chain):
+        with (
+            patch("y.get_price", AsyncMock(return_value=2.0)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
             client = TestClient(app)
             response = client.get(
-                "/prices", params={"tokens": f"{DAI},{USDC}", "amounts": "1000,abc"}
+                "/price_series",
+                params={"token": DAI, "start_block": "100", "end_block": "102"},
+                headers={"Accept": "application/x-ndjson"},
             )
 
-            assert response.status_code == 400
-            data = response.json()
-            assert "amount" in data["error"].lower()
-
-
-class TestBatchPricesCaching:
-    """Tests for caching behavior in batch pricing."""
-
-    @pytest.mark.asyncio
-    async def test_cache_hit_for_single_token(self, mock_y_module: None) -> None:
-        """Individual results are cached and retrievable via single /price."""
-        from unittest.mock import patch
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[0] == {
+            "index": 2,
+            "block": 102,
+            "block_timestamp": None,
+            "price": 1.0,
+            "cached": True,
+        }
+        assert sorted(line["index"] for line in lines[1:]) == [0, 1]
 
+    def test_failed_points_carry_their_error(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
         from src.server import app
 
-        mock_get_prices = AsyncMock(return_value=[1.0])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
-        mock_chain = type("MockChain", (), {"height": 19000000})()
-
-        # Mock cache functions
-        cached_data: dict[str, dict[str, object]] = {}
-
-        def mock_get_cached_price(token: str, block: int) -> dict[str, object] | None:
-            key = f"{token}:{block}"
-            return cached_data.get(key)
-
-        def mock_set_cached_price(
-            token: str, block: int, price: float, block_timestamp: int | None = None
-        ) -> None:
-            key = f"{token}:{block}"
-            cached_data[key] = {"price": price, "block_timestamp": block_timestamp}
+        async def fake_get_price(token: str, block: int, **kwargs: object) -> float | None:
+            if block == 101:
+                raise RuntimeError("pool reverted")
+            return None
 
         with (
-            patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
-            patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", mock_get_cached_price),
-            patch("src.server.set_cached_price", mock_set_cached_price),
+            patch("y.get_price", AsyncMock(side_effect=fake_get_price)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
         ):
             client = TestClient(app)
+            response = client.get(
+                "/price_series", params={"token": DAI, "start_block": "100", "end_block": "101"}
+            )
 
-            # First request - should fetch
-            response = client.get("/prices", params={"tokens": DAI, "block": "18000000"})
-            assert response.status_code == 200
-            data = response.json()
-            assert data[0]["cached"] is False
-
-            # Verify it was cached
-            assert f"{DAI}:18000000" in cached_data
+        assert response.status_code == 200
+        points = response.json()["points"]
+        assert [p["price"] for p in points] == [None, None]
+        assert "No price found" in points[0]["error"]
+        assert "pool reverted" in points[1]["error"]
 
     @pytest.mark.asyncio
-    async def test_amounts_bypass_cache_write(self, mock_y_module: None) -> None:
-        """Results with amounts are NOT cached."""
-        from unittest.mock import patch
+    async def test_stream_disconnect_still_caches_misses(self, mock_y_module: None) -> None:
+        import src.server as server_module
+        from src.cache import get_cached_price, set_cached_price
+        from src.params import SeriesParams
 
-        from fastapi.testclient import TestClient
+        set_cached_price(DAI, 100, 1.0)
+        release = asyncio.Event()
 
-        from src.server import app
+        async def slow_get_price(token: str, block: int, **kwargs: object) -> float:
+            await release.wait()
+            return 2.0
 
-        mock_get_prices = AsyncMock(return_value=[1.0])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
-        mock_chain = type("MockChain", (), {"height": 19000000})()
+        with (
+            patch("y.get_price", AsyncMock(side_effect=slow_get_price)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            response = await server_module._handle_series_request(
+                SeriesParams(token=DAI, blocks=(100, 101, 102)), stream=True
+            )
+            body = response.body_iterator
+            first = await body.__anext__()
+            assert b'"block": 100' in first
+            await body.aclose()
 
-        cached_data: dict[str, dict[str, object]] = {}
+            pending = list(server_module._series_fetches)
+            assert len(pending) == 2
+            release.set()
+            await asyncio.gather(*pending)
 
-        def mock_set_cached_price(
-            token: str, block: int, price: float, block_timestamp: int | None = None
-        ) -> None:
-            key = f"{token}:{block}"
-            cached_data[key] = {"price": price, "block_timestamp": block_timestamp}
+        assert get_cached_price(DAI, 101) is not None
+        assert get_cached_price(DAI, 102) is not None
 
-        with (
-            patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
-            patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", return_value=None),
-            patch("src.server.set_cached_price", mock_set_cached_price),
-        ):
-            client = TestClient(app)
+    def test_timestamp_resolution_failure_returns_502(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
 
-            # Request with amount - should NOT cache
+        from src.server import app
+
+        with patch("y.get_block_at_timestamp", AsyncMock(side_effect=RuntimeError("rpc down"))):
+            client = TestClient(app)
             response = client.get(
-                "/prices", params={"tokens": DAI, "block": "18000000", "amounts": "1000"}
+                "/price_series", params={"token": DAI, "timestamps": "1700000000"}
             )
-            assert response.status_code == 200
 
-            # Verify it was NOT cached
-            assert f"{DAI}:18000000" not in cached_data
+        assert response.status_code == 502
+        assert "resolve timestamps" in response.json()["error"]
 
+    def test_requires_range_or_timestamps(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
 
-class TestBatchPricesParams:
-    """Tests for ignored params in batch pricing."""
+        from src.server import app
 
+        client = TestClient(app)
+        response = client.get("/price_series", params={"token": DAI})
 
-class TestBatchPricesMixedAmounts:
-    """Tests for mixed amounts lists (some None) - documenting intended semantics.
+        assert response.status_code == 400
+        assert "timestamps" in response.json()["error"]
 
-    This documents the behavior where some tokens in a batch have amounts
-    specified and others don't. Tokens with None amounts are cached normally,
-    while tokens with amounts skip caching (since price depends on amount).
-    """
+
+class TestPriceMatrix:
+    """Tests for POST /price_matrix."""
 
     @pytest.mark.asyncio
-    async def test_mixed_amounts_passed_to_get_prices(self, mock_y_module: None) -> None:
-        """Mixed amounts list with None values is passed to get_prices correctly."""
+    async def test_one_get_prices_call_per_block_for_misses(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
+        from src.cache import get_cached_error, get_cached_price, set_cached_price
         from src.server import app
 
-        mock_get_prices = AsyncMock(return_value=[1.0, 2.0, 3.0])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
-        mock_chain = type("MockChain", (), {"height": 19000000})()
+        set_cached_price(DAI, 100, 1.0, block_timestamp=1600000000)
+        set_cached_price(USDC, 200, 0.99, block_timestamp=1600000200)
+        set_cached_price(WETH, 200, 2000.0, block_timestamp=1600000200)
+
+        async def fake_get_prices(
+            tokens: Sequence[str], block: int, **kwargs: object
+        ) -> list[float | None]:
+            return [None if token == WETH else block / 100 for token in tokens]
+
+        mock_get_prices = AsyncMock(side_effect=fake_get_prices)
 
         with (
             patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
-            patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", return_value=None),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
         ):
             client = TestClient(app)
-            # DAI has amount 1000, USDC has None, WETH has amount 500
-            response = client.get(
-                "/prices",
-                params={
-                    "tokens": f"{DAI},{USDC},{WETH}",
-                    "amounts": "1000,,500",
-                    "block": "18000000",
-                },
+            response = client.post(
+                "/price_matrix",
+                json={"tokens": [DAI, USDC, WETH, DAI.lower()], "blocks": [100, 200, 100]},
             )
 
-            assert response.status_code == 200
-            data = response.json()
-            assert len(data) == 3
-
-            # Verify amounts were passed correctly to get_prices
-            call_kwargs = mock_get_prices.call_args[1]
-            assert call_kwargs.get("amounts") == (1000.0, None, 500.0)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["blocks"] == [100, 200, 100]
+        assert data["tokens"] == [DAI, USDC, WETH, DAI.lower()]
+        assert data["prices"] == [
+            [1.0, 2.0, 1.0],
+            [1.0, 0.99, 1.0],
+            [None, 2000.0, None],
+            [1.0, 2.0, 1.0],
+        ]
+        assert data["block_timestamps"] == [1700000000, 1700000000, 1700000000]
+        calls = sorted(
+            (call.args[1], list(call.args[0])) for call in mock_get_prices.call_args_list
+        )
+        assert calls == [(100, [USDC, WETH]), (200, [DAI])]
+        assert get_cached_price(USDC, 100) is not None
+        assert get_cached_error(WETH, 100) is not None
 
     @pytest.mark.asyncio
-    async def test_mixed_amounts_caching_semantics(self, mock_y_module: None) -> None:
-        """Tokens with None amounts are cached, tokens with amounts are not."""
+    async def test_fully_cached_matrix_makes_no_calls(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
+        from src.cache import set_cached_error, set_cached_price
         from src.server import app
 
-        mock_get_prices = AsyncMock(return_value=[1.0, 2.0, 3.0])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
-        mock_chain = type("MockChain", (), {"height": 19000000})()
+        set_cached_price(DAI, 100, 1.0, block_timestamp=1600000000)
+        set_cached_error(USDC, 100, "no route")
+        mock_get_prices = AsyncMock()
 
-        cached_data: dict[str, dict[str, object]] = {}
+        with patch("y.get_prices", mock_get_prices):
+            client = TestClient(app)
+            response = client.post("/price_matrix", json={"tokens": [DAI, USDC], "blocks": [100]})
 
-        def mock_get_cached_price(token: str, block: int) -> dict[str, object] | None:
-            key = f"{token}:{block}"
-            return cached_data.get(key)
+        assert response.json()["prices"] == [[1.0], [None]]
+        assert response.json()["block_timestamps"] == [1600000000]
+        mock_get_prices.assert_not_called()
 
-        def mock_set_cached_price(
-            token: str, block: int, price: float, block_timestamp: int | None = None
-        ) -> None:
-            key = f"{token}:{block}"
-            cached_data[key] = {"price": price, "block_timestamp": block_timestamp}
+    @pytest.mark.asyncio
+    async def test_timestamps_are_resolved_to_blocks(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_block_at = AsyncMock(side_effect=[18000000, 18000050])
 
         with (
-            patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
-            patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", mock_get_cached_price),
-            patch("src.server.set_cached_price", mock_set_cached_price),
+            patch("y.get_block_at_timestamp", mock_block_at),
+            patch("y.get_prices", AsyncMock(return_value=[1.0])),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
         ):
             client = TestClient(app)
-            # DAI has amount, USDC has None, WETH has amount
-            response = client.get(
-                "/prices",
-                params={
-                    "tokens": f"{DAI},{USDC},{WETH}",
-                    "amounts": "1000,,500",
-                    "block": "18000000",
-                },
+            response = client.post(
+                "/price_matrix",
+                json={"tokens": [DAI], "timestamps": [1700000000, "2023-11-14T22:23:20Z"]},
             )
 
-            assert response.status_code == 200
+        data = response.json()
+        assert data["blocks"] == [18000000, 18000050]
+        assert data["timestamps"] == [1700000000, 1700000600]
+        assert data["prices"] == [[1.0, 1.0]]
 
-            # USDC (with None amount) should be cached
-            assert f"{USDC}:18000000" in cached_data
+    @pytest.mark.parametrize("error", [TimeoutError, RuntimeError("rpc reset")])
+    def test_timed_out_or_failed_block_is_not_cached(
+        self, mock_y_module: None, error: BaseException | type[BaseException]
+    ) -> None:
+        from fastapi.testclient import TestClient
 
-            # DAI and WETH (with amounts) should NOT be cached
-            assert f"{DAI}:18000000" not in cached_data
-            assert f"{WETH}:18000000" not in cached_data
+        from src.cache import get_cached_error
+        from src.server import app
 
-    @pytest.mark.asyncio
-    async def test_all_none_amounts_all_cached(self, mock_y_module: None) -> None:
-        """When all amounts are None, all results are cached."""
+        with (
+            patch("y.get_prices", AsyncMock(side_effect=error)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            client = TestClient(app)
+            response = client.post("/price_matrix", json={"tokens": [DAI], "blocks": [100]})
+
+        assert response.status_code == 200
+        assert response.json()["prices"] == [[None]]
+        assert get_cached_error(DAI, 100) is None
+
+    def test_invalid_body_returns_400(self, mock_y_module: None) -> None:
         from fastapi.testclient import TestClient
 
         from src.server import app
 
-        mock_get_prices = AsyncMock(return_value=[1.0, 2.0])
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
-        mock_chain = type("MockChain", (), {"height": 19000000})()
+        client = TestClient(app)
+        response = client.post("/price_matrix", json={"tokens": [DAI]})
 
-        cached_data: dict[str, dict[str, object]] = {}
+        assert response.status_code == 400
+        assert "blocks" in response.json()["error"]
 
-        def mock_set_cached_price(
-            token: str, block: int, price: float, block_timestamp: int | None = None
-        ) -> None:
-            key = f"{token}:{block}"
-            cached_data[key] = {"price": price, "block_timestamp": block_timestamp}
 
+@pytest.fixture
+async def jobs_client(mock_y_module: None, tmp_path: Path) -> AsyncGenerator[Any]:
+    """An async client with the job runner started on a temporary job store."""
+    from httpx import ASGITransport, AsyncClient
+
+    from src.server import _jobs, app
+
+    await _jobs.start(str(tmp_path / "jobs.sqlite3"))
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+    finally:
+        await _jobs.stop()
+
+
+async def _poll_job(client: Any, job_id: str) -> dict[str, Any]:
+    for _ in range(200):
+        data: dict[str, Any] = (await client.get(f"/jobs/{job_id}")).json()
+        if data["status"] in ("done", "failed"):
+            return data
+        await asyncio.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+class TestJobsEndpoint:
+    """Tests for POST /jobs and GET /jobs/{id}."""
+
+    @pytest.mark.asyncio
+    async def test_price_job(self, jobs_client: Any) -> None:
         with (
-            patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
-            patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", return_value=None),
-            patch("src.server.set_cached_price", mock_set_cached_price),
+            patch("y.get_price", AsyncMock(return_value=1.5)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
         ):
-            client = TestClient(app)
-            # Both tokens have None amounts
-            response = client.get(
-                "/prices",
-                params={
-                    "tokens": f"{DAI},{USDC}",
-                    "amounts": ",",
-                    "block": "18000000",
-                },
+            response = await jobs_client.post(
+                "/jobs", json={"kind": "price", "token": DAI, "block": 18000000}
             )
+            assert response.status_code == 202
+            assert response.json()["status"] == "queued"
+            job = await _poll_job(jobs_client, response.json()["id"])
 
-            assert response.status_code == 200
-
-            # Both should be cached
-            assert f"{DAI}:18000000" in cached_data
-            assert f"{USDC}:18000000" in cached_data
+        assert job["status"] == "done"
+        assert job["result"]["price"] == 1.5
+        assert job["result"]["block"] == 18000000
 
     @pytest.mark.asyncio
-    async def test_none_amount_token_uses_cache_on_hit(self, mock_y_module: None) -> None:
-        """Tokens with None amounts can get cache hits."""
-        from fastapi.testclient import TestClient
+    async def test_batch_job_result_in_request_order(self, jobs_client: Any) -> None:
+        import json
 
-        from src.server import app
+        usd = {DAI: 1.0, USDC: 0.99}
 
-        mock_get_prices = AsyncMock(return_value=[1.0])  # Only for WETH
-        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
-        mock_chain = type("MockChain", (), {"height": 19000000})()
+        with (
+            patch("y.get_price", AsyncMock(side_effect=lambda token, block, **kw: usd[token])),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            submitted = (
+                await jobs_client.post(
+                    "/jobs", json={"kind": "batch", "tokens": [DAI, USDC], "block": 18000000}
+                )
+            ).json()
+            job = await _poll_job(jobs_client, submitted["id"])
+            streamed = await jobs_client.get(
+                f"/jobs/{submitted['id']}", headers={"Accept": "application/x-ndjson"}
+            )
 
-        # DAI already cached
-        def mock_get_cached_price(token: str, block: int) -> dict[str, object] | None:
-            if token == DAI:
-                return {"price": 1.0, "block_timestamp": 1700000000}
-            return None
+        assert [r["price"] for r in job["result"]] == [1.0, 0.99]
+        assert "index" not in job["result"][0]
+        lines = [json.loads(line) for line in streamed.text.splitlines()]
+        assert sorted(line["index"] for line in lines[:-1]) == [0, 1]
+        assert lines[-1]["status"] == "done"
 
+    @pytest.mark.asyncio
+    async def test_series_job(self, jobs_client: Any) -> None:
         with (
-            patch("y.get_prices", mock_get_prices),
-            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
-            patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", mock_get_cached_price),
-            patch("src.server.set_cached_price", lambda *args, **kwargs: None),
+            patch("y.get_price", AsyncMock(side_effect=lambda token, block, **kw: block / 100)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
         ):
-            client = TestClient(app)
-            # DAI has None amount (can use cache), WETH has amount (must fetch)
-            response = client.get(
-                "/prices",
-                params={
-                    "tokens": f"{DAI},{WETH}",
-                    "amounts": ",500",
-                    "block": "18000000",
-                },
-            )
+            submitted = (
+                await jobs_client.post(
+                    "/jobs",
+                    json={"kind": "series", "token": DAI, "start_block": 100, "end_block": 102},
+                )
+            ).json()
+            job = await _poll_job(jobs_client, submitted["id"])
 
-            assert response.status_code == 200
-            data = response.json()
-            assert len(data) == 2
+        assert job["result"]["token"] == DAI
+        assert [p["price"] for p in job["result"]["points"]] == [1.0, 1.01, 1.02]
 
-            # DAI should be from cache
-            assert data[0]["token"] == DAI
-            assert data[0]["cached"] is True
+    @pytest.mark.asyncio
+    async def test_failed_job_reports_error(self, jobs_client: Any) -> None:
+        with patch("y.get_price", AsyncMock(return_value=None)):
+            submitted = (
+                await jobs_client.post(
+                    "/jobs", json={"kind": "price", "token": DAI, "block": 18000000}
+                )
+            ).json()
+            job = await _poll_job(jobs_client, submitted["id"])
 
-            # WETH should be fresh
-            assert data[1]["token"] == WETH
-            assert data[1]["cached"] is False
+        assert job["status"] == "failed"
+        assert job["error_status"] == 404
+        assert "No price found" in job["error"]
 
-            # get_prices should only be called for WETH
-            mock_get_prices.assert_called_once()
-            call_args = mock_get_prices.call_args
-            # The tokens passed should just be WETH
-            assert call_args[0][0] == (WETH,)
+    @pytest.mark.asyncio
+    async def test_job_admitted_and_charged_as_submitting_client(self, jobs_client: Any) -> None:
+        from src.ratelimit import ClientLimiter
+
+        limiter = ClientLimiter(rate=0.01, burst=1, compute_rate=1.0, compute_burst=100)
+        client = {"X-Forwarded-For": "5.5.5.5"}
+        body = {"kind": "price", "token": DAI, "block": 18000000}
+
+        with (
+            patch("src.server._limiter", limiter),
+            patch("src.server.TRUSTED_PROXY_HOPS", 1),
+            patch.object(limiter, "charge_compute", wraps=limiter.charge_compute) as charge,
+            patch("y.get_price", AsyncMock(return_value=1.5)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+        ):
+            submitted = await jobs_client.post("/jobs", json=body, headers=client)
+            job = await _poll_job(jobs_client, submitted.json()["id"])
+            refused = await jobs_client.post("/jobs", json=body, headers=client)
+
+        assert job["status"] == "done"
+        assert {call.args[0] for call in charge.call_args_list} == {"ip:5.5.5.5"}
+        assert refused.status_code == 429
+        assert "Retry-After" in refused.headers
+
+    @pytest.mark.asyncio
+    async def test_invalid_job_and_unknown_id(self, jobs_client: Any) -> None:
+        invalid = await jobs_client.post("/jobs", json={"kind": "nope"})
+        unknown = await jobs_client.get("/jobs/does-not-exist")
+
+        assert invalid.status_code == 400
+        assert "kind" in invalid.json()["error"]
+        assert unknown.status_code == 404
 
 
 class TestCheckBucketEndpoint:
@@ -1831,7 +3740,7 @@ class TestCrossAreaCacheAmount:
             patch("y.get_price", mock_get_price),
             patch("y.get_block_timestamp_async", mock_get_block_timestamp),
             patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", return_value=None),
+            patch("src.server.lookup_cached", return_value=CacheMiss()),
             patch("src.server.set_cached_price", mock_set_cached_price),
         ):
             client = TestClient(app)
@@ -1861,9 +3770,9 @@ class TestCrossAreaCacheAmount:
 
         cached_data: dict[str, dict[str, object]] = {}
 
-        def mock_get_cached_price(token: str, block: int) -> dict[str, object] | None:
-            key = f"{token}:{block}"
-            return cached_data.get(key)
+        def mock_lookup_cached(token: str, block: int) -> CacheLookup:
+            entry = cached_data.get(f"{token}:{block}")
+            return CacheHit(entry) if entry is not None else CacheMiss()
 
         def mock_set_cached_price(
             token: str, block: int, price: float, block_timestamp: int | None = None
@@ -1875,7 +3784,7 @@ class TestCrossAreaCacheAmount:
             patch("y.get_price", mock_get_price),
             patch("y.get_block_timestamp_async", mock_get_block_timestamp),
             patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", mock_get_cached_price),
+            patch("src.server.lookup_cached", mock_lookup_cached),
             patch("src.server.set_cached_price", mock_set_cached_price),
         ):
             client = TestClient(app)
@@ -1993,7 +3902,7 @@ class TestPriceTimeoutAndMisc:
         with (
             patch("y.get_price", slow_price),
             patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", return_value=None),
+            patch("src.server.lookup_cached", return_value=CacheMiss()),
         ):
             client = TestClient(app)
             response = client.get("/price", params={"token": DAI})
@@ -2047,7 +3956,7 @@ class TestPriceTimeoutAndMisc:
             patch("y.get_prices", mock_get_prices),
             patch("y.get_block_timestamp_async", mock_get_block_timestamp),
             patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", return_value=None),
+            patch("src.server.lookup_cached_many", side_effect=_no_cached_lookups),
         ):
             client = TestClient(app)
             response = client.get(
@@ -2059,6 +3968,133 @@ class TestPriceTimeoutAndMisc:
         assert "silent" not in mock_get_prices.call_args.kwargs
 
 
+class TestPriceDeadline:
+    """Tests for client deadlines on /price (timeout / X-Request-Deadline)."""
+
+    @pytest.mark.asyncio
+    async def test_deadline_returns_504_and_cancels_lookup(self, mock_y_module: None) -> None:
+        from httpx import ASGITransport, AsyncClient
+
+        from src.server import app
+
+        cancelled = asyncio.Event()
+
+        async def slow_price(*args: object, **kwargs: object) -> float:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return 1.0
+
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+        with (
+            patch("y.get_price", slow_price),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached", return_value=CacheMiss()),
+        ):
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://t") as c:
+                response = await c.get(
+                    "/price", params={"token": DAI, "block": "18000000", "timeout": "0.05"}
+                )
+            await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+        assert response.status_code == 504
+        assert response.json() == {"error": "Price lookup exceeded the 0.05s deadline"}
+        assert response.headers["Server-Timing"] == "deadline;dur=50, remaining;dur=0"
+
+    @pytest.mark.asyncio
+    async def test_continue_in_background_fills_cache(self, mock_y_module: None) -> None:
+        from httpx import ASGITransport, AsyncClient
+
+        from src.server import _deadline_background, app
+
+        release = asyncio.Event()
+
+        async def slow_price(*args: object, **kwargs: object) -> float:
+            await release.wait()
+            return 2.0
+
+        mock_set_price = MagicMock()
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+        with (
+            patch("y.get_price", slow_price),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached", return_value=CacheMiss()),
+            patch("src.server.set_cached_price", mock_set_price),
+        ):
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://t") as c:
+                response = await c.get(
+                    "/price",
+                    params={"token": DAI, "block": "18000000", "continue_in_background": "true"},
+                    headers={"X-Request-Deadline": "0.05"},
+                )
+            assert response.status_code == 504
+            assert len(_deadline_background) == 1
+            release.set()
+            await asyncio.gather(*_deadline_background)
+
+        mock_set_price.assert_called_once_with(DAI, 18000000, 2.0, block_timestamp=1700000000)
+        assert not _deadline_background
+
+    @pytest.mark.asyncio
+    async def test_success_reports_remaining_budget(self, mock_y_module: None) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+        with (
+            patch("y.get_price", AsyncMock(return_value=1.0)),
+            patch("y.get_block_timestamp_async", AsyncMock(return_value=1700000000)),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached", return_value=CacheMiss()),
+        ):
+            client = TestClient(app)
+            # The shorter of the query parameter and the header applies
+            response = client.get(
+                "/price",
+                params={"token": DAI, "timeout": "30"},
+                headers={"X-Request-Deadline": "2"},
+            )
+
+        assert response.status_code == 200
+        assert response.json()["price"] == 1.0
+        timing = dict(
+            part.strip().split(";dur=") for part in response.headers["Server-Timing"].split(",")
+        )
+        assert timing["deadline"] == "2000"
+        assert 0 < int(timing["remaining"]) <= 2000
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        ("params", "headers", "message"),
+        [
+            ({"timeout": "soon"}, {}, "Invalid timeout: 'soon'"),
+            ({"timeout": "0"}, {}, "Invalid timeout: '0'"),
+            ({}, {"X-Request-Deadline": "301"}, "Invalid X-Request-Deadline: '301'"),
+        ],
+    )
+    async def test_invalid_deadline_returns_400(
+        self,
+        mock_y_module: None,
+        params: dict[str, str],
+        headers: dict[str, str],
+        message: str,
+    ) -> None:
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        client = TestClient(app)
+        response = client.get("/price", params={"token": DAI, **params}, headers=headers)
+
+        assert response.status_code == 400
+        assert response.json()["error"].startswith(message)
+        assert "Server-Timing" not in response.headers
+
+
 class TestRedocEndpoint:
     """Tests for GET /redoc documentation endpoint."""
 
@@ -2130,15 +4166,15 @@ class TestPriceCacheHit:
         mock_get_price = AsyncMock(return_value=1.0)
         mock_chain = type("MockChain", (), {"height": 19000000})()
 
-        def mock_get_cached_price(token: str, block: int) -> dict[str, object] | None:
+        def mock_lookup_cached(token: str, block: int) -> CacheLookup:
             if token == DAI and block == 18000000:
-                return {"price": 1.23, "block_timestamp": 1700000000}
-            return None
+                return CacheHit({"price": 1.23, "block_timestamp": 1700000000})
+            return CacheMiss()
 
         with (
             patch("y.get_price", mock_get_price),
             patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", mock_get_cached_price),
+            patch("src.server.lookup_cached", mock_lookup_cached),
         ):
             client = TestClient(app)
             response = client.get("/price", params={"token": DAI, "block": "18000000"})
@@ -2508,8 +4544,7 @@ class TestErrorCaching:
             patch("y.get_price", mock_get_price),
             patch("y.get_block_timestamp_async", mock_get_block_timestamp),
             patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", return_value=None),
-            patch("src.server.get_cached_error", return_value=None),
+            patch("src.server.lookup_cached", return_value=CacheMiss()),
             patch("src.server.set_cached_error", mock_set_cached_error),
         ):
             client = TestClient(app)
@@ -2539,8 +4574,7 @@ class TestErrorCaching:
         with (
             patch("y.get_price", mock_get_price),
             patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", return_value=None),
-            patch("src.server.get_cached_error", return_value=cached_error_entry),
+            patch("src.server.lookup_cached", return_value=CacheErrorHit(cached_error_entry)),
         ):
             client = TestClient(app)
             response = client.get("/price", params={"token": DAI, "block": "18000000"})
@@ -2549,6 +4583,30 @@ class TestErrorCaching:
         # The real price fetch must NOT have been called
         mock_get_price.assert_not_called()
 
+    @pytest.mark.asyncio
+    async def test_miss_path_reads_cache_once(self, mock_y_module: None) -> None:
+        """A cache miss costs one lookup, not a price read followed by an error read."""
+        from fastapi.testclient import TestClient
+
+        from src.server import app
+
+        mock_get_price = AsyncMock(return_value=1.0)
+        mock_get_block_timestamp = AsyncMock(return_value=1700000000)
+        mock_chain = type("MockChain", (), {"height": 19000000})()
+        mock_lookup = MagicMock(return_value=CacheMiss())
+
+        with (
+            patch("y.get_price", mock_get_price),
+            patch("y.get_block_timestamp_async", mock_get_block_timestamp),
+            patch("brownie.chain", mock_chain),
+            patch("src.server.lookup_cached", mock_lookup),
+        ):
+            client = TestClient(app)
+            response = client.get("/price", params={"token": DAI, "block": "18000000"})
+
+        assert response.status_code == 200
+        mock_lookup.assert_called_once_with(DAI, 18000000)
+
     @pytest.mark.asyncio
     async def test_exception_is_cached_as_error(self, mock_y_module: None) -> None:
         """When price fetch raises an exception, the error is written to cache."""
@@ -2566,8 +4624,7 @@ class TestErrorCaching:
         with (
             patch("y.get_price", mock_get_price),
             patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", return_value=None),
-            patch("src.server.get_cached_error", return_value=None),
+            patch("src.server.lookup_cached", return_value=CacheMiss()),
             patch("src.server.set_cached_error", mock_set_cached_error),
         ):
             client = TestClient(app)
@@ -2691,8 +4748,7 @@ class TestForceCacheBypass:
             patch("y.get_price", mock_get_price),
             patch("y.get_block_timestamp_async", mock_get_block_timestamp),
             patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", return_value=None),
-            patch("src.server.get_cached_error", return_value=cached_error_entry),
+            patch("src.server.lookup_cached", return_value=CacheErrorHit(cached_error_entry)),
         ):
             client = TestClient(app)
             response = client.get(
@@ -2724,8 +4780,7 @@ class TestForceCacheBypass:
         with (
             patch("y.get_price", mock_get_price),
             patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", return_value=None),
-            patch("src.server.get_cached_error", return_value=cached_error_entry),
+            patch("src.server.lookup_cached", return_value=CacheErrorHit(cached_error_entry)),
         ):
             client = TestClient(app)
             response = client.get("/price", params={"token": DAI, "block": "18000000"})
@@ -2760,8 +4815,7 @@ class TestForceCacheBypass:
             patch("y.get_price", mock_get_price),
             patch("y.get_block_timestamp_async", mock_get_block_timestamp),
             patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", return_value=None),
-            patch("src.server.get_cached_error", return_value=cached_error_entry),
+            patch("src.server.lookup_cached", return_value=CacheErrorHit(cached_error_entry)),
             patch("src.server.set_cached_price", mock_set_cached_price),
         ):
             client = TestClient(app)
@@ -2790,8 +4844,7 @@ class TestForceCacheBypass:
             patch("y.get_price", mock_get_price),
             patch("y.get_block_timestamp_async", mock_get_block_timestamp),
             patch("brownie.chain", mock_chain),
-            patch("src.server.get_cached_price", return_value=None),
-            patch("src.server.get_cached_error", return_value=None),
+            patch("src.server.lookup_cached", return_value=CacheMiss()),
         ):
             client = TestClient(app)
             response = client.get(
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from src.singleflight import SingleFlight, singleflight_calls_total
+
+
+def _count(group: str, role: str) -> float:
+    value: float = singleflight_calls_total.labels(group=group, role=role)._value.get()
+    return value
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_call(self) -> None:
+        flights: SingleFlight[int] = SingleFlight("test-share")
+        calls = 0
+        release = asyncio.Event()
+
+        async def work() -> int:
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return 42
+
+        waiters = [asyncio.create_task(flights.do("k", work)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        assert await asyncio.gather(*waiters) == [42] * 5
+        assert calls == 1
+        assert _count("test-share", "leader") == 1
+        assert _count("test-share", "coalesced") == 4
+        assert len(flights) == 0
+
+    @pytest.mark.asyncio
+    async def test_different_keys_run_separately(self) -> None:
+        flights: SingleFlight[str] = SingleFlight("test-keys")
+
+        async def work(value: str) -> str:
+            await asyncio.sleep(0)
+            return value
+
+        results = await asyncio.gather(
+            flights.do("a", lambda: work("a")), flights.do("b", lambda: work("b"))
+        )
+        assert list(results) == ["a", "b"]
+
+    @pytest.mark.asyncio
+    async def test_exception_reaches_every_caller_and_is_not_cached(self) -> None:
+        flights: SingleFlight[int] = SingleFlight("test-error")
+        attempts = 0
+
+        async def failing() -> int:
+            nonlocal attempts
+            attempts += 1
+            await asyncio.sleep(0)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(
+            flights.do("k", failing), flights.do("k", failing), return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        with pytest.raises(RuntimeError):
+            await flights.do("k", failing)
+        assert attempts == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_shared_work(self) -> None:
+        flights: SingleFlight[int] = SingleFlight("test-cancel")
+        release = asyncio.Event()
+        finished = False
+
+        async def work() -> int:
+            nonlocal finished
+            await release.wait()
+            finished = True
+            return 7
+
+        leader = asyncio.create_task(flights.do("k", work))
+        follower = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        release.set()
+        assert await follower == 7
+        assert finished
+
+    @pytest.mark.asyncio
+    async def test_work_completes_when_every_caller_is_cancelled(self) -> None:
+        flights: SingleFlight[int] = SingleFlight("test-orphan")
+        done = asyncio.Event()
+
+        async def work() -> int:
+            await asyncio.sleep(0.01)
+            done.set()
+            return 1
+
+        caller = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0)
+        caller.cancel()
+        await asyncio.wait_for(done.wait(), timeout=1)
+        await asyncio.sleep(0)
+        assert len(flights) == 0
+
+    @pytest.mark.asyncio
+    async def test_work_cancelled_when_every_caller_leaves_without_keep_running(self) -> None:
+        flights: SingleFlight[int] = SingleFlight("test-drop")
+        cancelled = asyncio.Event()
+
+        async def work() -> int:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return 1
+
+        callers = [asyncio.create_task(flights.do("k", work, keep_running=False)) for _ in range(2)]
+        await asyncio.sleep(0)
+        callers[0].cancel()
+        await asyncio.sleep(0)
+        assert not cancelled.is_set()
+        callers[1].cancel()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        await asyncio.sleep(0)
+        assert len(flights) == 0
+
+    @pytest.mark.asyncio
+    async def test_one_keep_running_caller_keeps_the_work(self) -> None:
+        flights: SingleFlight[int] = SingleFlight("test-keep")
+        done = asyncio.Event()
+
+        async def work() -> int:
+            await asyncio.sleep(0.01)
+            done.set()
+            return 1
+
+        dropping = asyncio.create_task(flights.do("k", work, keep_running=False))
+        keeping = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0)
+        dropping.cancel()
+        keeping.cancel()
+        await asyncio.wait_for(done.wait(), timeout=1)
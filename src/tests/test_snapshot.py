@@ -0,0 +1,127 @@
+import gzip
+from collections.abc import Generator
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.cache import (
+    close_cache,
+    get_cached_price,
+    set_cached_error,
+    set_cached_price,
+    set_cached_prices_many,
+)
+from src.snapshot import (
+    SnapshotError,
+    export_snapshot,
+    import_snapshot,
+    iter_snapshot,
+    read_snapshot_header,
+)
+
+TOKEN_A = "0x" + "aa" * 20
+TOKEN_B = "0x" + "bb" * 20
+
+
+def _use_cache(path: Path) -> None:
+    """Point the price cache at a different directory."""
+    close_cache()
+    patch("src.cache.CACHE_DIR", str(path)).start()
+
+
+@pytest.fixture(autouse=True)
+def stop_patches() -> Generator[None]:
+    yield
+    patch.stopall()
+
+
+@pytest.fixture
+def snapshot(tmp_path: Path) -> str:
+    """A snapshot of a small cache with prices, an error and a non-address key."""
+    _use_cache(tmp_path / "source")
+    set_cached_prices_many(
+        [(TOKEN_B, 10, 2.5, 1700000000), (TOKEN_A, 20, 1.0, None), (TOKEN_A, 3, 1.5, 1600000000)]
+    )
+    set_cached_error(TOKEN_B, 11, "no route")
+    set_cached_price("not-an-address", 1, 9.0)
+    path = str(tmp_path / "prices.snap")
+    export_snapshot(path, chain="ethereum")
+    return path
+
+
+class TestExport:
+    def test_records_sorted_by_token_then_block(self, snapshot: str) -> None:
+        assert list(iter_snapshot(snapshot)) == [
+            (TOKEN_A, 3, 1.5, 1600000000),
+            (TOKEN_A, 20, 1.0, None),
+            (TOKEN_B, 10, 2.5, 1700000000),
+        ]
+
+    def test_header(self, snapshot: str) -> None:
+        header = read_snapshot_header(snapshot)
+        assert header.chain == "ethereum"
+        assert header.count == 3
+
+    def test_sorts_across_spilled_runs(self, tmp_path: Path) -> None:
+        _use_cache(tmp_path / "source")
+        tokens = [f"0x{i:040x}" for i in range(50)]
+        set_cached_prices_many((t, b, 1.0, None) for t in reversed(tokens) for b in (2, 1))
+        path = str(tmp_path / "runs.snap")
+        with patch("src.snapshot._SORT_RUN_SIZE", 7):
+            export_snapshot(path, chain="ethereum")
+        assert [(t, b) for t, b, _, _ in iter_snapshot(path)] == [
+            (t, b) for t in tokens for b in (1, 2)
+        ]
+
+
+class TestImport:
+    def test_round_trip_into_fresh_cache(self, snapshot: str, tmp_path: Path) -> None:
+        _use_cache(tmp_path / "dest")
+        result = import_snapshot(snapshot, chain="ethereum")
+        assert result.imported == 3
+        entry = get_cached_price(TOKEN_B, 10)
+        assert entry is not None
+        assert entry["price"] == 2.5
+        assert entry["block_timestamp"] == 1700000000
+        assert get_cached_price(TOKEN_B, 11) is None
+
+    def test_does_not_overwrite_existing_entries(self, snapshot: str, tmp_path: Path) -> None:
+        _use_cache(tmp_path / "dest")
+        set_cached_price(TOKEN_A, 3, 99.0)
+        result = import_snapshot(snapshot)
+        assert (result.imported, result.existing) == (2, 1)
+        entry = get_cached_price(TOKEN_A, 3)
+        assert entry is not None
+        assert entry["price"] == 99.0
+
+    def test_second_import_is_a_noop(self, snapshot: str, tmp_path: Path) -> None:
+        _use_cache(tmp_path / "dest")
+        import_snapshot(snapshot)
+        result = import_snapshot(snapshot)
+        assert (result.imported, result.existing, result.resumed_from) == (0, 0, 3)
+
+    def test_resumes_after_interruption(self, snapshot: str, tmp_path: Path) -> None:
+        _use_cache(tmp_path / "dest")
+
+        def interrupt(done: int, total: int) -> None:
+            raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            import_snapshot(snapshot, batch_size=2, progress=interrupt)
+        result = import_snapshot(snapshot, batch_size=2)
+        assert result.resumed_from == 2
+        assert result.imported == 1
+        assert get_cached_price(TOKEN_B, 10) is not None
+
+    def test_rejects_other_chain(self, snapshot: str, tmp_path: Path) -> None:
+        _use_cache(tmp_path / "dest")
+        with pytest.raises(SnapshotError, match="ethereum"):
+            import_snapshot(snapshot, chain="base")
+
+    def test_rejects_non_snapshot_file(self, tmp_path: Path) -> None:
+        path = tmp_path / "bogus.snap"
+        with gzip.open(path, "wb") as f:
+            f.write(b"not a snapshot")
+        with pytest.raises(SnapshotError):
+            import_snapshot(str(path))